@@ -0,0 +1,233 @@
+"""
+دفتر أرصدة العملاء والموردين (AccountTransaction.balance_after)
+
+- الرصيد بعد الحركة = رصيد الحركة السابقة (بترتيب date, created_at, id) + أثرها.
+- رصيد CustomerSupplier يُحدّث بتحديث ذرّي واحد F('balance') + الفرق.
+- الحركات بتاريخ سابق (أو تعديل المبلغ/الاتجاه/التاريخ والحذف) تعيد ترقيم
+  الأرصدة اللاحقة فقط بدالة نافذة (Window) ويُكتب منها ما تغيّر فقط.
+- إعادة البناء الكاملة بأمر fix_balance_after.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Q, Sum, When, Window
+
+ZERO = Decimal('0')
+
+LEDGER_ORDER = ('date', 'created_at', 'id')
+
+
+def signed_amount(direction, amount):
+    """أثر الحركة على رصيد الطرف: المدين يزيد والدائن ينقص"""
+    amount = amount or ZERO
+    return amount if direction == 'debit' else -amount
+
+
+def _signed_expression():
+    return Case(
+        When(direction='debit', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=18, decimal_places=3),
+    )
+
+
+def _running_balance(partition=False):
+    return Window(
+        expression=Sum(_signed_expression()),
+        partition_by=[F('customer_supplier_id')] if partition else None,
+        order_by=[F(name).asc() for name in LEDGER_ORDER],
+    )
+
+
+class PartyLedgerService:
+    """الرصيد المتراكم لحركات العملاء والموردين"""
+
+    @staticmethod
+    def _after(date, created_at, pk):
+        """شرط الحركات الواقعة بعد الموضع (date, created_at, id)"""
+        return (Q(date__gt=date) |
+                Q(date=date, created_at__gt=created_at) |
+                Q(date=date, created_at=created_at, id__gt=pk))
+
+    @staticmethod
+    def previous_balance(transaction):
+        """رصيد آخر حركة للطرف قبل هذه الحركة (صفر إذا لم توجد) - استعلام واحد"""
+        from .models import AccountTransaction
+
+        rows = AccountTransaction.objects.filter(customer_supplier_id=transaction.customer_supplier_id)
+        if transaction.pk:
+            rows = rows.exclude(pk=transaction.pk).exclude(
+                PartyLedgerService._after(transaction.date, transaction.created_at, transaction.pk)
+            )
+        else:
+            # الحركة الجديدة تقع بعد جميع حركات تاريخها
+            rows = rows.filter(date__lte=transaction.date)
+        previous = rows.order_by('-date', '-created_at', '-id').values_list('balance_after', flat=True).first()
+        return previous if previous is not None else ZERO
+
+    @staticmethod
+    def has_later(transaction):
+        from .models import AccountTransaction
+
+        return AccountTransaction.objects.filter(
+            customer_supplier_id=transaction.customer_supplier_id
+        ).filter(
+            PartyLedgerService._after(transaction.date, transaction.created_at, transaction.pk)
+        ).exists()
+
+    @staticmethod
+    def apply_party_delta(party_id, delta, party=None):
+        """تحديث ذرّي لرصيد الطرف بدون إعادة الحساب أو سيجنالات الحفظ"""
+        from customers.models import CustomerSupplier
+
+        if not delta:
+            return
+        CustomerSupplier.objects.filter(pk=party_id).update(balance=F('balance') + delta)
+        if party is not None:
+            # إبقاء الكائن المحمّل متوافقاً مع القيمة المخزنة
+            party.balance = (party.balance or ZERO) + delta
+
+    @staticmethod
+    def resequence(party_id, after=None, since_date=None):
+        """
+        إعادة حساب balance_after للحركات اللاحقة لموضع محدد فقط.
+
+        Args:
+            after: (date, created_at, id) - الحركات بعد هذا الموضع
+            since_date: أو جميع الحركات من هذا التاريخ شاملاً
+            (بدونهما تُعاد جميع حركات الطرف)
+
+        Returns:
+            int: عدد الحركات التي تغيّر رصيدها
+        """
+        from .models import AccountTransaction
+
+        rows = AccountTransaction.objects.filter(customer_supplier_id=party_id)
+        base = ZERO
+        suffix = None
+        if after is not None:
+            suffix = PartyLedgerService._after(*after)
+        elif since_date is not None:
+            suffix = Q(date__gte=since_date)
+        if suffix is not None:
+            previous = rows.exclude(suffix).order_by('-date', '-created_at', '-id').values_list(
+                'balance_after', flat=True
+            ).first()
+            base = previous if previous is not None else ZERO
+            rows = rows.filter(suffix)
+
+        changed = []
+        for pk, balance_after, running in rows.annotate(running=_running_balance()).values_list(
+            'id', 'balance_after', 'running'
+        ).order_by(*LEDGER_ORDER):
+            expected = base + (running or ZERO)
+            if balance_after != expected:
+                changed.append(AccountTransaction(id=pk, balance_after=expected))
+        AccountTransaction.objects.bulk_update(changed, ['balance_after'], batch_size=500)
+        return len(changed)
+
+    @staticmethod
+    def transaction_saved(transaction, old_state):
+        """
+        ترحيل أثر حفظ الحركة بعد كتابتها.
+
+        Args:
+            old_state: (customer_supplier_id, direction, amount, date) كما حُمّلت، أو None للحركة الجديدة
+        """
+        new_signed = signed_amount(transaction.direction, transaction.amount)
+        update_party = not getattr(transaction, '_skip_balance_update', False)
+        party = transaction.customer_supplier if 'customer_supplier' in transaction._state.fields_cache else None
+
+        if old_state is None:
+            if update_party:
+                PartyLedgerService.apply_party_delta(transaction.customer_supplier_id, new_signed, party)
+            if PartyLedgerService.has_later(transaction):
+                # حركة بتاريخ سابق
+                PartyLedgerService.resequence(
+                    transaction.customer_supplier_id,
+                    (transaction.date, transaction.created_at, transaction.pk),
+                )
+            return
+
+        old_party_id, old_direction, old_amount, old_date = old_state
+        old_signed = signed_amount(old_direction, old_amount)
+        if (old_party_id, old_signed, old_date) == (transaction.customer_supplier_id, new_signed, transaction.date):
+            return
+
+        if update_party:
+            if old_party_id == transaction.customer_supplier_id:
+                PartyLedgerService.apply_party_delta(old_party_id, new_signed - old_signed, party)
+            else:
+                PartyLedgerService.apply_party_delta(old_party_id, -old_signed)
+                PartyLedgerService.apply_party_delta(transaction.customer_supplier_id, new_signed, party)
+
+        if old_party_id != transaction.customer_supplier_id:
+            PartyLedgerService.resequence(old_party_id, since_date=old_date)
+        # إعادة الترقيم من الموضع الأقدم (التاريخ القديم أو الجديد) شاملاً هذه الحركة
+        start = min(old_date, transaction.date) if old_party_id == transaction.customer_supplier_id else transaction.date
+        PartyLedgerService.resequence(transaction.customer_supplier_id, since_date=start)
+
+    @staticmethod
+    def transaction_deleted(transaction):
+        """عكس أثر الحركة المحذوفة على رصيد الطرف والحركات اللاحقة"""
+        PartyLedgerService.apply_party_delta(
+            transaction.customer_supplier_id, -signed_amount(transaction.direction, transaction.amount)
+        )
+        PartyLedgerService.resequence(
+            transaction.customer_supplier_id, (transaction.date, transaction.created_at, transaction.pk)
+        )
+
+    @staticmethod
+    def rebuild(party_ids=None, dry_run=False, batch_size=1000):
+        """
+        إعادة بناء balance_after لجميع الحركات ورصيد كل طرف باستعلامات مجمّعة.
+
+        Returns:
+            dict: {'checked', 'fixed_transactions', 'fixed_parties', 'mismatches'}
+        """
+        from customers.models import CustomerSupplier
+        from .models import AccountTransaction
+
+        rows = AccountTransaction.objects.all()
+        parties = CustomerSupplier.objects.all()
+        if party_ids is not None:
+            rows = rows.filter(customer_supplier_id__in=party_ids)
+            parties = parties.filter(id__in=party_ids)
+
+        checked = 0
+        mismatches = []
+        changed = []
+        for pk, number, party_id, balance_after, running in rows.annotate(
+            running=_running_balance(partition=True)
+        ).values_list(
+            'id', 'transaction_number', 'customer_supplier_id', 'balance_after', 'running'
+        ).order_by('customer_supplier_id', *LEDGER_ORDER).iterator(chunk_size=batch_size):
+            checked += 1
+            expected = running or ZERO
+            if balance_after != expected:
+                mismatches.append((number, party_id, balance_after, expected))
+                changed.append(AccountTransaction(id=pk, balance_after=expected))
+                if not dry_run and len(changed) >= batch_size:
+                    AccountTransaction.objects.bulk_update(changed, ['balance_after'])
+                    changed = []
+        if not dry_run and changed:
+            AccountTransaction.objects.bulk_update(changed, ['balance_after'])
+
+        totals = dict(
+            rows.values('customer_supplier_id').annotate(total=Sum(_signed_expression()))
+            .order_by().values_list('customer_supplier_id', 'total')
+        )
+        party_changes = []
+        for party in parties.only('id', 'balance'):
+            expected = totals.get(party.id) or ZERO
+            if party.balance != expected:
+                party.balance = expected
+                party_changes.append(party)
+        if not dry_run:
+            CustomerSupplier.objects.bulk_update(party_changes, ['balance'], batch_size=batch_size)
+
+        return {
+            'checked': checked,
+            'fixed_transactions': len(mismatches),
+            'fixed_parties': len(party_changes),
+            'mismatches': mismatches,
+        }
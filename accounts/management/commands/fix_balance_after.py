@@ -3,9 +3,7 @@ Django management command لإصلاح أرصدة Balance After
 الاستخدام: python manage.py fix_balance_after
 """
 from django.core.management.base import BaseCommand
-from accounts.models import AccountTransaction
-from customers.models import CustomerSupplier
-from decimal import Decimal
+from accounts.ledger import PartyLedgerService
 from core.models import AuditLog
 from django.contrib.auth import get_user_model
 
@@ -46,59 +44,28 @@ class Command(BaseCommand):
                 ip_address='system'
             )
         
-        # معالجة جميع العملاء
-        customers = CustomerSupplier.objects.filter(transactions__isnull=False).distinct()
-        total_checked = 0
-        total_fixed = 0
+        # إعادة البناء المجمّعة: رصيد متراكم بدالة نافذة لكل عميل/مورد ثم تحديث المختلف فقط
+        result = PartyLedgerService.rebuild(dry_run=dry_run)
+        total_checked = result['checked']
+        total_fixed = result['fixed_transactions']
         
-        for customer in customers:
-            self.stdout.write(f'📊 {customer.name}')
-            
-            transactions = AccountTransaction.objects.filter(
-                customer_supplier=customer
-            ).order_by('date', 'created_at', 'id')
-            
-            balance = Decimal('0')
-            fixed_count = 0
-            
-            for txn in transactions:
-                total_checked += 1
-                
-                if txn.direction == 'debit':
-                    balance += txn.amount
-                else:
-                    balance -= txn.amount
-                
-                if abs(balance - txn.balance_after) >= Decimal('0.001'):
-                    if dry_run:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f'   ⚠️  {txn.transaction_number}: '
-                                f'{float(txn.balance_after):.3f} → {float(balance):.3f}'
-                            )
-                        )
-                    else:
-                        old_balance = txn.balance_after
-                        txn.balance_after = balance
-                        txn._skip_balance_update = True
-                        txn.save(update_fields=['balance_after'])
-                        
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'   ✅ {txn.transaction_number}: '
-                                f'{float(old_balance):.3f} → {float(balance):.3f}'
-                            )
-                        )
-                    
-                    fixed_count += 1
-                    total_fixed += 1
-            
-            if fixed_count == 0:
-                self.stdout.write(f'   ℹ️  صحيح ({transactions.count()} معاملة)')
+        for number, party_id, stored, expected in result['mismatches']:
+            if dry_run:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'   ⚠️  {number}: '
+                        f'{float(stored):.3f} → {float(expected):.3f}'
+                    )
+                )
             else:
-                self.stdout.write(f'   🎯 {fixed_count}/{transactions.count()}')
-            
-            self.stdout.write('')
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'   ✅ {number}: '
+                        f'{float(stored):.3f} → {float(expected):.3f}'
+                    )
+                )
+        
+        self.stdout.write('')
         
         # تسجيل انتهاء العملية
         if admin_user and not dry_run:
@@ -114,7 +81,7 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'✅ النتيجة:'))
         self.stdout.write(f'   المفحوص: {total_checked}')
         self.stdout.write(f'   المُصلح: {total_fixed}')
-        self.stdout.write(f'   العملاء: {customers.count()}')
+        self.stdout.write(f'   أرصدة العملاء/الموردين المُصلحة: {result["fixed_parties"]}')
         self.stdout.write('=' * 80)
         
         if dry_run and total_fixed > 0:
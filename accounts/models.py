@@ -101,21 +101,42 @@ class AccountTransaction(models.Model):
     def __str__(self):
         return f"{self.transaction_number} - {self.customer_supplier.name} - {self.amount}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # القيم المؤثرة على الرصيد كما حُمّلت - لترحيل الفرق فقط عند التعديل
+        loaded = instance.__dict__
+        if all(name in loaded for name in ('customer_supplier_id', 'direction', 'amount', 'date')):
+            instance._ledger_state = (loaded['customer_supplier_id'], loaded['direction'],
+                                      loaded['amount'], loaded['date'])
+        return instance
+
     def save(self, *args, **kwargs):
+        from django.db import transaction
+        from backup.restore_context import is_restoring
+        from .ledger import PartyLedgerService
+
         # توليد رقم الحركة إذا لم يكن موجوداً
         if not self.transaction_number:
             self.transaction_number = self.generate_transaction_number()
         
-        # حساب الرصيد بعد الحركة
-        if not self.balance_after:
-            self.balance_after = self.calculate_balance_after()
-        
-        super().save(*args, **kwargs)
-        
-        # تحديث رصيد العميل/المورد
-        # تجاهل التحديث إذا كان هناك flag
-        if not getattr(self, '_skip_balance_update', False):
-            self.update_customer_supplier_balance()
+        # أثناء الاستعادة تُحفظ الأرصدة كما هي في النسخة الاحتياطية
+        if is_restoring():
+            super().save(*args, **kwargs)
+            return
+
+        old_state = getattr(self, '_ledger_state', None) if self.pk else None
+        with transaction.atomic(savepoint=False):
+            # حساب الرصيد بعد الحركة
+            if not self.balance_after:
+                self.balance_after = self.calculate_balance_after()
+            
+            super().save(*args, **kwargs)
+            
+            # تحديث رصيد العميل/المورد بالفرق وإعادة ترقيم الحركات اللاحقة عند الحاجة
+            # (_skip_balance_update يمنع تحديث رصيد الطرف فقط)
+            PartyLedgerService.transaction_saved(self, old_state)
+        self._ledger_state = (self.customer_supplier_id, self.direction, self.amount, self.date)
 
     def generate_transaction_number(self):
         """توليد رقم الحركة"""
@@ -129,102 +150,10 @@ class AccountTransaction(models.Model):
         return f"{prefix}-{timestamp}-{random_part}"
 
     def calculate_balance_after(self):
-        """حساب الرصيد بعد الحركة - الرصيد المتراكم حتى هذه المعاملة"""
-        # حساب الرصيد من الصفر بناءً على جميع المعاملات حتى هذه المعاملة
-        # نستخدم Q objects لتحديد المعاملات السابقة بدقة
-        from django.db.models import Q
-        
-        # جلب جميع المعاملات السابقة (قبل تاريخ هذه المعاملة، أو في نفس التاريخ ولكن قبل created_at)
-        if self.pk:  # إذا كانت المعاملة محفوظة بالفعل
-            # نستثني المعاملة الحالية ونأخذ فقط ما قبلها
-            transactions = AccountTransaction.objects.filter(
-                customer_supplier=self.customer_supplier
-            ).filter(
-                Q(date__lt=self.date) |  # معاملات قبل هذا التاريخ
-                Q(date=self.date, created_at__lt=self.created_at) |  # معاملات في نفس التاريخ قبل هذه
-                Q(date=self.date, created_at=self.created_at, id__lt=self.pk)  # نفس الوقت لكن ID أصغر
-            ).exclude(pk=self.pk).order_by('date', 'created_at', 'id')
-        else:  # معاملة جديدة لم تحفظ بعد
-            from django.utils import timezone
-            current_time = timezone.now()
-            transactions = AccountTransaction.objects.filter(
-                customer_supplier=self.customer_supplier
-            ).filter(
-                Q(date__lt=self.date) |  # معاملات قبل هذا التاريخ
-                Q(date=self.date, created_at__lt=current_time)  # معاملات في نفس التاريخ قبل الآن
-            ).order_by('date', 'created_at', 'id')
-        
-        # الرصيد الافتتاحي = 0
-        balance = Decimal('0')
-        
-        # إضافة جميع المعاملات السابقة
-        for transaction in transactions:
-            if transaction.direction == 'debit':
-                balance += transaction.amount
-            else:
-                balance -= transaction.amount
-        
-        # إضافة هذه المعاملة
-        if self.direction == 'debit':
-            balance += self.amount
-        else:
-            balance -= self.amount
-        
-        return balance
-
-    def update_customer_supplier_balance(self):
-        """تحديث رصيد العميل/المورد مع فحوصات وتسجيل"""
-        try:
-            # حساب الرصيد الجديد بناءً على جميع الحركات
-            transactions = AccountTransaction.objects.filter(
-                customer_supplier=self.customer_supplier
-            ).order_by('date', 'created_at')
-
-            new_balance = Decimal('0')
-            for transaction in transactions:
-                if transaction.direction == 'debit':
-                    new_balance += transaction.amount
-                else:
-                    new_balance -= transaction.amount
-
-            # فحص إذا كان الرصيد مختلفاً
-            old_balance = self.customer_supplier.balance
-            if old_balance != new_balance:
-                # تسجيل التغيير في سجل الأنشطة
-                from core.models import AuditLog
-                AuditLog.objects.create(
-                    user=self.created_by,
-                    action_type='update',
-                    content_type='customer_supplier',
-                    object_id=self.customer_supplier.id,
-                    description=f'تحديث رصيد {self.customer_supplier.name}: من {old_balance} إلى {new_balance} (بسبب معاملة {self.transaction_number})',
-                    ip_address='127.0.0.1'
-                )
-
-                # تحديث رصيد العميل/المورد
-                self.customer_supplier.balance = new_balance
-                self.customer_supplier.save(update_fields=['balance'])
-
-                print(f"✅ تم تحديث رصيد {self.customer_supplier.name}: {old_balance} → {new_balance}")
-            else:
-                print(f"ℹ️ رصيد {self.customer_supplier.name} محدث بالفعل: {new_balance}")
-
-        except Exception as e:
-            print(f"❌ خطأ في تحديث رصيد {self.customer_supplier.name}: {e}")
-            # تسجيل الخطأ في سجل الأنشطة
-            try:
-                from core.models import AuditLog
-                AuditLog.objects.create(
-                    user=self.created_by,
-                    action_type='error',
-                    content_type='account_transaction',
-                    object_id=self.id,
-                    description=f'خطأ في تحديث الرصيد: {str(e)}',
-                    ip_address='system'
-                )
-            except:
-                pass
-            raise
+        """حساب الرصيد بعد الحركة: رصيد الحركة السابقة للطرف + أثر هذه الحركة"""
+        from .ledger import PartyLedgerService, signed_amount
+
+        return PartyLedgerService.previous_balance(self) + signed_amount(self.direction, self.amount)
 
     @staticmethod
     def create_transaction(customer_supplier, transaction_type, direction, amount, 
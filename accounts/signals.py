@@ -4,33 +4,6 @@ from django.utils.translation import gettext_lazy as _
 from .models import AccountTransaction
 
 
-@receiver(post_save, sender=AccountTransaction)
-def update_customer_supplier_balance(sender, instance, created, **kwargs):
-    """تحديث رصيد العميل/المورد عند إنشاء معاملة جديدة"""
-    if created:
-        try:
-            customer_supplier = instance.customer_supplier
-            
-            # حساب التغيير في الرصيد
-            if instance.direction == 'debit':
-                # مدين - يزيد من رصيد العميل (دين على العميل)
-                customer_supplier.balance += instance.amount
-            elif instance.direction == 'credit':
-                # دائن - يقلل من رصيد العميل (دفع من العميل)
-                customer_supplier.balance -= instance.amount
-            
-            # استخدام flag لتجنب الفحص التلقائي
-            customer_supplier._skip_balance_check = True
-            customer_supplier.save(update_fields=['balance'])
-            if hasattr(customer_supplier, '_skip_balance_check'):
-                delattr(customer_supplier, '_skip_balance_check')
-        except Exception as e:
-            # تسجيل الخطأ دون إيقاف العملية
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f'خطأ في تحديث رصيد العميل/المورد: {e}')
-
-
 @receiver(post_save, sender=AccountTransaction)
 def log_account_transaction_activity(sender, instance, created, **kwargs):
     """تسجيل إنشاء أو تعديل المعاملات المالية في سجل الأنشطة"""
@@ -90,34 +63,19 @@ def recalculate_balance_and_log_deletion(sender, instance, **kwargs):
     try:
         from core.models import AuditLog
         from django.contrib.auth import get_user_model
-        from decimal import Decimal
         
         User = get_user_model()
         
         # محاولة الحصول على المستخدم الحالي
         user = User.objects.filter(is_active=True).first()
         
-        # إعادة حساب رصيد العميل/المورد من جميع الحركات المتبقية
+        # عكس أثر الحركة على رصيد العميل/المورد وإعادة ترقيم الحركات اللاحقة فقط
+        from .ledger import PartyLedgerService
         customer_supplier = instance.customer_supplier
         old_balance = customer_supplier.balance
-        
-        # حساب الرصيد الجديد بناءً على جميع الحركات المتبقية
-        transactions = AccountTransaction.objects.filter(
-            customer_supplier=customer_supplier
-        ).order_by('date', 'created_at')
-        
-        new_balance = Decimal('0')
-        for transaction in transactions:
-            if transaction.direction == 'debit':
-                new_balance += transaction.amount
-            else:
-                new_balance -= transaction.amount
-        
-        # تحديث رصيد العميل/المورد
-        customer_supplier.balance = new_balance
-        customer_supplier.save(update_fields=['balance'])
-        
-        print(f"✅ تم تحديث رصيد {customer_supplier.name} بعد حذف المعاملة: {old_balance} → {new_balance}")
+        PartyLedgerService.transaction_deleted(instance)
+        customer_supplier.refresh_from_db(fields=['balance'])
+        new_balance = customer_supplier.balance
         
         description = _(
             'تم حذف معاملة %(transaction_type)s رقم %(transaction_number)s '
@@ -0,0 +1,81 @@
+"""
+اختبارات دفتر أرصدة العملاء والموردين
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from accounts.ledger import PartyLedgerService
+from accounts.models import AccountTransaction
+from customers.models import CustomerSupplier
+
+User = get_user_model()
+
+
+class PartyLedgerTests(TestCase):
+    """الرصيد بعد الحركة ورصيد الطرف بالفروق"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger_user', password='test_password')
+        self.customer = CustomerSupplier.objects.create(name='عميل الدفتر', type='customer', city='عمان')
+
+    def _post(self, direction, amount, day):
+        return AccountTransaction.create_transaction(
+            self.customer, 'adjustment', direction, Decimal(amount),
+            reference_type='adjustment', user=self.user, date=date(2024, 1, day)
+        )
+
+    def _balances(self):
+        return list(AccountTransaction.objects.filter(customer_supplier=self.customer)
+                    .order_by('date', 'created_at', 'id').values_list('balance_after', flat=True))
+
+    def assertLedgerConsistent(self):
+        result = PartyLedgerService.rebuild(dry_run=True)
+        self.assertEqual(result['fixed_transactions'], 0, result['mismatches'])
+        self.assertEqual(result['fixed_parties'], 0)
+
+    def test_back_dated_insert_update_and_delete(self):
+        self._post('debit', '100', 5)
+        late = self._post('debit', '50', 9)
+        self.assertEqual(self._balances(), [Decimal('100'), Decimal('150')])
+
+        # حركة بتاريخ سابق تعيد ترقيم الحركات اللاحقة فقط
+        early = self._post('credit', '30', 3)
+        self.assertEqual(self._balances(), [Decimal('-30'), Decimal('70'), Decimal('120')])
+        self.assertLedgerConsistent()
+
+        late.amount = Decimal('80')
+        late.save()
+        early.date = date(2024, 1, 7)
+        early.save()
+        self.assertEqual(self._balances(), [Decimal('100'), Decimal('70'), Decimal('150')])
+        self.assertLedgerConsistent()
+
+        early.delete()
+        self.assertEqual(self._balances(), [Decimal('100'), Decimal('180')])
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('180'))
+        self.assertLedgerConsistent()
+
+    def test_posting_cost_does_not_grow_with_history(self):
+        for day in range(1, 11):
+            self._post('debit', '10', day)
+
+        with self.assertNumQueries(5):
+            # الرصيد السابق + الإدراج + رصيد الطرف + فحص الحركات اللاحقة + سجل النشاط
+            self._post('credit', '5', 20)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('95'))
+        self.assertEqual(self._balances()[-1], Decimal('95'))
+
+    def test_rebuild_repairs_drift(self):
+        self._post('debit', '40', 2)
+        self._post('credit', '15', 4)
+        AccountTransaction.objects.update(balance_after=Decimal('0'))
+
+        result = PartyLedgerService.rebuild()
+        self.assertEqual(result['fixed_transactions'], 2)
+        self.assertEqual(self._balances(), [Decimal('40'), Decimal('25')])
+        self.assertLedgerConsistent()
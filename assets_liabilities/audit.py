@@ -0,0 +1,12 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق assets_liabilities (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('assets_liabilities.Asset', fields=['name', 'category', 'description', 'purchase_cost', 'current_value', 'status']),
+    AuditConfig('assets_liabilities.Liability', fields=['name', 'category', 'description', 'current_balance', 'status']),
+    AuditConfig('assets_liabilities.AssetCategory', fields=['name', 'account', 'depreciation_rate', 'useful_life_years', 'is_depreciable', 'is_active']),
+    AuditConfig('assets_liabilities.LiabilityCategory', fields=['name', 'account', 'is_active']),
+    AuditConfig('assets_liabilities.DepreciationEntry', fields=['asset', 'depreciation_date', 'depreciation_amount', 'net_book_value_after']),
+)
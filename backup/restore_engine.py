@@ -0,0 +1,467 @@
+"""
+محرك استعادة النسخ الاحتياطية بالإدراج المجمّع (BulkRestoreEngine)
+
+كانت الاستعادة تحفظ كل سجل على حدة (update_or_create / save) وتجلب كل مفتاح
+أجنبي باستعلام filter(pk=...).first() بدون معاملة، فتستغرق استعادة نسخة
+إنتاجية ساعات. المحرك:
+
+- يعالج الجداول بترتيب الاعتماديات (يحدده perform_backup_restore) داخل معاملة
+  واحدة مع نقطة حفظ (savepoint) لكل جدول: فشل جدول يتراجع عنه وحده.
+- يتحقق من المفاتيح الأجنبية بمجموعة مفاتيح محمّلة مرة واحدة لكل نموذج
+  (وتُحدّث بما يُدرج)، ويحفظ قيمة المفتاح مباشرة (<field>_id) بدون جلب الكائن.
+- يُدرج السجلات الجديدة بـ bulk_create ويحدّث الموجودة بـ bulk_update على دفعات؛
+  عند فشل دفعة يُعاد حفظ سجلاتها واحداً واحداً (كل سجل في نقطة حفظ) لعزل السجل المعطوب.
+- يؤجل فحص القيود حتى نهاية الاستعادة (نفس أسلوب loaddata) ثم يتحقق منها مرة
+  واحدة، ويعيد تعيين تسلسلات المفاتيح مرة واحدة للجداول المستعادة.
+- يسجل لكل جدول المدة وعدد السجلات في الثانية في بيانات تقدم الاستعادة.
+
+قواعد تنظيف السجلات (القيم الافتراضية، الحقول القديمة...) هي نفس قواعد
+الاستعادة السابقة.
+"""
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# حقول تبقى كما هي عند تحديث سجل موجود (السجل الموجود يُحدّث بحقول النسخة فقط)
+KEEP_ON_UPDATE = {
+    'journal.JournalEntry': ('entry_number',),
+}
+
+# الحقول المسموحة للنماذج التي تغير هيكلها
+VALID_FIELDS = {
+    'core.AuditLog': ('pk', 'user', 'action_type', 'content_type', 'object_id', 'description', 'ip_address',
+                      'timestamp'),
+    'core.CompanySettings': ('pk', 'company_name', 'logo', 'currency', 'address', 'phone', 'email', 'tax_number',
+                             'default_tax_rate', 'session_timeout_minutes', 'enable_session_timeout',
+                             'logout_on_browser_close', 'created_at', 'updated_at'),
+    'core.DocumentSequence': ('pk', 'document_type', 'prefix', 'digits', 'current_number', 'created_at',
+                              'updated_at'),
+}
+
+INTEGER_FIELDS = ('IntegerField', 'PositiveIntegerField')
+NUMERIC_FIELDS = ('DecimalField', 'FloatField') + INTEGER_FIELDS
+
+
+class RecordError(ValueError):
+    """سجل لا يمكن استعادته (يُتخطى ويُسجل في أخطاء الجدول)"""
+
+
+def record_data(record_item):
+    """بيانات السجل من تنسيق Django fixtures أو التنسيق المباشر"""
+    if not isinstance(record_item, dict):
+        return None
+    if 'fields' in record_item and 'pk' in record_item:
+        data = dict(record_item['fields'])
+        data['pk'] = record_item['pk']
+        return data
+    return dict(record_item)
+
+
+def _fix_record(engine, model, data):
+    """تعديلات خاصة ببعض النماذج؛ تعيد None لتخطي السجل"""
+    label = model._meta.label
+    if label in VALID_FIELDS:
+        data = {key: value for key, value in data.items() if key in VALID_FIELDS[label]}
+
+    if label == 'core.AuditLog':
+        # تجاهل السجلات التي لا يوجد مستخدمها
+        user_id = data.get('user')
+        user_model = model._meta.get_field('user').related_model
+        if not user_id or not engine.has_pk(user_model, user_id):
+            return None
+    elif label == 'core.CompanySettings':
+        if data.get('default_tax_rate') is None:
+            data['default_tax_rate'] = Decimal('0.00')
+    elif label == 'auth.Group':
+        if not data.get('dashboard_sections'):
+            data['dashboard_sections'] = []
+    elif label == 'users.User':
+        for key, default in (('first_name', 'غير محدد'), ('last_name', 'غير محدد'), ('phone', '000000000')):
+            if not data.get(key):
+                data[key] = default
+        if data.get('department') in (None, 'null'):
+            data['department'] = ''
+        if data.get('groups') in (None, 'null'):
+            data['groups'] = []
+        if data.get('email') is None:
+            data['email'] = ''
+    elif label == 'products.Category':
+        if data.get('description') is None:
+            data['description'] = ''
+    elif label == 'customers.CustomerSupplier':
+        for key in ('email', 'notes'):
+            if data.get(key) is None:
+                data[key] = ''
+    elif label == 'banks.BankAccount':
+        if data.get('iban') is None:
+            data['iban'] = ''
+    elif label == 'settings.SuperAdminSettings':
+        if not data.get('system_subtitle'):
+            data['system_subtitle'] = ''
+        if not data.get('app_logo'):
+            data['app_logo'] = None
+    return data
+
+
+def _numeric_value(field, value):
+    """نفس تنظيف الحقول الرقمية في الاستعادة السابقة"""
+    kind = field.get_internal_type()
+    try:
+        if value is None or value == '':
+            if field.null:
+                return None
+            return 0 if kind in INTEGER_FIELDS else 0.0
+        if isinstance(value, str):
+            value = value.replace(',', '').strip()
+            if kind in INTEGER_FIELDS:
+                return int(float(value)) if value else 0
+            if kind == 'DecimalField':
+                return Decimal(value) if value else Decimal('0.0')
+            return float(value) if value else 0.0
+        if isinstance(value, (int, float)):
+            if kind in INTEGER_FIELDS:
+                return int(value)
+            if kind == 'DecimalField':
+                return Decimal(str(value))
+            return float(value)
+        return value
+    except (ValueError, TypeError, InvalidOperation):
+        if kind in INTEGER_FIELDS:
+            return 0
+        return Decimal('0.0') if kind == 'DecimalField' else 0.0
+
+
+def _required_default(field):
+    kind = field.get_internal_type()
+    if kind == 'DecimalField':
+        return Decimal('0.00')
+    if kind in INTEGER_FIELDS:
+        return 0
+    if kind in ('CharField', 'TextField'):
+        return ''
+    if kind == 'BooleanField':
+        return False
+    raise RecordError(f'Required field {field.name} is missing or null')
+
+
+class TablePlan:
+    """حقول النموذج محسوبة مرة واحدة لكل جدول بدلاً من فحص _meta لكل سجل"""
+
+    def __init__(self, model):
+        self.model = model
+        self.label = model._meta.label
+        self.pk_name = model._meta.pk.name
+        self.fields = {}
+        for field in model._meta.concrete_fields:
+            self.fields[field.name] = field
+            self.fields.setdefault(field.attname, field)
+        self.many_to_many = {field.name: field for field in model._meta.local_many_to_many}
+        self.keep_on_update = set(KEEP_ON_UPDATE.get(self.label, ()))
+
+
+class BulkRestoreEngine:
+    """
+    استعادة جداول النسخة الاحتياطية.
+
+    on_progress(table_info): يُستدعى بعد كل دفعة لتحديث بيانات التقدم.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, on_progress=None):
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self._pks = {}
+        self._incoming = None
+        self.restored_models = []
+        self.processed_records = 0
+
+    # ------------------------------------------------------------------
+    # مجموعات المفاتيح الموجودة
+    # ------------------------------------------------------------------
+    def known_pks(self, model):
+        model = model._meta.concrete_model
+        if model not in self._pks:
+            self._pks[model] = set(model._base_manager.values_list('pk', flat=True))
+        return self._pks[model]
+
+    def has_pk(self, model, value):
+        try:
+            value = model._meta.pk.to_python(value)
+        except Exception:
+            return False
+        return value in self.known_pks(model)
+
+    # ------------------------------------------------------------------
+    # الاستعادة
+    # ------------------------------------------------------------------
+    def restore(self, tables):
+        """
+        tables: [(النموذج، السجلات، بيانات تقدم الجدول)] بترتيب الاستعادة.
+        """
+        with transaction.atomic():
+            with connection.constraint_checks_disabled():
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                for model, records, table_info in tables:
+                    self.restore_table(model, records, table_info)
+            # فحص القيود المؤجلة مرة واحدة لكل الجداول المستعادة
+            connection.check_constraints(table_names=[model._meta.db_table for model in self.restored_models])
+        # الإدراج المجمّع لا يرسل إشارات الإبطال: تفريغ الذاكرة المؤقتة (الإعدادات، دليل الحسابات، الكتالوج)
+        from core import settings_cache
+        settings_cache.clear()
+        return self.reset_sequences()
+
+    def restore_table(self, model, records, table_info):
+        table_info.setdefault('errors', [])
+        table_info['status'] = 'running'
+        started = time.monotonic()
+        restored_before = table_info.get('actual_records', 0)
+        try:
+            with transaction.atomic():
+                self._restore_table(model, records, table_info)
+            table_info['status'] = 'completed'
+            if model not in self.restored_models:
+                self.restored_models.append(model)
+        except Exception as error:
+            logger.warning(f"فشل في استعادة جدول {table_info.get('display_name', model._meta.label)}: {error}")
+            # تراجع الجدول بالكامل: إعادة تحميل مفاتيحه عند الحاجة
+            self._pks.pop(model._meta.concrete_model, None)
+            self.processed_records -= table_info.get('actual_records', 0) - restored_before
+            table_info['actual_records'] = restored_before
+            table_info['status'] = 'error'
+            table_info['error'] = str(error)
+
+        duration = time.monotonic() - started
+        table_info['duration'] = round(duration, 3)
+        table_info['records_per_second'] = int(table_info['actual_records'] / duration) if duration > 0 else 0
+        table_info['progress'] = 100
+        self._report(table_info)
+
+    def _restore_table(self, model, records, table_info):
+        plan = TablePlan(model)
+        known = self.known_pks(model)
+        # مفاتيح الجدول نفسه في النسخة: مرجع ذاتي لسجل لاحق (الحساب الأب) صحيح لأن الفحص مؤجل
+        incoming = set()
+        for record_item in records:
+            data = record_data(record_item)
+            if data and data.get('pk', data.get(plan.pk_name)) is not None:
+                try:
+                    incoming.add(model._meta.pk.to_python(data.get('pk', data.get(plan.pk_name))))
+                except Exception:
+                    pass
+        self._incoming = (model._meta.concrete_model, incoming)
+
+        journal_numbers = None
+        if plan.label == 'journal.JournalEntry':
+            journal_numbers = dict(model._base_manager.values_list('entry_number', 'pk'))
+
+        batch = []
+        many_to_many = []
+        total = len(records)
+        for index, record_item in enumerate(records, 1):
+            data = record_data(record_item)
+            if data is None:
+                continue
+            pk_value = data.get('pk', data.get(plan.pk_name))
+            try:
+                data = _fix_record(self, model, data)
+                if data is None:
+                    continue
+                obj, m2m = self._build(plan, data)
+                if journal_numbers is not None:
+                    self._unique_entry_number(obj, journal_numbers)
+                batch.append(obj)
+                if m2m:
+                    many_to_many.append((obj, m2m))
+            except Exception as error:
+                self._record_error(table_info, model, pk_value, error)
+            if len(batch) >= self.batch_size:
+                self._flush(plan, batch, table_info, known)
+                batch = []
+                table_info['progress'] = int(index * 100 / total) if total else 100
+                self._report(table_info)
+        if batch:
+            self._flush(plan, batch, table_info, known)
+        self._incoming = None
+
+        if many_to_many:
+            self._restore_many_to_many(plan, many_to_many, known)
+        if table_info['errors']:
+            self._clear_dangling_self_references(model)
+
+    def _build(self, plan, data):
+        """تحويل بيانات السجل إلى كائن غير محفوظ + بيانات Many-to-Many"""
+        model = plan.model
+        values = {}
+        m2m = {}
+        provided = []
+        pk_value = data.pop('pk', None)
+        for key, value in data.items():
+            if key in plan.many_to_many:
+                if isinstance(value, list):
+                    m2m[key] = value
+                continue
+            field = plan.fields.get(key)
+            if field is None or field.primary_key:
+                continue
+            if field.name not in plan.keep_on_update:
+                provided.append(field.name)
+            if field.is_relation:
+                values[field.attname] = self._related_pk(field, value)
+            elif field.get_internal_type() in NUMERIC_FIELDS:
+                values[field.attname] = _numeric_value(field, value)
+            else:
+                values[field.attname] = value
+
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            value = values.get(field.attname, models.NOT_PROVIDED)
+            # None -> '' للحقول النصية الاختيارية
+            if value is None and field.blank and field.get_internal_type() in ('CharField', 'TextField', 'EmailField'):
+                values[field.attname] = ''
+            elif value is models.NOT_PROVIDED and field.has_default():
+                values[field.attname] = field.get_default()
+            value = values.get(field.attname)
+            if value is None and not field.null and not field.blank:
+                if field.is_relation:
+                    raise RecordError(f'Required field {field.name} is missing or null')
+                values[field.attname] = _required_default(field)
+
+        if pk_value is not None:
+            values[model._meta.pk.attname] = model._meta.pk.to_python(pk_value)
+        obj = model(**values)
+        # الحقول التي تُحدّث إن كان السجل موجوداً (update_or_create كان يحدّث حقول النسخة فقط)
+        obj._restore_fields = tuple(dict.fromkeys(provided))
+        return obj, m2m
+
+    def _related_pk(self, field, value):
+        """قيمة المفتاح الأجنبي بعد التحقق من وجود السجل المرتبط"""
+        if value is None or str(value) == 'null':
+            if not field.null:
+                raise RecordError(f'Required field {field.name} has null value')
+            return None
+        related_model = field.related_model._meta.concrete_model
+        target = field.target_field
+        try:
+            related_pk = target.to_python(value)
+        except Exception:
+            related_pk = value
+        known = self.known_pks(related_model)
+        incoming = self._incoming[1] if self._incoming and self._incoming[0] is related_model else ()
+        if related_pk in known or related_pk in incoming:
+            return related_pk
+        if field.null:
+            logger.debug(f"FK مفقود {field.name}={value}، تم تعيين None")
+            return None
+        # نفس الحل البديل السابق: أول سجل متاح
+        if known:
+            fallback = min(known)
+            logger.warning(f"⚠️ استخدام FK بديل لـ {field.name}: {fallback} بدلاً من {value}")
+            return fallback
+        raise RecordError(f'FK_NOT_FOUND:{field.name}={value} (لا يوجد سجلات بديلة في {related_model.__name__})')
+
+    @staticmethod
+    def _unique_entry_number(entry, numbers):
+        """رقم قيد مستخدم لقيد آخر: توليد رقم جديد بدلاً من تعارض القيد الفريد"""
+        owner = numbers.get(entry.entry_number)
+        if not entry.entry_number or (owner is not None and owner != entry.pk):
+            entry.entry_number = entry.generate_entry_number()
+        numbers[entry.entry_number] = entry.pk
+
+    def _flush(self, plan, batch, table_info, known):
+        model = plan.model
+        manager = model._base_manager
+        new = [obj for obj in batch if obj.pk is None or obj.pk not in known]
+        existing = [obj for obj in batch if obj.pk is not None and obj.pk in known]
+        try:
+            with transaction.atomic():
+                if new:
+                    manager.bulk_create(new, batch_size=self.batch_size)
+                groups = {}
+                for obj in existing:
+                    groups.setdefault(obj._restore_fields, []).append(obj)
+                for fields, objs in groups.items():
+                    if fields:
+                        manager.bulk_update(objs, fields, batch_size=self.batch_size)
+            saved = batch
+        except Exception as error:
+            logger.debug(f"فشل إدراج دفعة {plan.label} ({error}) - الحفظ سجلاً سجلاً")
+            saved = []
+            for obj in batch:
+                try:
+                    with transaction.atomic():
+                        if obj.pk is not None and obj.pk in known:
+                            if obj._restore_fields:
+                                manager.filter(pk=obj.pk).update(
+                                    **{name: getattr(obj, model._meta.get_field(name).attname)
+                                       for name in obj._restore_fields}
+                                )
+                        else:
+                            manager.bulk_create([obj])
+                    saved.append(obj)
+                except Exception as record_error:
+                    self._record_error(table_info, model, obj.pk, record_error)
+
+        for obj in saved:
+            if obj.pk is not None:
+                known.add(obj.pk)
+        table_info['actual_records'] = table_info.get('actual_records', 0) + len(saved)
+        self.processed_records += len(saved)
+
+    def _restore_many_to_many(self, plan, items, known):
+        """استبدال علاقات Many-to-Many للسجلات المستعادة بإدراج مجمّع في جدول الربط"""
+        for name, field in plan.many_to_many.items():
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                continue
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            target_model = field.related_model
+            owners = [obj.pk for obj, m2m in items if name in m2m and obj.pk in known]
+            if not owners:
+                continue
+            rows = []
+            for obj, m2m in items:
+                if name not in m2m or obj.pk not in known:
+                    continue
+                for related_id in m2m[name]:
+                    if isinstance(related_id, (int, str)) and str(related_id).isdigit() \
+                            and self.has_pk(target_model, related_id):
+                        rows.append(through(**{f'{source}_id': obj.pk, f'{target}_id': int(related_id)}))
+            through._base_manager.filter(**{f'{source}_id__in': owners}).delete()
+            through._base_manager.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+
+    @staticmethod
+    def _clear_dangling_self_references(model):
+        """مرجع ذاتي لسجل فشلت استعادته: يُفرغ إن كان الحقل اختيارياً"""
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model is model and field.null:
+                model._base_manager.filter(**{f'{field.name}__isnull': False}).exclude(
+                    **{f'{field.name}__in': model._base_manager.values('pk')}
+                ).update(**{field.name: None})
+
+    def _record_error(self, table_info, model, pk_value, error):
+        message = str(error)
+        logger.warning(f"⚠️ فشل في استعادة سجل في {model._meta.label}[{pk_value}]: {message}")
+        table_info['errors'].append({'record': pk_value if pk_value is not None else 'unknown', 'error': message})
+
+    def _report(self, table_info):
+        if self.on_progress:
+            self.on_progress(table_info)
+
+    def reset_sequences(self):
+        """إعادة تعيين تسلسلات المفاتيح للجداول المستعادة مرة واحدة"""
+        statements = connection.ops.sequence_reset_sql(no_style(), self.restored_models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        return len(statements)
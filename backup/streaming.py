@@ -0,0 +1,166 @@
+"""
+النسخ الاحتياطي المتدفق (NDJSON مضغوط بـ gzip)
+
+كان النسخ الاحتياطي يسلسل كل جدول بـ serializers.serialize على أجزاء
+queryset[start:end] (OFFSET يعيد قراءة ما قبله في كل جزء)، ثم يعيد تحليل
+الناتج بـ json.loads ويجمع قاعدة البيانات كاملة في قاموس واحد قبل الكتابة.
+
+التنسيق المتدفق يكتب سطراً لكل عنصر في ملف gzip أثناء القراءة:
+
+    {"type": "metadata", "metadata": {...}, "media_files": [...], "locale_files": [...]}
+    {"type": "table", "app": "journal", "model": "account", "count": 120}
+    {"model": "journal.account", "pk": 1, "fields": {...}}
+    ...
+
+- السجلات بنفس تنسيق Django fixtures (المفاتيح الأجنبية كقيم pk) فتستعيدها
+  نفس مسارات الاستعادة.
+- القراءة بترقيم المفتاح (pk > آخر مفتاح) على دفعات باستخدام values_list بدلاً
+  من تحميل الكائنات والمسلسل الكامل.
+- القارئ يعيد جدولاً واحداً في كل مرة، فلا يتجاوز استهلاك الذاكرة أكبر جدول.
+"""
+import base64
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXTENSION = '.ndjson.gz'
+CHUNK_SIZE = 2000
+
+
+class BackupJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder + الحقول الثنائية (base64 كما في مسلسل Django)"""
+
+    def default(self, o):
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(bytes(o)).decode('ascii')
+        return super().default(o)
+
+
+def is_streaming_backup(filename):
+    return filename.endswith(EXTENSION)
+
+
+def iter_chunks(model, chunk_size=CHUNK_SIZE):
+    """
+    سجلات النموذج بتنسيق Django fixtures على دفعات (قائمة لكل دفعة).
+
+    علاقات Many-to-Many (جداول الربط التلقائية) تُقرأ باستعلام واحد لكل دفعة.
+    """
+    label = model._meta.label_lower
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    names = [field.name for field in fields]
+    columns = ['pk'] + [field.attname for field in fields]
+    many_to_many = [
+        (field.name, field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name())
+        for field in model._meta.many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+
+    queryset = model._base_manager.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page.values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        pks = [row[0] for row in rows]
+
+        links = {}
+        for name, through, source, target in many_to_many:
+            related = links[name] = {}
+            for owner_id, target_id in through._base_manager.filter(
+                **{f'{source}_id__in': pks}
+            ).order_by('pk').values_list(f'{source}_id', f'{target}_id'):
+                related.setdefault(owner_id, []).append(target_id)
+
+        chunk = []
+        for row in rows:
+            record = {'model': label, 'pk': row[0], 'fields': dict(zip(names, row[1:]))}
+            for name, related in links.items():
+                record['fields'][name] = related.get(row[0], [])
+            chunk.append(record)
+        yield chunk
+
+        if len(rows) < chunk_size:
+            return
+        last_pk = pks[-1]
+
+
+class BackupWriter:
+    """كتابة ملف النسخة سطراً سطراً"""
+
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def _write(self, item):
+        self.file.write(json.dumps(item, cls=BackupJSONEncoder, ensure_ascii=False))
+        self.file.write('\n')
+
+    def write_metadata(self, metadata, **extra):
+        self._write({'type': 'metadata', 'metadata': metadata, **extra})
+
+    def write_table(self, app_name, model_name, count):
+        self._write({'type': 'table', 'app': app_name, 'model': model_name, 'count': count})
+
+    def write_records(self, records):
+        for record in records:
+            self._write(record)
+
+
+class BackupReader:
+    """
+    قراءة ملف النسخة المتدفق.
+
+    tables(): عناوين الجداول فقط (بدون تحليل السجلات) لتجهيز تتبع التقدم.
+    iter_tables(): (التطبيق، النموذج، السجلات) لكل جدول بترتيب الملف.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _lines(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield line
+
+    def metadata(self):
+        for line in self._lines():
+            item = json.loads(line)
+            if item.get('type') == 'metadata':
+                return item
+            break
+        return {}
+
+    def tables(self):
+        return [
+            json.loads(line) for line in self._lines()
+            if line.startswith('{"type": "table"')
+        ]
+
+    def iter_tables(self):
+        current = None
+        records = []
+        for line in self._lines():
+            item = json.loads(line)
+            kind = item.get('type')
+            if kind == 'metadata':
+                continue
+            if kind == 'table':
+                if current is not None:
+                    yield current['app'], current['model'], records
+                current, records = item, []
+            elif current is not None:
+                records.append(item)
+        if current is not None:
+            yield current['app'], current['model'], records
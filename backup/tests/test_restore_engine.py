@@ -0,0 +1,77 @@
+"""
+اختبارات استعادة النسخ الاحتياطية بالإدراج المجمّع
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from backup.restore_engine import BulkRestoreEngine
+from backup.views import get_restore_progress_data, perform_backup_restore
+from core.models import AuditLog
+from journal.models import Account
+
+User = get_user_model()
+
+
+def account(pk, code, parent=None, account_type='asset'):
+    return {'model': 'journal.account', 'pk': pk,
+            'fields': {'code': code, 'name': f'حساب {code}', 'account_type': account_type, 'parent': parent,
+                       'balance': '0.000', 'is_active': True}}
+
+
+class BulkRestoreEngineTests(TestCase):
+    """المفاتيح الأجنبية تُتحقق من مجموعة مفاتيح محمّلة، والسجلات تُدرج على دفعات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='restore_user', password='test_password')
+        Account.objects.create(pk=900, code='900', name='حساب قديم', account_type='asset')
+
+    def test_restore_resolves_references_and_reports_throughput(self):
+        backup_data = {'data': {
+            'journal': {'account': [
+                # الأب يأتي بعد الابن في النسخة
+                account(901, '901', parent=902),
+                account(902, '902'),
+                # أب غير موجود -> None لأن الحقل اختياري
+                account(903, '903', parent=5555),
+                # تحديث سجل موجود
+                {'model': 'journal.account', 'pk': 900,
+                 'fields': {'code': '900', 'name': 'حساب محدث', 'account_type': 'asset'}},
+            ]},
+            'core': {'auditlog': [
+                {'model': 'core.auditlog', 'pk': 50001,
+                 'fields': {'user': self.user.pk, 'action_type': 'create', 'content_type': 'Account',
+                            'description': 'سجل مستعاد'}},
+                # مستخدم غير موجود -> يُتخطى السجل
+                {'model': 'core.auditlog', 'pk': 50002,
+                 'fields': {'user': 7777, 'action_type': 'create', 'content_type': 'Account',
+                            'description': 'سجل يتيم'}},
+            ]},
+        }}
+        perform_backup_restore(backup_data, user=self.user)
+
+        self.assertEqual(Account.objects.get(pk=901).parent_id, 902)
+        self.assertIsNone(Account.objects.get(pk=903).parent_id)
+        self.assertEqual(Account.objects.get(pk=900).name, 'حساب محدث')
+        self.assertTrue(AuditLog.objects.filter(pk=50001, description='سجل مستعاد').exists())
+        self.assertFalse(AuditLog.objects.filter(description='سجل يتيم').exists())
+
+        progress = get_restore_progress_data()
+        self.assertEqual(progress['status'], 'completed')
+        tables = {table['display_name']: table for table in progress['tables_status']}
+        self.assertEqual(tables['journal.account']['actual_records'], 4)
+        self.assertIn('records_per_second', tables['journal.account'])
+        self.assertIn('duration', tables['journal.account'])
+        # إنشاء حساب جديد بعد الاستعادة لا يتعارض مع المفاتيح المستعادة
+        self.assertGreater(Account.objects.create(code='NEW', name='جديد', account_type='asset').pk, 903)
+
+    def test_query_count_does_not_grow_with_records(self):
+        records = [account(1000 + index, f'A{index}', parent=1000) for index in range(300)]
+        table_info = {'display_name': 'journal.account', 'actual_records': 0}
+        with CaptureQueriesContext(connection) as queries:
+            BulkRestoreEngine(batch_size=100).restore([(Account, records, table_info)])
+        self.assertEqual(table_info['actual_records'], 300)
+        self.assertEqual(table_info['errors'], [])
+        self.assertEqual(Account.objects.filter(parent_id=1000).count(), 300)
+        self.assertLess(len(queries), 30)
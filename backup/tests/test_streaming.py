@@ -0,0 +1,58 @@
+"""
+اختبارات النسخ الاحتياطي المتدفق (NDJSON + gzip)
+"""
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from backup.streaming import BackupReader, BackupWriter, iter_chunks
+from backup.views import perform_backup_restore
+from journal.models import Account
+
+User = get_user_model()
+
+
+class StreamingBackupTests(TestCase):
+    """الكتابة على دفعات بترقيم المفتاح، والقراءة جدولاً جدولاً لنفس مسار الاستعادة"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='streaming_user', password='test_password')
+        self.parent = Account.objects.create(code='S1', name='حساب رئيسي', account_type='asset')
+        for index in range(5):
+            Account.objects.create(code=f'S1{index}', name=f'حساب فرعي {index}', account_type='asset',
+                                   parent=self.parent)
+        self.path = os.path.join(tempfile.mkdtemp(), 'backup.ndjson.gz')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_keyset_chunks(self):
+        # استعلام لكل دفعة + استعلام أخير فارغ (عدد السجلات من مضاعفات الدفعة)
+        with self.assertNumQueries(4):
+            chunks = list(iter_chunks(Account, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2])
+        record = chunks[0][1]
+        self.assertEqual(record['model'], 'journal.account')
+        self.assertEqual(record['fields']['parent'], self.parent.pk)
+        self.assertEqual(record['fields']['balance'], Account.objects.get(pk=record['pk']).balance)
+
+    def test_round_trip_restore(self):
+        with BackupWriter(self.path) as writer:
+            writer.write_metadata({'backup_name': 'اختبار'})
+            writer.write_table('journal', 'account', Account.objects.count())
+            for chunk in iter_chunks(Account, chunk_size=4):
+                writer.write_records(chunk)
+
+        reader = BackupReader(self.path)
+        self.assertEqual(reader.metadata()['metadata']['backup_name'], 'اختبار')
+        self.assertEqual(reader.tables(), [{'type': 'table', 'app': 'journal', 'model': 'account', 'count': 6}])
+        expected = dict(Account.objects.values_list('code', 'parent__code'))
+
+        Account.objects.filter(parent__isnull=False).delete()
+        Account.objects.all().delete()
+        perform_backup_restore(reader, user=self.user)
+
+        self.assertEqual(dict(Account.objects.values_list('code', 'parent__code')), expected)
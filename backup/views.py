@@ -2,9 +2,8 @@
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import FileResponse, JsonResponse, HttpResponse, Http404
 from django.contrib import messages
-from django.core import serializers
 from django.apps import apps
 from django.conf import settings
 from django.utils.translation import gettext as _
@@ -20,12 +19,18 @@ import json
 import os
 import threading
 import time
+import uuid
 import logging
 from datetime import datetime as dt_module
 from openpyxl import Workbook
 from decimal import Decimal
 from django.core.management import call_command
 
+from .streaming import EXTENSION as STREAMING_EXTENSION, BackupReader, BackupWriter, iter_chunks
+
+# امتدادات ملفات النسخ الاحتياطية المدعومة (JSON القديم، Excel، والتنسيق المتدفق المضغوط)
+BACKUP_EXTENSIONS = ('.json', '.xlsx', STREAMING_EXTENSION)
+
 logger = logging.getLogger(__name__)
 
 # إضافة AuditLog import مع حماية من تضارب الـ IDs
@@ -65,49 +70,125 @@ except Exception:
     AUDIT_AVAILABLE = False
     logger.debug('AuditLog not available or import failed in backup.views')
 
-def reset_all_sequences():
-    """إعادة تعيين جميع sequences في قاعدة البيانات لتجنب تضارب IDs"""
-    from django.db import connection
-    from django.apps import apps
+
+# 🎯 ترتيب الاستعادة الصحيح: عكس ترتيب المسح (الجذور أولاً → الأطفال أخيراً)
+# المبدأ: استعد الصف المشار إليه قبل الصف الذي يشير
+RESTORATION_ORDER = [
+    # ════════════════════════════════════════════════════════
+    # المستوى 0: الإعدادات والمتسلسلات (الجذور - أول شيء)
+    # ════════════════════════════════════════════════════════
+    'core.documentsequence',
+    'core.companysettings',
+    'settings.jofotarasettings',
+    'settings.documentprintsettings',
+    'settings.companysettings',
+    'settings.currency',
+    'settings.superadminsettings',  # ⭐ إعدادات المدير العام
     
-    sequences_reset = 0
+    # ════════════════════════════════════════════════════════
+    # المستوى 1: المستخدمين والصلاحيات (أول شيء!)
+    # ════════════════════════════════════════════════════════
+    'auth.group',  # ⭐ المجموعات قبل المستخدمين
+    'auth.permission',  # ⭐ الصلاحيات
+    'auth.user',  # ⭐ auth.user من Django
+    'users.user',  # ⭐ ⭐ users.user من نظامنا - حاسم جداً!
+    'users.usergroup',  # ⭐ مجموعات المستخدمين
+    'users.usergroupmembership',  # ⭐ عضويات المجموعات
+    'users.userprofile',  # ⭐ بعد المستخدمين
     
-    try:
-        with connection.cursor() as cursor:
-            # الحصول على جميع الجداول التي تحتوي على auto-increment fields
-            for model in apps.get_models():
-                if hasattr(model._meta, 'db_table'):
-                    table_name = model._meta.db_table
-                    
-                    # الحصول على اسم sequence للجدول (في PostgreSQL)
-                    # sequence name pattern: table_name_id_seq
-                    sequence_name = f"{table_name}_id_seq"
-                    
-                    try:
-                        # الحصول على أعلى ID موجود في الجدول
-                        cursor.execute(f"SELECT MAX(id) FROM {table_name}")
-                        max_id = cursor.fetchone()[0]
-                        
-                        if max_id is not None:
-                            # إعادة تعيين sequence إلى max_id + 1
-                            cursor.execute(f"SELECT setval('{sequence_name}', {max_id + 1}, false)")
-                            sequences_reset += 1
-                            logger.debug(f"تم إعادة تعيين sequence {sequence_name} إلى {max_id + 1}")
-                        else:
-                            # إذا كان الجدول فارغ، إعادة تعيين إلى 1
-                            cursor.execute(f"SELECT setval('{sequence_name}', 1, false)")
-                            sequences_reset += 1
-                            logger.debug(f"تم إعادة تعيين sequence {sequence_name} إلى 1 (جدول فارغ)")
-                            
-                    except Exception as e:
-                        # قد لا يكون للجدول sequence أو قد يكون هناك خطأ آخر
-                        logger.debug(f"تخطي إعادة تعيين sequence للجدول {table_name}: {str(e)}")
-                        continue
-                        
-    except Exception as e:
-        logger.warning(f"فشل في إعادة تعيين sequences: {str(e)}")
+    # ════════════════════════════════════════════════════════
+    # المستوى 2: الجداول الأساسية المرجعية (بدون FK خارجية)
+    # ════════════════════════════════════════════════════════
+    'revenues_expenses.sector',
+    'revenues_expenses.revenueexpensecategory',
+    'provisions.provisiontype',
+    'assets_liabilities.liabilitycategory',
+    'assets_liabilities.assetcategory',
+    'journal.account',  # ⭐ الحسابات قبل كل شيء يستخدمها
+    'accounts.costcenter',  # ⭐ مراكز التكلفة
+    'hr.leavetype',
+    'hr.position',
+    'hr.department',
+    'products.category',
+    'products.unit',  # ⭐ وحدات القياس قبل المنتجات
+    'customers.customercategory',  # ⭐ فئات العملاء قبل العملاء
+    'customers.customersupplier',  # ⭐ العملاء/الموردين قبل الفواتير
+    'customers.customer',  # ⭐ العملاء المنفصلين
+    
+    # ════════════════════════════════════════════════════════
+    # المستوى 2: البيانات الأساسية المشار إليها كثيراً
+    # ════════════════════════════════════════════════════════
+    'inventory.warehouse',  # ⭐ المستودعات قبل الفواتير والحركات
+    'cashboxes.cashbox',
+    'banks.bankaccount',
+    'products.product',  # ⭐ المنتجات قبل عناصر الفواتير
+    
+    # ════════════════════════════════════════════════════════
+    # المستوى 3: السجلات التابعة للجذور
+    # ════════════════════════════════════════════════════════
+    'reports.reportaccesscontrol',
+    'documents.document',
+    'provisions.provision',
+    'assets_liabilities.liability',
+    'assets_liabilities.asset',
+    'hr.employee',  # بعد departments & positions
     
-    return sequences_reset
+    # ════════════════════════════════════════════════════════
+    # المستوى 4: الفواتير والقيود الرئيسية
+    # ════════════════════════════════════════════════════════
+    'hr.payrollperiod',
+    'hr.contract',
+    'purchases.purchaseinvoice',  # ⭐ بعد customers, warehouse, products
+    'sales.salesinvoice',  # ⭐ بعد customers, warehouse, products
+    'journal.journalentry',
+    'journal.yearendclosing',
+    
+    # ════════════════════════════════════════════════════════
+    # المستوى 5: المستندات الرئيسية والمعاملات
+    # ════════════════════════════════════════════════════════
+    'purchases.purchasereturn',
+    'sales.salesreturn',
+    'sales.salescreditnote',
+    'purchases.purchasedebitnote',
+    'payments.paymentvoucher',
+    'receipts.paymentreceipt',
+    'banks.banktransfer',
+    'banks.banktransaction',
+    'banks.bankreconciliation',
+    'banks.bankstatement',
+    'cashboxes.cashboxtransfer',
+    'cashboxes.cashboxtransaction',
+    'inventory.warehousetransfer',
+    'inventory.inventorymovement',
+    'accounts.accounttransaction',
+    'revenues_expenses.recurringrevenueexpense',
+    'revenues_expenses.revenueexpenseentry',
+    'assets_liabilities.depreciationentry',
+    'provisions.provisionentry',
+    'journal.journalline',  # ⭐ بعد journalentry و accounts
+    
+    # ════════════════════════════════════════════════════════
+    # المستوى 6: بنود وتفاصيل المستندات
+    # ════════════════════════════════════════════════════════
+    'receipts.checkcollection',
+    'hr.employeedocument',
+    'hr.leaverequest',
+    'hr.attendance',
+    'hr.payrollentry',
+    'inventory.warehousetransferitem',
+    'purchases.purchasereturnitem',
+    'sales.salesreturnitem',
+    'purchases.purchaseinvoiceitem',  # ⭐ بعد purchaseinvoice و products
+    'sales.salesinvoiceitem',  # ⭐ بعد salesinvoice و products
+    
+    # ════════════════════════════════════════════════════════
+    # المستوى 7 (الأخير): سجلات التدقيق والإشعارات
+    # ════════════════════════════════════════════════════════
+    'receipts.receiptreversal',
+    'core.systemnotification',
+    'core.auditlog',  # ⭐ سجل المراجعة - آخر شيء
+]
+
 
 def log_audit(user, action, description):
     """تسجيل الحدث في سجل المراجعة"""
@@ -564,7 +645,7 @@ class BackupRestoreView(LoginRequiredMixin, TemplateView):
         # جلب قائمة النسخ الاحتياطية
         backups = []
         for filename in os.listdir(backup_dir):
-            if filename.endswith('.json') or filename.endswith('.xlsx'):
+            if filename.endswith(BACKUP_EXTENSIONS):
                 filepath = os.path.join(backup_dir, filename)
                 try:
                     stat = os.stat(filepath)
@@ -818,6 +899,9 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
         set_backup_progress_data(progress_data)
         
         tables_info = get_backup_tables_info()
+        # الجداول بترتيب الاستعادة: الملف المتدفق يُستعاد بترتيب كتابته
+        order = {label: index for index, label in enumerate(RESTORATION_ORDER)}
+        tables_info.sort(key=lambda table: order.get(f"{table['app_name']}.{table['model_name']}", len(order)))
         total_tables = len(tables_info)
         total_records = sum(table['record_count'] for table in tables_info)
         
@@ -838,22 +922,18 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
         })
         set_backup_progress_data(progress_data)
         
-        time.sleep(2)
-        
         # إنشاء هيكل النسخة الاحتياطية
-        backup_content = {
-            'metadata': {
-                'backup_name': f'نسخة احتياطية {timestamp}',
-                'created_at': timezone.now().isoformat(),
-                'created_by': user.username if user else 'system',
-                'system_version': '1.0',
-                'total_tables': total_tables,
-                'total_records': total_records,
-                'format': format_type.upper(),
-                'description': 'نسخة احتياطية كاملة مع معلومات تفصيلية'
-            },
-            'data': {}
+        metadata = {
+            'backup_name': f'نسخة احتياطية {timestamp}',
+            'created_at': timezone.now().isoformat(),
+            'created_by': user.username if user else 'system',
+            'system_version': '1.0',
+            'total_tables': total_tables,
+            'total_records': total_records,
+            'format': format_type.upper(),
+            'description': 'نسخة احتياطية كاملة مع معلومات تفصيلية'
         }
+        backup_content = {'metadata': metadata, 'data': {}}
 
         # تضمين قائمة بملفات الوسائط المهمة (شعارات النظام وصور الخلفية) ضمن المحتوى
         try:
@@ -883,6 +963,13 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
             backup_content['locale_files'] = locale_files
         except Exception as e:
             logger.warning(f"فشل في حصر ملفات الترجمة للنسخ الاحتياطي: {str(e)}")
+
+        # التنسيق المتدفق يكتب كل دفعة مباشرة إلى الملف المضغوط؛ XLSX يحتاج المحتوى كاملاً
+        writer = None
+        if format_type.lower() == 'json':
+            writer = BackupWriter(filepath)
+            writer.write_metadata(metadata, media_files=backup_content.get('media_files', []),
+                                  locale_files=backup_content.get('locale_files', []))
         
         # متغيرات التتبع
         processed_tables = 0
@@ -898,252 +985,122 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
         set_backup_progress_data(progress_data)
         
         # نسخ البيانات من كل جدول
-        for table_index, table_info in enumerate(tables_info):
-            app_name = table_info['app_name']
-            model_name = table_info['model_name']
-            display_name = table_info['display_name']
-            expected_records = table_info['record_count']
-            
-            try:
-                progress_data = get_backup_progress_data()
-                tables_status = progress_data.get('tables_status', [])
-                
-                if table_index < len(tables_status):
-                    tables_status[table_index]['status'] = 'processing'
-                    tables_status[table_index]['progress'] = 0
-                
-                progress_data.update({
-                    'current_table': f'معالجة {display_name}...',
-                    'tables_status': tables_status
-                })
-                set_backup_progress_data(progress_data)
-                
-                # تسجيل بداية معالجة الجدول
-                log_audit(user, 'create', f'بدء نسخ الجدول: {display_name} ({expected_records} سجل متوقع)')
-                
-                # الحصول على النموذج
-                app = apps.get_app_config(app_name)
-                model = app.get_model(model_name)
-                
-                if app_name not in backup_content['data']:
-                    backup_content['data'][app_name] = {}
-                
-                # نسخ البيانات مع معالجة خاصة للحقول الإشكالية
-                queryset = model.objects.all()
-                
-                # تحسين الاستعلامات للنماذج ذات العلاقات
-                if hasattr(model, '_meta'):
-                    # إضافة select_related للعلاقات الأجنبية المباشرة
-                    foreign_keys = [f.name for f in model._meta.fields if hasattr(f, 'related_model') and f.related_model]
-                    if foreign_keys:
-                        queryset = queryset.select_related(*foreign_keys)
-                    
-                    # إضافة prefetch_related للعلاقات العكسية المهمة
-                    reverse_relations = []
-                    for related in model._meta.related_objects:
-                        if related.one_to_many or related.many_to_many:
-                            reverse_relations.append(related.get_accessor_name())
-                    if reverse_relations:
-                        queryset = queryset.prefetch_related(*reverse_relations)
-                
-                actual_records = queryset.count()
-                
-                if actual_records > 0:
-                    # زيادة عدد الأجزاء لتسريع المعالجة (من 10 إلى 50 جزء)
-                    chunk_size = max(100, actual_records // 50)  # حد أدنى 100 سجل لكل جزء
-                    processed_in_table = 0
-                    
-                    all_data = []
-                    for chunk_start in range(0, actual_records, chunk_size):
-                        chunk_end = min(chunk_start + chunk_size, actual_records)
-                        chunk_queryset = queryset[chunk_start:chunk_end]
-                        
-                        try:
-                            # محاولة التسلسل العادي أولاً مع التحقق من الحقول المتاحة
-                            chunk_data = serializers.serialize('json', chunk_queryset)
-                            serialized_data = json.loads(chunk_data)
-                            
-                            # تنظيف البيانات من الحقول المحذوفة
-                            cleaned_data = []
-                            for item in serialized_data:
-                                if 'fields' in item:
-                                    # إزالة الحقول المحذوفة أو غير الموجودة - تم إزالة فلترة is_service
-                                    pass
-                                cleaned_data.append(item)
-                            
-                            all_data.extend(cleaned_data)
-                            
-                        except Exception as serialization_error:
-                            # في حالة فشل التسلسل، نعالج السجلات فردياً
-                            logger.warning(f"فشل تسلسل chunk في {display_name}: {str(serialization_error)}")
-                            
-                            for record in chunk_queryset:
-                                try:
-                                    # محاولة تسلسل سجل واحد
-                                    single_data = serializers.serialize('json', [record])
-                                    serialized_record = json.loads(single_data)
-                                    
-                                    # تنظيف البيانات من الحقول المحذوفة
-                                    for item in serialized_record:
-                                        # تم إزالة فلترة is_service - الحقل لم يعد موجود
-                                        pass
-                                    
-                                    all_data.extend(serialized_record)
-                                    
-                                except Exception as single_error:
-                                    # معالجة خاصة للسجلات التالفة
-                                    logger.warning(f"فشل في تسلسل سجل {record.pk} في {display_name}: {str(single_error)}")
-                                    
-                                    # إنشاء سجل آمن يدوياً
-                                    safe_record = {
-                                        'model': f"{app_name}.{model_name}",
-                                        'pk': record.pk,
-                                        'fields': {}
-                                    }
-                                    
-                                    # نسخ الحقول مع تجنب المشاكل
-                                    for field in model._meta.fields:
-                                        field_name = field.name
-                                        
-                                        # تم إزالة فلترة is_service - الحقل لم يعد موجود
-                                            
-                                        try:
-                                            value = getattr(record, field_name)
-                                            
-                                            # معالجة خاصة للحقول الإشكالية
-                                            if hasattr(field, 'upload_to'):  # حقول الملفات والصور
-                                                if value and hasattr(value, 'name'):
-                                                    safe_record['fields'][field_name] = value.name
-                                                else:
-                                                    safe_record['fields'][field_name] = None
-                                            elif hasattr(value, 'isoformat'):  # حقول التاريخ
-                                                safe_record['fields'][field_name] = value.isoformat()
-                                            elif value is None:
-                                                safe_record['fields'][field_name] = None
-                                            else:
-                                                # التأكد من أن القيمة قابلة للتسلسل
-                                                try:
-                                                    json.dumps(value)
-                                                    safe_record['fields'][field_name] = value
-                                                except (TypeError, ValueError):
-                                                    safe_record['fields'][field_name] = str(value)
-                                                    
-                                        except Exception as field_error:
-                                            logger.warning(f"فشل في حقل {field_name} للسجل {record.pk}: {str(field_error)}")
-                                            safe_record['fields'][field_name] = None
-                                    
-                                    all_data.append(safe_record)
-                                    log_audit(user, 'warning', f'تم إصلاح سجل تالف: {display_name} - المعرف: {record.pk}')
-                        
-                        processed_in_table = chunk_end
-                        table_progress = int((processed_in_table / actual_records) * 100)
-                        
+        try:
+            for table_index, table_info in enumerate(tables_info):
+                app_name = table_info['app_name']
+                model_name = table_info['model_name']
+                display_name = table_info['display_name']
+                expected_records = table_info['record_count']
+
+                try:
+                    progress_data = get_backup_progress_data()
+                    tables_status = progress_data.get('tables_status', [])
+
+                    if table_index < len(tables_status):
+                        tables_status[table_index]['status'] = 'processing'
+                        tables_status[table_index]['progress'] = 0
+
+                    progress_data.update({
+                        'current_table': f'معالجة {display_name}...',
+                        'tables_status': tables_status
+                    })
+                    set_backup_progress_data(progress_data)
+
+                    # تسجيل بداية معالجة الجدول
+                    log_audit(user, 'create', f'بدء نسخ الجدول: {display_name} ({expected_records} سجل متوقع)')
+
+                    # الحصول على النموذج
+                    app = apps.get_app_config(app_name)
+                    model = app.get_model(model_name)
+
+                    if writer is not None:
+                        writer.write_table(app_name, model_name, expected_records)
+                    else:
+                        all_data = backup_content['data'].setdefault(app_name, {}).setdefault(model_name, [])
+
+                    # قراءة السجلات بترقيم المفتاح على دفعات
+                    actual_records = 0
+                    for chunk in iter_chunks(model):
+                        if writer is not None:
+                            writer.write_records(chunk)
+                        else:
+                            all_data.extend(chunk)
+                        actual_records += len(chunk)
+
+                        table_progress = min(int((actual_records / expected_records) * 100), 100) if expected_records else 100
                         progress_data = get_backup_progress_data()
                         tables_status = progress_data.get('tables_status', [])
                         if table_index < len(tables_status):
                             tables_status[table_index]['progress'] = table_progress
-                        
+
                         progress_data.update({
-                            'current_table': f'{display_name}: {processed_in_table}/{actual_records} ({table_progress}%)',
+                            'current_table': f'{display_name}: {actual_records}/{expected_records} ({table_progress}%)',
+                            'processed_records': processed_records + actual_records,
                             'tables_status': tables_status
                         })
                         set_backup_progress_data(progress_data)
-                        
-                        time.sleep(0.3)
-                    
-                    backup_content['data'][app_name][model_name] = all_data
-                else:
-                    backup_content['data'][app_name][model_name] = []
-                
-                processed_records += actual_records
-                processed_tables += 1
-                
-                progress_data = get_backup_progress_data()
-                tables_status = progress_data.get('tables_status', [])
-                if table_index < len(tables_status):
-                    tables_status[table_index]['status'] = 'completed'
-                    tables_status[table_index]['progress'] = 100
-                    tables_status[table_index]['actual_records'] = actual_records
-                
-                # حساب الوقت المتبقي
-                elapsed_time = time.time() - start_time
-                if processed_tables > 0:
-                    avg_time_per_table = elapsed_time / processed_tables
-                    remaining_tables = total_tables - processed_tables
-                    estimated_remaining = avg_time_per_table * remaining_tables
-                    estimated_time = f"{int(estimated_remaining)} ثانية متبقية تقريباً"
-                else:
-                    estimated_time = "حساب الوقت المتبقي..."
-                
-                overall_progress = 10 + int(((processed_tables / total_tables) * 80))
-                progress_data.update({
-                    'processed_tables': processed_tables,
-                    'processed_records': processed_records,
-                    'percentage': overall_progress,
-                    'tables_status': tables_status,
-                    'estimated_time': estimated_time,
-                    'current_table': f'اكتمل {display_name} ✅ ({actual_records} سجل)'
-                })
-                set_backup_progress_data(progress_data)
-                
-                log_audit(user, 'update', f'اكتمل نسخ الجدول: {display_name} - تم نسخ {actual_records} سجل')
-                
-                time.sleep(0.5)
-                
-            except Exception as e:
-                error_msg = f"تعذر نسخ جدول {display_name}: {str(e)}"
-                logger.error(error_msg)
-                
-                # تسجيل الخطأ
-                log_audit(user, 'error', error_msg)
-                
-                progress_data = get_backup_progress_data()
-                tables_status = progress_data.get('tables_status', [])
-                if table_index < len(tables_status):
-                    tables_status[table_index]['status'] = 'error'
-                    tables_status[table_index]['error'] = str(e)
-                    tables_status[table_index]['progress'] = 0
-                
-                # تحديث الحالة للمتابعة رغم الخطأ
-                processed_tables += 1
-                overall_progress = 10 + int(((processed_tables / total_tables) * 80))
-                
-                progress_data.update({
-                    'processed_tables': processed_tables,
-                    'percentage': overall_progress,
-                    'tables_status': tables_status,
-                    'current_table': f'⚠️ فشل في {display_name}: {str(e)[:50]}...',
-                    'errors': progress_data.get('errors', []) + [error_msg]
-                })
-                set_backup_progress_data(progress_data)
-                
-                # متابعة المعالجة للجدول التالي
-                time.sleep(1)
-                continue
-                if table_index < len(tables_status):
-                    tables_status[table_index]['status'] = 'error'
-                    tables_status[table_index]['error'] = str(e)
-                
-                progress_data.update({
-                    'tables_status': tables_status,
-                    'current_table': f'خطأ في {display_name}: {str(e)}'
-                })
-                set_backup_progress_data(progress_data)
-                
-                if AUDIT_AVAILABLE:
-                    try:
-                        AuditLog.objects.create(
-                            user=user,
-                            action_type='backup_table_error',
-                            content_type='backup_system',
-                            description=f'خطأ في نسخ الجدول: {display_name} - {str(e)}'
-                        )
-                    except Exception as audit_e:
-                        logger.warning(f"فشل في تسجيل خطأ النسخ الاحتياطي في AuditLog: {audit_e}")
-                
-                processed_tables += 1
-                time.sleep(1)
-                continue
+
+                    processed_records += actual_records
+                    processed_tables += 1
+
+                    progress_data = get_backup_progress_data()
+                    tables_status = progress_data.get('tables_status', [])
+                    if table_index < len(tables_status):
+                        tables_status[table_index]['status'] = 'completed'
+                        tables_status[table_index]['progress'] = 100
+                        tables_status[table_index]['actual_records'] = actual_records
+
+                    # حساب الوقت المتبقي
+                    elapsed_time = time.time() - start_time
+                    if processed_records > 0:
+                        estimated_remaining = elapsed_time / processed_records * max(total_records - processed_records, 0)
+                        estimated_time = f"{int(estimated_remaining)} ثانية متبقية تقريباً"
+                    else:
+                        estimated_time = "حساب الوقت المتبقي..."
+
+                    overall_progress = 10 + int(((processed_tables / total_tables) * 80))
+                    progress_data.update({
+                        'processed_tables': processed_tables,
+                        'processed_records': processed_records,
+                        'percentage': overall_progress,
+                        'tables_status': tables_status,
+                        'estimated_time': estimated_time,
+                        'current_table': f'اكتمل {display_name} ✅ ({actual_records} سجل)'
+                    })
+                    set_backup_progress_data(progress_data)
+
+                    log_audit(user, 'update', f'اكتمل نسخ الجدول: {display_name} - تم نسخ {actual_records} سجل')
+
+                except Exception as e:
+                    error_msg = f"تعذر نسخ جدول {display_name}: {str(e)}"
+                    logger.error(error_msg)
+
+                    # تسجيل الخطأ
+                    log_audit(user, 'error', error_msg)
+
+                    progress_data = get_backup_progress_data()
+                    tables_status = progress_data.get('tables_status', [])
+                    if table_index < len(tables_status):
+                        tables_status[table_index]['status'] = 'error'
+                        tables_status[table_index]['error'] = str(e)
+                        tables_status[table_index]['progress'] = 0
+
+                    # تحديث الحالة للمتابعة رغم الخطأ
+                    processed_tables += 1
+                    overall_progress = 10 + int(((processed_tables / total_tables) * 80))
+
+                    progress_data.update({
+                        'processed_tables': processed_tables,
+                        'percentage': overall_progress,
+                        'tables_status': tables_status,
+                        'current_table': f'⚠️ فشل في {display_name}: {str(e)[:50]}...',
+                        'errors': progress_data.get('errors', []) + [error_msg]
+                    })
+                    set_backup_progress_data(progress_data)
+                    continue
+        finally:
+            if writer is not None:
+                writer.close()
         
         # حفظ النسخة الاحتياطية
         progress_data = get_backup_progress_data()
@@ -1156,7 +1113,7 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
         set_backup_progress_data(progress_data)
         
         try:
-            # حفظ حسب النوع المطلوب
+            # ملف التنسيق المتدفق كُتب أثناء القراءة؛ XLSX يُحفظ الآن
             if format_type.lower() == 'xlsx':
                 if AUDIT_AVAILABLE:
                     try:
@@ -1169,19 +1126,6 @@ def perform_backup_task(user, timestamp, filename, filepath, format_type='json')
                     except Exception as audit_e:
                         logger.warning(f"فشل في تسجيل حفظ XLSX في AuditLog: {audit_e}")
                 save_backup_as_xlsx(backup_content, filepath)
-            else:
-                if AUDIT_AVAILABLE:
-                    try:
-                        AuditLog.objects.create(
-                            user=user,
-                            action_type='backup_saving_json',
-                            content_type='backup_system',
-                            description=f'بدء حفظ النسخة الاحتياطية بصيغة JSON: {filename}'
-                        )
-                    except Exception as audit_e:
-                        logger.warning(f"فشل في تسجيل حفظ JSON في AuditLog: {audit_e}")
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(backup_content, f, ensure_ascii=False, indent=2)
             
             # التأكد من حفظ الملف
             if not os.path.exists(filepath):
@@ -1728,6 +1672,41 @@ def convert_field_value(field, value):
 
 
 
+def resolve_restore_model(app_name, model_name):
+    """النموذج المقابل لجدول في النسخة الاحتياطية (مع أسماء النماذج المبتورة أو القديمة)"""
+    try:
+        app_config = apps.get_app_config(app_name)
+    except LookupError:
+        return None
+    try:
+        return app_config.get_model(model_name)
+    except LookupError:
+        pass
+
+    # قائمة بتطابقات أسماء النماذج المعروفة
+    model_mappings = {
+        'expenses_revenueexpens': 'RevenueExpenseEntry',
+        'expenses_revenueexpe': 'RevenueExpenseEntry',
+        'expenses_recurringreve': 'RecurringRevenueExpense',
+        'expenses_recurringrev': 'RecurringRevenueExpense',
+    }
+    if model_name.lower() in model_mappings:
+        try:
+            model = app_config.get_model(model_mappings[model_name.lower()])
+            logger.info(f"✅ تم إيجاد النموذج البديل: {model_name} → {model_mappings[model_name.lower()]}")
+            return model
+        except LookupError:
+            pass
+
+    # إذا لم نجد تطابق، نحاول البحث بشكل جزئي
+    for available_model in app_config.get_models():
+        model_table_name = available_model._meta.db_table.replace(f"{app_name}_", "").lower()
+        if model_name.lower().startswith(model_table_name[:15]) or model_table_name.startswith(model_name.lower()[:15]):
+            logger.info(f"✅ تم إيجاد النموذج بالمطابقة الجزئية: {model_name} → {available_model.__name__}")
+            return available_model
+    return None
+
+
 def perform_backup_restore(backup_data, clear_data=False, user=None):
     """تنفيذ عملية الاستعادة الفعلية"""
     from .restore_context import set_restoring
@@ -1742,130 +1721,28 @@ def perform_backup_restore(backup_data, clear_data=False, user=None):
 
         start_time = time.time()
 
-        # 🎯 ترتيب الاستعادة الصحيح: عكس ترتيب المسح (الجذور أولاً → الأطفال أخيراً)
-        # المبدأ: استعد الصف المشار إليه قبل الصف الذي يشير
-        restoration_order = [
-            # ════════════════════════════════════════════════════════
-            # المستوى 0: الإعدادات والمتسلسلات (الجذور - أول شيء)
-            # ════════════════════════════════════════════════════════
-            'core.documentsequence',
-            'core.companysettings',
-            'settings.jofotarasettings',
-            'settings.documentprintsettings',
-            'settings.companysettings',
-            'settings.currency',
-            'settings.superadminsettings',  # ⭐ إعدادات المدير العام
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 1: المستخدمين والصلاحيات (أول شيء!)
-            # ════════════════════════════════════════════════════════
-            'auth.group',  # ⭐ المجموعات قبل المستخدمين
-            'auth.permission',  # ⭐ الصلاحيات
-            'auth.user',  # ⭐ auth.user من Django
-            'users.user',  # ⭐ ⭐ users.user من نظامنا - حاسم جداً!
-            'users.usergroup',  # ⭐ مجموعات المستخدمين
-            'users.usergroupmembership',  # ⭐ عضويات المجموعات
-            'users.userprofile',  # ⭐ بعد المستخدمين
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 2: الجداول الأساسية المرجعية (بدون FK خارجية)
-            # ════════════════════════════════════════════════════════
-            'revenues_expenses.sector',
-            'revenues_expenses.revenueexpensecategory',
-            'provisions.provisiontype',
-            'assets_liabilities.liabilitycategory',
-            'assets_liabilities.assetcategory',
-            'journal.account',  # ⭐ الحسابات قبل كل شيء يستخدمها
-            'accounts.costcenter',  # ⭐ مراكز التكلفة
-            'hr.leavetype',
-            'hr.position',
-            'hr.department',
-            'products.category',
-            'products.unit',  # ⭐ وحدات القياس قبل المنتجات
-            'customers.customercategory',  # ⭐ فئات العملاء قبل العملاء
-            'customers.customersupplier',  # ⭐ العملاء/الموردين قبل الفواتير
-            'customers.customer',  # ⭐ العملاء المنفصلين
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 2: البيانات الأساسية المشار إليها كثيراً
-            # ════════════════════════════════════════════════════════
-            'inventory.warehouse',  # ⭐ المستودعات قبل الفواتير والحركات
-            'cashboxes.cashbox',
-            'banks.bankaccount',
-            'products.product',  # ⭐ المنتجات قبل عناصر الفواتير
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 3: السجلات التابعة للجذور
-            # ════════════════════════════════════════════════════════
-            'reports.reportaccesscontrol',
-            'documents.document',
-            'provisions.provision',
-            'assets_liabilities.liability',
-            'assets_liabilities.asset',
-            'hr.employee',  # بعد departments & positions
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 4: الفواتير والقيود الرئيسية
-            # ════════════════════════════════════════════════════════
-            'hr.payrollperiod',
-            'hr.contract',
-            'purchases.purchaseinvoice',  # ⭐ بعد customers, warehouse, products
-            'sales.salesinvoice',  # ⭐ بعد customers, warehouse, products
-            'journal.journalentry',
-            'journal.yearendclosing',
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 5: المستندات الرئيسية والمعاملات
-            # ════════════════════════════════════════════════════════
-            'purchases.purchasereturn',
-            'sales.salesreturn',
-            'sales.salescreditnote',
-            'purchases.purchasedebitnote',
-            'payments.paymentvoucher',
-            'receipts.paymentreceipt',
-            'banks.banktransfer',
-            'banks.banktransaction',
-            'banks.bankreconciliation',
-            'banks.bankstatement',
-            'cashboxes.cashboxtransfer',
-            'cashboxes.cashboxtransaction',
-            'inventory.warehousetransfer',
-            'inventory.inventorymovement',
-            'accounts.accounttransaction',
-            'revenues_expenses.recurringrevenueexpense',
-            'revenues_expenses.revenueexpenseentry',
-            'assets_liabilities.depreciationentry',
-            'provisions.provisionentry',
-            'journal.journalline',  # ⭐ بعد journalentry و accounts
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 6: بنود وتفاصيل المستندات
-            # ════════════════════════════════════════════════════════
-            'receipts.checkcollection',
-            'hr.employeedocument',
-            'hr.leaverequest',
-            'hr.attendance',
-            'hr.payrollentry',
-            'inventory.warehousetransferitem',
-            'purchases.purchasereturnitem',
-            'sales.salesreturnitem',
-            'purchases.purchaseinvoiceitem',  # ⭐ بعد purchaseinvoice و products
-            'sales.salesinvoiceitem',  # ⭐ بعد salesinvoice و products
-            
-            # ════════════════════════════════════════════════════════
-            # المستوى 7 (الأخير): سجلات التدقيق والإشعارات
-            # ════════════════════════════════════════════════════════
-            'receipts.receiptreversal',
-            'core.systemnotification',
-            'core.auditlog',  # ⭐ سجل المراجعة - آخر شيء
-        ]
+        restoration_order = RESTORATION_ORDER
 
         # تهيئة تتبع التقدم
         flat_tables = []
         total_records_expected = 0
         backup_data_dict = {}  # قاموس للوصول السريع للبيانات
         
-        if isinstance(backup_data, dict) and 'data' in backup_data:
+        if isinstance(backup_data, BackupReader):
+            # الملف المتدفق مكتوب بترتيب الاستعادة: عناوين الجداول فقط، والسجلات تُقرأ جدولاً جدولاً
+            for table in backup_data.tables():
+                flat_tables.append({
+                    'app_name': table['app'],
+                    'model_name': table['model'],
+                    'display_name': f"{table['app']}.{table['model']}",
+                    'record_count': table['count'],
+                    'status': 'pending',
+                    'progress': 0,
+                    'actual_records': 0,
+                    'error': None
+                })
+                total_records_expected += table['count']
+        elif isinstance(backup_data, dict) and 'data' in backup_data:
             # 🔧 تحويل أسماء التطبيقات القديمة إلى الأسماء الجديدة
             app_name_mapping = {
                 'revenues': 'revenues_expenses',
@@ -2013,502 +1890,82 @@ def perform_backup_restore(backup_data, clear_data=False, user=None):
             logger.info("مسح البيانات الموجودة...")
             perform_clear_all_data(user)
         
-        # استعادة البيانات
-        processed_tables = 0
-        processed_records = 0
-        skipped_records = 0  # 🔍 عداد للسجلات المتخطاة
-        
-        # 🔍 تسجيل بداية الاستعادة
+        # استعادة البيانات بالإدراج المجمّع (معاملة واحدة، نقطة حفظ لكل جدول)
+        from .restore_engine import BulkRestoreEngine
+
         logger.info(f"🚀 بدء استعادة {len(flat_tables)} جدول مع {total_records_expected} سجل متوقع")
-        logger.info(f"� أول 20 جدول: {[t['display_name'] for t in flat_tables[:20]]}")
-        
-        # �🔧 تم إزالة transaction.atomic() - كان يسبب rollback كامل عند أي خطأ
+
         try:
-            for i, table_info in enumerate(flat_tables):
-                app_name = table_info['app_name']
-                model_name = table_info['model_name']
-                
-                # 🔍 تسجيل بداية معالجة كل جدول
-                logger.info(f"📊 [{i+1}/{len(flat_tables)}] معالجة جدول: {table_info['display_name']} ({table_info['record_count']} سجل متوقع)")
-                
-                progress_data['current_table'] = table_info['display_name']
-                progress_data['processed_tables'] = i
-                
-                # حساب الوقت المتوقع
+            if isinstance(backup_data, BackupReader):
+                table_records = (records for app_name, model_name, records in backup_data.iter_tables())
+            else:
+                table_records = (backup_data['data'][t['app_name']][t['model_name']] for t in flat_tables)
+
+            def tables():
+                # الجداول تُحمّل عند الوصول إليها (جدول واحد في الذاكرة للملف المتدفق)
+                for table_info, records in zip(flat_tables, table_records):
+                    model = resolve_restore_model(table_info['app_name'], table_info['model_name'])
+                    if model is None:
+                        logger.warning(f"⚠️ لم يتم العثور على النموذج {table_info['display_name']} - تخطي")
+                        table_info['status'] = 'skipped'
+                        table_info['error'] = 'النموذج غير موجود'
+                        continue
+                    yield model, records if isinstance(records, list) else [], table_info
+
+            def on_progress(table_info):
+                processed_tables = sum(1 for t in flat_tables if t['status'] in ('completed', 'error', 'skipped'))
                 elapsed = time.time() - start_time
-                if processed_tables > 0:
-                    avg_time_per_table = elapsed / processed_tables
-                    remaining_tables = len(flat_tables) - processed_tables
-                    estimated_seconds = avg_time_per_table * remaining_tables
-                    progress_data['estimated_time'] = f"{int(estimated_seconds)} ثانية متبقية"
-                else:
-                    progress_data['estimated_time'] = 'جاري الحساب...'
-                
-                set_restore_progress_data(progress_data)
-                
-                try:
-                    # الحصول على النموذج
-                    app_config = apps.get_app_config(app_name)
-                    
-                    # 🔧 معالجة أسماء النماذج المبتورة أو القديمة
-                    try:
-                        model = app_config.get_model(model_name)
-                    except LookupError:
-                        # محاولة إيجاد النموذج الصحيح بناءً على جزء من الاسم
-                        model = None
-                        # قائمة بتطابقات أسماء النماذج المعروفة
-                        model_mappings = {
-                            'expenses_revenueexpens': 'RevenueExpenseEntry',
-                            'expenses_revenueexpe': 'RevenueExpenseEntry',
-                            'expenses_recurringreve': 'RecurringRevenueExpense',
-                            'expenses_recurringrev': 'RecurringRevenueExpense',
-                        }
-                        
-                        # محاولة إيجاد تطابق
-                        if model_name.lower() in model_mappings:
-                            try:
-                                model = app_config.get_model(model_mappings[model_name.lower()])
-                                logger.info(f"✅ تم إيجاد النموذج البديل: {model_name} → {model_mappings[model_name.lower()]}")
-                            except LookupError:
-                                pass
-                        
-                        # إذا لم نجد تطابق، نحاول البحث بشكل جزئي
-                        if not model:
-                            for available_model in app_config.get_models():
-                                model_table_name = available_model._meta.db_table.replace(f"{app_name}_", "").lower()
-                                if model_name.lower().startswith(model_table_name[:15]) or model_table_name.startswith(model_name.lower()[:15]):
-                                    model = available_model
-                                    logger.info(f"✅ تم إيجاد النموذج بالمطابقة الجزئية: {model_name} → {available_model.__name__}")
-                                    break
-                        
-                        # إذا لم نجد النموذج نهائياً
-                        if not model:
-                            logger.warning(f"⚠️ لم يتم العثور على النموذج {app_name}.{model_name} - تخطي")
-                            progress_data['tables_status'][i]['status'] = 'skipped'
-                            progress_data['tables_status'][i]['error'] = f'النموذج غير موجود'
-                            set_restore_progress_data(progress_data)
-                            processed_tables += 1
-                            continue
-                    
-                    if model and 'data' in backup_data and app_name in backup_data['data'] and model_name in backup_data['data'][app_name]:
-                        records = backup_data['data'][app_name][model_name]
-                        if isinstance(records, list):
-                            for record_item in records:
-                                try:
-                                    # تحويل من تنسيق Django fixtures إلى البيانات المباشرة
-                                    if isinstance(record_item, dict):
-                                        if 'fields' in record_item and 'pk' in record_item:
-                                            # تنسيق Django fixtures: {'model': 'app.model', 'pk': 1, 'fields': {...}}
-                                            record_data = record_item['fields'].copy()
-                                            record_data['pk'] = record_item['pk']
-                                        else:
-                                            # تنسيق البيانات المباشرة
-                                            record_data = record_item.copy()
-                                    else:
-                                        continue
-                                    
-                                    # تنظيف البيانات للنماذج التي تغيرت هيكلها
-                                    if model._meta.label == 'core.AuditLog':
-                                        # إزالة الحقول القديمة التي لم تعد موجودة
-                                        valid_fields = ['pk', 'user', 'action_type', 'content_type', 'object_id', 'description', 'ip_address', 'timestamp']
-                                        record_data = {k: v for k, v in record_data.items() if k in valid_fields}
-                                        # تجاهل السجلات التي لها user_id null أو غير موجود
-                                        user_id = record_data.get('user')
-                                        if user_id:
-                                            # التحقق من وجود المستخدم في قاعدة البيانات
-                                            from users.models import User
-                                            if not User.objects.filter(pk=user_id).exists():
-                                                # المستخدم غير موجود، تخطي هذا السجل
-                                                continue
-                                        else:
-                                            # user_id مفقود، تخطي السجل
-                                            continue
-                                    elif model._meta.label == 'core.CompanySettings':
-                                        # إزالة الحقول القديمة
-                                        valid_fields = ['pk', 'company_name', 'logo', 'currency', 'address', 'phone', 'email', 'tax_number', 'default_tax_rate', 'session_timeout_minutes', 'enable_session_timeout', 'logout_on_browser_close', 'created_at', 'updated_at']
-                                        record_data = {k: v for k, v in record_data.items() if k in valid_fields}
-                                        # إضافة قيمة افتراضية لـ default_tax_rate إذا كان مفقوداً أو null
-                                        if 'default_tax_rate' not in record_data or record_data.get('default_tax_rate') is None:
-                                            from decimal import Decimal
-                                            record_data['default_tax_rate'] = Decimal('0.00')
-                                            logger.info(f"✅ تم إضافة قيمة افتراضية لـ default_tax_rate في CompanySettings")
-                                    elif model._meta.label == 'core.DocumentSequence':
-                                        # إزالة الحقول القديمة
-                                        valid_fields = ['pk', 'document_type', 'prefix', 'digits', 'current_number', 'created_at', 'updated_at']
-                                        record_data = {k: v for k, v in record_data.items() if k in valid_fields}
-                                    elif model._meta.label == 'auth.Group':
-                                        # إضافة قيمة افتراضية لـ dashboard_sections إذا كانت null
-                                        if not record_data.get('dashboard_sections'):
-                                            record_data['dashboard_sections'] = []
-                                    elif model._meta.label == 'users.User':
-                                        # إضافة قيم افتراضية للحقول المطلوبة
-                                        if not record_data.get('first_name'):
-                                            record_data['first_name'] = 'غير محدد'
-                                        if not record_data.get('phone'):
-                                            record_data['phone'] = '000000000'
-                                        if not record_data.get('last_name'):
-                                            record_data['last_name'] = 'غير محدد'
-                                        # إضافة قيمة افتراضية لـ department (CharField with blank=True needs empty string)
-                                        if 'department' not in record_data or record_data.get('department') in [None, 'null']:
-                                            record_data['department'] = ''
-                                        # إضافة قيمة افتراضية لـ groups (ManyToMany field)
-                                        if 'groups' not in record_data or record_data.get('groups') in [None, 'null']:
-                                            record_data['groups'] = []
-                                        # إضافة قيمة افتراضية لـ email إذا كان null
-                                        if record_data.get('email') is None:
-                                            record_data['email'] = ''
-                                    elif model._meta.label == 'products.Category':
-                                        # إضافة قيمة افتراضية لـ description إذا كان null
-                                        if record_data.get('description') is None:
-                                            record_data['description'] = ''
-                                    elif model._meta.label == 'customers.CustomerSupplier':
-                                        # إضافة قيم افتراضية للحقول blank=True إذا كانت null
-                                        if record_data.get('email') is None:
-                                            record_data['email'] = ''
-                                        if record_data.get('notes') is None:
-                                            record_data['notes'] = ''
-                                    elif model._meta.label == 'banks.BankAccount':
-                                        # إضافة قيمة افتراضية لـ iban إذا كان null
-                                        if record_data.get('iban') is None:
-                                            record_data['iban'] = ''
-                                    elif model._meta.label == 'settings.SuperAdminSettings':
-                                        # إضافة قيمة افتراضية لـ system_subtitle
-                                        if not record_data.get('system_subtitle'):
-                                            record_data['system_subtitle'] = ''
-                                        # إضافة قيمة افتراضية لـ app_logo إذا كان فارغاً
-                                        if not record_data.get('app_logo'):
-                                            record_data['app_logo'] = None
-                                    elif model._meta.label == 'journal.JournalEntry':
-                                        # 🔧 حل مشكلة تكرار entry_number
-                                        # إذا كان entry_number موجود مسبقاً، نولّد رقم جديد
-                                        entry_number = record_data.get('entry_number')
-                                        if entry_number:
-                                            # التحقق من وجود القيد
-                                            from journal.models import JournalEntry
-                                            if JournalEntry.objects.filter(entry_number=entry_number).exists():
-                                                # الرقم موجود، نحذفه ونترك النظام يولد رقم جديد
-                                                logger.debug(f"⚠️ entry_number مكرر: {entry_number}، سيتم توليد رقم جديد")
-                                                record_data.pop('entry_number', None)
-                                    elif model._meta.label == 'journal.Account':
-                                        # 🔧 معالجة خاصة للحسابات: نترك parent كما هو
-                                        # سيتم التعامل مع parent من خلال معالجة FK العادية
-                                        # إذا كان parent غير موجود وكان الحقل nullable، سيُعين None تلقائياً
-                                        pass
-                                    
-                                    # تنظيف البيانات من الحقول غير الموجودة في النموذج
-                                    model_field_names = [f.name for f in model._meta.get_fields()]
-                                    cleaned_data = {}
-                                    many_to_many_data = {}
-                                    
-                                    for key, value in record_data.items():
-                                        if key in model_field_names or key == 'pk':
-                                            # التحقق من نوع الحقل
-                                            field = None
-                                            for f in model._meta.get_fields():
-                                                if f.name == key:
-                                                    field = f
-                                                    break
-                                            
-                                            # Debug logging for groups field
-                                            if key == 'groups':
-                                                logger.info(f'Processing groups field: field={field}, value={value}, field_type={field.__class__.__name__ if field else None}')
-                                                if field:
-                                                    logger.info(f'  hasattr many_to_many: {hasattr(field, "many_to_many")}')
-                                                    if hasattr(field, 'many_to_many'):
-                                                        logger.info(f'  many_to_many value: {field.many_to_many}')
-                                                    logger.info(f'  isinstance list: {isinstance(value, list)}')
-                                            
-                                            if field:
-                                                # معالجة Many-to-Many fields أولاً (قبل Foreign Key)
-                                                if (hasattr(field, 'many_to_many') and field.many_to_many) or field.__class__.__name__ == 'ManyToManyField':
-                                                    if isinstance(value, list):
-                                                        many_to_many_data[key] = value
-                
-                                                    # تجاهل Many-to-Many في البيانات الأساسية
-                                                # معالجة Foreign Key (لكن ليس Many-to-Many)
-                                                elif hasattr(field, 'related_model') and field.related_model and not (hasattr(field, 'many_to_many') and field.many_to_many):
-                                                    try:
-                                                        if value is None or str(value) == 'null':
-                                                            # إذا كان الحقل مطلوب ولكن القيمة null، تخطي هذا السجل
-                                                            if not field.null:
-                                                                # لا نستطيع استعادة سجل بدون قيمة لحقل مطلوب
-                                                                logger.warning(f"تخطي استعادة سجل في {model._meta.label}: الحقل {key} مطلوب لكن القيمة null")
-                                                                raise ValueError(f"Required field {key} has null value")
-                                                            else:
-                                                                cleaned_data[key] = None
-                                                        elif isinstance(value, (int, str)) and str(value).isdigit():
-                                                            # البحث عن الكائن المرتبط
-                                                            related_obj = field.related_model.objects.filter(pk=int(value)).first()
-                                                            if related_obj:
-                                                                cleaned_data[key] = related_obj
-                                                            elif not field.null:
-                                                                # 🔧 محاولة استخدام أول سجل متاح كحل بديل
-                                                                first_available = field.related_model.objects.first()
-                                                                if first_available:
-                                                                    cleaned_data[key] = first_available
-                                                                    logger.warning(f"⚠️ استخدام FK بديل لـ {key}: {first_available.pk} بدلاً من {value}")
-                                                                else:
-                                                                    # إذا لم يوجد أي سجل، يجب التخطي
-                                                                    raise ValueError(f"FK_NOT_FOUND:{key}={value} (لا يوجد سجلات بديلة في {field.related_model.__name__})")
-                                                            else:
-                                                                # الحقل nullable، يمكن تركه None
-                                                                cleaned_data[key] = None
-                                                                logger.debug(f"FK مفقود {key}={value}، تم تعيين None")
-                                                        else:
-                                                            cleaned_data[key] = value
-                                                    except ValueError as ve:
-                                                        # إعادة رفع ValueError للتخطي
-                                                        raise ve
-                                                    except Exception:
-                                                        # في حالة الخطأ الآخر، تجاهل هذا الحقل
-                                                        pass
-                                                # معالجة الحقول الرقمية لتجنب أخطاء التحويل
-                                                elif field.__class__.__name__ in ['DecimalField', 'FloatField', 'IntegerField', 'PositiveIntegerField']:
-                                                    try:
-                                                        if value is None or value == '':
-                                                            cleaned_data[key] = None if field.null else (0 if field.__class__.__name__ in ['IntegerField', 'PositiveIntegerField'] else 0.0)
-                                                        elif isinstance(value, str):
-                                                            # تنظيف النص وتحويله لرقم
-                                                            numeric_value = value.replace(',', '').strip()
-                                                            if field.__class__.__name__ in ['IntegerField', 'PositiveIntegerField']:
-                                                                cleaned_data[key] = int(float(numeric_value)) if numeric_value else 0
-                                                            elif field.__class__.__name__ == 'DecimalField':
-                                                                # استخدام Decimal للحقول من نوع DecimalField
-                                                                from decimal import Decimal
-                                                                cleaned_data[key] = Decimal(str(numeric_value)) if numeric_value else Decimal('0.0')
-                                                            else:
-                                                                cleaned_data[key] = float(numeric_value) if numeric_value else 0.0
-                                                        elif isinstance(value, (int, float)):
-                                                            if field.__class__.__name__ in ['IntegerField', 'PositiveIntegerField']:
-                                                                cleaned_data[key] = int(value)
-                                                            elif field.__class__.__name__ == 'DecimalField':
-                                                                from decimal import Decimal
-                                                                cleaned_data[key] = Decimal(str(value))
-                                                            else:
-                                                                cleaned_data[key] = float(value)
-                                                        else:
-                                                            cleaned_data[key] = value
-                                                    except (ValueError, TypeError):
-                                                        if field.__class__.__name__ in ['IntegerField', 'PositiveIntegerField']:
-                                                            cleaned_data[key] = 0
-                                                        elif field.__class__.__name__ == 'DecimalField':
-                                                            from decimal import Decimal
-                                                            cleaned_data[key] = Decimal('0.0')
-                                                        else:
-                                                            cleaned_data[key] = 0.0
-                                                else:
-                                                    if key == 'groups':
-                                                        logger.warning(f'groups field being treated as regular field! value: {value}, field type: {field.__class__.__name__}')
-                                                    cleaned_data[key] = value
-                                            else:
-                                                cleaned_data[key] = value
-                                    
-                                    # تحويل None إلى قيم فارغة للحقول blank=True
-                                    for f in model._meta.get_fields():
-                                        if hasattr(f, 'blank') and f.blank and f.name in cleaned_data and cleaned_data[f.name] is None:
-                                            if f.__class__.__name__ in ['CharField', 'TextField', 'EmailField']:
-                                                cleaned_data[f.name] = ''
-                                    
-                                    # تعيين القيم الافتراضية للحقول المفقودة التي لها قيم افتراضية
-                                    for f in model._meta.get_fields():
-                                        if f.name not in cleaned_data and hasattr(f, 'default') and f.default is not models.NOT_PROVIDED:
-                                            if callable(f.default):
-                                                # إذا كانت الدالة الافتراضية قابلة للاستدعاء
-                                                try:
-                                                    cleaned_data[f.name] = f.default()
-                                                except:
-                                                    # في حالة فشل الاستدعاء، استخدم None
-                                                    cleaned_data[f.name] = None
-                                            else:
-                                                cleaned_data[f.name] = f.default
-                                    
-                                    # التحقق من أن جميع الحقول المطلوبة موجودة
-                                    for f in model._meta.get_fields():
-                                        # تخطي ManyToMany fields (سيتم معالجتها لاحقاً)
-                                        if hasattr(f, 'many_to_many') and f.many_to_many:
-                                            continue
-                                        # تخطي OneToOne reverse relations
-                                        if f.__class__.__name__ == 'OneToOneRel':
-                                            continue
-                                        # التحقق من الحقول المطلوبة (غير null وغير blank)
-                                        if hasattr(f, 'null') and not f.null and not getattr(f, 'blank', False) and f.name != 'id':
-                                            if f.name not in cleaned_data or cleaned_data[f.name] is None:
-                                                # 🔧 محاولة إضافة قيمة افتراضية بناءً على نوع الحقل
-                                                field_default_added = False
-                                                if f.__class__.__name__ == 'DecimalField':
-                                                    from decimal import Decimal
-                                                    cleaned_data[f.name] = Decimal('0.00')
-                                                    field_default_added = True
-                                                    logger.info(f"✅ تم إضافة قيمة افتراضية Decimal(0.00) للحقل '{f.name}' في {model._meta.label}")
-                                                elif f.__class__.__name__ in ['IntegerField', 'PositiveIntegerField']:
-                                                    cleaned_data[f.name] = 0
-                                                    field_default_added = True
-                                                    logger.info(f"✅ تم إضافة قيمة افتراضية 0 للحقل '{f.name}' في {model._meta.label}")
-                                                elif f.__class__.__name__ in ['CharField', 'TextField']:
-                                                    cleaned_data[f.name] = ''
-                                                    field_default_added = True
-                                                    logger.info(f"✅ تم إضافة قيمة افتراضية '' للحقل '{f.name}' في {model._meta.label}")
-                                                elif f.__class__.__name__ == 'BooleanField':
-                                                    cleaned_data[f.name] = False
-                                                    field_default_added = True
-                                                    logger.info(f"✅ تم إضافة قيمة افتراضية False للحقل '{f.name}' في {model._meta.label}")
-                                                
-                                                if not field_default_added:
-                                                    # لم نتمكن من إضافة قيمة افتراضية، تخطي هذا السجل
-                                                    logger.warning(f"⚠️ تخطي سجل في {model._meta.label}: الحقل المطلوب '{f.name}' مفقود أو null ولا يمكن تعيين قيمة افتراضية")
-                                                    raise ValueError(f"Required field {f.name} is missing or null")
-                                    
-                                    # إنشاء أو تحديث السجل
-                                    pk_value = cleaned_data.get('pk')
-                                    
-                                    # 🔧 معالجة خاصة لـ JournalEntry لحل مشكلة entry_number المكرر
-                                    if model._meta.label == 'journal.JournalEntry' and pk_value:
-                                        # محاولة الحصول على القيد الموجود
-                                        try:
-                                            obj = model.objects.get(pk=pk_value)
-                                            # تحديث الحقول
-                                            for k, v in cleaned_data.items():
-                                                if k != 'pk' and k != 'entry_number':  # لا نحدث entry_number
-                                                    setattr(obj, k, v)
-                                            obj.save()
-                                            created = False
-                                        except model.DoesNotExist:
-                                            # القيد غير موجود، ننشئ واحد جديد
-                                            data_without_entry_number = {k: v for k, v in cleaned_data.items() if k not in ['pk', 'entry_number']}
-                                            obj = model(**data_without_entry_number)
-                                            obj.save()  # سيولد entry_number تلقائياً
-                                            created = True
-                                    elif pk_value:
-                                        obj, created = model.objects.update_or_create(
-                                            pk=pk_value,
-                                            defaults={k: v for k, v in cleaned_data.items() if k != 'pk'}
-                                        )
-                                    else:
-                                        obj = model.objects.create(**{k: v for k, v in cleaned_data.items() if k != 'pk'})
-                                        created = True
-                                    
-                                    # معالجة Many-to-Many fields بعد إنشاء الكائن
-                                    for field_name, related_ids in many_to_many_data.items():
-                                        try:
-                                            # الحصول على ManyToManyManager
-                                            field_manager = getattr(obj, field_name)
-                                            if hasattr(field_manager, 'set'):
-                                                if isinstance(related_ids, list):
-                                                    # التحقق من وجود الكائنات المرتبطة وتحويل الـ IDs
-                                                    valid_ids = []
-                                                    for rel_id in related_ids:
-                                                        if isinstance(rel_id, (int, str)) and str(rel_id).isdigit():
-                                                            valid_ids.append(int(rel_id))
-                                                    field_manager.set(valid_ids)
-                                                else:
-                                                    # إذا لم تكن list، قم بمسح العلاقات
-                                                    field_manager.clear()
-                                        except Exception as m2m_err:
-                                            # تجاهل أخطاء Many-to-Many
-                                            logger.warning(f"خطأ في معالجة Many-to-Many field {field_name}: {m2m_err}")
-                                            pass
-                                    
-                                    processed_records += 1
-                                    table_info['actual_records'] += 1
-                                    
-                                    # 🔍 Logging مفصّل لكل سجل مستعاد
-                                    if model._meta.label in ['banks.bankaccount', 'banks.banktransaction', 'cashboxes.cashbox']:
-                                        logger.info(f"✅ استعادة {model._meta.label}[pk={pk_value}]: {cleaned_data.get('name', 'N/A')}")
-                                    else:
-                                        logger.debug(f"✅ استعادة سجل {table_info['display_name']}[{pk_value}]")
-                                except Exception as rec_err:
-                                    error_msg = str(rec_err)
-                                    
-                                    # 🔍 Logging مفصّل للأخطاء
-                                    logger.error(f"❌ خطأ في استعادة {model._meta.label}: {error_msg}")
-                                    logger.error(f"   البيانات: {cleaned_data if 'cleaned_data' in locals() else record_data}")
-                                    
-                                    # تسجيل في Audit Log
-                                    if AUDIT_AVAILABLE:
-                                        try:
-                                            AuditLog.objects.create(
-                                                user=user,
-                                                action_type='restore_record_error',
-                                                description=f'خطأ في استعادة {model._meta.label}: {error_msg}'
-                                            )
-                                        except Exception:
-                                            pass
-                                    # 🔧 تحسين: محاولة الاستعادة مع قيم افتراضية في حالة FK مفقودة
-                                    if error_msg.startswith("FK_NOT_FOUND:"):
-                                        logger.warning(f"⚠️ FK مفقود في {table_info['display_name']}: {error_msg}")
-                                        # يمكن هنا إضافة منطق لمحاولة استخدام FK افتراضي
-                                    elif error_msg.startswith("Required field"):
-                                        logger.warning(f"⚠️ حقل مطلوب مفقود في {table_info['display_name']}: {error_msg}")
-                                    else:
-                                        logger.warning(f"⚠️ فشل في استعادة سجل في {table_info['display_name']}: {rec_err}")
-                                    
-                                    # تسجيل الخطأ في تفاصيل الجدول
-                                    if not table_info.get('errors'):
-                                        table_info['errors'] = []
-                                    table_info['errors'].append({
-                                        'record': pk_value if 'pk_value' in locals() else 'unknown',
-                                        'error': error_msg
-                                    })
-                                    skipped_records += 1  # 🔍 زيادة عداد السجلات المتخطاة
-                                    continue
-                    
-                    processed_tables += 1
-                    percentage = int((processed_tables / len(flat_tables)) * 100) if flat_tables else 100
-                    progress_data['percentage'] = percentage
-                    progress_data['processed_tables'] = processed_tables
-                    progress_data['processed_records'] = processed_records
-                    progress_data['tables_status'][i]['status'] = 'completed'
-                    set_restore_progress_data(progress_data)
-                    
-                except Exception as e:
-                    logger.warning(f"فشل في استعادة جدول {table_info['display_name']}: {str(e)}")
-                    progress_data['tables_status'][i]['status'] = 'error'
-                    progress_data['tables_status'][i]['error'] = str(e)
-                    set_restore_progress_data(progress_data)
-                    continue
-                
-                # إعادة تعيين جميع sequences لتجنب تضارب IDs في المستقبل
                 progress_data.update({
-                'current_table': 'إعادة تعيين sequences قاعدة البيانات...',
-                'percentage': 95
+                    'current_table': table_info['display_name'],
+                    'processed_tables': processed_tables,
+                    'processed_records': engine.processed_records,
+                    'percentage': min(int(engine.processed_records * 90 / total_records_expected), 90)
+                    if total_records_expected else 90,
+                    'records_per_second': int(engine.processed_records / elapsed) if elapsed > 0 else 0,
                 })
+                remaining = total_records_expected - engine.processed_records
+                if engine.processed_records and remaining > 0:
+                    progress_data['estimated_time'] = f"{int(remaining * elapsed / engine.processed_records)} ثانية متبقية"
                 set_restore_progress_data(progress_data)
-                
-                sequences_reset = reset_all_sequences()
-                logger.info(f"تم إعادة تعيين {sequences_reset} sequence بعد الاستعادة")
-                
-                # 📊 إنشاء تقرير مفصل
-                total_errors = sum(1 for t in flat_tables if t.get('errors'))
-                total_restored = sum(t.get('actual_records', 0) for t in flat_tables)
-                total_skipped = total_records_expected - total_restored
-                
-                elapsed_time = time.time() - start_time
-                
-                # طباعة ملخص نهائي في السجل
-                logger.info("\n" + "="*80)
-                logger.info("📊 تقرير الاستعادة النهائي")
-                logger.info("="*80)
-                logger.info(f"⏱️  المدة الإجمالية: {elapsed_time:.2f} ثانية")
-                logger.info(f"📈 الإحصائيات:")
-                logger.info(f"  • إجمالي السجلات المتوقعة: {total_records_expected}")
-                logger.info(f"  • السجلات المستعادة: ✅ {total_restored}")
-                logger.info(f"  • السجلات المتخطاة: ⚠️ {total_skipped}")
-                logger.info(f"  • الجداول المعالجة: {processed_tables}/{len(flat_tables)}")
-                logger.info(f"  • عدد الجداول التي بها أخطاء: ❌ {total_errors}")
-                logger.info(f"  • Sequences المعاد تعيينها: {sequences_reset}")
-                
-                if total_errors > 0:
-                    logger.info(f"\n⚠️  الجداول التي بها مشاكل:")
-                    for table in flat_tables:
-                        if table.get('errors'):
-                            logger.info(f"  • {table['display_name']}: {len(table['errors'])} خطأ")
-                            for error in table['errors'][:3]:  # أول 3 أخطاء فقط
-                                logger.info(f"    - {error}")
-                
-                logger.info("="*80)
-                
-                # إكمال التقدم
-                progress_data.update({
+
+            engine = BulkRestoreEngine(on_progress=on_progress)
+            # تعيد عدد أوامر إعادة تعيين تسلسلات المفاتيح (مرة واحدة في النهاية)
+            sequences_reset = engine.restore(tables())
+            processed_tables = len(flat_tables)
+            logger.info(f"تم إعادة تعيين {sequences_reset} sequence بعد الاستعادة")
+
+            # 📊 إنشاء تقرير مفصل
+            total_errors = sum(1 for t in flat_tables if t.get('errors'))
+            total_restored = sum(t.get('actual_records', 0) for t in flat_tables)
+            total_skipped = total_records_expected - total_restored
+            
+            elapsed_time = time.time() - start_time
+            
+            # طباعة ملخص نهائي في السجل
+            logger.info("\n" + "="*80)
+            logger.info("📊 تقرير الاستعادة النهائي")
+            logger.info("="*80)
+            logger.info(f"⏱️  المدة الإجمالية: {elapsed_time:.2f} ثانية")
+            logger.info(f"📈 الإحصائيات:")
+            logger.info(f"  • إجمالي السجلات المتوقعة: {total_records_expected}")
+            logger.info(f"  • السجلات المستعادة: ✅ {total_restored}")
+            logger.info(f"  • السجلات المتخطاة: ⚠️ {total_skipped}")
+            logger.info(f"  • الجداول المعالجة: {processed_tables}/{len(flat_tables)}")
+            logger.info(f"  • عدد الجداول التي بها أخطاء: ❌ {total_errors}")
+            logger.info(f"  • Sequences المعاد تعيينها: {sequences_reset}")
+            
+            if total_errors > 0:
+                logger.info(f"\n⚠️  الجداول التي بها مشاكل:")
+                for table in flat_tables:
+                    if table.get('errors'):
+                        logger.info(f"  • {table['display_name']}: {len(table['errors'])} خطأ")
+                        for error in table['errors'][:3]:  # أول 3 أخطاء فقط
+                            logger.info(f"    - {error}")
+            
+            logger.info("="*80)
+            
+            # إكمال التقدم
+            progress_data.update({
                 'is_running': False,
                 'status': 'completed',
                 'percentage': 100,
@@ -2519,80 +1976,131 @@ def perform_backup_restore(backup_data, clear_data=False, user=None):
                 'records_skipped': total_skipped,
                 'tables_with_errors': total_errors,
                 'elapsed_time': f'{elapsed_time:.2f} ثانية',
+                'records_per_second': int(total_restored / elapsed_time) if elapsed_time > 0 else 0,
                 'estimated_time': '0 ثانية متبقية'
-                })
-                set_restore_progress_data(progress_data)
-                
-                log_audit(user, 'create', f'اكتمل استعادة النسخة الاحتياطية: {total_restored}/{total_records_expected} سجل من {processed_tables} جدول ({total_skipped} متخطى)، تم إعادة تعيين {sequences_reset} sequence')
-                
-                # 🔍 تسجيل مفصل في Audit Log
-                if AUDIT_AVAILABLE:
+            })
+            set_restore_progress_data(progress_data)
+            
+            log_audit(user, 'create', f'اكتمل استعادة النسخة الاحتياطية: {total_restored}/{total_records_expected} سجل من {processed_tables} جدول ({total_skipped} متخطى)، تم إعادة تعيين {sequences_reset} sequence')
+            
+            # 🔍 تسجيل مفصل في Audit Log
+            if AUDIT_AVAILABLE:
+                try:
+                    # تسجيل عام للعملية
+                    AuditLog.objects.create(
+                        user=user,
+                        action_type='restore_complete',
+                        description=f'نجحت عملية الاستعادة: {total_restored} سجل من {processed_tables} جدول، تخطي {total_skipped} سجل، {total_errors} جدول به أخطاء'
+                    )
+                    
+                    # تسجيل تفصيلي للأخطاء إن وجدت
+                    if total_errors > 0:
+                        error_details = []
+                        for table in flat_tables:
+                            if table.get('errors'):
+                                error_details.append(f"{table['display_name']}: {len(table['errors'])} خطأ")
+                        
+                        AuditLog.objects.create(
+                            user=user,
+                            action_type='restore_errors',
+                            description=f'تفاصيل الأخطاء في الاستعادة: ' + ', '.join(error_details[:10])
+                        )
+                except Exception:
+                    pass
+            
+            # 🔧 تصحيح الأرصدة البنكية والصناديق بعد الاستعادة
+            logger.info("🔄 بدء تصحيح الأرصدة البنكية والصناديق...")
+            try:
+                from banks.models import BankAccount
+                from cashboxes.models import Cashbox
+                
+                # تصحيح أرصدة البنوك
+                banks_fixed = 0
+                for bank in BankAccount.objects.all():
+                    old_balance = bank.balance
+                    actual_balance = bank.calculate_actual_balance()
+                    if old_balance != actual_balance:
+                        bank.balance = actual_balance
+                        bank.save(update_fields=['balance'])
+                        banks_fixed += 1
+                        logger.info(f"   ✅ تم تصحيح رصيد {bank.name}: {old_balance} → {actual_balance}")
+                
+                # تصحيح أرصدة الصناديق
+                cashboxes_fixed = 0
+                for cashbox in Cashbox.objects.all():
+                    old_balance = cashbox.balance
+                    actual_balance = cashbox.calculate_actual_balance()
+                    if old_balance != actual_balance:
+                        cashbox.balance = actual_balance
+                        cashbox.save(update_fields=['balance'])
+                        cashboxes_fixed += 1
+                        logger.info(f"   ✅ تم تصحيح رصيد {cashbox.name}: {old_balance} → {actual_balance}")
+                
+                logger.info(f"✅ تم تصحيح {banks_fixed} بنك و {cashboxes_fixed} صندوق")
+                
+                # تسجيل في Audit Log
+                if AUDIT_AVAILABLE and (banks_fixed > 0 or cashboxes_fixed > 0):
                     try:
-                        # تسجيل عام للعملية
                         AuditLog.objects.create(
                             user=user,
-                            action_type='restore_complete',
-                            description=f'نجحت عملية الاستعادة: {total_restored} سجل من {processed_tables} جدول، تخطي {total_skipped} سجل، {total_errors} جدول به أخطاء'
+                            action_type='balance_correction',
+                            description=f'تم تصحيح الأرصدة بعد الاستعادة: {banks_fixed} بنك، {cashboxes_fixed} صندوق'
                         )
-                        
-                        # تسجيل تفصيلي للأخطاء إن وجدت
-                        if total_errors > 0:
-                            error_details = []
-                            for table in flat_tables:
-                                if table.get('errors'):
-                                    error_details.append(f"{table['display_name']}: {len(table['errors'])} خطأ")
-                            
-                            AuditLog.objects.create(
-                                user=user,
-                                action_type='restore_errors',
-                                description=f'تفاصيل الأخطاء في الاستعادة: ' + ', '.join(error_details[:10])
-                            )
                     except Exception:
                         pass
-                
-                # 🔧 تصحيح الأرصدة البنكية والصناديق بعد الاستعادة
-                logger.info("🔄 بدء تصحيح الأرصدة البنكية والصناديق...")
-                try:
-                    from banks.models import BankAccount
-                    from cashboxes.models import Cashbox
-                    
-                    # تصحيح أرصدة البنوك
-                    banks_fixed = 0
-                    for bank in BankAccount.objects.all():
-                        old_balance = bank.balance
-                        actual_balance = bank.calculate_actual_balance()
-                        if old_balance != actual_balance:
-                            bank.balance = actual_balance
-                            bank.save(update_fields=['balance'])
-                            banks_fixed += 1
-                            logger.info(f"   ✅ تم تصحيح رصيد {bank.name}: {old_balance} → {actual_balance}")
-                    
-                    # تصحيح أرصدة الصناديق
-                    cashboxes_fixed = 0
-                    for cashbox in Cashbox.objects.all():
-                        old_balance = cashbox.balance
-                        actual_balance = cashbox.calculate_actual_balance()
-                        if old_balance != actual_balance:
-                            cashbox.balance = actual_balance
-                            cashbox.save(update_fields=['balance'])
-                            cashboxes_fixed += 1
-                            logger.info(f"   ✅ تم تصحيح رصيد {cashbox.name}: {old_balance} → {actual_balance}")
-                    
-                    logger.info(f"✅ تم تصحيح {banks_fixed} بنك و {cashboxes_fixed} صندوق")
-                    
-                    # تسجيل في Audit Log
-                    if AUDIT_AVAILABLE and (banks_fixed > 0 or cashboxes_fixed > 0):
-                        try:
-                            AuditLog.objects.create(
-                                user=user,
-                                action_type='balance_correction',
-                                description=f'تم تصحيح الأرصدة بعد الاستعادة: {banks_fixed} بنك، {cashboxes_fixed} صندوق'
-                            )
-                        except Exception:
-                            pass
-                except Exception as balance_error:
-                    logger.error(f"خطأ في تصحيح الأرصدة: {str(balance_error)}")
-                
+            except Exception as balance_error:
+                logger.error(f"خطأ في تصحيح الأرصدة: {str(balance_error)}")
+
+            # 🔧 إعادة بناء لقطات الأرصدة اليومية (السيجنالات معطلة أثناء الاستعادة)
+            try:
+                from journal.snapshots import AccountSnapshotService
+                snapshots_count = AccountSnapshotService.rebuild()
+                logger.info(f"✅ تم إعادة بناء {snapshots_count} لقطة رصيد يومية")
+            except Exception as snapshot_error:
+                logger.error(f"خطأ في إعادة بناء لقطات الأرصدة: {str(snapshot_error)}")
+
+            # 🔧 إعادة بناء طبقات تكلفة FIFO (السيجنالات معطلة أثناء الاستعادة)
+            try:
+                from inventory.cost_layers import CostLayerService
+                layers_count = CostLayerService.rebuild()
+                logger.info(f"✅ تم إعادة بناء {layers_count} طبقة تكلفة FIFO")
+            except Exception as layers_error:
+                logger.error(f"خطأ في إعادة بناء طبقات التكلفة: {str(layers_error)}")
+
+            # 🔧 إعادة بناء أرصدة المخزون لكل منتج/مستودع
+            try:
+                from inventory.stock_levels import StockLevelService
+                levels_count = StockLevelService.rebuild()
+                logger.info(f"✅ تم إعادة بناء {levels_count} رصيد مخزون")
+            except Exception as levels_error:
+                logger.error(f"خطأ في إعادة بناء أرصدة المخزون: {str(levels_error)}")
+
+            # 🔧 إعادة بناء فهرس البحث الشامل (السيجنالات معطلة أثناء الاستعادة)
+            try:
+                from search.services import SearchIndexService
+                search_result = SearchIndexService.rebuild()
+                logger.info(f"✅ تم فهرسة {sum(search_result.values())} مستند للبحث الشامل")
+            except Exception as search_error:
+                logger.error(f"خطأ في إعادة بناء فهرس البحث: {str(search_error)}")
+
+            # 🔧 مطابقة أرصدة العملاء والموردين مع حركاتهم
+            try:
+                from accounts.ledger import PartyLedgerService
+                ledger_result = PartyLedgerService.rebuild()
+                logger.info(f"✅ تم تصحيح {ledger_result['fixed_transactions']} رصيد حركة و{ledger_result['fixed_parties']} رصيد عميل/مورد")
+            except Exception as ledger_error:
+                logger.error(f"خطأ في مطابقة أرصدة العملاء والموردين: {str(ledger_error)}")
+
+            # 🔧 مزامنة عدادات الترقيم مع المستندات المستعادة (لم يعد التخصيص يمسح الأرقام الموجودة)
+            try:
+                from core.models import DocumentSequence
+                from core.numbering import DocumentNumberService
+                for sequence in DocumentSequence.objects.all():
+                    DocumentNumberService.resync(sequence)
+                DocumentNumberService.release_blocks()
+            except Exception as sequence_error:
+                logger.error(f"خطأ في مزامنة تسلسلات المستندات: {str(sequence_error)}")
+
         except Exception as e:
             # 🔧 لا نرفع الخطأ - نسجله فقط للسماح بالاستعادة الجزئية
             logger.error(f"خطأ في استعادة البيانات: {str(e)}")
@@ -3191,7 +2699,8 @@ def create_backup(request):
             filename = f'backup_{timestamp}.xlsx'
             format_name = 'XLSX'
         else:
-            filename = f'backup_{timestamp}.json'
+            # JSON يُكتب بالتنسيق المتدفق المضغوط (NDJSON + gzip)
+            filename = f'backup_{timestamp}{STREAMING_EXTENSION}'
             format_name = 'JSON'
             selected_format = 'json'
             
@@ -3278,7 +2787,7 @@ def create_backup(request):
 def download_backup(request, filename):
     """تحميل ملف النسخة الاحتياطية"""
     
-    if not filename.endswith(('.json', '.xlsx')):
+    if not filename.endswith(BACKUP_EXTENSIONS):
         raise Http404("نوع الملف غير مدعوم")
     
     backup_dir = os.path.join(settings.MEDIA_ROOT, 'backups')
@@ -3297,13 +2806,16 @@ def download_backup(request, filename):
         except Exception:
             pass
     
-    content_type = 'application/json' if filename.endswith('.json') else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    if filename.endswith(STREAMING_EXTENSION):
+        content_type = 'application/gzip'
+    elif filename.endswith('.json'):
+        content_type = 'application/json'
+    else:
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     
     try:
-        with open(filepath, 'rb') as f:
-            response = HttpResponse(f.read(), content_type=content_type)
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+        # إرسال الملف على أجزاء بدلاً من قراءته كاملاً في الذاكرة
+        return FileResponse(open(filepath, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
     except Exception as e:
         logger.error(f"خطأ في تحميل الملف {filename}: {str(e)}")
         raise Http404("حدث خطأ في تحميل الملف")
@@ -3321,7 +2833,7 @@ def delete_backup(request, filename):
             })
         return redirect('backup:backup_restore')
     
-    if not filename.endswith(('.json', '.xlsx')):
+    if not filename.endswith(BACKUP_EXTENSIONS):
         error_msg = "نوع الملف غير مدعوم"
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -3431,7 +2943,9 @@ def restore_backup(request):
                     return JsonResponse({'success': False, 'error': msg})
                 messages.error(request, msg)
                 return redirect('backup:backup_restore')
-            if filepath.endswith('.json'):
+            if filepath.endswith(STREAMING_EXTENSION):
+                backup_data = BackupReader(filepath)
+            elif filepath.endswith('.json'):
                 with open(filepath, 'r', encoding='utf-8') as f:
                     backup_data = json.load(f)
             elif filepath.endswith('.xlsx'):
@@ -3444,6 +2958,19 @@ def restore_backup(request):
                 messages.error(request, msg)
                 return redirect('backup:backup_restore')
             input_name_for_audit = filename_from_list
+        elif backup_file and backup_file.name.endswith(STREAMING_EXTENSION):
+            # الاستعادة تعمل في الخلفية بعد انتهاء الطلب: حفظ الملف المرفوع في مجلد النسخ ثم قراءته منه
+            backup_dir = os.path.join(settings.MEDIA_ROOT, 'backups')
+            os.makedirs(backup_dir, exist_ok=True)
+            # اسم فريد حتى لا يُستبدل ملف نسخة موجود بنفس الاسم
+            filepath = os.path.join(backup_dir, 'uploaded_{}_{}_{}'.format(
+                dt_module.now().strftime('%Y%m%d_%H%M%S'), uuid.uuid4().hex[:8], os.path.basename(backup_file.name)
+            ))
+            with open(filepath, 'xb') as destination:
+                for chunk in backup_file.chunks():
+                    destination.write(chunk)
+            backup_data = BackupReader(filepath)
+            input_name_for_audit = backup_file.name
         elif backup_file and backup_file.name.endswith('.json'):
             file_content = backup_file.read().decode('utf-8')
             backup_data = json.loads(file_content)
@@ -3678,7 +3205,7 @@ def list_backups(request):
         
         backups = []
         for filename in os.listdir(backup_dir):
-            if filename.endswith('.json') or filename.endswith('.xlsx'):
+            if filename.endswith(BACKUP_EXTENSIONS):
                 filepath = os.path.join(backup_dir, filename)
                 try:
                     stat = os.stat(filepath)
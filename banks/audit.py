@@ -0,0 +1,11 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق banks (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('banks.BankAccount', fields=['name', 'account_number', 'is_active']),
+    AuditConfig('banks.BankTransfer', fields=['transfer_number', 'date', 'from_account', 'to_account', 'amount', 'description']),
+    AuditConfig('banks.BankStatement', fields=['bank_account', 'date', 'reference', 'debit', 'credit', 'is_reconciled']),
+    AuditConfig('banks.BankReconciliation', fields=['bank_account', 'statement_date', 'book_balance', 'statement_balance', 'difference', 'status']),
+)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banks', '0020_alter_bankaccount_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['bank', 'transaction_type', 'is_opening_balance'], name='bank_txn_bank_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='banktransaction',
+            index=models.Index(fields=['bank', 'date'], name='bank_txn_bank_date_idx'),
+        ),
+    ]
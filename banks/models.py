@@ -178,6 +178,10 @@ class BankTransaction(models.Model):
         verbose_name = _('Bank Transaction')
         verbose_name_plural = _('Bank Transactions')
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['bank', 'transaction_type', 'is_opening_balance'], name='bank_txn_bank_type_idx'),
+            models.Index(fields=['bank', 'date'], name='bank_txn_bank_date_idx'),
+        ]
         default_permissions = []  # No permissions needed - available to everyone
     
     def __str__(self):
@@ -2213,10 +2213,10 @@ class BankStatementUpdateView(LoginRequiredMixin, BanksViewPermissionMixin, Upda
 @login_required
 def account_export_xlsx(request, pk):
     """تصدير معاملات الحساب البنكي إلى ملف Excel"""
-    from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill, Alignment
-    from django.http import HttpResponse
+    from django.db.models import Q, Sum
     from django.utils.translation import gettext as _
+    from core.exports import iter_rows, xlsx_response
     from core.signals import log_user_activity
     from decimal import Decimal
     
@@ -2231,42 +2231,21 @@ def account_export_xlsx(request, pk):
             _('Bank Account Transactions Exported to Excel: {}').format(account.name)
         )
         
-        # إنشاء ملف Excel جديد
-        wb = Workbook()
-        ws = wb.active
-        ws.title = _("Bank Account Statement")
-        
-        # تنسيق العناوين
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        center_alignment = Alignment(horizontal="center")
-        
-        # إضافة معلومات الحساب
-        ws['A1'] = _("Bank Account Statement")
-        ws['A1'].font = Font(bold=True, size=16)
-        ws.merge_cells('A1:G1')
-        ws['A1'].alignment = center_alignment
-        
-        ws['A3'] = _("Account Name") + ":"
-        ws['B3'] = account.name
-        
-        ws['A4'] = _("Bank Name") + ":"
-        ws['B4'] = account.bank_name
-        
-        ws['A5'] = _("Account Number") + ":"
-        ws['B5'] = account.account_number
-        
-        ws['A6'] = _("Current Balance") + ":"
-        ws['B6'] = f"{account.balance} {account.get_currency_symbol()}"
-        
-        ws['A7'] = _("Transactions Count") + ":"
-        transactions_count = BankTransaction.objects.filter(bank=account).count()
-        ws['B7'] = transactions_count
-        
-        ws['A8'] = _("Export Date") + ":"
-        ws['B8'] = str(timezone.now().date())
+        # معلومات الحساب
+        transactions = BankTransaction.objects.filter(bank=account)
+        preamble = [
+            [_("Bank Account Statement")],
+            [],
+            [_("Account Name") + ":", account.name],
+            [_("Bank Name") + ":", account.bank_name],
+            [_("Account Number") + ":", account.account_number],
+            [_("Current Balance") + ":", f"{account.balance} {account.get_currency_symbol()}"],
+            [_("Transactions Count") + ":", transactions.count()],
+            [_("Export Date") + ":", str(timezone.now().date())],
+            [],
+        ]
         
-        # إضافة عناوين الأعمدة
+        # عناوين الأعمدة
         headers = [
             _("Date"),
             _("Transaction Type"),
@@ -2277,60 +2256,43 @@ def account_export_xlsx(request, pk):
             _("Created By")
         ]
         
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=10, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = center_alignment
-        
-        # الحصول على جميع المعاملات
-        transactions = BankTransaction.objects.filter(bank=account).order_by('date', 'created_at')
-        
-        # حساب الرصيد المتراكم
-        running_balance = account.initial_balance or Decimal('0')
-        for transaction in transactions:
-            if transaction.transaction_type == 'deposit':
-                running_balance += transaction.amount
-            else:  # withdrawal
-                running_balance -= transaction.amount
-            transaction.running_balance = running_balance
-        
-        # عكس الترتيب للعرض (الأحدث أولاً)
-        transactions = list(reversed(transactions))
-        
-        # إضافة بيانات المعاملات
-        for row_num, transaction in enumerate(transactions, 11):
-            ws.cell(row=row_num, column=1).value = transaction.date.strftime('%Y-%m-%d')
-            ws.cell(row=row_num, column=2).value = transaction.get_transaction_type_display()
-            ws.cell(row=row_num, column=3).value = transaction.reference_number or "-"
-            ws.cell(row=row_num, column=4).value = transaction.description
-            ws.cell(row=row_num, column=5).value = float(transaction.amount)
-            ws.cell(row=row_num, column=6).value = float(transaction.running_balance)
-            ws.cell(row=row_num, column=7).value = transaction.created_by.username
-        
-        # تعديل عرض الأعمدة
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # إنشاء الاستجابة
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        # الرصيد المتراكم بعد آخر معاملة، ثم المعاملات من الأحدث للأقدم على دفعات
+        # مع طرح أثر كل معاملة بعد كتابتها (بدلاً من تحميلها كلها وعكس ترتيبها)
+        totals = transactions.aggregate(
+            deposits=Sum('amount', filter=Q(transaction_type='deposit')),
+            withdrawals=Sum('amount', filter=~Q(transaction_type='deposit')),
         )
-        filename = f"bank_account_statement_{account.name}_{timezone.now().date()}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        closing_balance = (account.initial_balance or Decimal('0')) + (totals['deposits'] or Decimal('0')) - (totals['withdrawals'] or Decimal('0'))
+        transaction_types = dict(BankTransaction._meta.get_field('transaction_type').flatchoices)
+        
+        def rows():
+            running_balance = closing_balance
+            for date, transaction_type, reference_number, description, amount, username in iter_rows(
+                transactions.order_by('-date', '-created_at', '-id'),
+                ('date', 'transaction_type', 'reference_number', 'description', 'amount', 'created_by__username'),
+            ):
+                yield [
+                    date.strftime('%Y-%m-%d'),
+                    str(transaction_types.get(transaction_type, transaction_type)),
+                    reference_number or "-",
+                    description,
+                    float(amount),
+                    float(running_balance),
+                    username,
+                ]
+                if transaction_type == 'deposit':
+                    running_balance -= amount
+                else:  # withdrawal
+                    running_balance += amount
         
-        wb.save(response)
-        return response
+        filename = f"bank_account_statement_{account.name}_{timezone.now().date()}.xlsx"
+        return xlsx_response(
+            filename, rows(), headers=headers, title=_("Bank Account Statement"), preamble=preamble,
+            widths=[20, 18, 18, 40, 15, 22, 15],
+            header_font=Font(bold=True, color="FFFFFF"),
+            header_fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            header_alignment=Alignment(horizontal="center"),
+        )
         
     except Exception as e:
         messages.error(request, _('An error occurred while exporting: {}').format(str(e)))
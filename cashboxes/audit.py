@@ -0,0 +1,9 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق cashboxes (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('cashboxes.Cashbox', fields=['name', 'description', 'is_active']),
+    AuditConfig('cashboxes.CashboxTransfer', fields=['transfer_number', 'date', 'from_cashbox', 'to_cashbox', 'amount', 'description']),
+)
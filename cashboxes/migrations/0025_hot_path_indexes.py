@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashboxes', '0024_alter_cashbox_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashboxtransaction',
+            index=models.Index(fields=['cashbox', 'date'], name='cashbox_txn_cashbox_date_idx'),
+        ),
+    ]
@@ -330,6 +330,9 @@ class CashboxTransaction(models.Model):
         verbose_name = _('Cashbox Transaction')
         verbose_name_plural = _('Cashbox Transactions')
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['cashbox', 'date'], name='cashbox_txn_cashbox_date_idx'),
+        ]
         default_permissions = []  # No permissions needed - available to everyone
 
     def __str__(self):
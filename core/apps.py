@@ -9,3 +9,6 @@ class CoreConfig(AppConfig):
     def ready(self):
         """تشغيل الـ signals عند تحميل التطبيق"""
         import core.signals
+        # ربط مراجعة النماذج المعلنة في audit.py لكل تطبيق
+        from core.audit_registry import autodiscover
+        autodiscover()
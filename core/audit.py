@@ -0,0 +1,8 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق core (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('core.CompanySettings', fields=['company_name', 'address', 'phone', 'email', 'tax_number', 'session_timeout_minutes', 'enable_session_timeout']),
+)
@@ -0,0 +1,136 @@
+"""
+سجل النماذج الخاضعة للمراجعة (Audit registry)
+
+بدلاً من مستقبلات pre_save/post_save/post_delete عامة تعمل لكل نموذج في
+المشروع (بما فيها الحركات المشتقة عالية الحجم مثل InventoryMovement و
+JournalLine و CashboxTransaction و AccountTransaction)، يعلن كل تطبيق في ملف
+audit.py النماذج التي يريد مراجعتها والحقول التي تُعرض تغييراتها:
+
+    from core.audit_registry import AuditConfig, audit_registry
+
+    audit_registry.register(
+        AuditConfig('sales.SalesInvoice', fields=['invoice_number', 'customer', 'total_amount']),
+    )
+
+تُربط المستقبلات بهذه النماذج فقط (sender)، وتُلتقط القيم السابقة للحقول
+المتتبعة عند التحميل من قاعدة البيانات (Model.from_db) على الكائن نفسه - بدون
+استعلام إضافي قبل الحفظ وبدون قاموس عام مشترك بين الجداول والخيوط.
+
+كل نموذج في تطبيقات المشروع يجب أن يُسجل ما عدا NOT_AUDITED (الجداول المشتقة
+التي تُعاد من المستندات، وسجل المراجعة والإشعارات) - انظر core.tests.test_audit_writer.
+
+AUDIT_LOG_ENABLED = False يعطل المراجعة التلقائية بالكامل (انظر أمر benchmark_audit).
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+NOT_AUDITED = frozenset({
+    'core.AuditLog', 'core.SystemNotification', 'core.DocumentSequence',
+    'inventory.InventoryMovement', 'inventory.StockLevel', 'inventory.InventoryCostLayer',
+    'journal.JournalLine', 'journal.AccountBalanceSnapshot',
+    'cashboxes.CashboxTransaction', 'banks.BankTransaction', 'accounts.AccountTransaction',
+    'search.SearchDocument',
+})
+
+
+class AuditConfig:
+    """إعداد مراجعة نموذج واحد"""
+
+    def __init__(self, model, fields=()):
+        """
+        Args:
+            model: 'app_label.ModelName'
+            fields: أسماء الحقول التي تُعرض تغييراتها في وصف التحديث
+        """
+        self.model_label = model
+        self.field_names = tuple(fields)
+        self.model = None
+        self.fields = ()
+        self.relations = {}
+
+    def resolve(self):
+        self.model = apps.get_model(self.model_label)
+        concrete = {field.name: field for field in self.model._meta.concrete_fields}
+        missing = [name for name in self.field_names if name not in concrete]
+        if missing:
+            raise ValueError(f'{self.model_label}: حقول مراجعة غير موجودة {missing}')
+        # (الاسم، attname): المفاتيح الأجنبية تُقارن بالمعرّف دون جلب الكائن
+        self.fields = tuple((name, concrete[name].attname) for name in self.field_names)
+        # المفاتيح الأجنبية -> النموذج المرتبط (لعرض الاسم بدل المعرّف في وصف التغييرات)
+        self.relations = {name: concrete[name].related_model for name in self.field_names
+                          if concrete[name].is_relation}
+        return self
+
+    def snapshot(self, instance):
+        """قيم الحقول المتتبعة من الذاكرة (الحقول المؤجلة لا تُحمّل)"""
+        values = instance.__dict__
+        return {name: values[attname] for name, attname in self.fields if attname in values}
+
+
+def _audited_from_db(original):
+    def from_db(cls, db, field_names, values):
+        instance = original.__func__(cls, db, field_names, values)
+        config = audit_registry.get(cls)
+        if config is not None and audit_registry.connected:
+            instance._audit_previous_values = config.snapshot(instance)
+        return instance
+    return classmethod(from_db)
+
+
+class AuditRegistry:
+    def __init__(self):
+        self._configs = {}
+        self.connected = False
+
+    def register(self, *configs):
+        for config in configs:
+            config.resolve()
+            self._configs[config.model] = config
+            model = config.model
+            if '_audit_original_from_db' not in model.__dict__:
+                model._audit_original_from_db = model.from_db
+                model.from_db = _audited_from_db(model.from_db)
+            if self.connected:
+                self._connect_model(model)
+
+    def get(self, model):
+        return self._configs.get(model)
+
+    def is_registered(self, model):
+        return model in self._configs
+
+    def models(self):
+        return list(self._configs)
+
+    def _connect_model(self, model):
+        from .signals import log_model_delete, log_model_save
+
+        uid = model._meta.label_lower
+        post_save.connect(log_model_save, sender=model, dispatch_uid=f'audit_save_{uid}')
+        post_delete.connect(log_model_delete, sender=model, dispatch_uid=f'audit_delete_{uid}')
+
+    def connect(self):
+        """ربط مستقبلات المراجعة بالنماذج المسجلة فقط"""
+        self.connected = True
+        for model in self._configs:
+            self._connect_model(model)
+
+    def disconnect(self):
+        self.connected = False
+        for model in self._configs:
+            uid = model._meta.label_lower
+            post_save.disconnect(sender=model, dispatch_uid=f'audit_save_{uid}')
+            post_delete.disconnect(sender=model, dispatch_uid=f'audit_delete_{uid}')
+
+
+audit_registry = AuditRegistry()
+
+
+def autodiscover():
+    """تحميل audit.py من جميع التطبيقات ثم ربط المستقبلات"""
+    from django.utils.module_loading import autodiscover_modules
+
+    autodiscover_modules('audit')
+    if getattr(settings, 'AUDIT_LOG_ENABLED', True):
+        audit_registry.connect()
@@ -0,0 +1,148 @@
+"""
+كاتب سجل المراجعة غير المتزامن (AuditLog)
+
+بدلاً من INSERT متزامن لكل حفظ/حذف/عرض داخل معاملة المستخدم:
+- تُجمع السجلات كقواميس وتُرسل إلى طابور محدود الحجم بعد تثبيت المعاملة
+  (transaction.on_commit) - فلا يُسجل ما تم التراجع عنه كما في السابق.
+- خيط خلفي يسحب السجلات على دفعات ويكتبها بـ bulk_create.
+- الضغط العكسي: إذا امتلأ الطابور ينتظر المُنتج قليلاً ثم يكتب السجل بنفسه
+  بدلاً من إسقاطه.
+- عند إيقاف العملية (atexit) يُفرغ الطابور بالكامل.
+
+الإعدادات: AUDIT_LOG_ASYNC (بدونه تُكتب السجلات مباشرة بعد التثبيت)،
+AUDIT_LOG_BATCH_SIZE و AUDIT_LOG_QUEUE_SIZE و AUDIT_LOG_FLUSH_INTERVAL.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# مهلة انتظار المُنتج عند امتلاء الطابور قبل الكتابة المباشرة (ثوانٍ)
+PUT_TIMEOUT = 0.05
+
+
+def _reset_sequence():
+    """إعادة تعيين تسلسل AuditLog في PostgreSQL بعد تعارض المفتاح الأساسي"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT MAX(id) FROM core_auditlog")
+        max_id = cursor.fetchone()[0] or 0
+        cursor.execute(f"SELECT setval('core_auditlog_id_seq', {max_id + 1}, false)")
+
+
+class AuditLogWriter:
+    """طابور سجلات المراجعة وكتابتها على دفعات"""
+
+    def __init__(self, async_mode=True, batch_size=200, queue_size=10000, flush_interval=1.0, start_worker=True):
+        self.async_mode = async_mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.start_worker = start_worker
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            async_mode=getattr(settings, 'AUDIT_LOG_ASYNC', True),
+            batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 200),
+            queue_size=getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000),
+            flush_interval=getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 1.0),
+        )
+
+    def record(self, user_id, action_type, content_type, object_id=None, description='', ip_address=None):
+        """إضافة سجل؛ يُرسل بعد تثبيت المعاملة الحالية (أو فوراً خارجها)"""
+        entry = {
+            'user_id': user_id,
+            'action_type': action_type,
+            'content_type': content_type,
+            'object_id': object_id,
+            'description': description,
+            'ip_address': ip_address,
+        }
+        transaction.on_commit(lambda: self._enqueue(entry))
+
+    def _enqueue(self, entry):
+        if not self.async_mode:
+            self._write([entry])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put(entry, timeout=PUT_TIMEOUT)
+        except queue.Full:
+            # الضغط العكسي: الكتابة في خيط المُنتج بدلاً من فقدان السجل
+            self._write([entry])
+
+    def _ensure_worker(self):
+        if not self.start_worker or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _take_batch(self, block):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(block=True)
+            if batch:
+                self._write(batch)
+                close_old_connections()
+
+    def flush(self):
+        """كتابة كل ما في الطابور الآن في الخيط الحالي؛ يعيد عدد السجلات"""
+        written = 0
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def shutdown(self, timeout=5):
+        """إيقاف الخيط الخلفي وتفريغ الطابور"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _write(self, entries):
+        from .models import AuditLog
+
+        try:
+            AuditLog.objects.bulk_create([AuditLog(**entry) for entry in entries], batch_size=self.batch_size)
+        except IntegrityError as e:
+            if 'duplicate key' not in str(e).lower() and 'unique constraint' not in str(e).lower():
+                logger.error(f"Error writing audit log batch: {e}")
+                return
+            try:
+                _reset_sequence()
+                AuditLog.objects.bulk_create([AuditLog(**entry) for entry in entries], batch_size=self.batch_size)
+            except Exception as retry_e:
+                logger.warning(f"فشل في تسجيل نشاط المستخدم حتى بعد إعادة تعيين sequence: {retry_e}")
+        except Exception as e:
+            logger.error(f"Error writing audit log batch: {e}")
+
+
+audit_writer = AuditLogWriter.from_settings()
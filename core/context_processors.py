@@ -1,5 +1,5 @@
+from . import settings_cache
 from .models import CompanySettings
-from settings.models import Currency, CompanySettings as SettingsCompanySettings
 from django.utils import translation
 from django.utils import timezone
 
@@ -7,14 +7,14 @@ from django.utils import timezone
 def company_settings(request):
     """إضافة إعدادات الشركة إلى السياق"""
     return {
-        'company_settings': CompanySettings.get_settings()
+        'company_settings': settings_cache.company_settings() or CompanySettings.get_settings()
     }
 
 
 def currency_context(request):
     """إضافة معلومات العملة إلى السياق"""
-    base_currency = Currency.get_base_currency()
-    settings_company = SettingsCompanySettings.objects.first()
+    base_currency = settings_cache.base_currency()
+    settings_company = settings_cache.settings_company()
     
     return {
         'base_currency': base_currency,
@@ -136,7 +136,7 @@ def active_menu_context(request):
             pass
         else:
             try:
-                from .models import AuditLog
+                from .audit_writer import audit_writer
                 
                 # تجنب التسجيل المكرر للصفحة نفسها
                 request._navigation_logged = True
@@ -169,8 +169,8 @@ def active_menu_context(request):
                 
                 section_name = section_names.get(active_menu, active_menu)
                 
-                AuditLog.objects.create(
-                    user=request.user,
+                audit_writer.record(
+                    user_id=request.user.pk,
                     action_type='navigation',
                     content_type='sidebar_navigation',
                     description=f'انتقال إلى قسم: {section_name}'
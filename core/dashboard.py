@@ -0,0 +1,212 @@
+"""
+بيانات لوحة التحكم المجمعة (DashboardService)
+
+كانت الصفحة الرئيسية تنفذ 10 استعلامات لإحصائيات المبيعات والمشتريات (عدد
+ومجموع لكل فترة) واستعلامين لكل حساب بنكي واستعلاماً لكل صندوق. الآن:
+- إحصائيات كل نوع مستند باستعلام واحد بالتجميع الشرطي (Count/Sum مع filter)
+  لكل الفترات: اليوم، الشهر، الربع، نصف السنة، السنة.
+- أرصدة جميع البنوك باستعلام مجمّع واحد، وكذلك الصناديق والشيكات المعلقة.
+- تُحفظ كل كتلة في core.settings_cache بمفتاح يتضمن تاريخ اليوم ومدة صلاحية
+  قصيرة (DASHBOARD_CACHE_TIMEOUT)، وتُبطل عند حفظ/حذف النماذج المؤثرة فيها
+  (انظر MODEL_KEYS و core.signals).
+الكتل مشتركة بين المستخدمين؛ ولا تُحسب إلا الكتل الظاهرة في أقسام المستخدم.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import settings_cache
+
+ZERO = Decimal('0')
+
+SALES = 'dashboard_sales'
+PURCHASES = 'dashboard_purchases'
+BALANCES = 'dashboard_balances'
+
+# النموذج -> كتل لوحة التحكم التي تعتمد عليه
+MODEL_KEYS = {
+    'sales.salesinvoice': (SALES,),
+    'purchases.purchaseinvoice': (PURCHASES,),
+    'banks.bankaccount': (BALANCES,),
+    'banks.banktransaction': (BALANCES,),
+    'cashboxes.cashbox': (BALANCES,),
+    'cashboxes.cashboxtransaction': (BALANCES,),
+    'receipts.paymentreceipt': (BALANCES,),
+    'core.companysettings': (BALANCES,),
+}
+
+PERIODS = ('today', 'month', 'quarter', 'half_year', 'year')
+
+
+def _today():
+    return timezone.now().date()
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+def _key(block, today):
+    return f'{block}:{today.isoformat()}'
+
+
+def period_starts(today):
+    """بداية كل فترة ('today' تعني تاريخ اليوم نفسه)"""
+    return {
+        'today': today,
+        'month': today.replace(day=1),
+        'quarter': date(today.year, ((today.month - 1) // 3) * 3 + 1, 1),
+        'half_year': date(today.year, 1 if today.month <= 6 else 7, 1),
+        'year': date(today.year, 1, 1),
+    }
+
+
+def invalidate_for_model(model):
+    blocks = MODEL_KEYS.get(model._meta.label_lower)
+    if blocks:
+        today = _today()
+        settings_cache.invalidate(*(_key(block, today) for block in blocks))
+
+
+class DashboardService:
+    """حساب كتل لوحة التحكم وتخزينها مؤقتاً"""
+
+    @staticmethod
+    def document_statistics(model, today):
+        """
+        عدد ومجموع total_amount لكل فترة باستعلام واحد.
+
+        Returns:
+            dict: {'today': {'count', 'total'}, 'month': ..., 'year': ...}
+        """
+        starts = period_starts(today)
+        aggregates = {}
+        for period, start in starts.items():
+            condition = Q(date=today) if period == 'today' else Q(date__gte=start)
+            aggregates[f'{period}_count'] = Count('id', filter=condition)
+            aggregates[f'{period}_total'] = Sum('total_amount', filter=condition)
+        row = model.objects.filter(date__gte=starts['year']).aggregate(**aggregates)
+        return {
+            period: {'count': row[f'{period}_count'], 'total': row[f'{period}_total'] or 0}
+            for period in PERIODS
+        }
+
+    @staticmethod
+    def bank_balances():
+        """الرصيد الفعلي لكل حساب بنكي نشط (نفس BankAccount.calculate_actual_balance) مجمعة بالعملة"""
+        from banks.models import BankAccount
+
+        decimal_field = DecimalField(max_digits=18, decimal_places=3)
+        movements = Q(transactions__is_opening_balance=False)
+        accounts = BankAccount.objects.filter(is_active=True).annotate(
+            deposits=Coalesce(Sum('transactions__amount', filter=movements & Q(transactions__transaction_type='deposit')),
+                              Value(ZERO), output_field=decimal_field),
+            withdrawals=Coalesce(Sum('transactions__amount', filter=movements & Q(transactions__transaction_type='withdrawal')),
+                                 Value(ZERO), output_field=decimal_field),
+        ).order_by('name', 'id').values('name', 'account_number', 'currency', 'initial_balance', 'deposits', 'withdrawals')
+
+        balances = {}
+        for account in accounts:
+            balances.setdefault(account['currency'], []).append({
+                'name': account['name'],
+                'balance': (account['initial_balance'] or ZERO) + account['deposits'] - account['withdrawals'],
+                'account_number': account['account_number'],
+            })
+        return balances
+
+    @staticmethod
+    def cashbox_balances():
+        """الرصيد الفعلي لكل صندوق نشط (نفس Cashbox.calculate_actual_balance) مجمعة بالعملة"""
+        from cashboxes.models import Cashbox
+
+        cashboxes = Cashbox.objects.filter(is_active=True).annotate(
+            actual_balance=Coalesce(Sum('cashboxtransaction__amount'), Value(ZERO),
+                                    output_field=DecimalField(max_digits=18, decimal_places=3)),
+        ).order_by('name', 'id').values('name', 'location', 'currency', 'actual_balance')
+
+        balances = {}
+        for cashbox in cashboxes:
+            balances.setdefault(cashbox['currency'], []).append({
+                'name': cashbox['name'],
+                'balance': cashbox['actual_balance'],
+                'location': cashbox['location'],
+            })
+        return balances
+
+    @staticmethod
+    def pending_checks(today, base_currency_code):
+        """الشيكات المعلقة التي لم يحن استحقاقها مجمعة بعملة صندوقها"""
+        from receipts.models import PaymentReceipt
+
+        checks = PaymentReceipt.objects.filter(
+            payment_type='check',
+            check_status='pending',
+            check_due_date__gt=today,
+            is_active=True,
+            is_reversed=False,
+        ).values(
+            'receipt_number', 'amount', 'check_number', 'check_due_date',
+            'customer__name', 'check_cashbox__currency', 'cashbox__currency',
+        )
+
+        by_currency = {}
+        for check in checks:
+            currency = check['check_cashbox__currency'] or check['cashbox__currency'] or base_currency_code
+            group = by_currency.setdefault(currency, {'total_amount': 0, 'count': 0, 'checks': []})
+            if check['amount'] > 0:
+                group['total_amount'] += check['amount']
+                group['count'] += 1
+                group['checks'].append({
+                    'receipt_number': check['receipt_number'],
+                    'customer_name': check['customer__name'],
+                    'amount': check['amount'],
+                    'check_number': check['check_number'],
+                    'due_date': check['check_due_date'],
+                })
+        return by_currency
+
+    @staticmethod
+    def base_currency_code():
+        company_settings = settings_cache.company_settings()
+        return company_settings.currency if company_settings and company_settings.currency else 'JOD'
+
+    @staticmethod
+    def sales_statistics(today=None):
+        from sales.models import SalesInvoice
+
+        today = today or _today()
+        return settings_cache.get(_key(SALES, today),
+                                  lambda: DashboardService.document_statistics(SalesInvoice, today),
+                                  timeout=_timeout())
+
+    @staticmethod
+    def purchase_statistics(today=None):
+        from purchases.models import PurchaseInvoice
+
+        today = today or _today()
+        return settings_cache.get(_key(PURCHASES, today),
+                                  lambda: DashboardService.document_statistics(PurchaseInvoice, today),
+                                  timeout=_timeout())
+
+    @staticmethod
+    def balances(today=None):
+        """
+        Returns:
+            dict: bank_balances, cashbox_balances, pending_checks_by_currency, base_currency_code
+        """
+        today = today or _today()
+
+        def load():
+            base_currency_code = DashboardService.base_currency_code()
+            return {
+                'bank_balances': DashboardService.bank_balances(),
+                'cashbox_balances': DashboardService.cashbox_balances(),
+                'pending_checks_by_currency': DashboardService.pending_checks(today, base_currency_code),
+                'base_currency_code': base_currency_code,
+            }
+
+        return settings_cache.get(_key(BALANCES, today), load, timeout=_timeout())
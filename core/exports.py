@@ -0,0 +1,101 @@
+"""
+محرك التصدير المتدفق (Excel / CSV)
+
+بدلاً من بناء Workbook كامل في الذاكرة خلية بخلية من queryset محمّل بالكامل:
+- iter_rows: قراءة الصفوف على دفعات (values_list + iterator) بدون كائنات النماذج.
+- xlsx_response: openpyxl بوضع الكتابة فقط (write_only) يكتب الصفوف إلى ملف
+  مؤقت على القرص، ثم يُرسل الملف بـ FileResponse.
+- csv_response: StreamingHttpResponse يكتب كل صف عند إرساله (مع BOM لـ Excel والعربية).
+فيبقى استهلاك الذاكرة ثابتاً مهما كان عدد الصفوف (سنة من الفواتير أو سجل الأنشطة كاملاً).
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.functional import Promise
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CHUNK_SIZE = 2000
+
+
+def iter_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """صفوف queryset كـ tuples للحقول المحددة على دفعات"""
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _text(value):
+    # النصوص المترجمة الكسولة لا تُكتب في الخلايا ولا في csv كما هي
+    return str(value) if isinstance(value, Promise) else value
+
+
+class _Echo:
+    """ملف وهمي يعيد ما يُكتب فيه ليُرسل csv.writer كل صف مباشرة"""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, rows, headers=None, preamble=(), footer=()):
+    """
+    استجابة CSV متدفقة.
+
+    preamble / footer: صفوف تُكتب قبل العناوين وبعد البيانات (عنوان التقرير، الإجماليات).
+    """
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield '\ufeff'  # BOM for Excel + Arabic
+        for row in preamble:
+            yield writer.writerow([_text(value) for value in row])
+        if headers:
+            yield writer.writerow([_text(value) for value in headers])
+        for row in rows:
+            yield writer.writerow(row)
+        for row in footer:
+            yield writer.writerow([_text(value) for value in row])
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(filename, rows, headers=None, title=None, preamble=(), footer=(), widths=None,
+                  header_font=None, header_fill=None, header_alignment=None):
+    """
+    استجابة Excel بوضع الكتابة فقط.
+
+    widths: عرض الأعمدة بالترتيب (وضع الكتابة فقط لا يسمح بحسابه بعد كتابة الصفوف).
+    header_font / header_fill / header_alignment: تنسيق صف العناوين (openpyxl.styles).
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(str(title)[:31] if title else None)
+    for index, width in enumerate(widths or (), 1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+    for row in preamble:
+        worksheet.append([_text(value) for value in row])
+    if headers:
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(worksheet, value=_text(header))
+            if header_font is not None:
+                cell.font = header_font
+            if header_fill is not None:
+                cell.fill = header_fill
+            if header_alignment is not None:
+                cell.alignment = header_alignment
+            cells.append(cell)
+        worksheet.append(cells)
+    for row in rows:
+        worksheet.append(row)
+    for row in footer:
+        worksheet.append([_text(value) for value in row])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
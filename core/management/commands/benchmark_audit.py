@@ -0,0 +1,108 @@
+"""
+قياس أثر سجل المراجعة على زمن حفظ فاتورة المبيعات
+الاستخدام: python manage.py benchmark_audit --invoices 50 --items 5
+
+ينشئ فواتير تجريبية داخل معاملة يتم التراجع عنها في النهاية (لا يترك أي بيانات)،
+مرة مع ربط مستقبلات المراجعة ومرة بدونها، ويعرض الوسيط والمتوسط لكل فاتورة.
+كتابة AuditLog نفسها تتم بعد التثبيت في الخيط الخلفي فلا تدخل في القياس.
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.audit_registry import audit_registry
+from core.middleware import _current_user
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'مقارنة زمن حفظ فاتورة المبيعات مع تفعيل سجل المراجعة وتعطيله'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=50, help='عدد الفواتير لكل حالة')
+        parser.add_argument('--items', type=int, default=5, help='عدد البنود في كل فاتورة')
+
+    def handle(self, *args, **options):
+        invoices = options['invoices']
+        items = options['items']
+        was_connected = audit_registry.connected
+
+        try:
+            with transaction.atomic():
+                fixtures = self._fixtures(items)
+                _current_user.user = fixtures['user']
+                _current_user.request = None
+
+                results = {}
+                # تشغيل تمهيدي ثم القياس بالتناوب لتقليل أثر الذاكرة المؤقتة
+                for label, enabled in (('warmup', True), ('on', True), ('off', False)):
+                    if enabled:
+                        audit_registry.connect()
+                    else:
+                        audit_registry.disconnect()
+                    results[label] = self._run(fixtures, label, invoices if label != 'warmup' else 3)
+
+                transaction.set_rollback(True)
+        finally:
+            _current_user.user = None
+            if was_connected:
+                audit_registry.connect()
+            else:
+                audit_registry.disconnect()
+
+        on, off = results['on'], results['off']
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'الفواتير: {invoices} × {items} بند')
+        for label, timings in (('مع المراجعة', on), ('بدون المراجعة', off)):
+            self.stdout.write(
+                f'{label}: الوسيط {statistics.median(timings):.2f} ms - المتوسط {statistics.mean(timings):.2f} ms'
+            )
+        overhead = (statistics.median(on) / statistics.median(off) - 1) * 100 if statistics.median(off) else 0
+        self.stdout.write(self.style.SUCCESS(f'الكلفة الإضافية للمراجعة: {overhead:.1f}%'))
+
+    def _fixtures(self, items):
+        from customers.models import CustomerSupplier
+        from inventory.models import Warehouse
+        from products.models import Category, Product
+
+        user = User.objects.filter(is_superuser=True).first() or User.objects.create_user(
+            username='audit_benchmark_user', password=None
+        )
+        category = Category.objects.create(name='تصنيف قياس المراجعة')
+        products = [
+            Product.objects.create(code=f'AUDIT-BENCH-{index}', name=f'منتج قياس {index}', category=category,
+                                   sale_price=Decimal('10.000'), cost_price=Decimal('6.000'))
+            for index in range(items)
+        ]
+        return {
+            'user': user,
+            'customer': CustomerSupplier.objects.create(name='عميل قياس المراجعة', type='customer'),
+            'warehouse': Warehouse.objects.create(name='مستودع قياس المراجعة', code='AUDIT-BENCH-WH'),
+            'products': products,
+        }
+
+    def _run(self, fixtures, label, count):
+        from sales.models import SalesInvoice, SalesInvoiceItem
+
+        timings = []
+        for index in range(count):
+            started = time.perf_counter()
+            with transaction.atomic():
+                invoice = SalesInvoice.objects.create(
+                    invoice_number=f'AUDIT-BENCH-{label}-{index}', date=timezone.now().date(),
+                    customer=fixtures['customer'], warehouse=fixtures['warehouse'], payment_type='credit',
+                    created_by=fixtures['user'],
+                )
+                for product in fixtures['products']:
+                    SalesInvoiceItem.objects.create(invoice=invoice, product=product, quantity=Decimal('1'),
+                                                    unit_price=product.sale_price)
+                invoice.notes = 'قياس'
+                invoice.save()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
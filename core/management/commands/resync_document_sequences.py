@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from core.models import DocumentSequence
+from core.numbering import DocumentNumberService
+
+
+class Command(BaseCommand):
+    help = 'مزامنة عدادات تسلسل المستندات مع أعلى رقم مستخدم فعلياً (تشغيل دون اتصال)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--document-type',
+            type=str,
+            help='مزامنة نوع مستند محدد فقط',
+        )
+
+    def handle(self, *args, **options):
+        sequences = DocumentSequence.objects.all().order_by('document_type')
+        document_type = options.get('document_type')
+        if document_type:
+            sequences = sequences.filter(document_type=document_type)
+            if not sequences.exists():
+                self.stdout.write(self.style.ERROR(f'لا يوجد تسلسل لنوع المستند: {document_type}'))
+                return
+
+        advanced = 0
+        for sequence in sequences:
+            previous, current = DocumentNumberService.resync(sequence)
+            if current != previous:
+                advanced += 1
+                self.stdout.write(f'{sequence.document_type}: {previous} -> {current}')
+
+        DocumentNumberService.release_blocks(document_type)
+        self.stdout.write(self.style.SUCCESS(f'تمت المزامنة - تم تقديم {advanced} عداد'))
@@ -249,8 +249,8 @@ class SessionTimeoutMiddleware:
         if request.user.is_authenticated and not any(request.path.startswith(path) for path in excluded_paths):
             # الحصول على إعدادات الشركة
             try:
-                from core.models import CompanySettings
-                company_settings = CompanySettings.objects.first()
+                from core import settings_cache
+                company_settings = settings_cache.company_settings()
                 
                 # التحقق من تفعيل انتهاء الجلسة التلقائي
                 # فقط إذا كانت الإعدادات موجودة ومفعلة
@@ -496,8 +496,8 @@ class FiscalYearMiddleware:
         
         # التحقق من السنة الحالية
         try:
-            from journal.models import FiscalYear
-            current_year = FiscalYear.objects.filter(is_current=True).first()
+            from core import settings_cache
+            current_year = settings_cache.current_fiscal_year()
             
             # إذا كانت السنة الحالية مقفلة وليس superadmin
             if current_year and current_year.status == 'closed':
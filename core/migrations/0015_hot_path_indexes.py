@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_alter_companysettings_enable_integrity_checks_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action_type', 'content_type', 'timestamp'], name='audit_log_action_ctype_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='audit_log_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+from core.numbering import DOCUMENT_NUMBER_FIELDS
+
+
+def resync_document_sequences(apps, schema_editor):
+    """
+    تقديم كل عداد تسلسل ليتجاوز أعلى رقم مستخدم فعلياً (نفس DocumentNumberService.resync)،
+    حتى لا تبدأ قواعد البيانات المرقّاة التي تأخر عدادها بإصدار أرقام مكررة.
+    """
+    DocumentSequence = apps.get_model('core', 'DocumentSequence')
+
+    for sequence in DocumentSequence.objects.all():
+        target = DOCUMENT_NUMBER_FIELDS.get(sequence.document_type)
+        if not target:
+            continue
+        model_label, field = target
+        try:
+            model = apps.get_model(model_label)
+        except LookupError:
+            continue
+
+        last_number = None
+        numbers = model.objects.filter(**{f'{field}__startswith': sequence.prefix}).values_list(field, flat=True)
+        for value in numbers.iterator():
+            tail = str(value)[len(sequence.prefix):]
+            if tail.isdigit() and (last_number is None or int(tail) > last_number):
+                last_number = int(tail)
+
+        if last_number is not None and last_number + 1 > sequence.current_number:
+            DocumentSequence.objects.filter(pk=sequence.pk).update(current_number=last_number + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_hot_path_indexes'),
+        ('sales', '0028_salesinvoice_pos_payment_method_posshift'),
+        ('purchases', '0029_add_jofotara_fields_to_purchases'),
+        ('banks', '0021_hot_path_indexes'),
+        ('cashboxes', '0025_hot_path_indexes'),
+        ('journal', '0029_account_cashbox'),
+        ('inventory', '0017_hot_path_indexes'),
+        ('receipts', '0014_hot_path_indexes'),
+        ('payments', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(resync_document_sequences, migrations.RunPython.noop),
+    ]
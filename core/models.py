@@ -99,108 +99,12 @@ class DocumentSequence(models.Model):
         return f"{self.get_document_type_display()} - {self.prefix}"
 
     def get_next_number(self):
-        """الحصول على الرقم التالي مع قفل ذرّي ومزامنة مع آخر رقم مُستخدم فعلياً.
+        """الحصول على الرقم التالي بتحديث ذرّي للعداد دون مسح المستندات الموجودة.
 
-        يعالج حالات التعارض والتوازي لضمان فريدة رقم المستند.
+        مزامنة العداد مع الأرقام المستخدمة فعلياً تتم بأمر resync_document_sequences.
         """
-        # نعيد قفل سجل التسلسل ذاته داخل معاملة ذرّية لتفادي السباقات
-        with transaction.atomic():
-            seq = type(self).objects.select_for_update().get(pk=self.pk)
-
-            def _sync_with_last_used(last_number: int | None) -> int:
-                """أعد اختيار الرقم التالي بناءً على آخر رقم مُستخدم والـ current_number."""
-                if last_number is not None and last_number >= seq.current_number:
-                    return last_number + 1
-                return seq.current_number
-
-            # للتحويلات بين البنوك والصناديق
-            if seq.document_type == 'bank_cash_transfer':
-                from cashboxes.models import CashboxTransfer
-                last_transfer = (
-                    CashboxTransfer.objects
-                    .filter(transfer_number__startswith=seq.prefix)
-                    .order_by('-transfer_number')
-                    .first()
-                )
-                last_num = None
-                if last_transfer:
-                    try:
-                        last_num = int(str(last_transfer.transfer_number)[len(seq.prefix):])
-                    except Exception:
-                        last_num = None
-                next_number = _sync_with_last_used(last_num)
-
-            # مردود المبيعات
-            elif seq.document_type == 'sales_return':
-                from sales.models import SalesReturn
-                last_return = (
-                    SalesReturn.objects
-                    .filter(return_number__startswith=seq.prefix)
-                    .order_by('-return_number')
-                    .first()
-                )
-                last_num = None
-                if last_return:
-                    try:
-                        last_num = int(str(last_return.return_number)[len(seq.prefix):])
-                    except Exception:
-                        last_num = None
-                next_number = _sync_with_last_used(last_num)
-
-            # فواتير المبيعات (بما فيها POS عند استخدام نفس النموذج)
-            elif seq.document_type in ('sales_invoice', 'pos_invoice'):
-                from sales.models import SalesInvoice
-                existing_numbers = (
-                    SalesInvoice.objects
-                    .filter(invoice_number__startswith=seq.prefix)
-                    .values_list('invoice_number', flat=True)
-                )
-                last_num = None
-                max_found = -1
-                for inv in existing_numbers:
-                    tail = str(inv)[len(seq.prefix):]
-                    if tail.isdigit():
-                        try:
-                            num = int(tail)
-                            if num > max_found:
-                                max_found = num
-                        except Exception:
-                            continue
-                if max_found >= 0:
-                    last_num = max_found
-                next_number = _sync_with_last_used(last_num)
-
-            # القيود المحاسبية
-            elif seq.document_type == 'journal_entry':
-                from journal.models import JournalEntry
-                existing_numbers = (
-                    JournalEntry.objects
-                    .filter(entry_number__startswith=seq.prefix)
-                    .values_list('entry_number', flat=True)
-                )
-                last_num = None
-                max_found = -1
-                for entry in existing_numbers:
-                    tail = str(entry)[len(seq.prefix):]
-                    if tail.isdigit():
-                        try:
-                            num = int(tail)
-                            if num > max_found:
-                                max_found = num
-                        except Exception:
-                            continue
-                if max_found >= 0:
-                    last_num = max_found
-                next_number = _sync_with_last_used(last_num)
-
-            else:
-                # الأنواع الأخرى: استخدم current_number كما هو
-                next_number = seq.current_number
-
-            number = str(next_number).zfill(seq.digits)
-            seq.current_number = next_number + 1
-            seq.save(update_fields=['current_number', 'updated_at'])
-            return f"{seq.prefix}{number}"
+        from .numbering import DocumentNumberService
+        return DocumentNumberService.next_number(self.document_type)
 
     def get_formatted_number(self, number=None):
         """تنسيق الرقم"""
@@ -232,90 +136,8 @@ class DocumentSequence(models.Model):
                 seq.save(update_fields=['current_number', 'updated_at'])
 
     def peek_next_number(self):
-        """معاينة الرقم التالي دون حفظ أو قفل: يحسب بالاعتماد على أعلى رقم مستخدم فعلياً وcurrent_number."""
-        last_num = None
-        try:
-            if self.document_type in ('sales_invoice', 'pos_invoice'):
-                from sales.models import SalesInvoice
-                existing_numbers = (
-                    SalesInvoice.objects
-                    .filter(invoice_number__startswith=self.prefix)
-                    .values_list('invoice_number', flat=True)
-                )
-                max_found = -1
-                for inv in existing_numbers:
-                    tail = str(inv)[len(self.prefix):]
-                    if tail.isdigit():
-                        try:
-                            num = int(tail)
-                            if num > max_found:
-                                max_found = num
-                        except Exception:
-                            continue
-                if max_found >= 0:
-                    last_num = max_found
-            elif self.document_type == 'sales_return':
-                from sales.models import SalesReturn
-                last = (
-                    SalesReturn.objects
-                    .filter(return_number__startswith=self.prefix)
-                    .order_by('-return_number')
-                    .first()
-                )
-                if last:
-                    n = str(last.return_number)[len(self.prefix):]
-                    last_num = int(n) if n.isdigit() else None
-            elif self.document_type == 'cashbox_transfer':
-                from cashboxes.models import CashboxTransfer
-                last = (
-                    CashboxTransfer.objects
-                    .filter(transfer_number__startswith=self.prefix)
-                    .order_by('-transfer_number')
-                    .first()
-                )
-                if last:
-                    n = str(last.transfer_number)[len(self.prefix):]
-                    last_num = int(n) if n.isdigit() else None
-            elif self.document_type == 'bank_cash_transfer':
-                from cashboxes.models import CashboxTransfer
-                last = (
-                    CashboxTransfer.objects
-                    .filter(transfer_number__startswith=self.prefix)
-                    .order_by('-transfer_number')
-                    .first()
-                )
-                if last:
-                    n = str(last.transfer_number)[len(self.prefix):]
-                    last_num = int(n) if n.isdigit() else None
-            elif self.document_type == 'journal_entry':
-                from journal.models import JournalEntry
-                last = (
-                    JournalEntry.objects
-                    .filter(entry_number__startswith=self.prefix)
-                    .order_by('-entry_number')
-                    .first()
-                )
-                if last:
-                    n = str(last.entry_number)[len(self.prefix):]
-                    last_num = int(n) if n.isdigit() else None
-            elif self.document_type == 'warehouse_transfer':
-                from inventory.models import WarehouseTransfer
-                last = (
-                    WarehouseTransfer.objects
-                    .filter(transfer_number__startswith=self.prefix)
-                    .order_by('-transfer_number')
-                    .first()
-                )
-                if last:
-                    n = str(last.transfer_number)[len(self.prefix):]
-                    last_num = int(n) if n.isdigit() else None
-        except Exception:
-            pass
-
-        candidate = self.current_number
-        if last_num is not None and last_num + 1 > candidate:
-            candidate = last_num + 1
-        return f"{self.prefix}{str(candidate).zfill(self.digits)}"
+        """معاينة الرقم التالي دون حفظ أو قفل: العداد المخزن هو الرقم التالي."""
+        return self.get_formatted_number(self.current_number)
 
 
 class AuditLog(models.Model):
@@ -343,6 +165,10 @@ class AuditLog(models.Model):
         verbose_name = _('Audit Log')
         verbose_name_plural = _('Audit Logs')
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['action_type', 'content_type', 'timestamp'], name='audit_log_action_ctype_idx'),
+            models.Index(fields=['timestamp'], name='audit_log_timestamp_idx'),
+        ]
         permissions = [
             ('view_audit_log', _('Can view audit log')),
         ]
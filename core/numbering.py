@@ -0,0 +1,202 @@
+"""
+خدمة ترقيم المستندات
+
+العداد المعتمد هو current_number في سجل DocumentSequence: كل تخصيص هو
+تحديث ذرّي واحد (current_number = current_number + n) ثم قراءة القيمة،
+دون مسح أرقام المستندات الموجودة. التحديث نفسه يقفل السجل حتى نهاية
+المعاملة، فإذا تراجعت المعاملة تراجع العداد معها ولا تنشأ فجوات.
+
+عند ضبط DOCUMENT_NUMBER_BLOCK_SIZE بأكبر من 1 يحجز كل عامل كتلة أرقام
+دفعة واحدة ويوزعها من الذاكرة (أسرع تحت ضغط نقاط البيع، لكن الأرقام غير
+المستخدمة عند إيقاف العامل تبقى فجوات).
+
+مزامنة العداد مع أعلى رقم مستخدم فعلياً تتم دون اتصال بأمر
+resync_document_sequences وليس عند كل تخصيص. الأرقام المحفوظة من خارج
+الخدمة (المدخلة يدوياً أو المعروضة بـ peek_next_number ثم المحفوظة كما هي)
+تقدّم العداد بعد حفظ المستند (advance_past من core.signals). الأرقام التي
+يعيدها next_number من نوع IssuedNumber فلا تحتاج هذه الخطوة.
+"""
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+# حقل رقم المستند لكل نوع تسلسل: (app_label.Model, الحقل)
+DOCUMENT_NUMBER_FIELDS = {
+    'sales_invoice': ('sales.SalesInvoice', 'invoice_number'),
+    'pos_invoice': ('sales.SalesInvoice', 'invoice_number'),
+    'sales_return': ('sales.SalesReturn', 'return_number'),
+    'credit_note': ('sales.SalesCreditNote', 'note_number'),
+    'debit_note': ('purchases.PurchaseDebitNote', 'note_number'),
+    'purchase_invoice': ('purchases.PurchaseInvoice', 'invoice_number'),
+    'purchase_return': ('purchases.PurchaseReturn', 'return_number'),
+    'bank_transfer': ('banks.BankTransfer', 'transfer_number'),
+    'bank_cash_transfer': ('cashboxes.CashboxTransfer', 'transfer_number'),
+    'cashbox_transfer': ('cashboxes.CashboxTransfer', 'transfer_number'),
+    'journal_entry': ('journal.JournalEntry', 'entry_number'),
+    'warehouse_transfer': ('inventory.WarehouseTransfer', 'transfer_number'),
+    'receipt_voucher': ('receipts.PaymentReceipt', 'receipt_number'),
+    'payment_voucher': ('payments.PaymentVoucher', 'voucher_number'),
+}
+
+# كتل الأرقام المحجوزة لهذا العامل: {document_type: deque([(prefix, digits, next, last)])}
+_blocks = defaultdict(deque)
+_blocks_lock = threading.Lock()
+
+
+def format_document_number(prefix, digits, number):
+    return f"{prefix}{str(number).zfill(digits)}"
+
+
+class IssuedNumber(str):
+    """رقم خصصته الخدمة من العداد: حفظه لا يتطلب تقديم العداد"""
+
+
+class DocumentNumberService:
+    """تخصيص أرقام المستندات من عداد التسلسل"""
+
+    @staticmethod
+    def allocate(document_type, count=1):
+        """
+        حجز count رقماً متتالياً بتحديث ذرّي واحد.
+
+        Returns:
+            tuple: (prefix, digits, أول رقم محجوز)
+
+        Raises:
+            DocumentSequence.DoesNotExist: إذا لم يكن هناك تسلسل لهذا النوع
+        """
+        from .models import DocumentSequence
+
+        sequences = DocumentSequence.objects.filter(document_type=document_type)
+        with transaction.atomic(savepoint=False):
+            updated = sequences.update(
+                current_number=F('current_number') + count,
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                raise DocumentSequence.DoesNotExist(f'No document sequence for {document_type}')
+            prefix, digits, current_number = sequences.values_list(
+                'prefix', 'digits', 'current_number'
+            ).get()
+        return prefix, digits, current_number - count
+
+    @staticmethod
+    def next_number(document_type):
+        """الرقم التالي المنسق لنوع المستند"""
+        block_size = getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 1)
+        if block_size <= 1:
+            prefix, digits, number = DocumentNumberService.allocate(document_type)
+            return IssuedNumber(format_document_number(prefix, digits, number))
+
+        with _blocks_lock:
+            pool = _blocks[document_type]
+            if pool:
+                prefix, digits, number, last = pool[0]
+                if number < last:
+                    pool[0] = (prefix, digits, number + 1, last)
+                else:
+                    pool.popleft()
+                return IssuedNumber(format_document_number(prefix, digits, number))
+
+        prefix, digits, first = DocumentNumberService.allocate(document_type, block_size)
+        remaining = (prefix, digits, first + 1, first + block_size - 1)
+
+        def _publish():
+            with _blocks_lock:
+                _blocks[document_type].append(remaining)
+
+        # بقية الكتلة تصبح متاحة فقط بعد تثبيت الحجز؛ عند التراجع يعود العداد ولا تُستخدم
+        transaction.on_commit(_publish)
+        return IssuedNumber(format_document_number(prefix, digits, first))
+
+    @staticmethod
+    def release_blocks(document_type=None):
+        """إسقاط الكتل المحجوزة في الذاكرة (بعد تعديل البادئة أو الاستعادة)"""
+        with _blocks_lock:
+            if document_type is None:
+                _blocks.clear()
+            else:
+                _blocks.pop(document_type, None)
+
+    @staticmethod
+    def ensure_sequence(document_type, prefix, digits=6):
+        """
+        جلب تسلسل النوع أو إنشاؤه ومزامنته مع الأرقام الموجودة مرة واحدة.
+        """
+        from .models import DocumentSequence
+
+        sequence = DocumentSequence.objects.filter(document_type=document_type).first()
+        if sequence:
+            return sequence
+        try:
+            with transaction.atomic():
+                sequence = DocumentSequence.objects.create(
+                    document_type=document_type, prefix=prefix, digits=digits, current_number=1
+                )
+        except IntegrityError:
+            return DocumentSequence.objects.get(document_type=document_type)
+        DocumentNumberService.resync(sequence)
+        return sequence
+
+    @staticmethod
+    def last_used_number(sequence):
+        """أعلى رقم مستخدم فعلياً ببادئة التسلسل (مسح كامل - للمزامنة فقط)"""
+        from django.apps import apps
+
+        target = DOCUMENT_NUMBER_FIELDS.get(sequence.document_type)
+        if not target:
+            return None
+        model_label, field = target
+        model = apps.get_model(model_label)
+        numbers = model.objects.filter(**{f'{field}__startswith': sequence.prefix}).values_list(field, flat=True)
+
+        last_number = None
+        for value in numbers.iterator():
+            tail = str(value)[len(sequence.prefix):]
+            if tail.isdigit():
+                number = int(tail)
+                if last_number is None or number > last_number:
+                    last_number = number
+        return last_number
+
+    @staticmethod
+    def advance_past(model_label, number):
+        """
+        تقديم عدادات تسلسلات النموذج التي يطابق الرقم بادئتها إلى ما بعد الرقم،
+        حتى لا يعيد التخصيص التالي رقماً محفوظاً.
+        """
+        from .models import DocumentSequence
+
+        if not number:
+            return
+        number = str(number)
+        document_types = [document_type for document_type, (label, field) in DOCUMENT_NUMBER_FIELDS.items()
+                          if label == model_label]
+        sequences = DocumentSequence.objects.filter(document_type__in=document_types).values_list(
+            'pk', 'prefix', 'current_number')
+        for pk, prefix, current_number in sequences:
+            tail = number[len(prefix):] if number.startswith(prefix) else ''
+            if tail.isdigit() and int(tail) >= current_number:
+                DocumentSequence.objects.filter(pk=pk, current_number__lte=int(tail)).update(
+                    current_number=int(tail) + 1,
+                    updated_at=timezone.now(),
+                )
+
+    @staticmethod
+    def resync(sequence):
+        """
+        تقديم العداد ليتجاوز أعلى رقم مستخدم. لا يعيد العداد للخلف أبداً.
+
+        Returns:
+            tuple: (العداد السابق، العداد الحالي)
+        """
+        previous = sequence.current_number
+        last_number = DocumentNumberService.last_used_number(sequence)
+        if last_number is not None:
+            sequence.advance_to_at_least(last_number)
+            sequence.refresh_from_db(fields=['current_number'])
+        return previous, sequence.current_number
@@ -0,0 +1,223 @@
+"""
+ذاكرة مؤقتة لإعدادات النظام شبه الثابتة
+
+تُقرأ في كل طلب من الـ middleware ومعالجات السياق والوسوم: إعدادات الشركة
+(core و settings) والعملة الأساسية وإعدادات السوبر أدمين والسنة المالية الحالية
+ومستخدم النظام الذي تُنسب إليه سجلات المراجعة التلقائية.
+بدلاً من 6-8 استعلامات لكل صفحة تُحفظ في ذاكرة العملية مع رقم إصدار لكل مفتاح:
+
+- الحفظ والحذف (post_save / post_delete في core.signals) يرفعان رقم الإصدار
+  فوراً وبعد تثبيت المعاملة (on_commit).
+- عند ضبط SETTINGS_CACHE_ALIAS تُحفظ أرقام الإصدارات في ذاكرة Django المشتركة
+  (Redis/Memcached) فتلتقط جميع العمليات الإبطال؛ وإلا تنتهي القيم المحلية بعد
+  SETTINGS_CACHE_TIMEOUT ثانية.
+- المفاتيح الحساسة (strict: الصلاحيات، كتالوج نقطة البيع، دليل الحسابات) لا
+  تبقى بدون ذاكرة مشتركة أكثر من SETTINGS_CACHE_LOCAL_TIMEOUT ثوانٍ، لأن إبطالها
+  في عملية لا يصل إلى العمليات الأخرى. المفاتيح الكبيرة تمرر probe (استعلام
+  تجميعي رخيص يعيد بصمة الجدول): عند انتهاء الصلاحية تُقارن البصمة ولا يُعاد
+  التحميل إلا إذا تغيرت.
+- أثناء معاملة كتبت على هذه الجداول تُقرأ القيم من قاعدة البيانات مباشرة ولا
+  تُخزَّن، حتى لا تبقى في الذاكرة قيمة لم تُثبَّت (أو تم التراجع عنها)، وتُبطل
+  المفاتيح عند انتهاء المعاملة. معاملات TestCase لا تُثبَّت أبداً فيُسمح
+  بالتخزين داخلها ويُبطل عند التراجع عنها بين الاختبارات.
+
+تستخدم users.permission_matrix نفس الآلية بمفتاح لكل مستخدم (permission_matrix:<id>)،
+و core.dashboard لكتل لوحة التحكم بمدة صلاحية أقصر، و sales.pos_catalogue لكتالوج نقطة البيع،
+و journal.account_resolver لدليل الحسابات.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+COMPANY_SETTINGS = 'company_settings'
+SETTINGS_COMPANY = 'settings_company'
+BASE_CURRENCY = 'base_currency'
+SUPERADMIN_SETTINGS = 'superadmin_settings'
+CURRENT_FISCAL_YEAR = 'current_fiscal_year'
+SYSTEM_USER = 'system_user'
+
+# النموذج -> المفاتيح التي تعتمد عليه
+MODEL_KEYS = {
+    'core.companysettings': (COMPANY_SETTINGS,),
+    'settings.companysettings': (SETTINGS_COMPANY, BASE_CURRENCY),
+    'settings.currency': (SETTINGS_COMPANY, BASE_CURRENCY),
+    'settings.superadminsettings': (SUPERADMIN_SETTINGS,),
+    'journal.fiscalyear': (CURRENT_FISCAL_YEAR,),
+    'users.user': (SYSTEM_USER,),
+}
+
+_lock = threading.Lock()
+_entries = {}
+_versions = {}
+
+
+def _shared_cache():
+    alias = getattr(settings, 'SETTINGS_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    from django.core.cache import caches
+    return caches[alias]
+
+
+def _timeout():
+    return getattr(settings, 'SETTINGS_CACHE_TIMEOUT', 300)
+
+
+def _local_timeout():
+    return getattr(settings, 'SETTINGS_CACHE_LOCAL_TIMEOUT', 5)
+
+
+def _version(key):
+    shared = _shared_cache()
+    if shared is not None:
+        try:
+            return shared.get(f'settings_cache:{key}', 0)
+        except Exception:
+            pass
+    return _versions.get(key, 0)
+
+
+def _bump(keys):
+    shared = _shared_cache()
+    with _lock:
+        for key in keys:
+            _versions[key] = _versions.get(key, 0) + 1
+            _entries.pop(key, None)
+    if shared is not None:
+        for key in keys:
+            try:
+                shared.incr(f'settings_cache:{key}')
+            except ValueError:
+                shared.add(f'settings_cache:{key}', 1, None)
+            except Exception:
+                pass
+
+
+def _dirty():
+    """
+    المفاتيح التي كُتبت في معاملة لم تنتهِ لهذا الاتصال:
+    {key: (كتلة atomic, تجاوز الذاكرة أثناءها)}
+    """
+    dirty = getattr(connection, '_settings_cache_dirty', None)
+    if dirty is None:
+        dirty = connection._settings_cache_dirty = {}
+    return dirty
+
+
+def _is_dirty(key):
+    dirty = _dirty()
+    marker = dirty.get(key)
+    if marker is None:
+        return False
+    block, bypass = marker
+    if any(active is block for active in connection.atomic_blocks):
+        return bypass
+    # انتهت المعاملة (تثبيتاً أو تراجعاً) - القيمة المحفوظة قد لا تكون صحيحة
+    del dirty[key]
+    _bump((key,))
+    return False
+
+
+def bypassed(key):
+    """True إذا كانت قيمة المفتاح تُقرأ من قاعدة البيانات مباشرة (معاملة كتبت عليه لم تنتهِ)"""
+    return _is_dirty(key)
+
+
+def invalidate(*keys):
+    """إبطال المفاتيح الآن وبعد تثبيت المعاملة الحالية"""
+    keys = keys or tuple({key for model_keys in MODEL_KEYS.values() for key in model_keys})
+    if connection.in_atomic_block:
+        app_blocks = [block for block in connection.atomic_blocks if not block._from_testcase]
+        marker = (app_blocks[0], True) if app_blocks else (connection.atomic_blocks[-1], False)
+        dirty = _dirty()
+        for key in keys:
+            current = dirty.get(key)
+            if current is None or (marker[1] and not current[1]):
+                dirty[key] = marker
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_for_model(model):
+    keys = MODEL_KEYS.get(model._meta.label_lower)
+    if keys:
+        invalidate(*keys)
+
+
+def clear():
+    """تفريغ ذاكرة العملية بالكامل (للاختبارات والصيانة)"""
+    with _lock:
+        _entries.clear()
+    _dirty().clear()
+
+
+def get(key, loader, timeout=None, strict=False, probe=None):
+    """
+    القيمة المخزنة للمفتاح أو تحميلها بالدالة loader (قد تكون None).
+    timeout: مدة صلاحية القيمة محلياً بالثواني (افتراضياً SETTINGS_CACHE_TIMEOUT)
+    strict: قيمة لا يُقبل بقاؤها قديمة في العمليات الأخرى؛ بدون ذاكرة مشتركة
+    لا تتجاوز صلاحيتها SETTINGS_CACHE_LOCAL_TIMEOUT (0 = بدون تخزين)
+    probe: دالة رخيصة تعيد بصمة البيانات؛ القيمة المنتهية بنفس الإصدار والبصمة
+    تُمدد صلاحيتها دون استدعاء loader
+    """
+    if timeout is None:
+        timeout = _timeout()
+    if strict and _shared_cache() is None:
+        timeout = min(timeout, _local_timeout())
+    if _is_dirty(key) or timeout <= 0:
+        return loader()
+    version = _version(key)
+    entry = _entries.get(key)
+    if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+        return entry[2]
+    # البصمة تُقرأ قبل التحميل: تغيير بينهما يظهر في المقارنة التالية
+    fingerprint = probe() if probe is not None else None
+    if probe is not None and entry is not None and entry[0] == version and entry[3] == fingerprint:
+        value = entry[2]
+    else:
+        value = loader()
+    with _lock:
+        _entries[key] = (version, time.monotonic() + timeout, value, fingerprint)
+    return value
+
+
+def company_settings():
+    """core.CompanySettings (انتهاء الجلسة، التحقق من السلامة...)"""
+    from core.models import CompanySettings
+    return get(COMPANY_SETTINGS, lambda: CompanySettings.objects.first())
+
+
+def settings_company():
+    """settings.CompanySettings مع العملة الأساسية"""
+    from settings.models import CompanySettings
+    return get(SETTINGS_COMPANY, lambda: CompanySettings.objects.select_related('base_currency').first())
+
+
+def base_currency():
+    """نفس قاعدة Currency.get_base_currency"""
+    def load():
+        from settings.models import Currency
+        company = settings_company()
+        if company and company.base_currency:
+            return company.base_currency
+        return Currency.objects.filter(is_base_currency=True).first()
+    return get(BASE_CURRENCY, load)
+
+
+def superadmin_settings():
+    from settings.models import SuperadminSettings
+    return get(SUPERADMIN_SETTINGS, SuperadminSettings.get_settings)
+
+
+def current_fiscal_year():
+    from journal.models import FiscalYear
+    return get(CURRENT_FISCAL_YEAR, lambda: FiscalYear.objects.filter(is_current=True).first())
+
+
+def system_user_id():
+    """رقم أول مستخدم superuser (مستخدم سجلات المراجعة التلقائية) أو None"""
+    from django.contrib.auth import get_user_model
+    return get(SYSTEM_USER, lambda: get_user_model().objects.filter(
+        is_superuser=True).order_by('pk').values_list('pk', flat=True).first())
@@ -1,10 +1,12 @@
-from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.db.models.signals import m2m_changed
-from .models import AuditLog
+from .audit_writer import audit_writer
+from .audit_registry import audit_registry
+from .numbering import DOCUMENT_NUMBER_FIELDS, IssuedNumber
 from .middleware import get_current_user, get_current_request
 from .utils import get_client_ip
 from django.conf import settings
@@ -36,9 +38,9 @@ def log_activity(user, action_type, obj, description, request=None):
         if request:
             ip_address = get_client_ip(request)
         
-        # إنشاء سجل المراجعة مع حماية من تضارب IDs
-        AuditLog.objects.create(
-            user=user,
+        # يُكتب بعد تثبيت المعاملة على دفعات من الخيط الخلفي (core.audit_writer)
+        audit_writer.record(
+            user_id=user.pk,
             action_type=action_type,
             content_type=content_type,
             object_id=object_id,
@@ -46,35 +48,10 @@ def log_activity(user, action_type, obj, description, request=None):
             ip_address=ip_address
         )
     except Exception as e:
-        # إذا كان الخطأ متعلق بـ primary key constraint
-        if 'duplicate key' in str(e).lower() or 'unique constraint' in str(e).lower():
-            try:
-                # إعادة تعيين sequence AuditLog
-                from django.db import connection
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT MAX(id) FROM core_auditlog")
-                    max_id = cursor.fetchone()[0] or 0
-                    cursor.execute(f"SELECT setval('core_auditlog_id_seq', {max_id + 1}, false)")
-                
-                # محاولة مرة أخرى
-                AuditLog.objects.create(
-                    user=user,
-                    action_type=action_type,
-                    content_type=content_type,
-                    object_id=object_id,
-                    description=description,
-                    ip_address=ip_address
-                )
-            except Exception as retry_e:
-                # في حالة حدوث خطأ، لا نريد أن يتوقف النظام
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"فشل في تسجيل نشاط المستخدم حتى بعد إعادة تعيين sequence: {retry_e}")
-        else:
-            # في حالة حدوث خطأ، لا نريد أن يتوقف النظام
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error logging activity: {e}")
+        # في حالة حدوث خطأ، لا نريد أن يتوقف النظام
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error logging activity: {e}")
 
 
 # دالة مساعدة لتسجيل الأنشطة من الـ Views
@@ -106,17 +83,44 @@ def sync_group_users_permissions(group):
 # عند تعديل صلاحيات المجموعة
 def group_permissions_changed(sender, instance, action, **kwargs):
     if action in ["post_add", "post_remove", "post_clear"]:
-        sync_group_users_permissions(instance)
+        from users import permission_matrix
+        if isinstance(instance, Group):
+            sync_group_users_permissions(instance)
+            permission_matrix.invalidate_group(instance)
+        else:
+            # من جهة Permission: المجموعات المتأثرة غير معروفة بعد post_clear
+            permission_matrix.invalidate_users(User.objects.values_list('id', flat=True))
 
 m2m_changed.connect(group_permissions_changed, sender=Group.permissions.through)
 
 # عند تعديل عضوية المستخدم في المجموعات
-def user_groups_changed(sender, instance, action, **kwargs):
+def user_groups_changed(sender, instance, action, pk_set=None, **kwargs):
     if action in ["post_add", "post_remove", "post_clear"]:
-        sync_user_permissions(instance)
+        from users import permission_matrix
+        if isinstance(instance, User):
+            sync_user_permissions(instance)
+            permission_matrix.invalidate_user(instance)
+        elif pk_set:
+            # من جهة المجموعة (group.user_set.add/remove)
+            for user in User.objects.filter(pk__in=pk_set):
+                sync_user_permissions(user)
+            permission_matrix.invalidate_users(pk_set)
+        else:
+            permission_matrix.invalidate_users(User.objects.values_list('id', flat=True))
 
 m2m_changed.connect(user_groups_changed, sender=User.groups.through)
 
+# عند تعديل صلاحيات المستخدم المباشرة
+def user_permissions_changed(sender, instance, action, pk_set=None, **kwargs):
+    if action in ["post_add", "post_remove", "post_clear"]:
+        from users import permission_matrix
+        if isinstance(instance, User):
+            permission_matrix.invalidate_user(instance)
+        else:
+            permission_matrix.invalidate_users(User.objects.values_list('id', flat=True))
+
+m2m_changed.connect(user_permissions_changed, sender=User.user_permissions.through)
+
 def get_model_description(instance, action_type):
     """الحصول على وصف تفصيلي للنموذج حسب نوعه"""
     model_name = instance.__class__.__name__
@@ -164,16 +168,40 @@ def get_model_description(instance, action_type):
     return f"{action_desc} {item_description}"
 
 
+def _related_labels(config, previous_values, current_values):
+    """أسماء الكائنات المرتبطة للمفاتيح الأجنبية التي تغيرت فقط: in_bulk واحد لكل نموذج"""
+    wanted = {}
+    for field_name, related in (config.relations.items() if config else ()):
+        if field_name not in previous_values:
+            continue
+        values = (previous_values[field_name], current_values.get(field_name))
+        if values[0] != values[1]:
+            wanted.setdefault(related, set()).update(value for value in values if value is not None)
+    labels = {}
+    for related, ids in wanted.items():
+        for pk, obj in related._base_manager.in_bulk(ids).items():
+            labels[(related, pk)] = str(obj)
+    return labels
+
+
 def get_field_changes(instance, previous_values=None):
     """الحصول على تفاصيل التغييرات في الحقول"""
     if not previous_values:
         return ""
     
+    # القيم الحالية بنفس صيغة اللقطة (معرّف المفتاح الأجنبي بدلاً من جلب الكائن)
+    config = audit_registry.get(instance.__class__)
+    current_values = config.snapshot(instance) if config else {}
+    labels = _related_labels(config, previous_values, current_values)
     changes = []
     for field_name, old_value in previous_values.items():
         try:
-            new_value = getattr(instance, field_name, None)
+            new_value = current_values.get(field_name)
             if old_value != new_value:
+                related = config.relations.get(field_name) if config else None
+                if related is not None:
+                    old_value = labels.get((related, old_value), old_value)
+                    new_value = labels.get((related, new_value), new_value)
                 # ترجمة أسماء الحقول
                 field_translations = {
                     'name': 'الاسم',
@@ -203,61 +231,13 @@ def get_field_changes(instance, previous_values=None):
     return " | ".join(changes) if changes else ""
 
 
-# متغير لحفظ القيم السابقة قبل التحديث
-_previous_values = {}
-
-
-# Signals لتسجيل أنشطة النماذج تلقائياً
-@receiver(pre_save)
-def store_previous_values(sender, instance, **kwargs):
-    """حفظ القيم السابقة قبل التحديث"""
-    # تجنب AuditLog نفسه
-    if sender == AuditLog:
-        return
-    
-    # تجنب النماذج المستثناة
-    excluded_models = [
-        'Session', 'LogEntry', 'Migration', 'SystemNotification',
-        'ContentType', 'Permission', 'Group'
-    ]
-    
-    if sender.__name__ in excluded_models:
-        return
-    
-    # إذا كان الكائن موجود مسبقاً (تحديث)
-    if instance.pk:
-        try:
-            previous_instance = sender.objects.get(pk=instance.pk)
-            _previous_values[instance.pk] = {}
-            
-            # حفظ القيم المهمة
-            important_fields = ['name', 'total_amount', 'invoice_number', 'invoice_date', 
-                              'customer', 'supplier', 'phone', 'email', 'address', 
-                              'is_active', 'price', 'quantity', 'description',
-                              'account_name', 'account_number', 'balance', 'status']
-            
-            for field in important_fields:
-                if hasattr(previous_instance, field):
-                    _previous_values[instance.pk][field] = getattr(previous_instance, field)
-        except:
-            pass
-
-
-@receiver(post_save)
+# Signals لتسجيل أنشطة النماذج تلقائياً - تُربط بالنماذج المسجلة في
+# core.audit_registry فقط (ملفات audit.py في التطبيقات)
 def log_model_save(sender, instance, created, **kwargs):
     """تسجيل عمليات الحفظ/التحديث"""
-    # تجنب تسجيل AuditLog نفسه لمنع الحلقة اللانهائية
-    if sender == AuditLog:
-        return
-    
-    # تجنب تسجيل جلسات المستخدمين وبعض النماذج الأخرى
-    excluded_models = [
-        'Session', 'LogEntry', 'Migration', 'SystemNotification',
-        'ContentType', 'Permission', 'Group'
-    ]
-    
-    if sender.__name__ in excluded_models:
-        return
+    # القيم كما حُمّلت (from_db)؛ الحفظ التالي يُقارن بالقيم الحالية
+    previous_values = getattr(instance, '_audit_previous_values', None)
+    instance._audit_previous_values = audit_registry.get(sender).snapshot(instance)
     
     # محاولة الحصول على المستخدم من الـ context
     user = getattr(instance, '_audit_user', None)
@@ -273,12 +253,10 @@ def log_model_save(sender, instance, created, **kwargs):
     description = get_model_description(instance, action_type)
     
     # إضافة تفاصيل التغييرات للتحديثات
-    if not created and instance.pk in _previous_values:
-        changes = get_field_changes(instance, _previous_values[instance.pk])
+    if not created and previous_values:
+        changes = get_field_changes(instance, previous_values)
         if changes:
             description += f" - التغييرات: {changes}"
-        # تنظيف القيم السابقة
-        del _previous_values[instance.pk]
     
     # الحصول على الطلب الحالي
     request = get_current_request()
@@ -286,22 +264,8 @@ def log_model_save(sender, instance, created, **kwargs):
     log_activity(user, action_type, instance, description, request)
 
 
-@receiver(post_delete)
 def log_model_delete(sender, instance, **kwargs):
     """تسجيل عمليات الحذف"""
-    # تجنب تسجيل AuditLog نفسه
-    if sender == AuditLog:
-        return
-    
-    # تجنب تسجيل النماذج المستثناة
-    excluded_models = [
-        'Session', 'LogEntry', 'Migration', 'SystemNotification',
-        'ContentType', 'Permission', 'Group'
-    ]
-    
-    if sender.__name__ in excluded_models:
-        return
-    
     # محاولة الحصول على المستخدم
     user = getattr(instance, '_audit_user', None)
     if not user:
@@ -588,3 +552,109 @@ def category_post_delete(sender, instance, **kwargs):
     
     description = f'تم حذف فئة المنتجات: {instance.name}'
     log_activity(user, 'DELETE', instance, description, request)
+
+
+def _invalidate_settings_cache(sender, instance, **kwargs):
+    """إبطال ذاكرة الإعدادات المؤقتة عند تعديل أحد نماذجها"""
+    from . import settings_cache
+    settings_cache.invalidate_for_model(sender)
+
+
+for _settings_model in ('core.CompanySettings', 'settings.CompanySettings', 'settings.Currency',
+                        'settings.SuperadminSettings', 'journal.FiscalYear', 'users.User'):
+    post_save.connect(_invalidate_settings_cache, sender=_settings_model,
+                      dispatch_uid=f'settings_cache_save_{_settings_model}')
+    post_delete.connect(_invalidate_settings_cache, sender=_settings_model,
+                        dispatch_uid=f'settings_cache_delete_{_settings_model}')
+
+
+def _invalidate_permission_matrix(sender, instance, **kwargs):
+    """إبطال مصفوفة الصلاحيات عند تعديل المستخدم أو مجموعاته المخصصة"""
+    from users import permission_matrix
+
+    label = sender._meta.label_lower
+    if label == 'users.usergroupmembership':
+        permission_matrix.invalidate_users([instance.user_id])
+    elif label == 'users.usergroup':
+        permission_matrix.invalidate_user_group(instance)
+    elif kwargs.get('update_fields') != frozenset({'last_login'}):
+        # حفظ المستخدم (is_active وغيرها)؛ تحديث آخر دخول لا يغير الصلاحيات
+        permission_matrix.invalidate_user(instance)
+
+
+for _permission_model in ('users.User', 'users.UserGroup', 'users.UserGroupMembership'):
+    post_save.connect(_invalidate_permission_matrix, sender=_permission_model,
+                      dispatch_uid=f'permission_matrix_save_{_permission_model}')
+    post_delete.connect(_invalidate_permission_matrix, sender=_permission_model,
+                        dispatch_uid=f'permission_matrix_delete_{_permission_model}')
+
+
+def _invalidate_dashboard_cache(sender, instance, **kwargs):
+    """إبطال كتل لوحة التحكم المتأثرة بتعديل المستندات والأرصدة"""
+    from . import dashboard
+    dashboard.invalidate_for_model(sender)
+
+
+for _dashboard_model in ('sales.SalesInvoice', 'purchases.PurchaseInvoice', 'banks.BankAccount',
+                         'banks.BankTransaction', 'cashboxes.Cashbox', 'cashboxes.CashboxTransaction',
+                         'receipts.PaymentReceipt', 'core.CompanySettings'):
+    post_save.connect(_invalidate_dashboard_cache, sender=_dashboard_model,
+                      dispatch_uid=f'dashboard_cache_save_{_dashboard_model}')
+    post_delete.connect(_invalidate_dashboard_cache, sender=_dashboard_model,
+                        dispatch_uid=f'dashboard_cache_delete_{_dashboard_model}')
+
+
+def _invalidate_pos_catalogue(sender, instance, **kwargs):
+    """إبطال كتالوج نقطة البيع عند تعديل المنتجات"""
+    from sales import pos_catalogue
+    pos_catalogue.invalidate()
+
+
+post_save.connect(_invalidate_pos_catalogue, sender='products.Product', dispatch_uid='pos_catalogue_save')
+post_delete.connect(_invalidate_pos_catalogue, sender='products.Product', dispatch_uid='pos_catalogue_delete')
+
+
+def _invalidate_chart_of_accounts(sender, instance, update_fields=None, **kwargs):
+    """إبطال دليل الحسابات المخزن عند تعديل حساب (الرصيد غير مخزن فيه)"""
+    if update_fields is not None and set(update_fields) <= {'balance', 'updated_at'}:
+        return
+    from journal import account_resolver
+    account_resolver.invalidate()
+
+
+post_save.connect(_invalidate_chart_of_accounts, sender='journal.Account', dispatch_uid='chart_of_accounts_save')
+post_delete.connect(_invalidate_chart_of_accounts, sender='journal.Account', dispatch_uid='chart_of_accounts_delete')
+
+
+# حقل رقم المستند لكل نموذج مرقّم
+_DOCUMENT_NUMBER_FIELD = {model_label: field for model_label, field in DOCUMENT_NUMBER_FIELDS.values()}
+
+
+def _remember_document_number(sender, instance, **kwargs):
+    """الرقم كما حُمّل أو أُنشئ به الكائن (دون تحميل الحقل المؤجل)"""
+    instance._saved_document_number = instance.__dict__.get(_DOCUMENT_NUMBER_FIELD[sender._meta.label])
+
+
+def _advance_document_sequence(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    تقديم عداد التسلسل بعد حفظ رقم مستند لم يُخصص من الخدمة (يدوي أو معاين).
+
+    لا استعلام عند حفظ رقم خصصه next_number أو عند حفظ مستند لم يتغير رقمه.
+    """
+    from .numbering import DocumentNumberService
+
+    field = _DOCUMENT_NUMBER_FIELD[sender._meta.label]
+    if raw or (update_fields is not None and field not in update_fields):
+        return
+    number = instance.__dict__.get(field)
+    unchanged = not created and number == getattr(instance, '_saved_document_number', None)
+    if number and not unchanged and not isinstance(number, IssuedNumber):
+        DocumentNumberService.advance_past(sender._meta.label, number)
+    instance._saved_document_number = number
+
+
+for _numbered_model in sorted(_DOCUMENT_NUMBER_FIELD):
+    post_init.connect(_remember_document_number, sender=_numbered_model,
+                      dispatch_uid=f'document_number_remember_{_numbered_model}')
+    post_save.connect(_advance_document_sequence, sender=_numbered_model,
+                      dispatch_uid=f'document_sequence_advance_{_numbered_model}')
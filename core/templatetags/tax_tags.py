@@ -1,6 +1,7 @@
 from django import template
 from decimal import Decimal
-from settings.models import Currency, CompanySettings
+from settings.models import Currency
+from core import settings_cache
 
 register = template.Library()
 
@@ -44,7 +45,7 @@ def currency_format(amount, currency=None):
         # إذا لم تُمرر عملة، استخدم العملة الأساسية
         try:
             # محاولة الحصول على العملة من إعدادات الشركة أولاً
-            company_settings = CompanySettings.objects.first()
+            company_settings = settings_cache.settings_company()
             if company_settings and hasattr(company_settings, 'base_currency') and company_settings.base_currency:
                 base_currency = company_settings.base_currency
                 if hasattr(base_currency, 'decimal_places'):
@@ -55,8 +56,7 @@ def currency_format(amount, currency=None):
                     currency_display = base_currency.code
             else:
                 # إذا لم توجد إعدادات الشركة، ابحث عن العملة الأساسية مباشرة
-                from settings.models import Currency as CurrencyModel
-                base_currency = CurrencyModel.objects.filter(is_base_currency=True).first()
+                base_currency = settings_cache.base_currency()
                 if base_currency:
                     if hasattr(base_currency, 'decimal_places'):
                         decimal_places = base_currency.decimal_places
@@ -89,7 +89,7 @@ def get_currency_symbol(currency=None):
     
     # العملة الأساسية
     try:
-        company_settings = CompanySettings.objects.first()
+        company_settings = settings_cache.settings_company()
         if company_settings and company_settings.base_currency:
             base_currency = company_settings.base_currency
             if base_currency.symbol:
@@ -0,0 +1,87 @@
+"""
+اختبارات كاتب سجل المراجعة وسجل النماذج المراجَعة
+"""
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.test import TestCase
+
+from core.audit_registry import NOT_AUDITED, audit_registry
+from core.audit_writer import AuditLogWriter
+from core.models import AuditLog
+from core.signals import get_field_changes, log_model_save
+from inventory.models import InventoryMovement
+from journal.models import JournalLine
+from products.models import Category, Product
+from sales.models import SalesInvoice
+
+User = get_user_model()
+
+
+class AuditWriterTests(TestCase):
+    """السجلات تُكتب بعد التثبيت على دفعات، والتغييرات من الذاكرة"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='audit_writer_user', password='test_password')
+
+    def _record(self, writer, index):
+        writer.record(user_id=self.user.pk, action_type='view', content_type='Page', object_id=index,
+                      description=f'صفحة {index}')
+
+    def test_records_wait_for_commit_and_flush_in_one_batch(self):
+        writer = AuditLogWriter(batch_size=50, queue_size=2, start_worker=False)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            for index in range(3):
+                self._record(writer, index)
+        self.assertFalse(AuditLog.objects.filter(content_type='Page').exists())
+
+        # الطابور يتسع لسجلين؛ الثالث يُكتب مباشرة (ضغط عكسي)
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        with self.assertNumQueries(1):
+            self.assertEqual(writer.flush(), 2)
+        self.assertEqual(
+            sorted(AuditLog.objects.filter(content_type='Page').values_list('object_id', flat=True)), [0, 1, 2]
+        )
+
+    def test_previous_values_come_from_loaded_state(self):
+        category = Category.objects.create(name='تصنيف قديم')
+        category = Category.objects.get(pk=category.pk)
+        category.name = 'تصنيف جديد'
+
+        with self.assertNumQueries(0):
+            changes = get_field_changes(category, category._audit_previous_values)
+        self.assertIn("من 'تصنيف قديم' إلى 'تصنيف جديد'", changes)
+
+        with self.assertNumQueries(1):
+            # UPDATE فقط - بدون إعادة قراءة السجل قبل الحفظ
+            category.save()
+
+    def test_changed_foreign_keys_show_names(self):
+        old, new = Category.objects.create(name='فئة قديمة'), Category.objects.create(name='فئة جديدة')
+        product = Product.objects.create(code='AUD-1', name='منتج المراجعة', category=old, sale_price=1)
+        product = Product.objects.get(pk=product.pk)
+        product.category = new
+
+        with self.assertNumQueries(1):
+            changes = get_field_changes(product, product._audit_previous_values)
+        self.assertIn("من 'فئة قديمة' إلى 'فئة جديدة'", changes)
+
+    def test_receivers_attach_only_to_registered_models(self):
+        self.assertTrue(audit_registry.is_registered(SalesInvoice))
+        self.assertIn(log_model_save, post_save._live_receivers(SalesInvoice))
+        for model in (InventoryMovement, JournalLine):
+            self.assertFalse(audit_registry.is_registered(model))
+            self.assertNotIn(log_model_save, post_save._live_receivers(model))
+
+    def test_every_project_model_is_audited_except_derived_tables(self):
+        base_dir = str(settings.BASE_DIR)
+        unregistered = [
+            model._meta.label for model in apps.get_models()
+            if model._meta.managed and apps.get_app_config(model._meta.app_label).path.startswith(base_dir)
+            and not audit_registry.is_registered(model) and model._meta.label not in NOT_AUDITED
+        ]
+        self.assertEqual(unregistered, [])
@@ -0,0 +1,81 @@
+"""
+اختبارات خدمة بيانات لوحة التحكم
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from banks.models import BankAccount, BankTransaction
+from cashboxes.models import Cashbox, CashboxTransaction
+from core import settings_cache
+from core.dashboard import DashboardService, period_starts
+from customers.models import CustomerSupplier
+from inventory.models import Warehouse
+from sales.models import SalesInvoice
+
+User = get_user_model()
+
+
+class DashboardServiceTests(TestCase):
+    """استعلام مجمّع لكل كتلة، ونفس نتائج الحساب السابق، وإبطال عند التعديل"""
+
+    def setUp(self):
+        settings_cache.clear()
+        self.user = User.objects.create_user(username='dashboard_user', password='test_password', user_type='admin')
+        customer = CustomerSupplier.objects.create(name='عميل لوحة التحكم', type='customer', city='عمان')
+        warehouse = Warehouse.objects.create(name='مستودع لوحة التحكم', code='DB-WH')
+        self.today = timezone.now().date()
+        SalesInvoice.objects.bulk_create([
+            SalesInvoice(invoice_number=f'DB-{index}', date=self.today - timedelta(days=days), customer=customer,
+                         payment_type='cash', total_amount=Decimal(amount), warehouse=warehouse,
+                         created_by=self.user)
+            for index, (days, amount) in enumerate([(0, '10'), (0, '5'), (20, '7'), (80, '3'), (200, '11'), (400, '13')])
+        ])
+
+        self.bank = BankAccount.objects.create(name='بنك', bank_name='بنك', account_number='1', currency='JOD',
+                                               initial_balance=Decimal('100'))
+        BankTransaction.objects.bulk_create([
+            BankTransaction(bank=self.bank, transaction_type='deposit', amount=Decimal('50'), description='-',
+                            date=self.today, created_by=self.user),
+            BankTransaction(bank=self.bank, transaction_type='withdrawal', amount=Decimal('20'), description='-',
+                            date=self.today, created_by=self.user),
+            BankTransaction(bank=self.bank, transaction_type='deposit', amount=Decimal('100'), description='-',
+                            date=self.today, created_by=self.user, is_opening_balance=True),
+        ])
+        self.cashbox = Cashbox.objects.create(name='صندوق', currency='JOD')
+        CashboxTransaction.objects.bulk_create([
+            CashboxTransaction(cashbox=self.cashbox, transaction_type='deposit', amount=Decimal('30'), date=self.today,
+                               created_by=self.user),
+            CashboxTransaction(cashbox=self.cashbox, transaction_type='withdrawal', amount=Decimal('-5'), date=self.today,
+                               created_by=self.user),
+        ])
+
+    def test_statistics_match_per_period_aggregates(self):
+        with self.assertNumQueries(1):
+            stats = DashboardService.sales_statistics(self.today)
+
+        for period, start in period_starts(self.today).items():
+            invoices = SalesInvoice.objects.filter(date=start) if period == 'today' else SalesInvoice.objects.filter(date__gte=start)
+            self.assertEqual(stats[period]['count'], invoices.count())
+            self.assertEqual(stats[period]['total'], invoices.aggregate(total=Sum('total_amount'))['total'] or 0)
+
+        with self.assertNumQueries(0):
+            DashboardService.sales_statistics(self.today)
+
+    def test_balances_single_query_per_block_and_invalidation(self):
+        with self.assertNumQueries(4):
+            balances = DashboardService.balances(self.today)
+        self.assertEqual(balances['bank_balances']['JOD'][0]['balance'], self.bank.calculate_actual_balance())
+        self.assertEqual(balances['cashbox_balances']['JOD'][0]['balance'], self.cashbox.calculate_actual_balance())
+
+        with self.assertNumQueries(0):
+            DashboardService.balances(self.today)
+
+        CashboxTransaction.objects.create(cashbox=self.cashbox, transaction_type='deposit', amount=Decimal('12'),
+                                          date=self.today, created_by=self.user)
+        balances = DashboardService.balances(self.today)
+        self.assertEqual(balances['cashbox_balances']['JOD'][0]['balance'], Decimal('37'))
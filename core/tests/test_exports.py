@@ -0,0 +1,50 @@
+"""
+اختبارات محرك التصدير المتدفق
+"""
+import io
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from openpyxl import load_workbook
+
+from core.export_audit_log_excel import export_audit_log_to_excel
+from core.exports import csv_response, iter_rows
+from core.models import AuditLog
+
+User = get_user_model()
+
+
+class StreamingExportTests(TestCase):
+    """الصفوف تُقرأ على دفعات وتُكتب كما هي في Excel و CSV"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='export_user', password='test_password',
+                                             first_name='مستخدم', last_name='التصدير')
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.user, action_type='create', content_type='Product', description=f'سجل {index}',
+                     ip_address='127.0.0.1')
+            for index in range(5)
+        ])
+
+    def test_audit_log_xlsx(self):
+        queryset = AuditLog.objects.order_by('id')
+        response = export_audit_log_to_excel(queryset)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="audit_log.xlsx"')
+
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][1], 'المستخدم')
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1], 'مستخدم التصدير')
+        self.assertEqual(rows[5][4], 'سجل 4')
+
+    def test_csv_streams_rows_with_preamble_and_footer(self):
+        rows = iter_rows(AuditLog.objects.order_by('id'), ('description', 'content_type'), chunk_size=2)
+        response = csv_response('log.csv', rows, headers=['الوصف', 'النوع'], preamble=[['سجل الأنشطة']],
+                                footer=[['الإجمالي', 5]])
+        content = b''.join(response.streaming_content).decode('utf-8')
+        lines = content.lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[0], 'سجل الأنشطة')
+        self.assertEqual(lines[1], 'الوصف,النوع')
+        self.assertEqual(lines[2:7], [f'سجل {index},Product' for index in range(5)])
+        self.assertEqual(lines[-1], 'الإجمالي,5')
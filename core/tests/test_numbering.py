@@ -0,0 +1,99 @@
+"""
+اختبارات خدمة ترقيم المستندات
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import DocumentSequence
+from core.numbering import DocumentNumberService
+from journal.models import JournalEntry
+
+User = get_user_model()
+
+
+class DocumentNumberServiceTests(TestCase):
+    """التخصيص من العداد والمزامنة دون اتصال"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='numbering_user', password='test_password')
+        self.sequence = DocumentSequence.objects.create(
+            document_type='journal_entry', prefix='JE-', digits=4, current_number=1
+        )
+        DocumentNumberService.release_blocks()
+
+    def _entry(self, number):
+        return JournalEntry.objects.create(
+            entry_number=number, entry_date=date.today(), description='قيد ترقيم',
+            total_amount=Decimal('1.000'), created_by=self.user
+        )
+
+    def test_allocation_is_constant_and_ignores_existing_documents(self):
+        """التخصيص لا يمسح المستندات الموجودة"""
+        for index in range(5):
+            self._entry(f'JE-{9000 + index}')
+        # حفظ المستندات يقدّم العداد؛ إعادته تثبت أن التخصيص لا يمسح الأرقام
+        DocumentSequence.objects.filter(pk=self.sequence.pk).update(current_number=1)
+
+        with self.assertNumQueries(4):
+            first = self.sequence.get_next_number()
+            second = self.sequence.get_next_number()
+        self.assertEqual((first, second), ('JE-0001', 'JE-0002'))
+
+    def test_rolled_back_allocation_leaves_no_gap(self):
+        """التراجع عن المعاملة يعيد العداد"""
+        try:
+            with transaction.atomic():
+                DocumentNumberService.next_number('journal_entry')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(DocumentNumberService.next_number('journal_entry'), 'JE-0001')
+
+    def test_resync_advances_past_last_used_number(self):
+        """المزامنة تقدم العداد ولا تعيده للخلف"""
+        self._entry('JE-0041')
+        self.assertEqual(DocumentNumberService.resync(self.sequence), (1, 42))
+        self.assertEqual(DocumentNumberService.next_number('journal_entry'), 'JE-0042')
+
+        DocumentSequence.objects.filter(pk=self.sequence.pk).update(current_number=100)
+        self.sequence.refresh_from_db()
+        self.assertEqual(DocumentNumberService.resync(self.sequence), (100, 100))
+
+    def test_saved_peeked_number_advances_counter(self):
+        """رقم معروض بـ peek_next_number ومحفوظ كما هو لا يُخصص مرة أخرى"""
+        self._entry(self.sequence.peek_next_number())
+        self._entry('JE-0007')
+        self._entry('MANUAL-50')
+        self.assertEqual(DocumentNumberService.next_number('journal_entry'), 'JE-0008')
+
+    def test_saving_issued_or_unchanged_number_skips_sequence(self):
+        """حفظ رقم من next_number أو مستند لم يتغير رقمه لا يقرأ عداد التسلسل"""
+        table = DocumentSequence._meta.db_table
+        number = DocumentNumberService.next_number('journal_entry')
+        with CaptureQueriesContext(connection) as queries:
+            entry = self._entry(number)
+            entry = JournalEntry.objects.get(pk=entry.pk)
+            entry.description = 'قيد معدل'
+            entry.save()
+        self.assertFalse([query for query in queries if table in query['sql']])
+
+        entry.entry_number = 'JE-0030'
+        entry.save()
+        self.assertEqual(DocumentNumberService.next_number('journal_entry'), 'JE-0031')
+
+    @override_settings(DOCUMENT_NUMBER_BLOCK_SIZE=10)
+    def test_block_reservation_serves_from_memory(self):
+        """الكتلة المحجوزة توزع الأرقام دون الرجوع لقاعدة البيانات"""
+        with self.captureOnCommitCallbacks(execute=True):
+            numbers = [DocumentNumberService.next_number('journal_entry')]
+        with self.assertNumQueries(0):
+            numbers += [DocumentNumberService.next_number('journal_entry') for _ in range(9)]
+        self.assertEqual(numbers, [f'JE-{index:04d}' for index in range(1, 11)])
+        self.sequence.refresh_from_db()
+        self.assertEqual(self.sequence.current_number, 11)
+        DocumentNumberService.release_blocks()
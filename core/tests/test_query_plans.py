@@ -0,0 +1,202 @@
+"""
+اختبارات خطط الاستعلام (EXPLAIN) لمسارات التقارير ونقاط البيع
+
+تفشل إذا لم تستخدم الاستعلامات الرئيسية الفهرس المحدد الذي أضافته الترحيلات
+(بحث عبر الفهرس، لا مسح كامل للجدول أو لفهرس آخر). البيانات موزعة على حسابات
+ومنتجات وصناديق متعددة حتى يكون كل شرط انتقائياً، بدون إجبار المخطط على الفهارس.
+"""
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase
+
+from banks.models import BankAccount, BankTransaction
+from cashboxes.models import Cashbox, CashboxTransaction
+from core.models import AuditLog
+from customers.models import CustomerSupplier
+from inventory.cost_layers import CostLayerService
+from inventory.models import InventoryCostLayer, InventoryMovement, StockLevel, Warehouse
+from inventory.stock_levels import StockLevelService
+from journal.models import Account, JournalEntry, JournalLine
+from payments.models import PaymentVoucher
+from products.models import Category, Product
+from receipts.models import PaymentReceipt
+
+User = get_user_model()
+
+ROWS = 3000
+START = date(2022, 1, 1)
+
+
+def _day(index):
+    return START + timedelta(days=index % 1000)
+
+
+class QueryPlanTests(TestCase):
+    """الاستعلامات الساخنة تستخدم الفهارس المركبة والجزئية"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='plan_user', password='test_password')
+        accounts = Account.objects.bulk_create([
+            Account(code=f'PLAN-{index}', name=f'حساب الخطة {index}', account_type='asset') for index in range(40)
+        ])
+        cls.account = accounts[0]
+        warehouses = [Warehouse.objects.create(name=f'مستودع الخطة {index}', code=f'PLAN-WH{index}')
+                      for index in range(2)]
+        cls.warehouse = warehouses[0]
+        category = Category.objects.create(name='تصنيف الخطة')
+        products = Product.objects.bulk_create([
+            Product(code=f'PLAN-P{index}', name=f'منتج الخطة {index}', category=category,
+                    sale_price=Decimal('10.000'), cost_price=Decimal('5.000'))
+            for index in range(20)
+        ])
+        cls.product = products[0]
+
+        entries = JournalEntry.objects.bulk_create([
+            JournalEntry(entry_number=f'PLAN-{index}', entry_date=_day(index), description='قيد',
+                         total_amount=Decimal('1'), created_by=cls.user,
+                         reference_type=('sales_invoice', 'purchase_invoice', 'receipt')[index % 3],
+                         reference_id=index)
+            for index in range(ROWS)
+        ])
+        JournalLine.objects.bulk_create([
+            JournalLine(journal_entry=entry, account=account, debit=debit, credit=credit)
+            for index, entry in enumerate(entries)
+            for account, debit, credit in ((accounts[index % 40], Decimal('1'), 0),
+                                           (accounts[(index + 1) % 40], 0, Decimal('1')))
+        ])
+        InventoryMovement.objects.bulk_create([
+            InventoryMovement(movement_number=f'PLAN-M-{index}', date=_day(index),
+                              product=products[index % 20], warehouse=warehouses[index // 20 % 2],
+                              movement_type='in' if index % 4 else 'out',
+                              reference_type=('sales_invoice', 'purchase_invoice')[index % 2],
+                              reference_id=index, quantity=Decimal('1'), unit_cost=Decimal('1'),
+                              created_by=cls.user)
+            for index in range(ROWS)
+        ])
+        # bulk_create لا يطلق سيجنالات الحركة
+        CostLayerService.rebuild()
+        StockLevelService.rebuild()
+
+        AuditLog.objects.bulk_create([
+            AuditLog(user=cls.user, action_type=('create', 'update', 'delete', 'view')[index % 4],
+                     content_type=('SalesInvoice', 'PurchaseInvoice', 'JournalEntry', 'Product')[index // 4 % 4],
+                     object_id=index, description='سجل')
+            for index in range(ROWS)
+        ])
+
+        cashboxes = [Cashbox.objects.create(name=f'صندوق الخطة {index}') for index in range(10)]
+        cls.cashbox = cashboxes[0]
+        CashboxTransaction.objects.bulk_create([
+            CashboxTransaction(cashbox=cashboxes[index % 10], transaction_type='deposit', date=_day(index),
+                               amount=Decimal('1'), created_by=cls.user)
+            for index in range(ROWS)
+        ])
+        banks = [BankAccount.objects.create(name=f'بنك الخطة {index}', bank_name='بنك',
+                                            account_number=f'PLAN-{index}', created_by=cls.user)
+                 for index in range(10)]
+        cls.bank = banks[0]
+        BankTransaction.objects.bulk_create([
+            BankTransaction(bank=banks[index % 10], transaction_type=('deposit', 'withdrawal')[index % 2],
+                            amount=Decimal('1'), date=_day(index), created_by=cls.user)
+            for index in range(ROWS)
+        ])
+
+        customer = CustomerSupplier.objects.create(name='عميل الخطة', type='both', city='عمان')
+        # الشيكات المعلقة قليلة بين السندات
+        PaymentReceipt.objects.bulk_create([
+            PaymentReceipt(receipt_number=f'PLAN-R{index}', date=_day(index), customer=customer,
+                           payment_type='check' if index % 50 == 0 else 'cash', amount=Decimal('1'),
+                           check_status='pending' if index % 50 == 0 else 'cleared',
+                           check_due_date=_day(index + 30), created_by=cls.user)
+            for index in range(ROWS)
+        ])
+        PaymentVoucher.objects.bulk_create([
+            PaymentVoucher(voucher_number=f'PLAN-V{index}', date=_day(index), voucher_type='supplier',
+                           supplier=customer, payment_type='check' if index % 50 == 0 else 'cash',
+                           amount=Decimal('1'), check_status='pending' if index % 50 == 0 else 'cleared',
+                           check_due_date=_day(index + 30), created_by=cls.user)
+            for index in range(ROWS)
+        ])
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def _unique_index(self, model, columns):
+        """اسم الفهرس الفريد على الأعمدة (اسمه يختلف بين قواعد البيانات)"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        for name, constraint in constraints.items():
+            if constraint['unique'] and constraint['columns'] == list(columns):
+                return name
+        self.fail(f'لا يوجد فهرس فريد على {columns} في {model._meta.db_table}')
+
+    def assertUsesIndex(self, queryset, model, index_name):
+        """الخطة تبحث في جدول النموذج عبر الفهرس المحدد"""
+        vendor = connection.vendor
+        plan = queryset.explain()
+        name = re.escape(index_name)
+        if vendor == 'postgresql':
+            self.assertRegex(plan, rf'(Index Scan|Index Only Scan) using {name} on {model._meta.db_table}'
+                                   rf'|Bitmap Index Scan on {name}\b', plan)
+        elif vendor == 'sqlite':
+            table = re.escape(model._meta.db_table)
+            self.assertRegex(plan, rf'SEARCH (TABLE )?{table}\b[^\n]* USING (COVERING )?INDEX {name}\b', plan)
+        else:
+            self.skipTest(f'EXPLAIN checks are not defined for {vendor}')
+
+    def test_report_queries(self):
+        """رصيد الحساب حتى تاريخ ودفتر الأستاذ وقيود المستند"""
+        lines = JournalLine.objects.filter(account=self.account, journal_entry__entry_date__lte=date(2022, 3, 1))
+        self.assertUsesIndex(lines.values('account_id').annotate(total=Sum('debit')),
+                             JournalLine, 'journal_line_account_entry_idx')
+        self.assertUsesIndex(JournalEntry.objects.filter(reference_type='sales_invoice', reference_id=10),
+                             JournalEntry, 'journal_entry_reference_idx')
+        self.assertUsesIndex(JournalEntry.objects.filter(entry_date__range=(date(2022, 1, 1), date(2022, 1, 31))),
+                             JournalEntry, 'journal_entry_date_idx')
+
+    def test_inventory_and_pos_queries(self):
+        """الصرف وطبقات FIFO ورصيد المنتج في مستودع نقطة البيع"""
+        self.assertUsesIndex(
+            InventoryMovement.objects.filter(product=self.product, warehouse=self.warehouse, movement_type='out'),
+            InventoryMovement, 'inv_move_prod_wh_type_idx',
+        )
+        self.assertUsesIndex(InventoryMovement.objects.filter(reference_type='sales_invoice', reference_id=5),
+                             InventoryMovement, 'inv_move_reference_idx')
+        self.assertUsesIndex(
+            InventoryCostLayer.objects.filter(product=self.product, warehouse=self.warehouse, remaining_qty__gt=0)
+            .order_by('date', 'movement_id'),
+            InventoryCostLayer, 'inv_cost_layer_open_idx',
+        )
+        self.assertUsesIndex(StockLevel.objects.filter(product=self.product, warehouse=self.warehouse), StockLevel,
+                             self._unique_index(StockLevel, ['product_id', 'warehouse_id']))
+
+    def test_treasury_and_audit_queries(self):
+        """حركات الصناديق والبنوك والشيكات المفتوحة وسجل التدقيق"""
+        self.assertUsesIndex(CashboxTransaction.objects.filter(cashbox=self.cashbox).order_by('date'),
+                             CashboxTransaction, 'cashbox_txn_cashbox_date_idx')
+        # مجموع الإيداعات في BankAccount.calculate_actual_balance (التجميع بدون ترتيب)
+        self.assertUsesIndex(
+            BankTransaction.objects.filter(bank=self.bank, transaction_type='deposit', is_opening_balance=False)
+            .order_by().values('bank').annotate(total=Sum('amount')),
+            BankTransaction, 'bank_txn_bank_type_idx',
+        )
+        due_after = date(2022, 6, 1)
+        self.assertUsesIndex(
+            PaymentReceipt.objects.filter(payment_type='check', check_status='pending', check_due_date__gt=due_after),
+            PaymentReceipt, 'receipt_open_check_idx',
+        )
+        self.assertUsesIndex(
+            PaymentVoucher.objects.filter(payment_type='check', check_status='pending', check_due_date__gt=due_after),
+            PaymentVoucher, 'payment_open_check_idx',
+        )
+        self.assertUsesIndex(
+            AuditLog.objects.filter(action_type='create', content_type='SalesInvoice').order_by('-timestamp'),
+            AuditLog, 'audit_log_action_ctype_idx',
+        )
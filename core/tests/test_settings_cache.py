@@ -0,0 +1,78 @@
+"""
+اختبارات ذاكرة الإعدادات المؤقتة
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import settings_cache
+from core.models import CompanySettings
+from journal.models import FiscalYear
+from settings.models import CompanySettings as SettingsCompanySettings, Currency, SuperadminSettings
+
+User = get_user_model()
+
+SETTINGS_TABLES = (
+    CompanySettings._meta.db_table,
+    SettingsCompanySettings._meta.db_table,
+    Currency._meta.db_table,
+    SuperadminSettings._meta.db_table,
+    FiscalYear._meta.db_table,
+)
+
+
+class SettingsCacheTests(TestCase):
+    """لا استعلامات إعدادات في الطلب الدافئ، والحفظ يُبطل الذاكرة"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='settings_cache_user', password='test_password',
+                                             user_type='admin')
+        self.currency = Currency.objects.create(code='JOD', name='دينار', symbol='د.أ', decimal_places=3,
+                                                is_base_currency=True)
+        SettingsCompanySettings.objects.create(company_name='شركة', base_currency=self.currency)
+        CompanySettings.objects.create(company_name='شركة')
+        SuperadminSettings.get_settings()
+        FiscalYear.objects.create(year=2024, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                                  is_current=True, created_by=self.user)
+
+    def test_warm_request_runs_no_settings_queries(self):
+        self.client.force_login(self.user)
+        url = reverse('reports:aging_report')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        settings_queries = [
+            query['sql'] for query in queries.captured_queries
+            if any(f'"{table}"' in query['sql'] for table in SETTINGS_TABLES)
+        ]
+        self.assertEqual(settings_queries, [])
+        self.assertEqual(response.context['base_currency'], self.currency)
+
+    def test_save_invalidates_cached_values(self):
+        self.assertEqual(settings_cache.base_currency().symbol, 'د.أ')
+        self.assertEqual(settings_cache.current_fiscal_year().year, 2024)
+
+        self.currency.symbol = 'JD'
+        self.currency.save()
+        FiscalYear.objects.create(year=2025, start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+                                  is_current=True, created_by=self.user)
+
+        self.assertEqual(settings_cache.base_currency().symbol, 'JD')
+        self.assertEqual(settings_cache.current_fiscal_year().year, 2025)
+        with self.assertNumQueries(0):
+            settings_cache.base_currency()
+            settings_cache.current_fiscal_year()
+
+    @override_settings(SETTINGS_CACHE_ALIAS=None, SETTINGS_CACHE_LOCAL_TIMEOUT=0)
+    def test_strict_keys_are_not_kept_without_shared_cache(self):
+        loads = []
+        for _ in range(2):
+            settings_cache.get('strict_test', lambda: loads.append(1), strict=True)
+            settings_cache.get('relaxed_test', lambda: loads.append(2))
+        self.assertEqual(loads, [1, 2, 1])
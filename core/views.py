@@ -61,117 +61,26 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         context['dashboard_sections'] = list(dashboard_sections)
         
-        # تواريخ مختلفة للإحصائيات
-        today = django_timezone.now().date()
-        start_of_month = today.replace(day=1)
-        start_of_quarter = datetime(today.year, ((today.month - 1) // 3) * 3 + 1, 1).date()
-        start_of_half_year = datetime(today.year, 1 if today.month <= 6 else 7, 1).date()
-        start_of_year = datetime(today.year, 1, 1).date()
-
-        # إحصائيات المبيعات
-        sales_stats = self.get_sales_statistics(today, start_of_month, start_of_quarter, start_of_half_year, start_of_year)
-        context['sales_stats'] = sales_stats
-
-        # إحصائيات المشتريات
-        purchase_stats = self.get_purchase_statistics(today, start_of_month, start_of_quarter, start_of_half_year, start_of_year)
-        context['purchase_stats'] = purchase_stats
-
-        # أرصدة البنوك والصناديق
-        try:
-            from banks.models import BankAccount
-            from cashboxes.models import Cashbox
-            from receipts.models import PaymentReceipt
-            from .models import CompanySettings
-            
-            # العملة الأساسية من إعدادات الشركة (نحتاجها مبكراً)
-            company_settings = CompanySettings.get_settings()
-            base_currency_code = company_settings.currency if company_settings else 'JOD'
-            
-            # أرصدة البنوك (الرصيد الفعلي من المعاملات)
-            bank_accounts = BankAccount.objects.filter(is_active=True)
-            bank_balances = {}
-            for account in bank_accounts:
-                currency = account.currency  # CharField
-                if currency not in bank_balances:
-                    bank_balances[currency] = []
-                # حساب الرصيد الفعلي من المعاملات
-                actual_balance = account.calculate_actual_balance()
-                bank_balances[currency].append({
-                    'name': account.name,
-                    'balance': actual_balance,
-                    'account_number': account.account_number
-                })
-            
-            # أرصدة الصناديق (الرصيد الفعلي من المعاملات)
-            cashboxes = Cashbox.objects.filter(is_active=True)
-            cashbox_balances = {}
-            for cashbox in cashboxes:
-                currency = cashbox.currency  # CharField
-                if currency not in cashbox_balances:
-                    cashbox_balances[currency] = []
-                # حساب الرصيد الفعلي من المعاملات
-                actual_balance = cashbox.calculate_actual_balance()
-                cashbox_balances[currency].append({
-                    'name': cashbox.name,
-                    'balance': actual_balance,
-                    'location': cashbox.location
-                })
-            
-            # الشيكات المعلقة (لم يحن موعد استحقاقها ولم يتم تحصيلها)
-            pending_checks = PaymentReceipt.objects.filter(
-                payment_type='check',
-                check_status='pending',
-                check_due_date__gt=django_timezone.now().date(),
-                is_active=True,
-                is_reversed=False
-            ).select_related('customer', 'check_cashbox', 'cashbox')
-            
-            # تجميع الشيكات حسب العملة
-            pending_checks_by_currency = {}
-            for check in pending_checks:
-                # الحصول على العملة من الصندوق المرتبط بالشيك
-                currency = base_currency_code  # استخدام العملة الأساسية كافتراضي
-                if check.check_cashbox:
-                    currency = check.check_cashbox.currency
-                elif check.cashbox:
-                    currency = check.cashbox.currency
-                
-                if currency not in pending_checks_by_currency:
-                    pending_checks_by_currency[currency] = {
-                        'total_amount': 0,
-                        'count': 0,
-                        'checks': []
-                    }
-                
-                # التأكد من أن المبلغ أكبر من صفر
-                if check.amount > 0:
-                    pending_checks_by_currency[currency]['total_amount'] += check.amount
-                    pending_checks_by_currency[currency]['count'] += 1
-                    pending_checks_by_currency[currency]['checks'].append({
-                        'receipt_number': check.receipt_number,
-                        'customer_name': check.customer.name,
-                        'amount': check.amount,
-                        'check_number': check.check_number,
-                        'due_date': check.check_due_date
-                    })
-            
-            context['bank_balances'] = bank_balances
-            context['cashbox_balances'] = cashbox_balances
-            context['pending_checks_by_currency'] = pending_checks_by_currency
-            context['base_currency_code'] = base_currency_code
-            
-        except (ImportError, Exception) as e:
-            # الحصول على العملة الأساسية في حالة الخطأ
+        # الإحصائيات والأرصدة من DashboardService (استعلام مجمّع لكل كتلة مع ذاكرة مؤقتة قصيرة)
+        from .dashboard import DashboardService
+
+        context['sales_stats'] = self.get_sales_statistics()
+        context['purchase_stats'] = self.get_purchase_statistics()
+
+        # أرصدة البنوك والصناديق والشيكات المعلقة - فقط لمن يظهر له القسم
+        balances = {}
+        if 'banks_balances' in dashboard_sections:
             try:
-                company_settings = CompanySettings.get_settings()
-                base_currency_code = company_settings.currency if company_settings else 'JOD'
-            except:
-                base_currency_code = 'JOD'
-                
-            context['bank_balances'] = {}
-            context['cashbox_balances'] = {}
-            context['pending_checks_by_currency'] = {}
-            context['base_currency_code'] = base_currency_code
+                balances = DashboardService.balances()
+            except Exception:
+                balances = {}
+        context['bank_balances'] = balances.get('bank_balances', {})
+        context['cashbox_balances'] = balances.get('cashbox_balances', {})
+        context['pending_checks_by_currency'] = balances.get('pending_checks_by_currency', {})
+        try:
+            context['base_currency_code'] = balances.get('base_currency_code') or DashboardService.base_currency_code()
+        except Exception:
+            context['base_currency_code'] = 'JOD'
 
         # الإشعارات غير المقروءة
         unread_notifications = SystemNotification.objects.filter(is_read=False)
@@ -181,114 +90,34 @@ class DashboardView(LoginRequiredMixin, TemplateView):
 
         return context
 
-    def get_sales_statistics(self, today, start_of_month, start_of_quarter, start_of_half_year, start_of_year):
+    def get_sales_statistics(self):
         """Calculate sales statistics"""
         try:
-            from sales.models import SalesInvoice
-            
-            stats = {}
-            
-            # إحصائيات اليوم
-            today_sales = SalesInvoice.objects.filter(date=today)
-            stats['today'] = {
-                'count': today_sales.count(),
-                'total': today_sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات الشهر
-            month_sales = SalesInvoice.objects.filter(date__gte=start_of_month)
-            stats['month'] = {
-                'count': month_sales.count(),
-                'total': month_sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات الربع
-            quarter_sales = SalesInvoice.objects.filter(date__gte=start_of_quarter)
-            stats['quarter'] = {
-                'count': quarter_sales.count(),
-                'total': quarter_sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات نصف السنة
-            half_year_sales = SalesInvoice.objects.filter(date__gte=start_of_half_year)
-            stats['half_year'] = {
-                'count': half_year_sales.count(),
-                'total': half_year_sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات السنة
-            year_sales = SalesInvoice.objects.filter(date__gte=start_of_year)
-            stats['year'] = {
-                'count': year_sales.count(),
-                'total': year_sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            return stats
-            
+            from .dashboard import DashboardService
+            return DashboardService.sales_statistics()
         except ImportError:
             # في حالة عدم وجود تطبيق المبيعات
-            return {
-                'today': {'count': 0, 'total': 0},
-                'month': {'count': 0, 'total': 0},
-                'quarter': {'count': 0, 'total': 0},
-                'half_year': {'count': 0, 'total': 0},
-                'year': {'count': 0, 'total': 0},
-            }
-
-    def get_purchase_statistics(self, today, start_of_month, start_of_quarter, start_of_half_year, start_of_year):
+            return self._empty_statistics()
+
+    def get_purchase_statistics(self):
         """Calculate purchase statistics"""
         try:
-            from purchases.models import PurchaseInvoice
-            
-            stats = {}
-            
-            # إحصائيات اليوم
-            today_purchases = PurchaseInvoice.objects.filter(date=today)
-            stats['today'] = {
-                'count': today_purchases.count(),
-                'total': today_purchases.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات الشهر
-            month_purchases = PurchaseInvoice.objects.filter(date__gte=start_of_month)
-            stats['month'] = {
-                'count': month_purchases.count(),
-                'total': month_purchases.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات الربع
-            quarter_purchases = PurchaseInvoice.objects.filter(date__gte=start_of_quarter)
-            stats['quarter'] = {
-                'count': quarter_purchases.count(),
-                'total': quarter_purchases.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات نصف السنة
-            half_year_purchases = PurchaseInvoice.objects.filter(date__gte=start_of_half_year)
-            stats['half_year'] = {
-                'count': half_year_purchases.count(),
-                'total': half_year_purchases.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            # إحصائيات السنة
-            year_purchases = PurchaseInvoice.objects.filter(date__gte=start_of_year)
-            stats['year'] = {
-                'count': year_purchases.count(),
-                'total': year_purchases.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-            }
-            
-            return stats
-            
+            from .dashboard import DashboardService
+            return DashboardService.purchase_statistics()
         except ImportError:
             # في حالة عدم وجود تطبيق المشتريات
-            return {
-                'today': {'count': 0, 'total': 0},
-                'month': {'count': 0, 'total': 0},
-                'quarter': {'count': 0, 'total': 0},
-                'half_year': {'count': 0, 'total': 0},
-                'year': {'count': 0, 'total': 0},
-            }
-        
+            return self._empty_statistics()
+
+    @staticmethod
+    def _empty_statistics():
+        return {
+            'today': {'count': 0, 'total': 0},
+            'month': {'count': 0, 'total': 0},
+            'quarter': {'count': 0, 'total': 0},
+            'half_year': {'count': 0, 'total': 0},
+            'year': {'count': 0, 'total': 0},
+        }
+
 
 class NotificationListView(LoginRequiredMixin, ListView):
     """Notifications list"""
@@ -1181,29 +1010,11 @@ def audit_log_export_excel(request):
             queryset = queryset.filter(timestamp__date__lte=date_to)
         except ValueError:
             pass
-    # استيراد متأخر لتفادي اعتماد xlsxwriter عند استيراد views
-    try:
-        from .export_audit_log_excel import export_audit_log_to_excel
-        return export_audit_log_to_excel(queryset)
-    except Exception as e:
-        # في حال عدم توفر المكتبة، إرجاع CSV بسيط كبديل حتى لا ينكسر النظام
-        import csv, io
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Time', 'User', 'Action Type', 'Content Type', 'Description', 'IP Address'])
-        for log in queryset:
-            writer.writerow([
-                log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                getattr(log.user, 'username', ''),
-                getattr(log, 'action_type', ''),
-                getattr(log, 'content_type', ''),
-                getattr(log, 'description', ''),
-                getattr(log, 'ip_address', ''),
-            ])
-        from django.http import HttpResponse
-        response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename=audit_log.csv'
-        return response
+    # كتابة متدفقة على دفعات (core.exports)؛ CSV عند عدم توفر openpyxl
+    from .export_audit_log_excel import export_audit_log_to_excel, export_audit_log_to_csv
+    if not OPENPYXL_AVAILABLE:
+        return export_audit_log_to_csv(queryset)
+    return export_audit_log_to_excel(queryset)
 
 from django.contrib.auth import logout as django_logout
 from django.utils.translation import get_language
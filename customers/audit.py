@@ -0,0 +1,8 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق customers (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('customers.CustomerSupplier', fields=['name', 'type', 'email', 'phone', 'address', 'tax_number', 'credit_limit', 'is_active']),
+)
@@ -91,8 +91,8 @@ class CustomerSupplier(models.Model):
     @property
     def current_balance(self):
         """حساب الرصيد الحالي - يتم تحديثه تلقائياً من AccountTransaction.save()"""
-        # الرصيد يتم تحديثه تلقائياً عند حفظ أي معاملة
-        # في AccountTransaction.update_customer_supplier_balance()
+        # الرصيد يتم تحديثه بالفرق عند حفظ أو حذف أي معاملة
+        # في accounts.ledger.PartyLedgerService
         # لذلك نرجع self.balance مباشرة الذي يحتوي على الرصيد المحدث
         return self.balance
     
@@ -0,0 +1,8 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق documents (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('documents.Document', fields=['title', 'content_type', 'object_id']),
+)
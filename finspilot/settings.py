@@ -336,6 +336,26 @@ LOCALE_PATHS = [
     BASE_DIR / 'locale',
 ]
 
+# ذاكرة الإعدادات المؤقتة (core.settings_cache)
+# اسم ذاكرة مشتركة من CACHES (مثل Redis) لمزامنة الإبطال بين العمليات؛ بدونها
+# تنتهي القيم في كل عملية بعد SETTINGS_CACHE_TIMEOUT ثانية
+SETTINGS_CACHE_ALIAS = config('SETTINGS_CACHE_ALIAS', default=None)
+SETTINGS_CACHE_TIMEOUT = config('SETTINGS_CACHE_TIMEOUT', default=300, cast=int)
+# بدون ذاكرة مشتركة: أقصى صلاحية للمفاتيح الحساسة (الصلاحيات، أسعار نقطة البيع، دليل الحسابات)
+SETTINGS_CACHE_LOCAL_TIMEOUT = config('SETTINGS_CACHE_LOCAL_TIMEOUT', default=5, cast=int)
+
+# مدة صلاحية كتل لوحة التحكم (core.dashboard) بالثواني؛ تُبطل أيضاً عند تعديل المستندات
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=60, cast=int)
+
+# كاتب سجل المراجعة (core.audit_writer): خيط خلفي يكتب السجلات على دفعات بعد
+# تثبيت المعاملات؛ في الاختبارات تُكتب مباشرة بعد التثبيت
+# النماذج المراجَعة تُعلن في audit.py لكل تطبيق (core.audit_registry)
+AUDIT_LOG_ENABLED = config('AUDIT_LOG_ENABLED', default=True, cast=bool)
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', default=not TESTING, cast=bool)
+AUDIT_LOG_BATCH_SIZE = 200
+AUDIT_LOG_QUEUE_SIZE = 10000
+AUDIT_LOG_FLUSH_INTERVAL = 1.0
+
 # Session settings
 # مدة الجلسة: 24 ساعة (86400 ثانية) لتجنب انتهاء الجلسة السريع
 SESSION_COOKIE_AGE = 86400  # 24 hours
@@ -361,6 +381,10 @@ LOGIN_URL = '/ar/auth/login/'
 LOGIN_REDIRECT_URL = '/ar/'
 LOGOUT_REDIRECT_URL = '/ar/auth/login/'
 
+# ترقيم المستندات: عدد الأرقام التي يحجزها كل عامل دفعة واحدة
+# 1 = ترقيم متصل بلا فجوات، والقيم الأكبر تقلل التزاحم على سجل التسلسل
+DOCUMENT_NUMBER_BLOCK_SIZE = config('DOCUMENT_NUMBER_BLOCK_SIZE', default=1, cast=int)
+
 
 # ===== إعدادات أمنية للإنتاج فقط =====
 # تُفعّل فقط عندما DEBUG=False لضمان أن بيئة التطوير المحلية لا تتأثر
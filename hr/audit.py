@@ -0,0 +1,18 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق hr (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('hr.Employee', fields=['email', 'phone', 'address', 'department', 'position', 'status']),
+    AuditConfig('hr.Department', fields=['name', 'code', 'manager', 'is_active']),
+    AuditConfig('hr.Position', fields=['title', 'code', 'department', 'min_salary', 'max_salary', 'is_active']),
+    AuditConfig('hr.Contract', fields=['employee', 'contract_number', 'contract_type', 'start_date', 'end_date', 'salary', 'allowances', 'status']),
+    AuditConfig('hr.Attendance', fields=['employee', 'date', 'check_in_time', 'check_out_time', 'attendance_type']),
+    AuditConfig('hr.LeaveType', fields=['name', 'code', 'days_per_year', 'is_paid', 'is_active']),
+    AuditConfig('hr.LeaveRequest', fields=['employee', 'leave_type', 'start_date', 'end_date', 'status', 'approved_by']),
+    AuditConfig('hr.PayrollPeriod', fields=['name', 'start_date', 'end_date', 'is_processed']),
+    AuditConfig('hr.PayrollEntry', fields=['payroll_period', 'employee', 'basic_salary', 'allowances', 'deductions', 'net_salary', 'is_paid']),
+    AuditConfig('hr.EmployeeDocument', fields=['employee', 'document_type', 'title']),
+    AuditConfig('hr.EmployeeDeduction', fields=['employee', 'name', 'deduction_type', 'value', 'is_active']),
+)
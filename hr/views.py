@@ -2296,13 +2296,8 @@ def export_employees_excel(request):
         messages.error(request, _('You do not have permission to access HR module.'))
         return redirect('core:dashboard')
     
-    import openpyxl
-    from django.http import HttpResponse
     from datetime import datetime
-    
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = 'Employees'
+    from core.exports import iter_rows, xlsx_response
     
     # Headers
     headers = [
@@ -2310,29 +2305,21 @@ def export_employees_excel(request):
         'Department', 'Position', 'Hire Date', 'Status', 'Basic Salary'
     ]
     
-    for col_num, header in enumerate(headers, 1):
-        worksheet.cell(row=1, column=col_num, value=header)
-    
     # Data
-    employees = Employee.objects.select_related('department', 'position').all()
-    for row_num, employee in enumerate(employees, 2):
-        worksheet.cell(row=row_num, column=1, value=employee.employee_id)
-        worksheet.cell(row=row_num, column=2, value=employee.first_name)
-        worksheet.cell(row=row_num, column=3, value=employee.last_name)
-        worksheet.cell(row=row_num, column=4, value=employee.email)
-        worksheet.cell(row=row_num, column=5, value=employee.phone)
-        worksheet.cell(row=row_num, column=6, value=str(employee.department))
-        worksheet.cell(row=row_num, column=7, value=str(employee.position))
-        worksheet.cell(row=row_num, column=8, value=employee.hire_date)
-        worksheet.cell(row=row_num, column=9, value=employee.get_status_display())
-        worksheet.cell(row=row_num, column=10, value=float(employee.basic_salary))
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    statuses = dict(Employee.STATUS_CHOICES)
+    fields = ('employee_id', 'first_name', 'last_name', 'email', 'phone', 'department__name',
+              'position__title', 'position__department__name', 'hire_date', 'status', 'basic_salary')
+    rows = (
+        [
+            employee_id, first_name, last_name, email, phone, department,
+            f"{position} - {position_department}",  # Position.__str__
+            hire_date, str(statuses.get(status, status)), float(basic_salary),
+        ]
+        for (employee_id, first_name, last_name, email, phone, department, position, position_department,
+             hire_date, status, basic_salary) in iter_rows(Employee.objects.all(), fields)
     )
-    response['Content-Disposition'] = f'attachment; filename=employees_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    workbook.save(response)
+    response = xlsx_response(f'employees_{datetime.now().strftime("%Y%m%d")}.xlsx', rows,
+                             headers=headers, title='Employees')
     
     # Log activity
     create_hr_audit_log(
@@ -2353,13 +2340,8 @@ def export_attendance_excel(request):
         messages.error(request, _('You do not have permission to access HR module.'))
         return redirect('core:dashboard')
     
-    import openpyxl
-    from django.http import HttpResponse
     from datetime import datetime, timedelta
-    
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = 'Attendance'
+    from core.exports import iter_rows, xlsx_response
     
     # Headers
     headers = [
@@ -2367,33 +2349,25 @@ def export_attendance_excel(request):
         'Status', 'Worked Hours', 'Overtime Hours'
     ]
     
-    for col_num, header in enumerate(headers, 1):
-        worksheet.cell(row=1, column=col_num, value=header)
-    
     # Data (last 30 days)
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=30)
     
-    attendance_records = Attendance.objects.filter(
-        date__range=[start_date, end_date]
-    ).select_related('employee')
-    
-    for row_num, attendance in enumerate(attendance_records, 2):
-        worksheet.cell(row=row_num, column=1, value=attendance.employee.employee_id)
-        worksheet.cell(row=row_num, column=2, value=f"{attendance.employee.first_name} {attendance.employee.last_name}")
-        worksheet.cell(row=row_num, column=3, value=attendance.date)
-        worksheet.cell(row=row_num, column=4, value=attendance.check_in_time)
-        worksheet.cell(row=row_num, column=5, value=attendance.check_out_time)
-        worksheet.cell(row=row_num, column=6, value=attendance.get_attendance_type_display())
-        worksheet.cell(row=row_num, column=7, value=float(attendance.worked_hours or 0))
-        worksheet.cell(row=row_num, column=8, value=float(attendance.overtime_hours or 0))
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    attendance_records = Attendance.objects.filter(date__range=[start_date, end_date])
+    attendance_types = dict(Attendance.ATTENDANCE_TYPES)
+    fields = ('employee__employee_id', 'employee__first_name', 'employee__last_name', 'date', 'check_in_time',
+              'check_out_time', 'attendance_type', 'worked_hours', 'overtime_hours')
+    rows = (
+        [
+            employee_id, f"{first_name} {last_name}", attendance_date, check_in, check_out,
+            str(attendance_types.get(attendance_type, attendance_type)), float(worked_hours or 0),
+            float(overtime_hours or 0),
+        ]
+        for (employee_id, first_name, last_name, attendance_date, check_in, check_out, attendance_type,
+             worked_hours, overtime_hours) in iter_rows(attendance_records, fields)
     )
-    response['Content-Disposition'] = f'attachment; filename=attendance_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    workbook.save(response)
+    response = xlsx_response(f'attendance_{datetime.now().strftime("%Y%m%d")}.xlsx', rows,
+                             headers=headers, title='Attendance')
     
     # Log activity
     create_hr_audit_log(
@@ -2414,13 +2388,8 @@ def export_payroll_excel(request):
         messages.error(request, _('You do not have permission to access HR module.'))
         return redirect('core:dashboard')
     
-    import openpyxl
-    from django.http import HttpResponse
     from datetime import datetime
-    
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = 'Payroll'
+    from core.exports import iter_rows, xlsx_response
     
     # Headers
     headers = [
@@ -2429,34 +2398,17 @@ def export_payroll_excel(request):
         'Gross Salary', 'Net Salary'
     ]
     
-    for col_num, header in enumerate(headers, 1):
-        worksheet.cell(row=1, column=col_num, value=header)
-    
     # Data (last 3 months)
-    payroll_entries = PayrollEntry.objects.select_related(
-        'employee', 'payroll_period'
-    ).order_by('-payroll_period__start_date')[:100]  # Last 100 entries
-    
-    for row_num, entry in enumerate(payroll_entries, 2):
-        worksheet.cell(row=row_num, column=1, value=entry.employee.employee_id)
-        worksheet.cell(row=row_num, column=2, value=f"{entry.employee.first_name} {entry.employee.last_name}")
-        worksheet.cell(row=row_num, column=3, value=entry.payroll_period.period_name)
-        worksheet.cell(row=row_num, column=4, value=float(entry.basic_salary))
-        worksheet.cell(row=row_num, column=5, value=float(entry.allowances))
-        worksheet.cell(row=row_num, column=6, value=float(entry.overtime_amount))
-        worksheet.cell(row=row_num, column=7, value=float(entry.bonuses))
-        worksheet.cell(row=row_num, column=8, value=float(entry.deductions))
-        worksheet.cell(row=row_num, column=9, value=float(entry.social_security_deduction))
-        worksheet.cell(row=row_num, column=10, value=float(entry.income_tax))
-        worksheet.cell(row=row_num, column=11, value=float(entry.gross_salary))
-        worksheet.cell(row=row_num, column=12, value=float(entry.net_salary))
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    payroll_entries = PayrollEntry.objects.order_by('-payroll_period__start_date')[:100]  # Last 100 entries
+    fields = ('employee__employee_id', 'employee__first_name', 'employee__last_name', 'payroll_period__name',
+              'basic_salary', 'allowances', 'overtime_amount', 'bonuses', 'deductions',
+              'social_security_deduction', 'income_tax', 'gross_salary', 'net_salary')
+    rows = (
+        [employee_id, f"{first_name} {last_name}", period] + [float(amount) for amount in amounts]
+        for employee_id, first_name, last_name, period, *amounts in iter_rows(payroll_entries, fields)
     )
-    response['Content-Disposition'] = f'attachment; filename=payroll_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    workbook.save(response)
+    response = xlsx_response(f'payroll_{datetime.now().strftime("%Y%m%d")}.xlsx', rows,
+                             headers=headers, title='Payroll')
     
     # Log activity
     create_hr_audit_log(
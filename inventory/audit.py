@@ -0,0 +1,10 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق inventory (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('inventory.Warehouse', fields=['name', 'code', 'parent', 'address', 'is_active']),
+    AuditConfig('inventory.WarehouseTransfer', fields=['transfer_number', 'date', 'from_warehouse', 'to_warehouse', 'notes']),
+    AuditConfig('inventory.WarehouseTransferItem', fields=['transfer', 'product', 'quantity', 'unit_cost']),
+)
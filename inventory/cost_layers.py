@@ -0,0 +1,442 @@
+"""
+طبقات تكلفة FIFO الدائمة للمخزون
+
+لكل حركة دخول بتكلفة موجبة طبقة في InventoryCostLayer تحمل الكمية المتبقية.
+حالة الطبقات دائماً هي نتيجة استهلاك مجموع حركات الخروج للمنتج في المستودع
+من الطبقات الأقدم أولاً (date ثم رقم الحركة) - نفس نتيجة إعادة التشغيل الكامل
+التي كانت تتم في كل استدعاء لـ get_product_fifo_cost.
+
+- الصرف العادي يستهلك من الطبقات المفتوحة الأقدم مباشرة.
+- الحذف والتعديل والترحيل بتاريخ سابق يعيد توزيع طبقات المنتج/المستودع فقط.
+- إعادة البناء الكاملة بأمر rebuild_cost_layers.
+
+الكميات المتبقية تعكس كل حركات الخروج. التكلفة بتاريخ سابق (فاتورة مؤرخة
+بتاريخ قديم) تُحسب من حالة الطبقات في ذلك التاريخ كما في الإعادة الكاملة:
+خروج حتى التاريخ موزع على الطبقات حتى التاريخ. إذا لم يوجد خروج بعد التاريخ
+تُستخدم الكميات المتبقية مباشرة؛ وإلا تُحسب من الطبقة الأحدث للخلف حتى أول
+طبقة مستهلكة بالكامل (بدون المرور على كل التاريخ).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+ZERO = Decimal('0')
+
+
+def _layer_qualifies(movement_type, unit_cost):
+    """الدفعات الواردة بتكلفة موجبة فقط تدخل في FIFO"""
+    return movement_type == 'in' and (unit_cost or ZERO) > 0
+
+
+class CostLayerService:
+    """إدارة طبقات تكلفة FIFO"""
+
+    @staticmethod
+    def open_layers(product, warehouse=None, as_of_date=None):
+        """الطبقات المفتوحة مرتبة من الأقدم - استعلام واحد على الفهرس الجزئي"""
+        from .models import InventoryCostLayer
+
+        layers = InventoryCostLayer.objects.filter(product=product, remaining_qty__gt=0)
+        if warehouse is not None:
+            layers = layers.filter(warehouse=warehouse)
+        if as_of_date:
+            layers = layers.filter(date__lte=as_of_date)
+        return layers.order_by('date', 'movement_id')
+
+    @staticmethod
+    def open_layers_by_product(warehouse=None, product_ids=None):
+        """{product_id: [(الكمية المتبقية، تكلفة الوحدة)]} من الأقدم - استعلام واحد على الفهرس الجزئي"""
+        from .models import InventoryCostLayer
+
+        layers = InventoryCostLayer.objects.filter(remaining_qty__gt=0)
+        if warehouse is not None:
+            layers = layers.filter(warehouse=warehouse)
+        if product_ids is not None:
+            layers = layers.filter(product_id__in=product_ids)
+        result = {}
+        for product_id, remaining_qty, unit_cost in layers.order_by('product_id', 'date', 'movement_id').values_list(
+                'product_id', 'remaining_qty', 'unit_cost').iterator():
+            result.setdefault(product_id, []).append((remaining_qty, unit_cost))
+        return result
+
+    @staticmethod
+    def fifo_value(quantity, layers, fallback_cost):
+        """
+        قيمة كمية المخزون وفق FIFO من الكميات المتبقية في الطبقات المفتوحة (من الأقدم)،
+        وما زاد عنها بسعر التكلفة.
+        """
+        remaining = Decimal(quantity)
+        value = ZERO
+        if remaining <= 0:
+            return value
+        for remaining_qty, unit_cost in layers or ():
+            used = min(remaining, remaining_qty)
+            value += used * unit_cost
+            remaining -= used
+            if remaining <= 0:
+                return value
+        return value + remaining * Decimal(fallback_cost or 0)
+
+    @staticmethod
+    def movement_created(movement):
+        """تطبيق حركة جديدة على الطبقات"""
+        if _layer_qualifies(movement.movement_type, movement.unit_cost):
+            CostLayerService._add_layer(movement)
+        elif movement.movement_type == 'out':
+            CostLayerService.consume(movement.product_id, movement.warehouse_id, movement.quantity)
+
+    @staticmethod
+    def movement_changed(movement, old_state):
+        """
+        تعديل حركة موجودة: مزامنة طبقتها وإعادة توزيع المنتج/المستودع القديم والجديد.
+
+        Args:
+            old_state: قيم MOVEMENT_STATE_FIELDS كما حُمّلت
+        """
+        from .models import InventoryCostLayer, MOVEMENT_STATE_FIELDS
+
+        new_state = tuple(getattr(movement, name) for name in MOVEMENT_STATE_FIELDS)
+        if old_state == new_state:
+            return
+        old = dict(zip(MOVEMENT_STATE_FIELDS, old_state))
+
+        with transaction.atomic():
+            if _layer_qualifies(movement.movement_type, movement.unit_cost):
+                InventoryCostLayer.objects.update_or_create(
+                    movement=movement,
+                    defaults={
+                        'product_id': movement.product_id,
+                        'warehouse_id': movement.warehouse_id,
+                        'date': movement.date,
+                        'quantity': movement.quantity,
+                        'remaining_qty': movement.quantity,
+                        'unit_cost': movement.unit_cost,
+                    },
+                )
+            else:
+                InventoryCostLayer.objects.filter(movement=movement).delete()
+
+            pairs = {(old['product_id'], old['warehouse_id']), (movement.product_id, movement.warehouse_id)}
+            for product_id, warehouse_id in pairs:
+                CostLayerService.reallocate(product_id, warehouse_id)
+
+    @staticmethod
+    def movement_deleted(movement):
+        """بعد حذف الحركة (وطبقتها بالتتابع) يعاد توزيع الاستهلاك"""
+        if movement.movement_type in ('in', 'out'):
+            CostLayerService.reallocate(movement.product_id, movement.warehouse_id)
+
+    @staticmethod
+    def _add_layer(movement):
+        from .models import InventoryCostLayer
+
+        layers = InventoryCostLayer.objects.filter(product_id=movement.product_id,
+                                                   warehouse_id=movement.warehouse_id)
+        # إعادة التوزيع مطلوبة إذا كانت الدفعة بتاريخ سابق لطبقات مستهلكة (الاستهلاك كان سيبدأ منها)
+        # أو إذا لم تبق طبقات مفتوحة مع وجود صرف (عجز سابق يغطيه الوارد الجديد)
+        needs_reallocation = layers.filter(date__gt=movement.date, remaining_qty__lt=F('quantity')).exists()
+        if not needs_reallocation and not layers.filter(remaining_qty__gt=0).exists():
+            needs_reallocation = CostLayerService._has_outbound(movement)
+
+        InventoryCostLayer.objects.create(
+            movement=movement,
+            product_id=movement.product_id,
+            warehouse_id=movement.warehouse_id,
+            date=movement.date,
+            quantity=movement.quantity,
+            remaining_qty=movement.quantity,
+            unit_cost=movement.unit_cost,
+        )
+        if needs_reallocation:
+            CostLayerService.reallocate(movement.product_id, movement.warehouse_id)
+
+    @staticmethod
+    def _has_outbound(movement):
+        from .models import InventoryMovement
+
+        return InventoryMovement.objects.filter(
+            product_id=movement.product_id, warehouse_id=movement.warehouse_id, movement_type='out'
+        ).exists()
+
+    @staticmethod
+    def consume(product_id, warehouse_id, quantity):
+        """استهلاك كمية من الطبقات المفتوحة الأقدم أولاً"""
+        from .models import InventoryCostLayer
+
+        remaining = quantity or ZERO
+        if remaining <= 0:
+            return
+        with transaction.atomic():
+            layers = (InventoryCostLayer.objects
+                      .select_for_update()
+                      .filter(product_id=product_id, warehouse_id=warehouse_id, remaining_qty__gt=0)
+                      .order_by('date', 'movement_id'))
+            for layer in layers.iterator(chunk_size=20):
+                if remaining <= 0:
+                    break
+                taken = min(layer.remaining_qty, remaining)
+                InventoryCostLayer.objects.filter(pk=layer.pk).update(remaining_qty=layer.remaining_qty - taken)
+                remaining -= taken
+
+    @staticmethod
+    def reallocate(product_id, warehouse_id):
+        """
+        إعادة حساب الكميات المتبقية لمنتج/مستودع من مجموع الخروج وترتيب الطبقات.
+        """
+        from .models import InventoryCostLayer, InventoryMovement
+
+        with transaction.atomic():
+            consumed = InventoryMovement.objects.filter(
+                product_id=product_id, warehouse_id=warehouse_id, movement_type='out'
+            ).aggregate(total=Sum('quantity'))['total'] or ZERO
+
+            changed = []
+            layers = (InventoryCostLayer.objects.select_for_update()
+                      .filter(product_id=product_id, warehouse_id=warehouse_id)
+                      .order_by('date', 'movement_id'))
+            for layer in layers:
+                taken = min(layer.quantity, max(consumed, ZERO))
+                consumed -= taken
+                remaining = layer.quantity - taken
+                if remaining != layer.remaining_qty:
+                    layer.remaining_qty = remaining
+                    changed.append(layer)
+            if changed:
+                InventoryCostLayer.objects.bulk_update(changed, ['remaining_qty'], batch_size=500)
+
+    @staticmethod
+    def rebuild(product_ids=None, batch_size=1000):
+        """
+        إعادة بناء الطبقات من حركات المخزون بالكامل.
+
+        Returns:
+            int: عدد الطبقات المنشأة
+        """
+        from .models import InventoryCostLayer, InventoryMovement
+
+        movements = InventoryMovement.objects.filter(movement_type='in', unit_cost__gt=0)
+        existing = InventoryCostLayer.objects.all()
+        if product_ids is not None:
+            movements = movements.filter(product_id__in=product_ids)
+            existing = existing.filter(product_id__in=product_ids)
+
+        with transaction.atomic():
+            existing.delete()
+            layers = [
+                InventoryCostLayer(
+                    movement_id=movement_id, product_id=product_id, warehouse_id=warehouse_id,
+                    date=movement_date, quantity=quantity, remaining_qty=quantity, unit_cost=unit_cost,
+                )
+                for movement_id, product_id, warehouse_id, movement_date, quantity, unit_cost
+                in movements.values_list('id', 'product_id', 'warehouse_id', 'date', 'quantity', 'unit_cost')
+                .iterator()
+            ]
+            InventoryCostLayer.objects.bulk_create(layers, batch_size=batch_size)
+
+            pairs = {(layer.product_id, layer.warehouse_id) for layer in layers}
+            for product_id, warehouse_id in pairs:
+                CostLayerService.reallocate(product_id, warehouse_id)
+        return len(layers)
+
+    @staticmethod
+    def _outbound_as_of(product_ids, warehouse, movement_date, exclude_movement_id=None):
+        """
+        {product_id: (الخروج حتى التاريخ، الخروج بعده)} باستعلام واحد
+        (بدون تاريخ يُحسب كل الخروج في الأول).
+        """
+        from .models import InventoryMovement
+
+        outs = InventoryMovement.objects.filter(product_id__in=product_ids, movement_type='out')
+        if warehouse is not None:
+            outs = outs.filter(warehouse=warehouse)
+        if exclude_movement_id:
+            outs = outs.exclude(pk=exclude_movement_id)
+        if movement_date:
+            rows = outs.values('product_id').annotate(
+                before=Sum('quantity', filter=Q(date__lte=movement_date)),
+                after=Sum('quantity', filter=Q(date__gt=movement_date)),
+            ).order_by()
+        else:
+            rows = outs.values('product_id').annotate(before=Sum('quantity')).order_by()
+        return {row['product_id']: (row['before'] or ZERO, row.get('after') or ZERO) for row in rows}
+
+    @staticmethod
+    def _layers_as_of(product_id, warehouse, movement_date, consumed, exclude_movement_id=None):
+        """
+        الطبقات المفتوحة كما كانت في movement_date: الخروج حتى التاريخ (consumed)
+        موزع على الطبقات حتى التاريخ من الأقدم. تُقرأ الطبقات من الأحدث للخلف
+        حتى أول طبقة مستهلكة بالكامل.
+
+        Returns:
+            list: [[الكمية المتبقية، تكلفة الوحدة]] من الأقدم
+        """
+        from .models import InventoryCostLayer
+
+        layers = InventoryCostLayer.objects.filter(product_id=product_id)
+        if warehouse is not None:
+            layers = layers.filter(warehouse=warehouse)
+        if movement_date:
+            layers = layers.filter(date__lte=movement_date)
+        if exclude_movement_id:
+            layers = layers.exclude(movement_id=exclude_movement_id)
+
+        total = layers.aggregate(total=Sum('quantity'))['total'] or ZERO
+        result = []
+        newer = ZERO
+        for quantity, unit_cost in layers.order_by('-date', '-movement_id').values_list(
+                'quantity', 'unit_cost').iterator(chunk_size=20):
+            older = total - newer - quantity
+            remaining = min(quantity, older + quantity - consumed)
+            if remaining <= 0:
+                break
+            result.append([remaining, unit_cost])
+            newer += quantity
+        result.reverse()
+        return result
+
+    @staticmethod
+    def fifo_cost(product, warehouse, quantity_to_consume, movement_date=None, exclude_movement_id=None):
+        """
+        تكلفة الوحدة لاستهلاك كمية وفق FIFO من الطبقات المفتوحة كما كانت في
+        movement_date (بدون احتساب الحركة exclude_movement_id).
+
+        Returns:
+            Decimal أو None إذا لم توجد أي دفعة واردة
+        """
+        from .models import InventoryCostLayer
+
+        if quantity_to_consume <= 0:
+            quantity_to_consume = Decimal('1')
+
+        layers = None
+        if movement_date or exclude_movement_id:
+            before, after = CostLayerService._outbound_as_of(
+                [product.pk], warehouse, movement_date, exclude_movement_id).get(product.pk, (ZERO, ZERO))
+            if after or exclude_movement_id:
+                # خروج بعد التاريخ (أو حركة مستبعدة): حالة الطبقات في التاريخ
+                layers = CostLayerService._layers_as_of(product.pk, warehouse, movement_date, before,
+                                                        exclude_movement_id)
+        if layers is None:
+            layers = CostLayerService.open_layers(product, warehouse, movement_date).values_list(
+                'remaining_qty', 'unit_cost').iterator(chunk_size=20)
+
+        total_cost = ZERO
+        remaining_to_cost = quantity_to_consume
+        last_unit_cost = None
+        for remaining_qty, unit_cost in layers:
+            qty_from_layer = min(remaining_to_cost, remaining_qty)
+            total_cost += qty_from_layer * unit_cost
+            remaining_to_cost -= qty_from_layer
+            last_unit_cost = unit_cost
+            if remaining_to_cost <= 0:
+                break
+
+        if last_unit_cost is None:
+            # لا طبقات مفتوحة: آخر سعر شراء إن وجد
+            last_layers = InventoryCostLayer.objects.filter(product=product)
+            if warehouse is not None:
+                last_layers = last_layers.filter(warehouse=warehouse)
+            if movement_date:
+                last_layers = last_layers.filter(date__lte=movement_date)
+            if exclude_movement_id:
+                last_layers = last_layers.exclude(movement_id=exclude_movement_id)
+            return last_layers.order_by('-date', '-movement_id').values_list('unit_cost', flat=True).first()
+
+        # إذا لم تكفِ الطبقات المفتوحة، استخدم سعر آخر طبقة
+        if remaining_to_cost > 0:
+            total_cost += remaining_to_cost * last_unit_cost
+
+        return (total_cost / quantity_to_consume).quantize(Decimal('0.001'))
+
+    @staticmethod
+    def fifo_costs(warehouse, demands, movement_date=None):
+        """
+        تكلفة FIFO لعدة بنود دفعة واحدة: استعلام للطبقات المفتوحة لجميع المنتجات
+        واستعلام لآخر تكلفة للمنتجات التي لا طبقات مفتوحة لها. البنود المتتالية
+        لنفس المنتج تستهلك من الطبقات بالترتيب كما لو صُرفت واحدة تلو الأخرى.
+
+        Args:
+            demands: [(product_id, quantity)] بترتيب البنود
+
+        Returns:
+            list: تكلفة الوحدة لكل بند (None إذا لم توجد أي دفعة واردة للمنتج)
+        """
+        from .models import InventoryCostLayer
+
+        product_ids = {product_id for product_id, _quantity in demands}
+        layers = InventoryCostLayer.objects.filter(
+            product_id__in=product_ids, warehouse=warehouse, remaining_qty__gt=0
+        )
+        if movement_date:
+            layers = layers.filter(date__lte=movement_date)
+
+        # المنتجات التي لها خروج بعد التاريخ تُحسب طبقاتها كما كانت في التاريخ
+        back_dated = {}
+        if movement_date:
+            back_dated = {
+                product_id: before
+                for product_id, (before, after) in CostLayerService._outbound_as_of(
+                    product_ids, warehouse, movement_date).items()
+                if after
+            }
+            layers = layers.exclude(product_id__in=list(back_dated))
+
+        open_layers = {}
+        for product_id, remaining_qty, unit_cost in layers.order_by(
+            'product_id', 'date', 'movement_id'
+        ).values_list('product_id', 'remaining_qty', 'unit_cost').iterator():
+            open_layers.setdefault(product_id, []).append([remaining_qty, unit_cost])
+        for product_id, consumed in back_dated.items():
+            product_layers = CostLayerService._layers_as_of(product_id, warehouse, movement_date, consumed)
+            if product_layers:
+                open_layers[product_id] = product_layers
+
+        last_costs = {}
+        missing = product_ids - set(open_layers)
+        if missing:
+            history = InventoryCostLayer.objects.filter(product_id__in=missing, warehouse=warehouse)
+            if movement_date:
+                history = history.filter(date__lte=movement_date)
+            for product_id, unit_cost in history.order_by(
+                'product_id', '-date', '-movement_id'
+            ).values_list('product_id', 'unit_cost').iterator():
+                last_costs.setdefault(product_id, unit_cost)
+
+        costs = []
+        for product_id, quantity in demands:
+            product_layers = open_layers.get(product_id)
+            if not product_layers:
+                costs.append(last_costs.get(product_id))
+                continue
+
+            quantity_to_consume = quantity if quantity > 0 else Decimal('1')
+            total_cost = ZERO
+            remaining_to_cost = quantity_to_consume
+            last_unit_cost = product_layers[-1][1]
+            for layer in product_layers:
+                if remaining_to_cost <= 0:
+                    break
+                if layer[0] <= 0:
+                    continue
+                taken = min(remaining_to_cost, layer[0])
+                total_cost += taken * layer[1]
+                remaining_to_cost -= taken
+                last_unit_cost = layer[1]
+                if quantity > 0:
+                    layer[0] -= taken
+            if remaining_to_cost > 0:
+                total_cost += remaining_to_cost * last_unit_cost
+            costs.append((total_cost / quantity_to_consume).quantize(Decimal('0.001')))
+        return costs
+
+    @staticmethod
+    def movements_created(movements):
+        """تطبيق حركات خروج أُنشئت بـ bulk_create (بدون سيجنالات): استهلاك مجمّع لكل منتج/مستودع"""
+        consumed = {}
+        for movement in movements:
+            if movement.movement_type == 'out':
+                key = (movement.product_id, movement.warehouse_id)
+                consumed[key] = consumed.get(key, ZERO) + (movement.quantity or ZERO)
+        for (product_id, warehouse_id), quantity in consumed.items():
+            CostLayerService.consume(product_id, warehouse_id, quantity)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+from inventory.cost_layers import CostLayerService
+
+
+class Command(BaseCommand):
+    help = ('إعادة بناء طبقات تكلفة FIFO من حركات المخزون (بعد الحركات بتاريخ سابق أو الاستيراد) '
+            'ثم تكليف فواتير المبيعات التي فشل تكليفها بعد التثبيت')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product-code',
+            type=str,
+            help='إعادة بناء طبقات منتج محدد فقط',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='عدد الطبقات في كل دفعة إدخال',
+        )
+
+    def handle(self, *args, **options):
+        product_code = options.get('product_code')
+        product_ids = None
+
+        if product_code:
+            product_ids = list(Product.objects.filter(code=product_code).values_list('id', flat=True))
+            if not product_ids:
+                self.stdout.write(self.style.ERROR(f'لا يوجد منتج بالكود: {product_code}'))
+                return
+
+        self.stdout.write('بدء إعادة بناء طبقات تكلفة FIFO...')
+        created = CostLayerService.rebuild(product_ids=product_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'تم إنشاء {created} طبقة تكلفة'))
+
+        from sales.costing import InvoiceCostingService
+
+        costed, failed = InvoiceCostingService.cost_pending()
+        if costed or failed:
+            self.stdout.write(self.style.SUCCESS(f'تم تكليف {costed} فاتورة مبيعات معلّقة'))
+        if failed:
+            self.stdout.write(self.style.ERROR(f'فشل تكليف {failed} فاتورة - راجع السجل'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from inventory.stock_levels import StockLevelService
+
+
+class Command(BaseCommand):
+    help = 'مطابقة جدول أرصدة المخزون مع حركات المخزون وإصلاح الفروقات'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='تصحيح الأرصدة المختلفة',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='إعادة بناء جدول الأرصدة بالكامل من الحركات',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = StockLevelService.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'تم إعادة بناء {count} رصيد مخزون'))
+            return
+
+        mismatches = StockLevelService.verify(fix=options['fix'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('جميع أرصدة المخزون مطابقة للحركات'))
+            return
+
+        for item in mismatches:
+            self.stdout.write(
+                f"منتج {item['product_id']} / مستودع {item['warehouse_id']}: "
+                f"المخزن {item['stored']} - المتوقع {item['expected']}"
+            )
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'تم تصحيح {len(mismatches)} رصيد'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} رصيد غير مطابق (استخدم --fix للتصحيح)'))
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def build_cost_layers(apps, schema_editor):
+    """بناء طبقات التكلفة للحركات الموجودة: الخروج يستهلك الطبقات الأقدم أولاً"""
+    InventoryMovement = apps.get_model('inventory', 'InventoryMovement')
+    InventoryCostLayer = apps.get_model('inventory', 'InventoryCostLayer')
+
+    consumed = {}
+    for product_id, warehouse_id, quantity in InventoryMovement.objects.filter(
+        movement_type='out'
+    ).values_list('product_id', 'warehouse_id', 'quantity').iterator():
+        key = (product_id, warehouse_id)
+        consumed[key] = consumed.get(key, Decimal('0')) + quantity
+
+    layers = []
+    for movement_id, product_id, warehouse_id, movement_date, quantity, unit_cost in InventoryMovement.objects.filter(
+        movement_type='in', unit_cost__gt=0
+    ).order_by('product_id', 'warehouse_id', 'date', 'id').values_list(
+        'id', 'product_id', 'warehouse_id', 'date', 'quantity', 'unit_cost'
+    ).iterator():
+        key = (product_id, warehouse_id)
+        taken = min(quantity, max(consumed.get(key, Decimal('0')), Decimal('0')))
+        consumed[key] = consumed.get(key, Decimal('0')) - taken
+        layers.append(InventoryCostLayer(
+            movement_id=movement_id, product_id=product_id, warehouse_id=warehouse_id,
+            date=movement_date, quantity=quantity, remaining_qty=quantity - taken, unit_cost=unit_cost,
+        ))
+    InventoryCostLayer.objects.bulk_create(layers, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0037_category_sort_order'),
+        ('inventory', '0014_alter_warehouse_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Quantity')),
+                ('remaining_qty', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Remaining Quantity')),
+                ('unit_cost', models.DecimalField(decimal_places=3, max_digits=15, verbose_name='Unit Cost')),
+                ('movement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layer', to='inventory.inventorymovement', verbose_name='Inventory Movement')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.warehouse', verbose_name='Warehouse')),
+            ],
+            options={
+                'verbose_name': 'Inventory Cost Layer',
+                'verbose_name_plural': 'Inventory Cost Layers',
+                'ordering': ['date', 'movement_id'],
+                'default_permissions': [],
+                'indexes': [models.Index(fields=['product', 'warehouse', 'date', 'movement'], name='inv_cost_layer_fifo_idx'), models.Index(condition=models.Q(('remaining_qty__gt', 0)), fields=['product', 'warehouse', 'date', 'movement'], name='inv_cost_layer_open_idx')],
+            },
+        ),
+        migrations.RunPython(build_cost_layers, migrations.RunPython.noop),
+    ]
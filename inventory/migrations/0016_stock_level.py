@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def build_stock_levels(apps, schema_editor):
+    """حساب أرصدة المخزون الحالية لكل منتج/مستودع من الحركات الموجودة"""
+    InventoryMovement = apps.get_model('inventory', 'InventoryMovement')
+    StockLevel = apps.get_model('inventory', 'StockLevel')
+
+    totals = {}
+    for product_id, warehouse_id, movement_type, reference_type, quantity, total_cost in InventoryMovement.objects.filter(
+        movement_type__in=['in', 'out']
+    ).values_list('product_id', 'warehouse_id', 'movement_type', 'reference_type', 'quantity', 'total_cost').iterator():
+        level = totals.setdefault((product_id, warehouse_id), [Decimal('0'), Decimal('0'), Decimal('0')])
+        sign = 1 if movement_type == 'in' else -1
+        level[0] += sign * quantity
+        level[2] += sign * (total_cost or Decimal('0'))
+        if movement_type == 'in' and reference_type == 'opening_balance':
+            level[1] += quantity
+
+    StockLevel.objects.bulk_create([
+        StockLevel(product_id=product_id, warehouse_id=warehouse_id,
+                   quantity=quantity, opening_quantity=opening_quantity, value=value)
+        for (product_id, warehouse_id), (quantity, opening_quantity, value) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0037_category_sort_order'),
+        ('inventory', '0015_inventory_cost_layer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, default=0, max_digits=15, verbose_name='Quantity')),
+                ('opening_quantity', models.DecimalField(decimal_places=3, default=0, max_digits=15, verbose_name='Opening Balance Quantity')),
+                ('value', models.DecimalField(decimal_places=3, default=0, max_digits=18, verbose_name='Value')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='products.product', verbose_name='Product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='inventory.warehouse', verbose_name='Warehouse')),
+            ],
+            options={
+                'verbose_name': 'Stock Level',
+                'verbose_name_plural': 'Stock Levels',
+                'default_permissions': [],
+                'unique_together': {('product', 'warehouse')},
+            },
+        ),
+        migrations.RunPython(build_stock_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_stock_level'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['product', 'warehouse', 'movement_type', 'date'], name='inv_move_prod_wh_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['reference_type', 'reference_id'], name='inv_move_reference_idx'),
+        ),
+    ]
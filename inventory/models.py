@@ -6,6 +6,9 @@ from decimal import Decimal
 
 User = get_user_model()
 
+# حقول الحركة التي تؤثر على طبقات تكلفة FIFO وأرصدة المخزون
+MOVEMENT_STATE_FIELDS = ('product_id', 'warehouse_id', 'movement_type', 'reference_type', 'date', 'quantity', 'unit_cost')
+
 
 def get_product_average_cost(product, warehouse=None):
     """
@@ -45,106 +48,28 @@ def get_product_fifo_cost(product, warehouse, quantity_to_consume, movement_date
     """
     حساب تكلفة المنتج باستخدام طريقة FIFO (الوارد أولاً يخرج أولاً)
     
-    هذه الدالة تحسب تكلفة الوحدة بناءً على الدفعات المتبقية في المخزون
-    باستخدام منهجية FIFO (الأقدم يخرج أولاً)
+    تُقرأ الدفعات المتبقية من جدول طبقات التكلفة InventoryCostLayer (الطبقات
+    المفتوحة الأقدم فقط) بدلاً من إعادة تشغيل كامل تاريخ الحركات في كل استدعاء
     
     Args:
         product: المنتج
         warehouse: المستودع
         quantity_to_consume: الكمية المراد استهلاكها (لحساب المتوسط)
-        movement_date: تاريخ الحركة (لتجاهل الحركات اللاحقة)
-        exclude_movement_id: معرّف حركة معينة لاستبعادها من الحساب (مفيد عند إعادة الحساب)
+        movement_date: تاريخ الحركة (لتجاهل الدفعات اللاحقة)
+        exclude_movement_id: معرّف حركة دخول لاستبعاد طبقتها من الحساب
     
     Returns:
         Decimal: تكلفة الوحدة بناءً على FIFO
     """
-    from inventory.models import InventoryMovement
-    from datetime import datetime
-    
-    if quantity_to_consume <= 0:
-        quantity_to_consume = Decimal('1')
-    
-    # البحث عن حركات الدخول (المشتريات) مرتبة حسب التاريخ (الأقدم أولاً)
-    query = Q(product=product, movement_type='in', unit_cost__gt=0)
-    
-    if warehouse is not None:
-        query &= Q(warehouse=warehouse)
-    
-    if movement_date:
-        query &= Q(date__lte=movement_date)
-    
-    if exclude_movement_id:
-        query &= ~Q(id=exclude_movement_id)
-    
-    in_movements = InventoryMovement.objects.filter(query).order_by('date', 'id')
-    
-    if not in_movements.exists():
+    from inventory.cost_layers import CostLayerService
+
+    unit_cost = CostLayerService.fifo_cost(
+        product, warehouse, quantity_to_consume,
+        movement_date=movement_date, exclude_movement_id=exclude_movement_id
+    )
+    if unit_cost is None:
         return product.cost_price if hasattr(product, 'cost_price') else Decimal('0')
-    
-    # البحث عن حركات الخروج
-    out_query = Q(product=product, movement_type='out')
-    
-    if warehouse is not None:
-        out_query &= Q(warehouse=warehouse)
-    
-    if movement_date:
-        out_query &= Q(date__lte=movement_date)
-    
-    if exclude_movement_id:
-        out_query &= ~Q(id=exclude_movement_id)
-    
-    out_movements = InventoryMovement.objects.filter(out_query).order_by('date', 'id')
-    
-    # حساب الكميات المتبقية من كل دفعة دخول باستخدام FIFO
-    batches = []  # قائمة الدفعات المتبقية: [(quantity, unit_cost), ...]
-    
-    for in_movement in in_movements:
-        batches.append({
-            'quantity': in_movement.quantity,
-            'unit_cost': in_movement.unit_cost,
-            'date': in_movement.date,
-            'id': in_movement.id
-        })
-    
-    # طرح حركات الخروج من الدفعات حسب FIFO (الأقدم أولاً)
-    for out_movement in out_movements:
-        remaining_out = out_movement.quantity
-        
-        for batch in batches:
-            if remaining_out <= 0:
-                break
-            
-            if batch['quantity'] > 0:
-                consumed = min(batch['quantity'], remaining_out)
-                batch['quantity'] -= consumed
-                remaining_out -= consumed
-    
-    # إزالة الدفعات الفارغة
-    batches = [b for b in batches if b['quantity'] > 0]
-    
-    if not batches:
-        # إذا لم يكن هناك دفعات متبقية، استخدم آخر سعر شراء
-        return in_movements.last().unit_cost
-    
-    # حساب التكلفة من الدفعات المتبقية حسب FIFO
-    total_cost = Decimal('0')
-    remaining_to_cost = quantity_to_consume
-    
-    for batch in batches:
-        if remaining_to_cost <= 0:
-            break
-        
-        qty_from_batch = min(remaining_to_cost, batch['quantity'])
-        total_cost += qty_from_batch * batch['unit_cost']
-        remaining_to_cost -= qty_from_batch
-    
-    # إذا لم تكفِ الدفعات المتبقية، استخدم آخر سعر من آخر دفعة
-    if remaining_to_cost > 0:
-        last_batch = batches[-1]
-        total_cost += remaining_to_cost * last_batch['unit_cost']
-    
-    # إرجاع متوسط تكلفة الوحدة
-    return (total_cost / quantity_to_consume).quantize(Decimal('0.001'))
+    return unit_cost
 
 
 class Warehouse(models.Model):
@@ -242,11 +167,24 @@ class InventoryMovement(models.Model):
         verbose_name = _('Inventory Movement')
         verbose_name_plural = _('Inventory Movements')
         ordering = ['-date', '-movement_number']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'movement_type', 'date'], name='inv_move_prod_wh_type_idx'),
+            models.Index(fields=['reference_type', 'reference_id'], name='inv_move_reference_idx'),
+        ]
         default_permissions = []
 
     def __str__(self):
         return f"{self.movement_number} - {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # القيم كما حُمّلت - لتحديث طبقات التكلفة وأرصدة المخزون بالفرق عند التعديل أو الحذف
+        loaded = instance.__dict__
+        if all(name in loaded for name in MOVEMENT_STATE_FIELDS):
+            instance._movement_state = tuple(loaded[name] for name in MOVEMENT_STATE_FIELDS)
+        return instance
+
     def save(self, *args, **kwargs):
         # حساب التكلفة الإجمالية تلقائياً
         if self.quantity and self.unit_cost:
@@ -308,28 +246,85 @@ class InventoryMovement(models.Model):
         except Exception:
             return None
 
+    @classmethod
+    def next_movement_numbers(cls, count=1):
+        """أرقام الحركات التالية لليوم (MOV-YYYYMMDD-NNNN) - للإنشاء الفردي والمجمّع"""
+        from django.utils import timezone
+        current_date = timezone.now().strftime('%Y%m%d')
+        last_movement = cls.objects.filter(
+            movement_number__startswith=f'MOV-{current_date}'
+        ).order_by('-movement_number').first()
+        
+        if last_movement:
+            last_number = int(last_movement.movement_number.split('-')[-1])
+        else:
+            last_number = 0
+        return [f'MOV-{current_date}-{last_number + index:04d}' for index in range(1, count + 1)]
+
     def save(self, *args, **kwargs):
         # إنشاء رقم الحركة تلقائياً إذا لم يكن موجوداً
         if not self.movement_number:
-            from django.utils import timezone
-            current_date = timezone.now().strftime('%Y%m%d')
-            last_movement = InventoryMovement.objects.filter(
-                movement_number__startswith=f'MOV-{current_date}'
-            ).order_by('-movement_number').first()
-            
-            if last_movement:
-                last_number = int(last_movement.movement_number.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-                
-            self.movement_number = f'MOV-{current_date}-{new_number:04d}'
+            self.movement_number = InventoryMovement.next_movement_numbers()[0]
         
         # حساب التكلفة الإجمالية تلقائياً
         self.total_cost = self.quantity * self.unit_cost
         super().save(*args, **kwargs)
 
 
+class InventoryCostLayer(models.Model):
+    """
+    طبقة تكلفة FIFO: دفعة واردة واحدة بكميتها المتبقية.
+    تُستهلك الطبقات الأقدم أولاً عند الصرف وتُعاد توزيعها عند الحذف أو الترحيل بتاريخ سابق.
+    """
+    movement = models.OneToOneField(InventoryMovement, on_delete=models.CASCADE,
+                                    verbose_name=_('Inventory Movement'), related_name='cost_layer')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, verbose_name=_('Product'))
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name=_('Warehouse'))
+    date = models.DateField(_('Date'))
+    quantity = models.DecimalField(_('Quantity'), max_digits=10, decimal_places=3)
+    remaining_qty = models.DecimalField(_('Remaining Quantity'), max_digits=10, decimal_places=3)
+    unit_cost = models.DecimalField(_('Unit Cost'), max_digits=15, decimal_places=3)
+
+    class Meta:
+        verbose_name = _('Inventory Cost Layer')
+        verbose_name_plural = _('Inventory Cost Layers')
+        ordering = ['date', 'movement_id']
+        default_permissions = []
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'date', 'movement'], name='inv_cost_layer_fifo_idx'),
+            models.Index(fields=['product', 'warehouse', 'date', 'movement'], name='inv_cost_layer_open_idx',
+                         condition=Q(remaining_qty__gt=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.warehouse_id}: {self.remaining_qty}/{self.quantity}"
+
+
+class StockLevel(models.Model):
+    """
+    رصيد المخزون الحالي لكل منتج في كل مستودع.
+    يُحدّث بالفروق مع حركات المخزون (دخول - خروج) بدلاً من تجميع الحركات عند كل قراءة.
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE,
+                                verbose_name=_('Product'), related_name='stock_levels')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE,
+                                  verbose_name=_('Warehouse'), related_name='stock_levels')
+    quantity = models.DecimalField(_('Quantity'), max_digits=15, decimal_places=3, default=0)
+    # كمية حركات الرصيد الافتتاحي - الرصيد الافتتاحي يُحتسب من بيانات المنتج
+    opening_quantity = models.DecimalField(_('Opening Balance Quantity'), max_digits=15, decimal_places=3, default=0)
+    value = models.DecimalField(_('Value'), max_digits=18, decimal_places=3, default=0)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Stock Level')
+        verbose_name_plural = _('Stock Levels')
+        unique_together = ['product', 'warehouse']
+        default_permissions = []
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.warehouse_id}: {self.quantity}"
+
+
 class WarehouseTransfer(models.Model):
     """تحويل المستودعات"""
     transfer_number = models.CharField(_('Transfer Number'), max_length=50, unique=True)
@@ -1,11 +1,14 @@
 """
 إشارات نظام المخزون
 تنشئ الحسابات المحاسبية تلقائياً عند إنشاء المستودعات
+وتحدث طبقات تكلفة FIFO مع حركات المخزون
 """
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Warehouse
+from .models import Warehouse, InventoryMovement, MOVEMENT_STATE_FIELDS
+from .cost_layers import CostLayerService
+from .stock_levels import StockLevelService
 
 @receiver(post_save, sender=Warehouse)
 def create_warehouse_account(sender, instance, created, **kwargs):
@@ -86,4 +89,53 @@ def delete_warehouse_account(sender, instance, **kwargs):
     except Exception as e:
         print(f"❌ خطأ في حذف/تعطيل حساب المستودع: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+
+def _is_restoring():
+    try:
+        from backup.restore_context import is_restoring
+        return is_restoring()
+    except ImportError:
+        return False
+
+
+def _movement_state(instance):
+    return tuple(getattr(instance, name) for name in MOVEMENT_STATE_FIELDS)
+
+
+@receiver(pre_save, sender=InventoryMovement)
+def remember_movement_state(sender, instance, **kwargs):
+    """جلب القيم القديمة فقط إذا لم تُحمّل الحركة من قاعدة البيانات بكامل حقولها"""
+    if instance._state.adding or hasattr(instance, '_movement_state') or _is_restoring():
+        return
+    old_state = InventoryMovement.objects.filter(pk=instance.pk).values_list(*MOVEMENT_STATE_FIELDS).first()
+    if old_state:
+        instance._movement_state = tuple(old_state)
+
+
+@receiver(post_save, sender=InventoryMovement)
+def update_stock_on_movement_save(sender, instance, created, **kwargs):
+    """تحديث طبقات التكلفة وأرصدة المخزون بالفرق مع حفظ الحركة"""
+    if _is_restoring():
+        return
+
+    if created:
+        CostLayerService.movement_created(instance)
+        StockLevelService.movement_saved(instance, None)
+    else:
+        old_state = getattr(instance, '_movement_state', None)
+        if old_state is not None:
+            CostLayerService.movement_changed(instance, old_state)
+        StockLevelService.movement_saved(instance, old_state)
+    instance._movement_state = _movement_state(instance)
+
+
+@receiver(post_delete, sender=InventoryMovement)
+def update_stock_on_movement_delete(sender, instance, **kwargs):
+    """إعادة توزيع طبقات التكلفة وعكس أثر الحركة على أرصدة المخزون بعد الحذف"""
+    if _is_restoring():
+        return
+
+    CostLayerService.movement_deleted(instance)
+    StockLevelService.movement_deleted(instance, getattr(instance, '_movement_state', None) or _movement_state(instance))
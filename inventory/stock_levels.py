@@ -0,0 +1,226 @@
+"""
+أرصدة المخزون المادية (StockLevel)
+
+لكل منتج في كل مستودع سجل واحد بالكمية (دخول - خروج) وقيمتها. يُحدّث بالفروق
+مع إنشاء حركات المخزون وتعديلها وحذفها، فتصبح قراءة المخزون استعلاماً واحداً
+بدلاً من مجموعين على InventoryMovement لكل منتج.
+
+- كمية حركات الرصيد الافتتاحي تُحفظ منفصلة: الرصيد الحالي للمنتج يعتمد على
+  حقل opening_balance_quantity بدلاً منها (نفس قاعدة Product.current_stock).
+- المطابقة وإعادة البناء بأمر verify_stock_levels.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum, Case, When, DecimalField, Value
+from django.utils import timezone
+
+ZERO = Decimal('0')
+
+
+def _new_deltas():
+    return defaultdict(lambda: [ZERO, ZERO, ZERO])
+
+
+def _contribution(deltas, state, sign):
+    """أثر حركة على رصيد منتج/مستودع: (الكمية، كمية الافتتاحي، القيمة)"""
+    product_id, warehouse_id, movement_type, reference_type, _date, quantity, unit_cost = state
+    if movement_type not in ('in', 'out') or product_id is None or warehouse_id is None:
+        return
+    quantity = quantity or ZERO
+    direction = sign if movement_type == 'in' else -sign
+    delta = deltas[(product_id, warehouse_id)]
+    delta[0] += direction * quantity
+    # نفس تقريب total_cost المحفوظ في الحركة
+    delta[2] += direction * (quantity * (unit_cost or ZERO)).quantize(Decimal('0.001'))
+    if movement_type == 'in' and reference_type == 'opening_balance':
+        delta[1] += sign * quantity
+
+
+class StockLevelService:
+    """تحديث وقراءة أرصدة المخزون"""
+
+    @staticmethod
+    def movement_saved(movement, old_state):
+        from .models import MOVEMENT_STATE_FIELDS
+
+        deltas = _new_deltas()
+        if old_state is not None:
+            _contribution(deltas, old_state, -1)
+        _contribution(deltas, tuple(getattr(movement, name) for name in MOVEMENT_STATE_FIELDS), 1)
+        StockLevelService.apply(deltas)
+
+    @staticmethod
+    def movement_deleted(movement, state):
+        deltas = _new_deltas()
+        _contribution(deltas, state, -1)
+        StockLevelService.apply(deltas)
+
+    @staticmethod
+    def movements_created(movements):
+        """تطبيق حركات أُنشئت بـ bulk_create (بدون سيجنالات) بتحديث واحد لكل منتج/مستودع"""
+        from .models import MOVEMENT_STATE_FIELDS
+
+        deltas = _new_deltas()
+        for movement in movements:
+            _contribution(deltas, tuple(getattr(movement, name) for name in MOVEMENT_STATE_FIELDS), 1)
+        StockLevelService.apply(deltas)
+
+    @staticmethod
+    def apply(deltas):
+        """
+        تطبيق فروق {(product_id, warehouse_id): [quantity, opening_quantity, value]}.
+        """
+        from .models import StockLevel
+
+        now = timezone.now()
+        for (product_id, warehouse_id), (quantity, opening_quantity, value) in deltas.items():
+            if not quantity and not opening_quantity and not value:
+                continue
+            levels = StockLevel.objects.filter(product_id=product_id, warehouse_id=warehouse_id)
+            changes = {
+                'quantity': F('quantity') + quantity,
+                'opening_quantity': F('opening_quantity') + opening_quantity,
+                'value': F('value') + value,
+                'updated_at': now,
+            }
+            if levels.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    StockLevel.objects.create(product_id=product_id, warehouse_id=warehouse_id,
+                                              quantity=quantity, opening_quantity=opening_quantity, value=value)
+            except IntegrityError:
+                # أُنشئ السجل من معاملة متزامنة
+                levels.update(**changes)
+
+    @staticmethod
+    def levels(product_ids=None, warehouse=None):
+        """
+        أرصدة المنتجات باستعلام واحد.
+
+        Returns:
+            dict: {product_id: {'quantity', 'opening_quantity', 'value'}} مجمعة على المستودعات
+                  (أو لمستودع واحد إذا حُدد)
+        """
+        from .models import StockLevel
+
+        rows = StockLevel.objects.all()
+        if product_ids is not None:
+            rows = rows.filter(product_id__in=product_ids)
+        if warehouse is not None:
+            rows = rows.filter(warehouse=warehouse)
+        result = {}
+        for row in rows.values('product_id').annotate(
+            quantity=Sum('quantity'), opening_quantity=Sum('opening_quantity'), value=Sum('value')
+        ).order_by():
+            result[row['product_id']] = row
+        return result
+
+    @staticmethod
+    def on_hand(product, levels=None, warehouse=None):
+        """
+        الرصيد الحالي بنفس قاعدة Product.current_stock: حركات الدخول (بدون الافتتاحي)
+        - الخروج + الرصيد الافتتاحي من بيانات المنتج (في مستودعه فقط عند تحديد مستودع).
+        """
+        if levels is None:
+            levels = StockLevelService.levels([product.id], warehouse)
+        row = levels.get(product.id)
+        moved = (row['quantity'] - row['opening_quantity']) if row else ZERO
+        if warehouse is not None and product.opening_balance_warehouse_id != warehouse.id:
+            return moved
+        return moved + (product.opening_balance_quantity or ZERO)
+
+    @staticmethod
+    def compute_expected():
+        """
+        إعادة حساب الأرصدة من الحركات باستعلام مجمّع واحد.
+
+        Returns:
+            dict: {(product_id, warehouse_id): (quantity, opening_quantity, value)}
+        """
+        from .models import InventoryMovement
+
+        decimal_field = DecimalField(max_digits=18, decimal_places=3)
+        signed = Case(When(movement_type='in', then=F('quantity')),
+                      default=-F('quantity'), output_field=decimal_field)
+        signed_value = Case(When(movement_type='in', then=F('total_cost')),
+                            default=-F('total_cost'), output_field=decimal_field)
+        opening = Case(When(reference_type='opening_balance', movement_type='in', then=F('quantity')),
+                       default=Value(ZERO), output_field=decimal_field)
+
+        rows = InventoryMovement.objects.filter(movement_type__in=['in', 'out']).values(
+            'product_id', 'warehouse_id'
+        ).annotate(
+            signed_quantity=Sum(signed), opening_total=Sum(opening), signed_value=Sum(signed_value)
+        ).order_by()
+        return {
+            (row['product_id'], row['warehouse_id']): (
+                row['signed_quantity'] or ZERO, row['opening_total'] or ZERO, row['signed_value'] or ZERO
+            )
+            for row in rows
+        }
+
+    @staticmethod
+    def verify(fix=False):
+        """
+        مطابقة الأرصدة المخزنة مع الحركات.
+
+        Returns:
+            list: [{'product_id', 'warehouse_id', 'stored', 'expected'}]
+        """
+        from .models import StockLevel
+
+        expected = StockLevelService.compute_expected()
+        stored = {
+            (level.product_id, level.warehouse_id): level
+            for level in StockLevel.objects.all()
+        }
+
+        mismatches = []
+        for key in set(expected) | set(stored):
+            level = stored.get(key)
+            stored_values = (level.quantity, level.opening_quantity, level.value) if level else (ZERO, ZERO, ZERO)
+            expected_values = expected.get(key, (ZERO, ZERO, ZERO))
+            if stored_values != expected_values:
+                mismatches.append({
+                    'product_id': key[0],
+                    'warehouse_id': key[1],
+                    'stored': stored_values,
+                    'expected': expected_values,
+                })
+
+        if fix and mismatches:
+            with transaction.atomic():
+                to_update = []
+                to_create = []
+                for item in mismatches:
+                    quantity, opening_quantity, value = item['expected']
+                    level = stored.get((item['product_id'], item['warehouse_id']))
+                    if level:
+                        level.quantity, level.opening_quantity, level.value = quantity, opening_quantity, value
+                        to_update.append(level)
+                    else:
+                        to_create.append(StockLevel(
+                            product_id=item['product_id'], warehouse_id=item['warehouse_id'],
+                            quantity=quantity, opening_quantity=opening_quantity, value=value,
+                        ))
+                StockLevel.objects.bulk_update(to_update, ['quantity', 'opening_quantity', 'value'], batch_size=500)
+                StockLevel.objects.bulk_create(to_create, batch_size=500)
+        return mismatches
+
+    @staticmethod
+    def rebuild():
+        """إعادة بناء جدول الأرصدة بالكامل من الحركات"""
+        from .models import StockLevel
+
+        expected = StockLevelService.compute_expected()
+        with transaction.atomic():
+            StockLevel.objects.all().delete()
+            StockLevel.objects.bulk_create([
+                StockLevel(product_id=product_id, warehouse_id=warehouse_id,
+                           quantity=quantity, opening_quantity=opening_quantity, value=value)
+                for (product_id, warehouse_id), (quantity, opening_quantity, value) in expected.items()
+            ], batch_size=1000)
+        return len(expected)
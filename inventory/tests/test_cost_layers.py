@@ -0,0 +1,78 @@
+"""
+اختبارات طبقات تكلفة FIFO
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from inventory.cost_layers import CostLayerService
+from inventory.models import InventoryCostLayer, InventoryMovement, Warehouse, get_product_fifo_cost
+from products.models import Category, Product
+
+User = get_user_model()
+
+
+class CostLayerServiceTests(TestCase):
+    """الاستهلاك والاستعادة وإعادة البناء"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='fifo_user', password='test_password')
+        self.warehouse = Warehouse.objects.create(name='مستودع FIFO', code='FIFO-WH')
+        category = Category.objects.create(name='تصنيف FIFO')
+        self.product = Product.objects.create(code='FIFO-1', name='منتج FIFO', category=category,
+                                              sale_price=Decimal('10.000'), cost_price=Decimal('3.000'))
+
+    def _move(self, movement_type, quantity, unit_cost=Decimal('0'), movement_date=date(2024, 1, 1)):
+        return InventoryMovement.objects.create(
+            date=movement_date, product=self.product, warehouse=self.warehouse,
+            movement_type=movement_type, reference_type='adjustment', reference_id=1,
+            quantity=Decimal(quantity), unit_cost=Decimal(unit_cost), created_by=self.user
+        )
+
+    def _remaining(self):
+        return list(InventoryCostLayer.objects.filter(product=self.product)
+                    .order_by('date', 'movement_id').values_list('remaining_qty', flat=True))
+
+    def test_sale_consumes_oldest_layers(self):
+        """الصرف يستهلك الدفعات الأقدم وتكلفة البيع من الطبقات المفتوحة"""
+        self._move('in', '2', '5')
+        self._move('in', '2', '90')
+        self.assertEqual(get_product_fifo_cost(self.product, self.warehouse, Decimal('1')), Decimal('5.000'))
+
+        self._move('out', '3')
+        self.assertEqual(self._remaining(), [Decimal('0'), Decimal('1')])
+        with self.assertNumQueries(1):
+            cost = get_product_fifo_cost(self.product, self.warehouse, Decimal('1'))
+        self.assertEqual(cost, Decimal('90.000'))
+
+    def test_back_dated_cost_uses_layers_as_of_date(self):
+        """التكلفة بتاريخ سابق لا تتأثر بالصرف المؤرخ بعده"""
+        self._move('in', '2', '5', date(2024, 1, 1))
+        self._move('in', '2', '90', date(2024, 1, 5))
+        self._move('out', '3', movement_date=date(2024, 2, 1))
+
+        as_of = date(2024, 1, 10)
+        self.assertEqual(get_product_fifo_cost(self.product, self.warehouse, Decimal('2'), as_of), Decimal('5.000'))
+        self.assertEqual(get_product_fifo_cost(self.product, self.warehouse, Decimal('2')), Decimal('90.000'))
+        self.assertEqual(CostLayerService.fifo_costs(self.warehouse, [(self.product.pk, Decimal('3'))], as_of),
+                         [Decimal('33.333')])
+
+    def test_delete_and_back_dated_receipt_match_rebuild(self):
+        """الحذف والوارد بتاريخ سابق ينتجان نفس حالة إعادة البناء"""
+        self._move('in', '10', '5', date(2024, 2, 1))
+        sale = self._move('out', '4', movement_date=date(2024, 2, 5))
+        self._move('out', '8', movement_date=date(2024, 2, 6))
+        self._move('in', '5', '2', date(2024, 1, 15))
+        self._move('in', '3', '7', date(2024, 3, 1))
+        sale.delete()
+
+        incremental = self._remaining()
+        CostLayerService.rebuild()
+        self.assertEqual(incremental, self._remaining())
+        self.assertEqual(incremental, [Decimal('0'), Decimal('7'), Decimal('3')])
+
+    def test_no_layers_falls_back_to_product_cost(self):
+        """بدون دفعات واردة تُستخدم تكلفة المنتج"""
+        self.assertEqual(get_product_fifo_cost(self.product, self.warehouse, Decimal('1')), Decimal('3.000'))
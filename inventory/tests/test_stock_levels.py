@@ -0,0 +1,107 @@
+"""
+اختبارات أرصدة المخزون (StockLevel)
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.models import InventoryMovement, StockLevel, Warehouse
+from inventory.stock_levels import StockLevelService
+from products.models import Category, Product
+from settings.models import SuperadminSettings
+
+User = get_user_model()
+
+
+class StockLevelServiceTests(TestCase):
+    """تحديث الأرصدة بالفروق ومطابقتها مع الحركات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock_user', password='test_password')
+        self.warehouse = Warehouse.objects.create(name='مستودع الأرصدة', code='SL-WH')
+        self.other_warehouse = Warehouse.objects.create(name='مستودع ثاني', code='SL-WH2')
+        self.category = Category.objects.create(name='تصنيف الأرصدة')
+        self.product = self._product('SL-1')
+
+    def _product(self, code):
+        return Product.objects.create(code=code, name=f'منتج {code}', category=self.category,
+                                      sale_price=Decimal('10.000'), cost_price=Decimal('3.000'))
+
+    def _move(self, movement_type, quantity, unit_cost='0', product=None, warehouse=None,
+              reference_type='adjustment'):
+        return InventoryMovement.objects.create(
+            date=date(2024, 1, 1), product=product or self.product, warehouse=warehouse or self.warehouse,
+            movement_type=movement_type, reference_type=reference_type, reference_id=1,
+            quantity=Decimal(quantity), unit_cost=Decimal(unit_cost), created_by=self.user
+        )
+
+    def test_create_update_delete_match_movements(self):
+        """الإنشاء والتعديل والنقل بين المستودعات والحذف تبقي الأرصدة مطابقة"""
+        receipt = self._move('in', '10', '4')
+        sale = self._move('out', '3', '4')
+        self._move('in', '2', '5', reference_type='opening_balance')
+
+        level = StockLevel.objects.get(product=self.product, warehouse=self.warehouse)
+        self.assertEqual(level.quantity, Decimal('9'))
+        self.assertEqual(level.opening_quantity, Decimal('2'))
+        self.assertEqual(level.value, Decimal('38'))
+        self.assertEqual(self.product.current_stock, Decimal('7'))
+
+        receipt.quantity = Decimal('12')
+        receipt.save()
+        sale.warehouse = self.other_warehouse
+        sale.save()
+        sale.delete()
+
+        self.assertEqual(StockLevelService.verify(), [])
+        level.refresh_from_db()
+        self.assertEqual(level.quantity, Decimal('14'))
+
+    def test_verify_fix_repairs_drift(self):
+        self._move('in', '5', '2')
+        StockLevel.objects.filter(product=self.product).update(quantity=Decimal('1'))
+
+        self.assertEqual(len(StockLevelService.verify()), 1)
+        StockLevelService.verify(fix=True)
+        self.assertEqual(StockLevelService.verify(), [])
+
+    def test_inventory_list_queries_do_not_grow_with_products(self):
+        """عدد استعلامات قائمة المخزون ثابت مهما زاد عدد المنتجات"""
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self._move('in', '5', '2')
+        # الإعدادات التي تُنشأ عند أول قراءة ثم الذاكرة المؤقتة
+        SuperadminSettings.get_settings()
+        self.client.get(reverse('inventory:list'))
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('inventory:list'))
+        for index in range(5):
+            self._move('in', '5', '2', product=self._product(f'SL-EXTRA-{index}'))
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('inventory:list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['inventory_items']), 6)
+
+        self.assertEqual(len(few), len(many))
+
+    def test_inventory_value_is_fifo_from_open_cost_layers(self):
+        """قيمة المخزون المعروضة من الكميات المتبقية في طبقات التكلفة لا من متوسط الحركات"""
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self._move('in', '2', '5')
+        self._move('in', '2', '90')
+        self._move('out', '3')
+
+        response = self.client.get(reverse('inventory:list'))
+        item, = [item for item in response.context['inventory_items'] if item['product_id'] == self.product.pk]
+        self.assertEqual(item['quantity'], Decimal('1'))
+        self.assertEqual(item['value'], 90.0)
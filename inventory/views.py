@@ -2,14 +2,17 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView, View, DetailView
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Q, Max
+from decimal import Decimal
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.http import JsonResponse
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.utils.translation import gettext as _
-from .models import Warehouse, InventoryMovement, WarehouseTransfer, WarehouseTransferItem
+from .models import Warehouse, InventoryMovement, WarehouseTransfer, WarehouseTransferItem, StockLevel
+from .cost_layers import CostLayerService
+from .stock_levels import StockLevelService
 from products.models import Product
 from core.models import AuditLog
 from .permissions import CanViewInventoryMixin, CanAddInventoryMixin, CanEditInventoryMixin, CanDeleteInventoryMixin
@@ -44,37 +47,32 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
         
         # Get products - filter by warehouse if selected
         if selected_warehouse:
-            # Get products that have movements in this warehouse
-            product_ids = InventoryMovement.objects.filter(
+            # Get products that have stock levels (movements) in this warehouse
+            product_ids = StockLevel.objects.filter(
                 warehouse=selected_warehouse
-            ).values_list('product_id', flat=True).distinct()
+            ).values_list('product_id', flat=True)
             products = Product.objects.filter(is_active=True, id__in=product_ids)
         else:
             # Get all products
             products = Product.objects.filter(is_active=True)
-        context['total_products'] = products.count()
+        products = list(products)
+        context['total_products'] = len(products)
+        
+        # Stock levels for all products in one query (instead of two aggregates per product)
+        levels = StockLevelService.levels(warehouse=selected_warehouse)
+        # Open FIFO cost layers for valuation in one query
+        open_layers = CostLayerService.open_layers_by_product(warehouse=selected_warehouse)
         
         # Calculate inventory statistics
         total_current_stock = 0
         low_stock_items = []
+        inventory_items = []
         
         for product in products:
-            # Calculate current stock for this product
-            movement_filter = {'product': product}
-            if selected_warehouse:
-                movement_filter['warehouse'] = selected_warehouse
-            
-            in_movements = InventoryMovement.objects.filter(
-                movement_type='in',
-                **movement_filter
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            out_movements = InventoryMovement.objects.filter(
-                movement_type='out',
-                **movement_filter
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            current_stock = in_movements - out_movements + product.opening_balance_quantity
+            # Same logic as before: movements excluding opening balance + product opening balance
+            row = levels.get(product.id)
+            moved = (row['quantity'] - row['opening_quantity']) if row else 0
+            current_stock = moved + product.opening_balance_quantity
             
             # Add to total stock if positive
             if current_stock > 0:
@@ -86,37 +84,6 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
                     'product': product,
                     'current_stock': current_stock
                 })
-        
-        context['total_items'] = int(total_current_stock)
-        context['low_stock_items'] = len(low_stock_items)
-        
-        # Get today's movements
-        today = timezone.now().date()
-        today_movements_filter = {'date': today}
-        if selected_warehouse:
-            today_movements_filter['warehouse'] = selected_warehouse
-        today_movements = InventoryMovement.objects.filter(**today_movements_filter).count()
-        context['today_movements'] = today_movements
-        
-        # Get inventory items with current stock levels
-        inventory_items = []
-        for product in products:  # Show products filtered by warehouse if selected
-            # Calculate current stock for this product
-            movement_filter = {'product': product}
-            if selected_warehouse:
-                movement_filter['warehouse'] = selected_warehouse
-            
-            in_movements = InventoryMovement.objects.filter(
-                movement_type='in',
-                **movement_filter
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            out_movements = InventoryMovement.objects.filter(
-                movement_type='out',
-                **movement_filter
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            current_stock = in_movements - out_movements + product.opening_balance_quantity
             
             # Determine stock level
             if current_stock <= 0:
@@ -128,32 +95,8 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
             else:
                 stock_level = 'good'
             
-            # --- تعديل احتساب القيمة بناءً على تكلفة الشراء الفعلية المتبقية من فواتير الشراء مع تضمين الرصيد الافتتاحي ---
-            from purchases.models import PurchaseInvoiceItem
-            from decimal import Decimal
-            remaining_qty = Decimal(current_stock)
-            value = Decimal('0.0')
-            
-            # أولاً، استخدم الرصيد الافتتاحي إذا كان موجوداً
-            if product.opening_balance_quantity > 0 and remaining_qty > 0:
-                used_qty = min(Decimal(product.opening_balance_quantity), remaining_qty)
-                # حساب تكلفة الوحدة من الرصيد الافتتاحي
-                unit_cost = Decimal(product.opening_balance_cost) / Decimal(product.opening_balance_quantity) if product.opening_balance_quantity > 0 else Decimal('0')
-                value += used_qty * unit_cost
-                remaining_qty -= used_qty
-            
-            # ثم، جلب عناصر فواتير الشراء الأقدم فالأحدث
-            purchase_items = PurchaseInvoiceItem.objects.filter(product=product).order_by('invoice__date', 'invoice__id')
-            for item in purchase_items:
-                if remaining_qty <= 0:
-                    break
-                used_qty = min(item.quantity, remaining_qty)
-                value += used_qty * item.unit_price
-                remaining_qty -= used_qty
-            # إذا بقي كمية لم يتم تغطيتها من فواتير الشراء (حالة بيانات ناقصة)، استخدم سعر التكلفة الافتراضي
-            if remaining_qty > 0:
-                value += remaining_qty * Decimal(product.cost_price)
-            # --- نهاية التعديل ---
+            # FIFO value from the remaining quantities of the cost layers, falling back to the product cost price
+            value = CostLayerService.fifo_value(current_stock, open_layers.get(product.id), product.cost_price)
             inventory_items.append({
                 'product_id': product.id,
                 'product_name': product.name,
@@ -166,6 +109,17 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
                 'stock_level': stock_level
             })
         
+        context['total_items'] = int(total_current_stock)
+        context['low_stock_items'] = len(low_stock_items)
+        
+        # Get today's movements
+        today = timezone.now().date()
+        today_movements_filter = {'date': today}
+        if selected_warehouse:
+            today_movements_filter['warehouse'] = selected_warehouse
+        today_movements = InventoryMovement.objects.filter(**today_movements_filter).count()
+        context['today_movements'] = today_movements
+        
         # Sort inventory items
         if sort_by in ['product_name', 'product_code', 'quantity', 'unit_price', 'value', 'stock_level', 'warehouse_name']:
             reverse_sort = sort_direction == 'desc'
@@ -224,7 +178,6 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
         for movement in in_movements:
             cost_without_tax = movement.total_cost
             tax_rate = movement.product.tax_rate if movement.product else 0
-            from decimal import Decimal
             cost_without_tax_decimal = Decimal(str(cost_without_tax))
             tax_rate_decimal = Decimal(str(tax_rate))
             tax_amount = cost_without_tax_decimal * (tax_rate_decimal / Decimal('100'))
@@ -235,7 +188,6 @@ class InventoryListView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView)
         for movement in out_movements:
             cost_without_tax = movement.total_cost
             tax_rate = movement.product.tax_rate if movement.product else 0
-            from decimal import Decimal
             cost_without_tax_decimal = Decimal(str(cost_without_tax))
             tax_rate_decimal = Decimal(str(tax_rate))
             tax_amount = cost_without_tax_decimal * (tax_rate_decimal / Decimal('100'))
@@ -295,62 +247,24 @@ class WarehouseListView(CanViewInventoryMixin, LoginRequiredMixin, ListView):
     def _calculate_warehouse_inventory(self, warehouse):
         """حساب إجمالي قيمة وكمية المخزون في المستودع"""
         from products.models import Product
-        from purchases.models import PurchaseInvoiceItem
-        from decimal import Decimal
         
-        # Get products that have movements in this warehouse
-        product_ids = InventoryMovement.objects.filter(warehouse=warehouse).values_list('product_id', flat=True).distinct()
-        products = Product.objects.filter(is_active=True, id__in=product_ids)
+        # أرصدة المنتجات في المستودع باستعلام واحد
+        levels = StockLevelService.levels(warehouse=warehouse)
+        open_layers = CostLayerService.open_layers_by_product(warehouse=warehouse)
+        products = Product.objects.filter(is_active=True, id__in=list(levels))
         
         total_value = Decimal('0.0')
         total_quantity = Decimal('0.0')
         
         for product in products:
-            # Calculate current stock for this product in this warehouse
-            in_movements = InventoryMovement.objects.filter(
-                product=product,
-                warehouse=warehouse,
-                movement_type='in'
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            out_movements = InventoryMovement.objects.filter(
-                product=product,
-                warehouse=warehouse,
-                movement_type='out'
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            current_stock = in_movements - out_movements + product.opening_balance_quantity
+            row = levels[product.id]
+            current_stock = row['quantity'] - row['opening_quantity'] + product.opening_balance_quantity
             
             if current_stock <= 0:
                 continue
             
             total_quantity += Decimal(current_stock)
-            
-            # Calculate value using FIFO
-            remaining_qty = Decimal(current_stock)
-            value = Decimal('0.0')
-            
-            # Opening balance first
-            if product.opening_balance_quantity > 0 and remaining_qty > 0:
-                used_qty = min(Decimal(product.opening_balance_quantity), remaining_qty)
-                unit_cost = Decimal(product.opening_balance_cost) / Decimal(product.opening_balance_quantity) if product.opening_balance_quantity > 0 else Decimal('0')
-                value += used_qty * unit_cost
-                remaining_qty -= used_qty
-            
-            # Then purchase invoices (FIFO)
-            purchase_items = PurchaseInvoiceItem.objects.filter(product=product).order_by('invoice__date', 'invoice__id')
-            for item in purchase_items:
-                if remaining_qty <= 0:
-                    break
-                used_qty = min(item.quantity, remaining_qty)
-                value += used_qty * item.unit_price
-                remaining_qty -= used_qty
-            
-            # Fallback to cost price
-            if remaining_qty > 0:
-                value += remaining_qty * Decimal(product.cost_price)
-            
-            total_value += value
+            total_value += CostLayerService.fifo_value(current_stock, open_layers.get(product.id), product.cost_price)
         
         return total_value, total_quantity
 
@@ -707,7 +621,8 @@ class LowStockView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Get all products with their current stock levels
-        products = Product.objects.filter(is_active=True)
+        products = list(Product.objects.filter(is_active=True))
+        levels = StockLevelService.levels()
         low_stock_items = []
         
         out_of_stock_count = 0
@@ -715,18 +630,8 @@ class LowStockView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView):
         low_stock_count = 0
         
         for product in products:
-            # Calculate current stock for this product
-            in_movements = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='in'
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            out_movements = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='out'
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            current_stock = in_movements - out_movements + product.opening_balance_quantity
+            # Calculate current stock for this product from the stock levels table
+            current_stock = StockLevelService.on_hand(product, levels)
             min_quantity = 10  # Default minimum quantity
             
             # Determine stock level
@@ -745,11 +650,6 @@ class LowStockView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView):
             # Calculate stock percentage
             stock_percentage = min(100, (current_stock / min_quantity) * 100) if min_quantity > 0 else 0
             
-            # Get last movement date
-            last_movement = InventoryMovement.objects.filter(
-                product=product
-            ).order_by('-date', '-created_at').first()
-            
             low_stock_items.append({
                 'product_id': product.id,
                 'product_name': product.name,
@@ -759,9 +659,17 @@ class LowStockView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView):
                 'level': level,
                 'stock_percentage': max(0, stock_percentage),
                 'warehouse_name': 'المستودع الرئيسي',
-                'last_movement_date': last_movement.date if last_movement else None,
             })
         
+        # Last movement date for the listed products in one query
+        last_dates = dict(
+            InventoryMovement.objects.filter(product_id__in=[item['product_id'] for item in low_stock_items])
+            .values('product_id').annotate(last_date=Max('date')).order_by()
+            .values_list('product_id', 'last_date')
+        )
+        for item in low_stock_items:
+            item['last_movement_date'] = last_dates.get(item['product_id'])
+        
         # Sort by level (out -> critical -> low)
         level_priority = {'out': 0, 'critical': 1, 'low': 2}
         low_stock_items.sort(key=lambda x: level_priority.get(x['level'], 3))
@@ -771,7 +679,7 @@ class LowStockView(CanViewInventoryMixin, LoginRequiredMixin, TemplateView):
             'out_of_stock': out_of_stock_count,
             'critical_stock': critical_stock_count,
             'low_stock': low_stock_count,
-            'total_products': products.count(),
+            'total_products': len(products),
         })
         
         return context
@@ -936,17 +844,13 @@ class ProductInventoryDetailView(LoginRequiredMixin, TemplateView):
                 product = Product.objects.get(id=product_id, is_active=True)
                 
                 # Calculate current stock for this product
+                levels = StockLevelService.levels([product.id])
+                current_stock = levels[product.id]['quantity'] if product.id in levels else 0
                 in_movements = InventoryMovement.objects.filter(
                     product=product,
                     movement_type='in'
                 ).aggregate(total=Sum('quantity'))['total'] or 0
-                
-                out_movements = InventoryMovement.objects.filter(
-                    product=product,
-                    movement_type='out'
-                ).aggregate(total=Sum('quantity'))['total'] or 0
-                
-                current_stock = in_movements - out_movements
+                out_movements = in_movements - current_stock
                 
                 # Determine stock level
                 if current_stock <= 0:
@@ -995,26 +899,14 @@ class ProductInventoryDetailView(LoginRequiredMixin, TemplateView):
                 
                 # Get warehouses where this product exists
                 warehouses_with_stock = []
-                for warehouse in Warehouse.objects.filter(is_active=True):
-                    warehouse_in = InventoryMovement.objects.filter(
-                        product=product,
-                        warehouse=warehouse,
-                        movement_type='in'
-                    ).aggregate(total=Sum('quantity'))['total'] or 0
-                    
-                    warehouse_out = InventoryMovement.objects.filter(
-                        product=product,
-                        warehouse=warehouse,
-                        movement_type='out'
-                    ).aggregate(total=Sum('quantity'))['total'] or 0
-                    
-                    warehouse_stock = warehouse_in - warehouse_out
-                    
-                    if warehouse_stock > 0:
-                        warehouses_with_stock.append({
-                            'warehouse': warehouse,
-                            'quantity': warehouse_stock
-                        })
+                stock_rows = StockLevel.objects.filter(
+                    product=product, warehouse__is_active=True, quantity__gt=0
+                ).select_related('warehouse').order_by('warehouse_id')
+                for level in stock_rows:
+                    warehouses_with_stock.append({
+                        'warehouse': level.warehouse,
+                        'quantity': level.quantity
+                    })
                 
                 context.update({
                     'product': product,
@@ -1268,10 +1160,9 @@ class MovementDeleteView(CanDeleteInventoryMixin, LoginRequiredMixin, View):
 @login_required
 def export_inventory_excel(request):
     """تصدير قائمة المخزون إلى Excel"""
-    from django.http import HttpResponse
     from django.utils.translation import gettext_lazy as _
     from core.signals import log_export_activity
-    from openpyxl import Workbook
+    from core.exports import iter_rows, xlsx_response
     from openpyxl.styles import Font, PatternFill, Alignment
     from decimal import Decimal
 
@@ -1291,22 +1182,17 @@ def export_inventory_excel(request):
     # الحصول على بيانات المخزون (نفس منطق InventoryListView)
     from products.models import Product
 
-    products = Product.objects.filter(is_active=True)
+    levels = StockLevelService.levels()
+    open_layers = CostLayerService.open_layers_by_product()
+    # حقول العرض فقط على دفعات بدلاً من كائنات المنتجات
+    products = iter_rows(Product.objects.filter(is_active=True),
+                         ('id', 'name', 'code', 'sale_price', 'cost_price'))
 
     inventory_items = []
-    for product in products:
+    for product_id, name, code, sale_price, cost_price in products:
         # Calculate current stock for this product
-        in_movements = InventoryMovement.objects.filter(
-            product=product,
-            movement_type='in'
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-
-        out_movements = InventoryMovement.objects.filter(
-            product=product,
-            movement_type='out'
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-
-        current_stock = in_movements - out_movements
+        row = levels.get(product_id)
+        current_stock = row['quantity'] if row else Decimal('0')
 
         # Determine stock level
         if current_stock <= 0:
@@ -1318,29 +1204,16 @@ def export_inventory_excel(request):
         else:
             stock_level = 'good'
 
-        # Calculate value based on actual purchase invoice costs
-        from purchases.models import PurchaseInvoiceItem
-        remaining_qty = Decimal(current_stock)
-        value = Decimal('0.0')
-        # Get purchase invoice items in oldest to newest order
-        purchase_items = PurchaseInvoiceItem.objects.filter(product=product).order_by('invoice__date', 'invoice__id')
-        for item in purchase_items:
-            if remaining_qty <= 0:
-                break
-            used_qty = min(item.quantity, remaining_qty)
-            value += used_qty * item.unit_price
-            remaining_qty -= used_qty
-        # If there's remaining quantity not covered by purchase invoices (data gap), use default cost price
-        if remaining_qty > 0:
-            value += remaining_qty * Decimal(product.cost_price)
+        # FIFO من الكميات المتبقية في طبقات التكلفة وإلا سعر التكلفة
+        value = CostLayerService.fifo_value(current_stock, open_layers.get(product_id), cost_price)
 
         inventory_items.append({
-            'product_id': product.id,
-            'product_name': product.name,
-            'product_code': product.code,
+            'product_id': product_id,
+            'product_name': name,
+            'product_code': code,
             'quantity': current_stock,
             'value': float(value),
-            'sale_price': float(product.sale_price),
+            'sale_price': float(sale_price),
             'warehouse_name': 'المستودع الرئيسي',
             'stock_level': stock_level
         })
@@ -1357,17 +1230,7 @@ def export_inventory_excel(request):
     if stock_level_filter:
         inventory_items = [item for item in inventory_items if item['stock_level'] == stock_level_filter]
 
-    # إنشاء ملف Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = str(_('Inventory List'))
-
-    # تنسيق العناوين
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    center_alignment = Alignment(horizontal="center", vertical="center")
-
-    # كتابة العناوين
+    # إنشاء ملف Excel بوضع الكتابة فقط
     headers = [
         _('Product Name'),
         _('Product Code'),
@@ -1377,57 +1240,23 @@ def export_inventory_excel(request):
         _('Sale Price'),
         _('Stock Status')
     ]
-
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=str(header))
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_alignment
-
-    # كتابة البيانات
-    for row_num, item in enumerate(inventory_items, 2):
-        ws.cell(row=row_num, column=1, value=item['product_name'])
-        ws.cell(row=row_num, column=2, value=item['product_code'])
-        ws.cell(row=row_num, column=3, value=item['warehouse_name'])
-        ws.cell(row=row_num, column=4, value=item['quantity'])
-        ws.cell(row=row_num, column=5, value=item['value'])
-        ws.cell(row=row_num, column=6, value=item['sale_price'])
-
-        # تحديد حالة المخزون باللغة العربية
-        stock_status = ''
-        if item['stock_level'] == 'good':
-            stock_status = _('Good Stock')
-        elif item['stock_level'] == 'low':
-            stock_status = _('Low Stock')
-        elif item['stock_level'] == 'critical':
-            stock_status = _('Critical Stock')
-        else:
-            stock_status = _('Out of Stock')
-
-        ws.cell(row=row_num, column=7, value=str(stock_status))
-
-    # تعديل عرض الأعمدة
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)  # حد أقصى 50
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-    # إنشاء الاستجابة
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    stock_statuses = {
+        'good': _('Good Stock'),
+        'low': _('Low Stock'),
+        'critical': _('Critical Stock'),
+    }
+    rows = (
+        [item['product_name'], item['product_code'], item['warehouse_name'], item['quantity'], item['value'],
+         item['sale_price'], str(stock_statuses.get(item['stock_level'], _('Out of Stock')))]
+        for item in inventory_items
     )
     filename = f'inventory_list_{timezone.now().date()}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    # حفظ الملف
-    wb.save(response)
+    response = xlsx_response(
+        filename, rows, headers=headers, title=_('Inventory List'), widths=[40, 20, 20, 12, 15, 15, 18],
+        header_font=Font(bold=True, color="FFFFFF"),
+        header_fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+        header_alignment=Alignment(horizontal="center", vertical="center"),
+    )
 
     # تسجيل النشاط
     log_export_activity(request, str(_('Inventory List')), filename, 'Excel')
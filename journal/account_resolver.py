@@ -0,0 +1,195 @@
+"""
+محلل دليل الحسابات (AccountResolver)
+
+دوال JournalService.get_*_account كانت تنفذ get_or_create للحساب ولحسابه الأب
+في كل ترحيل، أي 2-8 استعلامات لدليل الحسابات لكل فاتورة. المحلل يحفظ الدليل
+في ذاكرة العملية عبر core.settings_cache:
+
+- خريطة رمز -> بيانات الحساب لكل الحسابات باستعلام values_list واحد.
+- خرائط الكيانات (عميل، مورد، صندوق، بنك، مستودع -> رقم الحساب) تُملأ عند أول
+  حل لكل كيان.
+- حفظ/حذف أي حساب (core.signals) يبطل الخريطة، عدا تحديث الرصيد وحده. بدون
+  ذاكرة مشتركة تتحقق العمليات الأخرى منها بعد انتهاء صلاحيتها القصيرة باستعلام
+  تجميعي واحد (أعلى updated_at وعدد الحسابات؛ تحديث الأرصدة لا يغيّره)، ولا
+  يُعاد تحميلها إلا إذا تغيرت النتيجة.
+- حسابات الصناديق والبنوك مرتبطة بكياناتها بحقلي cashbox و bank_account، وخريطة
+  الروابط (رقم الحساب -> الصندوق/البنك) تغني عن تحليل رمز الحساب لكل بند.
+- الحساب المفقود يُنشأ مرة واحدة تحت قفل (get_or_create يعيد الفحص في قاعدة
+  البيانات داخل القفل).
+- أثناء معاملة أنشأت أو عدلت حساباً تُقرأ الحسابات من قاعدة البيانات مباشرة
+  حتى تنتهي المعاملة، فلا يُحفظ حساب لم يُثبَّت.
+- تُحمّل الخريطة مع أول طلب للعملية (journal.apps).
+
+الحسابات المعادة نسخ جديدة في كل استدعاء بالحقول الثابتة فقط؛ الرصيد وتواريخ
+الإنشاء والتعديل مؤجلة وتُقرأ من قاعدة البيانات عند الوصول إليها.
+"""
+import logging
+import threading
+
+from django.db import DEFAULT_DB_ALIAS
+
+from core import settings_cache
+
+logger = logging.getLogger(__name__)
+
+CHART_KEY = 'chart_of_accounts'
+
+# بنفس ترتيب حقول النموذج (Account.from_db)
+ACCOUNT_FIELDS = ('id', 'code', 'name', 'account_type', 'parent_id', 'bank_account_id', 'cashbox_id',
+                  'description', 'is_active')
+_BANK_FIELD = ACCOUNT_FIELDS.index('bank_account_id')
+_CASHBOX_FIELD = ACCOUNT_FIELDS.index('cashbox_id')
+
+CUSTOMER = 'customer'
+SUPPLIER = 'supplier'
+CASHBOX = 'cashbox'
+BANK = 'bank'
+WAREHOUSE = 'warehouse'
+
+_create_lock = threading.Lock()
+
+
+def _link(cashbox_id, bank_account_id):
+    if cashbox_id is not None:
+        return CASHBOX, cashbox_id
+    if bank_account_id is not None:
+        return BANK, bank_account_id
+    return None
+
+
+class ChartOfAccounts:
+    """صفوف دليل الحسابات مفهرسة بالرمز والرقم"""
+
+    def __init__(self, rows):
+        self.by_code = {}
+        self.by_id = {}
+        # رقم الحساب -> (CASHBOX أو BANK، رقم الكيان)
+        self.links = {}
+        for row in rows:
+            self.by_code[row[1]] = row
+            self.by_id[row[0]] = row
+            link = _link(row[_CASHBOX_FIELD], row[_BANK_FIELD])
+            if link is not None:
+                self.links[row[0]] = link
+        # (نوع الكيان، رقمه) -> رقم الحساب
+        self.entities = {}
+
+
+def _load():
+    from .models import Account
+    return ChartOfAccounts(list(Account.objects.values_list(*ACCOUNT_FIELDS)))
+
+
+def _probe():
+    from django.db.models import Count, Max
+    from .models import Account
+    return tuple(Account.objects.aggregate(Max('updated_at'), Count('id')).values())
+
+
+def get_chart():
+    """الدليل المخزن، أو None أثناء معاملة كتبت على الحسابات"""
+    if settings_cache.bypassed(CHART_KEY):
+        return None
+    return settings_cache.get(CHART_KEY, _load, strict=True, probe=_probe)
+
+
+def invalidate():
+    settings_cache.invalidate(CHART_KEY)
+
+
+def warm():
+    """تحميل الدليل مسبقاً (بدون أخطاء إذا لم تكن الجداول جاهزة)"""
+    try:
+        get_chart()
+    except Exception as error:
+        logger.debug(f"تعذر تحميل دليل الحسابات مسبقاً: {error}")
+
+
+def _account(row):
+    from .models import Account
+    return Account.from_db(DEFAULT_DB_ALIAS, ACCOUNT_FIELDS, row)
+
+
+class AccountResolver:
+    """الحصول على حسابات الدليل بدون استعلامات بعد التحميل"""
+
+    @staticmethod
+    def get(code):
+        """الحساب بالرمز أو None"""
+        from .models import Account
+
+        chart = get_chart()
+        if chart is None:
+            return Account.objects.filter(code=code).first()
+        row = chart.by_code.get(code)
+        return _account(row) if row is not None else None
+
+    @staticmethod
+    def get_or_create(code, defaults):
+        """
+        الحساب بالرمز، أو إنشاؤه بالقيم defaults إذا لم يكن موجوداً.
+
+        Returns:
+            tuple: (الحساب، هل أُنشئ)
+        """
+        from .models import Account
+
+        account = AccountResolver.get(code)
+        if account is not None:
+            return account, False
+        with _create_lock:
+            return Account.objects.get_or_create(code=code, defaults=defaults)
+
+    @staticmethod
+    def for_entity(kind, entity_id, code, defaults):
+        """
+        حساب كيان (عميل، مورد، صندوق، بنك، مستودع) بالرمز، مع حفظ رقم حسابه
+        في خريطة الكيانات.
+
+        Returns:
+            tuple: (الحساب، هل أُنشئ)
+        """
+        chart = get_chart()
+        if chart is not None:
+            row = chart.by_id.get(chart.entities.get((kind, entity_id)))
+            if row is not None:
+                return _account(row), False
+
+        account, created = AccountResolver.get_or_create(code, defaults)
+        if chart is not None and not created:
+            chart.entities[(kind, entity_id)] = account.pk
+        return account, created
+
+    @staticmethod
+    def entity_account_id(kind, entity_id):
+        """رقم حساب الكيان إذا سبق حله، وإلا None"""
+        chart = get_chart()
+        if chart is None:
+            return None
+        return chart.entities.get((kind, entity_id))
+
+    @staticmethod
+    def links(account_ids):
+        """
+        الصندوق أو البنك المرتبط بكل حساب من account_ids (المرتبطة فقط).
+
+        Returns:
+            dict: {رقم الحساب: (CASHBOX أو BANK، رقم الكيان)}
+        """
+        from django.db.models import Q
+        from .models import Account
+
+        chart = get_chart()
+        if chart is None:
+            unknown = list(account_ids)
+            links = {}
+        else:
+            # حسابات لم يرها الدليل المخزن (أُنشئت أو رُبطت في عملية أخرى) تُقرأ من قاعدة البيانات
+            unknown = [pk for pk in account_ids if pk not in chart.by_id]
+            links = {pk: chart.links[pk] for pk in account_ids if pk in chart.links}
+        if unknown:
+            rows = Account.objects.filter(pk__in=unknown).filter(
+                Q(cashbox__isnull=False) | Q(bank_account__isnull=False)
+            ).values_list('id', 'cashbox_id', 'bank_account_id')
+            links.update({pk: _link(cashbox_id, bank_account_id) for pk, cashbox_id, bank_account_id in rows})
+        return links
@@ -1,4 +1,12 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def _warm_chart_of_accounts(sender, **kwargs):
+    """تحميل دليل الحسابات مع أول طلب للعملية ثم فصل المستقبل"""
+    request_started.disconnect(_warm_chart_of_accounts, dispatch_uid='warm_chart_of_accounts')
+    from journal import account_resolver
+    account_resolver.warm()
 
 
 class JournalConfig(AppConfig):
@@ -9,3 +17,5 @@ class JournalConfig(AppConfig):
     def ready(self):
         """تسجيل الإشارات عند بدء التطبيق"""
         import journal.signals
+        # لا استعلامات في ready(): يُحمّل دليل الحسابات مع أول طلب
+        request_started.connect(_warm_chart_of_accounts, dispatch_uid='warm_chart_of_accounts')
@@ -0,0 +1,11 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق journal (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('journal.JournalEntry', fields=['entry_number', 'entry_date', 'description', 'total_amount']),
+    AuditConfig('journal.Account', fields=['code', 'name', 'account_type', 'parent', 'description', 'is_active']),
+    AuditConfig('journal.FiscalYear', fields=['year', 'start_date', 'end_date', 'status', 'is_current']),
+    AuditConfig('journal.YearEndClosing', fields=['year', 'closing_date', 'net_profit', 'status', 'closing_entry']),
+)
@@ -0,0 +1,342 @@
+"""
+محرك الأرصدة التراكمي للحسابات المحاسبية
+
+بدلاً من إعادة تجميع جميع بنود الحساب عند حفظ كل بند قيد، يطبّق هذا المحرك
+فرق الحركة (مدين - دائن) مباشرة على رصيد الحساب المخزّن باستخدام تعبيرات F
+داخل قاعدة البيانات، ثم يرحّل الفرق إلى سلسلة الحسابات الأب مرة واحدة.
+
+- في الوضع الفوري: يُطبّق الفرق عند حفظ/حذف كل بند.
+- تُحدّث اللقطات اليومية (AccountBalanceSnapshot) بنفس الفروق.
+- في الوضع المؤجل (deferred): تُجمّع الفروق لكل القيد وتُطبّق دفعة واحدة
+  عند الخروج من الكتلة، داخل نفس المعاملة.
+- verify: يقارن الأرصدة المخزنة بإعادة حساب كاملة ويصححها عند الطلب.
+"""
+import threading
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import F, Case, When, Value, Sum
+
+logger = logging.getLogger(__name__)
+
+# أنواع الحسابات ذات الطبيعة المدينة (الرصيد = مدين - دائن)
+DEBIT_NATURE_TYPES = ('asset', 'expense', 'purchases')
+
+_local = threading.local()
+
+
+def signed_balance(account_type, debit_total, credit_total):
+    """الرصيد حسب طبيعة الحساب - نفس قاعدة Account.get_balance"""
+    debit_total = debit_total or Decimal('0')
+    credit_total = credit_total or Decimal('0')
+    if account_type in DEBIT_NATURE_TYPES:
+        return debit_total - credit_total
+    return credit_total - debit_total
+
+
+def _new_pending():
+    return defaultdict(lambda: [Decimal('0'), Decimal('0')])
+
+
+def _remember_entry_date(entry_id, entry_date):
+    """الاحتفاظ بتاريخ القيد لاستخدامه عند ترحيل اللقطات (حتى بعد حذف القيد)"""
+    dates = getattr(_local, 'entry_dates', None)
+    if dates is None or len(dates) > 1000:
+        dates = _local.entry_dates = {}
+    dates[entry_id] = entry_date
+
+
+class AccountBalanceEngine:
+    """محرك تحديث أرصدة الحسابات بالفروق"""
+
+    @staticmethod
+    def is_deferred():
+        """هل نحن داخل كتلة تأجيل؟"""
+        return getattr(_local, 'depth', 0) > 0
+
+    @staticmethod
+    @contextmanager
+    def deferred():
+        """
+        تأجيل تطبيق فروق الأرصدة حتى نهاية الكتلة ثم تطبيقها دفعة واحدة.
+
+        يجب استخدامها داخل transaction.atomic() حتى يكون تحديث الأرصدة
+        جزءاً من نفس المعاملة التي أنشأت البنود. الكتل المتداخلة تُدمج
+        في الكتلة الخارجية.
+        """
+        depth = getattr(_local, 'depth', 0)
+        if depth == 0:
+            _local.pending = _new_pending()
+        saved = {key: list(value) for key, value in _local.pending.items()}
+        _local.depth = depth + 1
+        try:
+            yield
+        except Exception:
+            _local.depth = depth
+            # التراجع عن فروق هذه الكتلة فقط
+            _local.pending = _new_pending()
+            _local.pending.update(saved)
+            raise
+        _local.depth = depth
+        if depth == 0:
+            pending = _local.pending
+            _local.pending = _new_pending()
+            AccountBalanceEngine.apply_changes(pending)
+
+    @staticmethod
+    def remember_entry_date(entry):
+        """تسجيل تاريخ قيد قبل حذفه"""
+        _remember_entry_date(entry.pk, entry.entry_date)
+
+    @staticmethod
+    def record(changes):
+        """
+        تسجيل فروق البنود: تطبيق فوري أو تجميع في الكتلة المؤجلة.
+
+        Args:
+            changes: {(account_id, journal_entry_id): [debit, credit]}
+        """
+        if AccountBalanceEngine.is_deferred():
+            for key, (debit, credit) in changes.items():
+                _local.pending[key][0] += debit
+                _local.pending[key][1] += credit
+            return {}
+        return AccountBalanceEngine.apply_changes(changes)
+
+    @staticmethod
+    def line_saved(line, created):
+        """معالجة حفظ بند قيد (إنشاء أو تعديل)"""
+        if 'journal_entry' in line._state.fields_cache and line.journal_entry:
+            _remember_entry_date(line.journal_entry_id, line.journal_entry.entry_date)
+
+        changes = _new_pending()
+        if not created:
+            old_state = getattr(line, '_balance_state', None)
+            if old_state and old_state[0]:
+                old_key = (old_state[0], old_state[1])
+                changes[old_key][0] -= Decimal(str(old_state[2] or 0))
+                changes[old_key][1] -= Decimal(str(old_state[3] or 0))
+        key = (line.account_id, line.journal_entry_id)
+        changes[key][0] += Decimal(str(line.debit or 0))
+        changes[key][1] += Decimal(str(line.credit or 0))
+        line._balance_state = (line.account_id, line.journal_entry_id, line.debit, line.credit)
+        return AccountBalanceEngine.record(changes)
+
+    @staticmethod
+    def line_deleted(line):
+        """معالجة حذف بند قيد"""
+        state = getattr(line, '_balance_state', None) or (
+            line.account_id, line.journal_entry_id, line.debit, line.credit
+        )
+        if not state[0]:
+            return {}
+        return AccountBalanceEngine.record({
+            (state[0], state[1]): [-Decimal(str(state[2] or 0)), -Decimal(str(state[3] or 0))]
+        })
+
+    @staticmethod
+    def apply_changes(changes):
+        """
+        تطبيق فروق البنود على أرصدة الحسابات وعلى اللقطات اليومية.
+
+        Args:
+            changes: {(account_id, journal_entry_id): [debit, credit]}
+
+        Returns:
+            dict: {account_id: الفرق المطبّق على الرصيد} شاملاً الحسابات الأب
+        """
+        from .models import JournalEntry
+        from .snapshots import AccountSnapshotService
+
+        changes = {key: value for key, value in changes.items() if value[0] or value[1]}
+        if not changes:
+            return {}
+
+        net_by_account = defaultdict(Decimal)
+        for (account_id, entry_id), (debit, credit) in changes.items():
+            net_by_account[account_id] += debit - credit
+        deltas = AccountBalanceEngine.apply_deltas(net_by_account)
+
+        # تحويل مفاتيح القيود إلى تواريخ للقطات اليومية
+        known_dates = getattr(_local, 'entry_dates', None) or {}
+        entry_ids = {entry_id for _, entry_id in changes}
+        missing = [entry_id for entry_id in entry_ids if entry_id not in known_dates]
+        entry_dates = {entry_id: known_dates[entry_id] for entry_id in entry_ids if entry_id in known_dates}
+        if missing:
+            entry_dates.update(JournalEntry.objects.filter(pk__in=missing).values_list('id', 'entry_date'))
+
+        snapshot_changes = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+        for (account_id, entry_id), (debit, credit) in changes.items():
+            entry_date = entry_dates.get(entry_id)
+            if entry_date is None:
+                logger.warning(f"تعذر تحديد تاريخ القيد {entry_id} لتحديث لقطات الحساب {account_id}")
+                continue
+            snapshot_changes[(account_id, entry_date)][0] += debit
+            snapshot_changes[(account_id, entry_date)][1] += credit
+        AccountSnapshotService.apply(snapshot_changes)
+
+        return deltas
+
+    @staticmethod
+    def apply_deltas(net_by_account):
+        """
+        تطبيق فروق (مدين - دائن) على الحسابات وترحيلها إلى الحسابات الأب.
+
+        Args:
+            net_by_account: {account_id: صافي المدين - الدائن}
+
+        Returns:
+            dict: {account_id: الفرق المطبّق على الرصيد} شاملاً الحسابات الأب
+        """
+        from .models import Account
+
+        net = {account_id: amount for account_id, amount in net_by_account.items() if amount}
+        if not net:
+            return {}
+
+        # تحميل الحسابات وسلسلة آبائها: استعلام واحد لكل مستوى في الشجرة
+        info = {}
+        to_load = set(net)
+        while to_load:
+            rows = Account.objects.filter(pk__in=to_load).values_list(
+                'id', 'parent_id', 'is_active', 'account_type'
+            )
+            to_load = set()
+            for account_id, parent_id, is_active, account_type in rows:
+                info[account_id] = (parent_id, is_active, account_type)
+                if parent_id and parent_id not in info:
+                    to_load.add(parent_id)
+            to_load -= set(info)
+
+        # الحساب الذي له أبناء نشطون رصيده مجموع أبنائه فقط (نفس قاعدة get_balance)
+        with_children = set(
+            Account.objects.filter(parent_id__in=list(net), is_active=True)
+            .values_list('parent_id', flat=True)
+        )
+
+        deltas = defaultdict(Decimal)
+        for account_id, amount in net.items():
+            if account_id not in info or account_id in with_children:
+                continue
+            parent_id, is_active, account_type = info[account_id]
+            signed = amount if account_type in DEBIT_NATURE_TYPES else -amount
+            deltas[account_id] += signed
+
+            # رصيد الأب = مجموع أرصدة أبنائه النشطين، لذا نرحّل طالما الحساب نشط
+            visited = {account_id}
+            current_id, current_active = parent_id, is_active
+            while current_id and current_active and current_id in info and current_id not in visited:
+                deltas[current_id] += signed
+                visited.add(current_id)
+                current_id, current_active = info[current_id][0], info[current_id][1]
+
+        deltas = {account_id: amount for account_id, amount in deltas.items() if amount}
+        if deltas:
+            # تحديث ذري واحد لجميع الحسابات المتأثرة
+            Account.objects.filter(pk__in=list(deltas)).update(
+                balance=F('balance') + Case(
+                    *[When(pk=account_id, then=Value(amount)) for account_id, amount in deltas.items()],
+                    default=Value(Decimal('0')),
+                    output_field=models.DecimalField(max_digits=15, decimal_places=3),
+                )
+            )
+
+        AccountBalanceEngine._sync_cashboxes_and_banks(net)
+        return deltas
+
+    @staticmethod
+    def _sync_cashboxes_and_banks(account_ids):
+        """مزامنة الصناديق والبنوك المرتبطة بالحسابات المرحّل إليها مباشرة"""
+        from .account_resolver import AccountResolver
+        from .models import Account
+        from .signals import sync_cashbox_or_bank_balance
+
+        linked = AccountResolver.links(account_ids)
+        if not linked:
+            return
+        accounts = Account.objects.filter(pk__in=list(linked)).select_related('bank_account', 'cashbox')
+        for account in accounts:
+            sync_cashbox_or_bank_balance(account)
+
+    @staticmethod
+    def compute_expected_balances():
+        """
+        إعادة حساب كاملة لأرصدة جميع الحسابات من البنود.
+
+        Returns:
+            tuple: (قائمة الحسابات، {account_id: الرصيد المتوقع})
+        """
+        from .models import Account, JournalLine
+
+        accounts = list(Account.objects.only('id', 'code', 'name', 'parent_id', 'is_active',
+                                             'account_type', 'balance'))
+        totals = {
+            row['account_id']: (row['debit'], row['credit'])
+            for row in JournalLine.objects.values('account_id').annotate(
+                debit=Sum('debit'), credit=Sum('credit')
+            ).order_by()
+        }
+
+        active_children = defaultdict(list)
+        for account in accounts:
+            if account.parent_id and account.is_active:
+                active_children[account.parent_id].append(account.id)
+        by_id = {account.id: account for account in accounts}
+
+        expected = {}
+
+        def resolve(account_id, visiting):
+            if account_id in expected:
+                return expected[account_id]
+            if account_id in visiting:
+                return Decimal('0')
+            visiting.add(account_id)
+            children = active_children.get(account_id)
+            if children:
+                value = sum((resolve(child_id, visiting) for child_id in children), Decimal('0'))
+            else:
+                debit, credit = totals.get(account_id, (None, None))
+                value = signed_balance(by_id[account_id].account_type, debit, credit)
+            visiting.discard(account_id)
+            expected[account_id] = value
+            return value
+
+        for account in accounts:
+            resolve(account.id, set())
+        return accounts, expected
+
+    @staticmethod
+    def verify(fix=False):
+        """
+        مطابقة الأرصدة المخزنة مع إعادة الحساب الكاملة.
+
+        Args:
+            fix: تصحيح الأرصدة غير المتطابقة
+
+        Returns:
+            list: الحسابات غير المتطابقة [{'account', 'stored', 'expected', 'difference'}]
+        """
+        from .models import Account
+
+        accounts, expected = AccountBalanceEngine.compute_expected_balances()
+        mismatches = []
+        for account in accounts:
+            value = expected[account.id]
+            if account.balance != value:
+                mismatches.append({
+                    'account': account,
+                    'stored': account.balance,
+                    'expected': value,
+                    'difference': value - account.balance,
+                })
+
+        if fix and mismatches:
+            for item in mismatches:
+                item['account'].balance = item['expected']
+            Account.objects.bulk_update([item['account'] for item in mismatches], ['balance'], batch_size=500)
+            logger.info(f"تم تصحيح أرصدة {len(mismatches)} حساب")
+
+        return mismatches
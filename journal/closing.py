@@ -0,0 +1,217 @@
+"""
+إقفال السنة المالية وفتح السنة التالية (YearEndClosingEngine)
+
+كان YearEndClosing.perform_closing يمر على كل حسابات الإيرادات والمصروفات:
+get_balance واستعلام exists لكل حساب ثم JournalLine.objects.create لكل بند
+(كل بند يمر بإشارات الأرصدة)، و FiscalYear.create_opening_balances بنفس النمط
+لحسابات الميزانية. مع آلاف الحسابات وملايين البنود تتجاوز العملية مهلة الطلب.
+
+المحرك:
+- يحسب أرصدة كل حسابات السنة باستعلام تجميع واحد (GROUP BY الحساب).
+- ينشئ قيد الإقفال وقيد الافتتاح عبر JournalPostingService (إدراج مجمّع وتطبيق
+  الأرصدة مرة واحدة لكل حساب).
+- قابل للاستئناف: القيود مرتبطة بالمرجع (year_end_closing / opening_balance + رقم
+  السجل) فإعادة التشغيل بعد انقطاع تعيد القيد الموجود ولا تكرره.
+- صافي الربح يُحسب من نفس الأرصدة المقفلة فيتوازن القيد دائماً؛ وتُقفل الأرصدة
+  السالبة أيضاً (في الجانب المعاكس).
+
+يستخدمه YearEndClosing.perform_closing و FiscalYear.create_opening_balances
+وأمر الإدارة close_fiscal_year.
+"""
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils.translation import gettext_lazy as _
+
+from .models import Account, FiscalYear, JournalLine
+from .posting import JournalPostingService
+
+logger = logging.getLogger(__name__)
+
+REVENUE_TYPES = ('revenue', 'sales')
+EXPENSE_TYPES = ('expense', 'purchases')
+BALANCE_SHEET_TYPES = ('asset', 'liability', 'equity')
+
+CLOSING_REFERENCE = 'year_end_closing'
+OPENING_REFERENCE = 'opening_balance'
+
+
+def grouped_balances(lines):
+    """
+    [{'account_id', 'name', 'balance'}] لكل حساب له بنود باستعلام تجميع واحد.
+    balance = المدين - الدائن.
+    """
+    rows = lines.values('account_id', 'account__code', 'account__name').annotate(
+        debit=Sum('debit'), credit=Sum('credit'),
+    ).order_by('account__code')
+    return [
+        {'account_id': row['account_id'], 'name': row['account__name'],
+         'balance': (row['debit'] or Decimal('0')) - (row['credit'] or Decimal('0'))}
+        for row in rows
+    ]
+
+
+def retained_earnings_account():
+    """حساب رأس المال الذي يُنقل إليه صافي الربح"""
+    return Account.objects.filter(account_type='equity', name__icontains='رأس المال').first()
+
+
+class YearEndClosingEngine:
+    """
+    on_progress(step, data): يُستدعى بعد كل مرحلة (الأرصدة، القيد، الحفظ) مع
+    عدد الحسابات والمدة.
+    """
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+
+    def _report(self, step, started, **data):
+        data['duration'] = round(time.monotonic() - started, 3)
+        logger.info(f"إقفال السنة - {step}: {data}")
+        if self.on_progress:
+            self.on_progress(step, data)
+
+    # ------------------------------------------------------------------
+    # الإقفال
+    # ------------------------------------------------------------------
+    @staticmethod
+    def year_start(year):
+        fiscal_year = FiscalYear.objects.filter(year=year).only('start_date').first()
+        return fiscal_year.start_date if fiscal_year else date(year, 1, 1)
+
+    def profit_and_loss(self, year, closing_date):
+        """أرصدة حسابات الإيرادات والمصروفات من بداية السنة حتى تاريخ الإقفال"""
+        lines = JournalLine.objects.filter(
+            account__account_type__in=REVENUE_TYPES + EXPENSE_TYPES,
+            journal_entry__entry_date__gte=self.year_start(year),
+            journal_entry__entry_date__lte=closing_date,
+        ).exclude(journal_entry__reference_type=CLOSING_REFERENCE)
+        return [row for row in grouped_balances(lines) if row['balance']]
+
+    def closing_lines(self, balances, retained_earnings):
+        """
+        بنود قيد الإقفال: تصفير كل حساب بعكس رصيده ونقل الفرق إلى رأس المال.
+
+        Returns:
+            tuple: (صافي الربح، البنود)
+        """
+        lines = []
+        for row in balances:
+            balance = row['balance']
+            lines.append({
+                'account_id': row['account_id'],
+                'debit': -balance if balance < 0 else Decimal('0'),
+                'credit': balance if balance > 0 else Decimal('0'),
+                'description': f"إقفال حساب {row['name']}",
+            })
+
+        # الإيرادات دائنة والمصروفات مدينة: صافي الربح = -(مجموع المدين - الدائن)
+        net_profit = -sum((row['balance'] for row in balances), Decimal('0'))
+        if net_profit and retained_earnings is not None:
+            lines.append({
+                'account_id': retained_earnings.pk,
+                'debit': -net_profit if net_profit < 0 else Decimal('0'),
+                'credit': net_profit if net_profit > 0 else Decimal('0'),
+                'description': 'نقل صافي الربح إلى رأس المال' if net_profit > 0 else 'نقل صافي الخسارة من رأس المال',
+            })
+        return net_profit, lines
+
+    def close(self, closing):
+        """
+        إقفال السنة لسجل YearEndClosing.
+
+        Returns:
+            tuple: (نجاح، رسالة)
+        """
+        if closing.status == 'completed':
+            return False, _("Closing already completed")
+
+        started = time.monotonic()
+        balances = self.profit_and_loss(closing.year, closing.closing_date)
+        self._report('balances', started, accounts=len(balances))
+
+        retained_earnings = retained_earnings_account()
+        net_profit, lines = self.closing_lines(balances, retained_earnings)
+        if net_profit and retained_earnings is None:
+            return False, _("Capital account not found")
+
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                closing_entry, = JournalPostingService.post_entries([{
+                    'entry_date': closing.closing_date,
+                    'description': f"إقفال السنة المالية {closing.year}",
+                    'reference_type': CLOSING_REFERENCE,
+                    'reference_id': closing.pk,
+                    'lines': lines,
+                }], user=closing.created_by)
+
+                closing.net_profit = net_profit
+                closing.closing_entry = closing_entry
+                closing.status = 'completed'
+                closing.save(update_fields=['net_profit', 'closing_entry', 'status', 'updated_at'])
+                fiscal_year = FiscalYear.objects.filter(year=closing.year).first()
+                if fiscal_year is not None:
+                    fiscal_year.status = 'closed'
+                    fiscal_year.closing = closing
+                    fiscal_year.save(update_fields=['status', 'closing', 'updated_at'])
+        except ValueError as error:
+            return False, str(error)
+        self._report('closing_entry', started, lines=len(lines), net_profit=net_profit)
+
+        return True, _("Year end closing performed successfully")
+
+    # ------------------------------------------------------------------
+    # الافتتاح
+    # ------------------------------------------------------------------
+    def balance_sheet(self, as_of_date):
+        """أرصدة حسابات الميزانية المتراكمة حتى نهاية السنة السابقة"""
+        lines = JournalLine.objects.filter(
+            account__account_type__in=BALANCE_SHEET_TYPES,
+            journal_entry__entry_date__lte=as_of_date,
+        )
+        return [row for row in grouped_balances(lines) if row['balance']]
+
+    def open_year(self, fiscal_year, previous_year):
+        """
+        قيد الأرصدة الافتتاحية للسنة من أرصدة الميزانية في نهاية السنة السابقة.
+
+        Returns:
+            tuple: (نجاح، رسالة)
+        """
+        started = time.monotonic()
+        balances = self.balance_sheet(previous_year.end_date)
+        self._report('balances', started, accounts=len(balances))
+
+        lines = [
+            {
+                'account_id': row['account_id'],
+                'debit': row['balance'] if row['balance'] > 0 else Decimal('0'),
+                'credit': -row['balance'] if row['balance'] < 0 else Decimal('0'),
+                'description': f"رصيد افتتاحي من سنة {previous_year.year}",
+            }
+            for row in balances
+        ]
+
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                opening_entry, = JournalPostingService.post_entries([{
+                    'entry_date': fiscal_year.start_date,
+                    'description': f"الأرصدة الافتتاحية للسنة المالية {fiscal_year.year}",
+                    'reference_type': OPENING_REFERENCE,
+                    'reference_id': fiscal_year.pk,
+                    'lines': lines,
+                }], user=fiscal_year.created_by)
+
+                fiscal_year.opening_entry = opening_entry
+                fiscal_year.save(update_fields=['opening_entry', 'updated_at'])
+        except ValueError as error:
+            return False, str(error)
+        self._report('opening_entry', started, lines=len(lines))
+
+        return True, _("Opening balances created successfully")
@@ -0,0 +1,185 @@
+"""
+دفتر الحساب (AccountLedger)
+
+كان account_ledger يحمّل كل بنود الحساب في بايثون لحساب الرصيد التراكمي ثم
+يرقّم القائمة، فعرض الصفحة الأولى لحساب صندوق فيه 500 ألف بند يبني كل الصفوف.
+
+- الترقيم بالمفتاح (keyset) على (تاريخ القيد، وقت إنشائه، رقم البند): كل صفحة
+  استعلام LIMIT يبدأ بعد آخر صف في الصفحة السابقة (أو قبل أول صف للرجوع).
+- رصيد بداية الصفحة = أقرب لقطة يومية قبل يوم أول صف + بنود نفس اليوم قبله،
+  ثم يُجمع الرصيد داخل الصفحة؛ فلا يعتمد زمن الصفحة على طول تاريخ الحساب.
+- إجماليات الفترة والرصيد الختامي من فروق اللقطات بدلاً من تجميع كل البنود.
+- التصدير الكامل استعلام واحد يحسب الرصيد التراكمي بـ Window(Sum) ويُقرأ على
+  دفعات (core.exports).
+
+الرصيد بطبيعة الحساب: المدين - الدائن للأصول والمصروفات، والعكس لغيرها. عند
+التصفية من تاريخ يبدأ الرصيد من رصيد الحساب قبل ذلك التاريخ.
+"""
+import base64
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum, Window
+
+from .models import JournalLine
+from .snapshots import AccountSnapshotService
+
+PAGE_SIZE = 50
+DEBIT_NATURE_TYPES = ('asset', 'expense', 'purchases')
+
+ORDER_FIELDS = ('journal_entry__entry_date', 'journal_entry__created_at', 'id')
+
+
+def encode_cursor(line):
+    entry = line.journal_entry
+    raw = f'{entry.entry_date.isoformat()}|{entry.created_at.isoformat()}|{line.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(التاريخ، وقت الإنشاء، رقم البند) أو None لقيمة غير صالحة"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        day, created_at, pk = raw.split('|')
+        return date.fromisoformat(day), datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after(key):
+    day, created_at, pk = key
+    return (Q(journal_entry__entry_date__gt=day)
+            | Q(journal_entry__entry_date=day, journal_entry__created_at__gt=created_at)
+            | Q(journal_entry__entry_date=day, journal_entry__created_at=created_at, id__gt=pk))
+
+
+def _before(key):
+    day, created_at, pk = key
+    return (Q(journal_entry__entry_date__lt=day)
+            | Q(journal_entry__entry_date=day, journal_entry__created_at__lt=created_at)
+            | Q(journal_entry__entry_date=day, journal_entry__created_at=created_at, id__lt=pk))
+
+
+class LedgerPage:
+    """صفحة من الدفتر: rows = [{'line', 'balance'}]"""
+
+    def __init__(self, rows, has_previous, has_next):
+        self.rows = rows
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.previous_cursor = encode_cursor(rows[0]['line']) if rows and has_previous else None
+        self.next_cursor = encode_cursor(rows[-1]['line']) if rows and has_next else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+
+class AccountLedger:
+    """حركات حساب واحد ضمن فترة اختيارية"""
+
+    def __init__(self, account, date_from=None, date_to=None):
+        self.account = account
+        self.date_from = date_from
+        self.date_to = date_to
+        self.sign = 1 if account.account_type in DEBIT_NATURE_TYPES else -1
+
+    def lines(self):
+        lines = JournalLine.objects.filter(account_id=self.account.pk)
+        if self.date_from:
+            lines = lines.filter(journal_entry__entry_date__gte=self.date_from)
+        if self.date_to:
+            lines = lines.filter(journal_entry__entry_date__lte=self.date_to)
+        return lines
+
+    def _signed(self, debit, credit):
+        return self.sign * ((debit or Decimal('0')) - (credit or Decimal('0')))
+
+    def _balance_through(self, day):
+        """الرصيد حتى نهاية يوم (شاملاً) من اللقطات"""
+        return self._signed(*AccountSnapshotService.get_totals(self.account.pk, day))
+
+    def opening_balance(self):
+        """الرصيد قبل بداية الفترة"""
+        if not self.date_from:
+            return Decimal('0')
+        return self._balance_through(self.date_from - timedelta(days=1))
+
+    def closing_balance(self):
+        """الرصيد في نهاية الفترة"""
+        return self._balance_through(self.date_to or date.max)
+
+    def totals(self):
+        """إجمالي المدين والدائن للفترة (فرق اللقطات)"""
+        debit, credit = AccountSnapshotService.get_totals(self.account.pk, self.date_to or date.max)
+        if self.date_from:
+            debit_before, credit_before = AccountSnapshotService.get_totals(
+                self.account.pk, self.date_from - timedelta(days=1))
+            debit, credit = debit - debit_before, credit - credit_before
+        return {'total_debit': debit, 'total_credit': credit}
+
+    def balance_before(self, line):
+        """الرصيد قبل بند: لقطة اليوم السابق + بنود نفس اليوم قبله"""
+        entry = line.journal_entry
+        balance = self._balance_through(entry.entry_date - timedelta(days=1))
+        same_day = JournalLine.objects.filter(
+            account_id=self.account.pk, journal_entry__entry_date=entry.entry_date,
+        ).filter(_before((entry.entry_date, entry.created_at, line.pk))).aggregate(
+            debit=Sum('debit'), credit=Sum('credit'),
+        )
+        return balance + self._signed(same_day['debit'], same_day['credit'])
+
+    def page(self, after=None, before=None, size=PAGE_SIZE):
+        """
+        صفحة بعد المؤشر after أو قبل المؤشر before (أو الصفحة الأولى).
+        المؤشرات من LedgerPage.next_cursor / previous_cursor.
+        """
+        lines = self.lines().select_related('journal_entry')
+        after, before = decode_cursor(after), decode_cursor(before)
+        if before:
+            lines = list(lines.filter(_before(before)).order_by(*(f'-{field}' for field in ORDER_FIELDS))[:size + 1])
+            has_previous, has_next = len(lines) > size, True
+            lines = lines[:size][::-1]
+        else:
+            if after:
+                lines = lines.filter(_after(after))
+            lines = list(lines.order_by(*ORDER_FIELDS)[:size + 1])
+            has_previous, has_next = after is not None, len(lines) > size
+            lines = lines[:size]
+
+        rows = []
+        if lines:
+            balance = self.balance_before(lines[0])
+            for line in lines:
+                balance += self._signed(line.debit, line.credit)
+                rows.append({'line': line, 'balance': balance})
+        return LedgerPage(rows, has_previous, has_next)
+
+    def iter_rows(self, chunk_size=2000):
+        """
+        كل بنود الفترة بالترتيب مع الرصيد التراكمي المحسوب في قاعدة البيانات:
+        (التاريخ، رقم القيد، الوصف، المدين، الدائن، الرصيد)
+        """
+        opening = self.opening_balance()
+        running = Window(
+            expression=Sum(F('debit') - F('credit')),
+            order_by=[F(field).asc() for field in ORDER_FIELDS],
+        )
+        rows = self.lines().annotate(running=running).order_by(*ORDER_FIELDS).values_list(
+            'journal_entry__entry_date', 'journal_entry__entry_number', 'line_description',
+            'journal_entry__description', 'debit', 'credit', 'running',
+        )
+        for day, number, line_description, entry_description, debit, credit, total in rows.iterator(
+                chunk_size=chunk_size):
+            yield day, number, line_description or entry_description, debit, credit, opening + self.sign * total
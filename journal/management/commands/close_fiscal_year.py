@@ -0,0 +1,102 @@
+from datetime import date, datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.closing import YearEndClosingEngine
+from journal.models import FiscalYear, YearEndClosing
+from journal.posting import default_created_by
+
+
+class Command(BaseCommand):
+    help = 'إقفال السنة المالية وإنشاء الأرصدة الافتتاحية للسنة التالية (قابل للاستئناف)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='السنة المالية المراد إقفالها')
+        parser.add_argument(
+            '--closing-date',
+            type=str,
+            help='تاريخ الإقفال YYYY-MM-DD (الافتراضي: نهاية السنة المالية أو 31 ديسمبر)',
+        )
+        parser.add_argument(
+            '--username',
+            type=str,
+            help='المستخدم المنفذ (الافتراضي: مدير نشط)',
+        )
+        parser.add_argument(
+            '--open-next',
+            action='store_true',
+            help='إنشاء الأرصدة الافتتاحية للسنة التالية (تُنشأ السنة إذا لم تكن موجودة)',
+        )
+
+    def handle(self, *args, **options):
+        year = options['year']
+        user = self._user(options.get('username'))
+        engine = YearEndClosingEngine(on_progress=self._progress)
+
+        fiscal_year = FiscalYear.objects.filter(year=year).first()
+        if options.get('closing_date'):
+            closing_date = datetime.strptime(options['closing_date'], '%Y-%m-%d').date()
+        else:
+            closing_date = fiscal_year.end_date if fiscal_year else date(year, 12, 31)
+
+        # سجل الإقفال يبقى pending حتى ينجح القيد، فإعادة التشغيل تكمل من حيث توقفت
+        closing, created = YearEndClosing.objects.get_or_create(
+            year=year,
+            defaults={'closing_date': closing_date, 'created_by': user},
+        )
+        if closing.status == 'completed':
+            self.stdout.write(f'السنة {year} مقفلة مسبقاً - تخطي الإقفال')
+        else:
+            self.stdout.write(f'بدء إقفال السنة المالية {year} حتى {closing.closing_date}...')
+            success, message = engine.close(closing)
+            if not success:
+                raise CommandError(str(message))
+            self.stdout.write(self.style.SUCCESS(f'{message} - صافي الربح: {closing.net_profit}'))
+
+        if options['open_next']:
+            self._open_next(engine, year, user)
+
+    def _open_next(self, engine, year, user):
+        previous_year = FiscalYear.objects.filter(year=year).first()
+        if previous_year is None:
+            raise CommandError(f'لا توجد سنة مالية {year} لنقل أرصدتها')
+        if previous_year.status != 'closed':
+            raise CommandError(f'السنة المالية {year} غير مقفلة')
+
+        next_year = FiscalYear.objects.filter(year=year + 1).first()
+        if next_year is None:
+            next_year = FiscalYear.objects.create(
+                year=year + 1,
+                start_date=date(year + 1, 1, 1),
+                end_date=date(year + 1, 12, 31),
+                status='active',
+                is_current=previous_year.is_current,
+                created_by=user,
+            )
+            self.stdout.write(f'تم إنشاء السنة المالية {next_year.year}')
+
+        if next_year.opening_entry_id:
+            self.stdout.write(f'الأرصدة الافتتاحية للسنة {next_year.year} موجودة مسبقاً - تخطي')
+            return
+
+        self.stdout.write(f'إنشاء الأرصدة الافتتاحية للسنة {next_year.year}...')
+        success, message = engine.open_year(next_year, previous_year)
+        if not success:
+            raise CommandError(str(message))
+        self.stdout.write(self.style.SUCCESS(str(message)))
+
+    def _user(self, username):
+        if username:
+            try:
+                return get_user_model().objects.get(username=username)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'لا يوجد مستخدم باسم: {username}')
+        user = default_created_by()
+        if user is None:
+            raise CommandError('لا يوجد مستخدم نشط لتنفيذ الإقفال')
+        return user
+
+    def _progress(self, step, data):
+        details = ', '.join(f'{key}={value}' for key, value in data.items())
+        self.stdout.write(f'  - {step}: {details}')
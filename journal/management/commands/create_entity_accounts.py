@@ -22,6 +22,7 @@ class Command(BaseCommand):
                         name=f'البنك - {bank.name}',
                         account_type='asset',
                         parent=parent_bank_account,
+                        bank_account=bank,
                         description=f'حساب البنك {bank.name}'
                     )
                     created_count += 1
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from journal.models import Account
+from journal.snapshots import AccountSnapshotService
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء لقطات الأرصدة اليومية للحسابات من بنود القيود'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account-code',
+            type=str,
+            help='إعادة بناء لقطات حساب محدد فقط',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='عدد اللقطات في كل دفعة إدخال',
+        )
+
+    def handle(self, *args, **options):
+        account_code = options.get('account_code')
+        account_ids = None
+
+        if account_code:
+            account_ids = list(Account.objects.filter(code=account_code).values_list('id', flat=True))
+            if not account_ids:
+                self.stdout.write(self.style.ERROR(f'لا يوجد حساب بالكود: {account_code}'))
+                return
+
+        self.stdout.write('بدء إعادة بناء لقطات الأرصدة اليومية...')
+        created = AccountSnapshotService.rebuild(account_ids=account_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'تم إنشاء {created} لقطة يومية'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from journal.balance_engine import AccountBalanceEngine
+
+
+class Command(BaseCommand):
+    help = 'مطابقة الأرصدة المخزنة (المحدثة بالفروق) مع إعادة حساب كاملة من بنود القيود'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='تصحيح الأرصدة غير المتطابقة',
+        )
+
+    def handle(self, *args, **options):
+        fix = options.get('fix', False)
+
+        self.stdout.write("=" * 80)
+        self.stdout.write(self.style.SUCCESS("🔍 مطابقة أرصدة الحسابات مع إعادة الحساب الكاملة"))
+        self.stdout.write("=" * 80)
+
+        with transaction.atomic():
+            mismatches = AccountBalanceEngine.verify(fix=fix)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("✅ جميع الأرصدة متطابقة"))
+            return
+
+        for item in mismatches:
+            account = item['account']
+            self.stdout.write(
+                f"📌 {account.code} - {account.name}: "
+                f"المخزن {item['stored']} / المحسوب {item['expected']} / الفرق {item['difference']}"
+            )
+
+        if fix:
+            self.stdout.write(self.style.SUCCESS(f"✅ تم تصحيح {len(mismatches)} حساب"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {len(mismatches)} حساب غير متطابق - استخدم --fix للتصحيح"
+            ))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0026_update_fiscal_year_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('debit_total', models.DecimalField(decimal_places=3, default=0, max_digits=18, verbose_name='Cumulative Debit')),
+                ('credit_total', models.DecimalField(decimal_places=3, default=0, max_digits=18, verbose_name='Cumulative Credit')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='journal.account', verbose_name='Account')),
+            ],
+            options={
+                'verbose_name': 'Account Balance Snapshot',
+                'verbose_name_plural': 'Account Balance Snapshots',
+                'ordering': ['account', 'date'],
+                'default_permissions': [],
+                'unique_together': {('account', 'date')},
+            },
+        ),
+    ]
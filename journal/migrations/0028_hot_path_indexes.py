@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0027_account_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['entry_date', 'id'], name='journal_entry_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['reference_type', 'reference_id'], name='journal_entry_reference_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalline',
+            index=models.Index(fields=['account', 'journal_entry'], name='journal_line_account_entry_idx'),
+        ),
+    ]
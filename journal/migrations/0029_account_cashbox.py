@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_cashbox_and_bank_accounts(apps, schema_editor):
+    """ربط حسابات الصناديق والبنوك الحالية بكياناتها من رموزها (101{id:03d} و 1020{id:04d})"""
+    Account = apps.get_model('journal', 'Account')
+    Cashbox = apps.get_model('cashboxes', 'Cashbox')
+    BankAccount = apps.get_model('banks', 'BankAccount')
+
+    for cashbox_id in Cashbox.objects.values_list('id', flat=True):
+        Account.objects.filter(code=f'101{cashbox_id:03d}', cashbox__isnull=True).update(cashbox_id=cashbox_id)
+    for bank_id in BankAccount.objects.values_list('id', flat=True):
+        Account.objects.filter(code=f'1020{bank_id:04d}', bank_account__isnull=True).update(bank_account_id=bank_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashboxes', '0025_hot_path_indexes'),
+        ('journal', '0028_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='cashbox',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='journal_accounts', to='cashboxes.cashbox', verbose_name='Linked Cash Box'),
+        ),
+        migrations.RunPython(link_cashbox_and_bank_accounts, migrations.RunPython.noop),
+    ]
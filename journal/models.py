@@ -26,6 +26,8 @@ class Account(models.Model):
                               verbose_name=_('Parent Account'), related_name='children')
     bank_account = models.ForeignKey('banks.BankAccount', on_delete=models.SET_NULL, null=True, blank=True,
                                     verbose_name=_('Linked Bank Account'), related_name='journal_accounts')
+    cashbox = models.ForeignKey('cashboxes.Cashbox', on_delete=models.SET_NULL, null=True, blank=True,
+                                verbose_name=_('Linked Cash Box'), related_name='journal_accounts')
     description = models.TextField(_('Description'), blank=True)
     is_active = models.BooleanField(_('Active'), default=True)
     balance = models.DecimalField(_('Balance'), max_digits=15, decimal_places=3, default=0)
@@ -177,30 +179,34 @@ class Account(models.Model):
             return Decimal('0')
         visited.add(self.id)
         
+        # استعلام واحد: هل للحساب أبناء نشطون + مجموع أرصدتهم (+ مجاميع بنوده بدون تاريخ)
+        active_children = Account.objects.filter(parent=models.OuterRef('pk'), is_active=True).order_by()
+        annotations = {
+            'has_children': models.Exists(active_children),
+            'children_total': models.Subquery(
+                active_children.values('parent').annotate(total=models.Sum('balance')).values('total')
+            ),
+        }
+        if not as_of_date:
+            lines = JournalLine.objects.filter(account=models.OuterRef('pk')).order_by().values('account')
+            for field in ('debit', 'credit'):
+                annotations[f'{field}_total'] = models.Subquery(
+                    lines.annotate(total=models.Sum(field)).values('total'),
+                    output_field=models.DecimalField(),
+                )
+        totals = Account.objects.filter(pk=self.pk).annotate(**annotations).values(*annotations).first() or {}
+
         # إذا كان الحساب له حسابات فرعية، اجمع أرصدة الحسابات الفرعية النشطة مباشرة
-        # باستخدام aggregate لعملية واحدة في قاعدة البيانات فقط
-        children_count = self.children.filter(is_active=True).exists()
-        if children_count:
-            # استعلام واحد فقط لجميع الأرصدة
-            total_balance = self.children.filter(is_active=True).aggregate(
-                total=models.Sum('balance')
-            )['total'] or Decimal('0')
-            return total_balance
-        
-        # إذا لم يكن له أبناء، احسب من قيوده الخاصة باستخدام QuerySet المُحسّن
-        lines = JournalLine.objects.filter(account=self).only('debit', 'credit')
-        
+        if totals.get('has_children'):
+            return totals['children_total'] or Decimal('0')
+
         if as_of_date:
-            # فلتر التاريخ يجب أن يكون قبل يتم تنفيذه في قاعدة البيانات
-            lines = lines.filter(journal_entry__entry_date__lte=as_of_date)
-        
-        # استعلام واحد فقط للمجاميع
-        totals = lines.aggregate(
-            debit=models.Sum('debit', output_field=models.DecimalField()), 
-            credit=models.Sum('credit', output_field=models.DecimalField())
-        )
-        debit_total = totals['debit'] or Decimal('0')
-        credit_total = totals['credit'] or Decimal('0')
+            # الرصيد حتى تاريخ: أقرب لقطة يومية + بنود الذيل بدلاً من مسح كل البنود
+            from .snapshots import AccountSnapshotService
+            debit_total, credit_total = AccountSnapshotService.get_totals(self.id, as_of_date)
+        else:
+            debit_total = totals.get('debit_total') or Decimal('0')
+            credit_total = totals.get('credit_total') or Decimal('0')
         
         # تحديد طبيعة الحساب حسب معايير IFRS
         if self.account_type in ['asset', 'expense', 'purchases']:
@@ -354,6 +360,10 @@ class JournalEntry(models.Model):
         verbose_name = _('Journal Entry')
         verbose_name_plural = _('Journal Entries')
         ordering = ['-entry_date', '-created_at']
+        indexes = [
+            models.Index(fields=['entry_date', 'id'], name='journal_entry_date_idx'),
+            models.Index(fields=['reference_type', 'reference_id'], name='journal_entry_reference_idx'),
+        ]
         default_permissions = []  # No default permissions
         permissions = [
             ("can_view_journal_entries", _("View Journal Entries")),
@@ -365,6 +375,13 @@ class JournalEntry(models.Model):
     def __str__(self):
         return f"{self.entry_number} - {self.description}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # تاريخ القيد كما حُمّل - لنقل اللقطات اليومية عند تعديل التاريخ
+        instance._loaded_entry_date = instance.__dict__.get('entry_date')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.entry_number:
             self.entry_number = self.generate_entry_number()
@@ -376,56 +393,10 @@ class JournalEntry(models.Model):
 
     def generate_entry_number(self):
         """توليد رقم القيد من تسلسل المستندات"""
-        try:
-            from core.models import DocumentSequence
-            seq = DocumentSequence.objects.get(document_type='journal_entry')
-            return seq.get_next_number()
-        except DocumentSequence.DoesNotExist:
-            # إذا لم يكن هناك تسلسل، استخدم الطريقة القديمة
-            from datetime import datetime
-            
-            current_year = datetime.now().year
-            base_pattern = f"JE-{current_year}-"
-            
-            # محاولة عدة مرات لتجنب السباق
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                try:
-                    # البحث عن جميع الأرقام المستخدمة في نفس السنة
-                    existing_entries = JournalEntry.objects.filter(
-                        entry_date__year=current_year,
-                        entry_number__startswith=base_pattern
-                    ).values_list('entry_number', flat=True)
-                    
-                    # استخراج الأرقام المستخدمة
-                    used_numbers = set()
-                    for entry_num in existing_entries:
-                        try:
-                            num_part = entry_num.split('-')[-1]
-                            if num_part.isdigit():
-                                used_numbers.add(int(num_part))
-                        except (ValueError, IndexError):
-                            continue
-                    
-                    # البحث عن أصغر رقم متاح
-                    new_number = 1
-                    while new_number in used_numbers:
-                        new_number += 1
-                    
-                    # التحقق من أن الرقم لا يزال متاحاً (قد يكون تم استخدامه في سباق)
-                    candidate_number = f"{base_pattern}{new_number:04d}"
-                    if not JournalEntry.objects.filter(entry_number=candidate_number).exists():
-                        return candidate_number
-                        
-                except Exception:
-                    continue
-            
-            # إذا فشلت جميع المحاولات، استخدم timestamp مع UUID
-            import time
-            import uuid
-            timestamp = str(int(time.time() * 1000000))[-8:]  # microsecond precision
-            unique_part = str(uuid.uuid4().hex)[:4].upper()
-            return f"{base_pattern}{timestamp}-{unique_part}"
+        from core.numbering import DocumentNumberService
+        # إنشاء التسلسل عند غيابه ومزامنته مرة واحدة بدلاً من مسح أرقام السنة في كل قيد
+        DocumentNumberService.ensure_sequence('journal_entry', prefix='JE-')
+        return DocumentNumberService.next_number('journal_entry')
 
     def clean(self):
         """التحقق من توازن القيد"""
@@ -453,10 +424,23 @@ class JournalLine(models.Model):
         verbose_name = _('Journal Line')
         verbose_name_plural = _('Journal Lines')
         default_permissions = []  # No permissions needed
+        indexes = [
+            models.Index(fields=['account', 'journal_entry'], name='journal_line_account_entry_idx'),
+        ]
 
     def __str__(self):
         return f"{self.journal_entry.entry_number} - {self.account.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # حفظ القيم كما حُمّلت لحساب فرق الرصيد عند التعديل أو الحذف دون إعادة الاستعلام
+        loaded = instance.__dict__
+        if all(name in loaded for name in ('account_id', 'journal_entry_id', 'debit', 'credit')):
+            instance._balance_state = (loaded['account_id'], loaded['journal_entry_id'],
+                                       loaded['debit'], loaded['credit'])
+        return instance
+
     def clean(self):
         """التحقق من صحة البيانات"""
         if self.debit < 0 or self.credit < 0:
@@ -483,19 +467,26 @@ class JournalLine(models.Model):
     @property
     def get_running_balance(self):
         """حساب الرصيد التراكمي حتى هذا البند"""
+        from datetime import timedelta
         from django.db.models import Sum
-        
-        # الحصول على جميع الحركات للحساب حتى تاريخ هذا البند
-        lines = JournalLine.objects.filter(
+        from .snapshots import AccountSnapshotService
+
+        entry_date = self.journal_entry.entry_date
+
+        # المجاميع حتى نهاية اليوم السابق من اللقطات اليومية
+        debit_total, credit_total = AccountSnapshotService.get_totals(
+            self.account_id, entry_date - timedelta(days=1)
+        )
+
+        # حركات نفس اليوم حتى هذا البند
+        same_day = JournalLine.objects.filter(
             account=self.account,
-            journal_entry__entry_date__lte=self.journal_entry.entry_date
-        ).exclude(
-            journal_entry__entry_date=self.journal_entry.entry_date,
-            created_at__gt=self.created_at
-        ).order_by('journal_entry__entry_date', 'created_at')
-        
-        debit_total = lines.aggregate(total=Sum('debit'))['total'] or Decimal('0')
-        credit_total = lines.aggregate(total=Sum('credit'))['total'] or Decimal('0')
+            journal_entry__entry_date=entry_date,
+            created_at__lte=self.created_at
+        ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
+
+        debit_total += same_day['debit'] or Decimal('0')
+        credit_total += same_day['credit'] or Decimal('0')
         
         # حسب نوع الحساب
         if self.account.account_type in ['asset', 'expense', 'purchases']:
@@ -504,6 +495,25 @@ class JournalLine(models.Model):
             return credit_total - debit_total
 
 
+class AccountBalanceSnapshot(models.Model):
+    """لقطة يومية تراكمية لمجاميع مدين ودائن الحساب حتى نهاية اليوم"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE,
+                                verbose_name=_('Account'), related_name='balance_snapshots')
+    date = models.DateField(_('Date'))
+    debit_total = models.DecimalField(_('Cumulative Debit'), max_digits=18, decimal_places=3, default=0)
+    credit_total = models.DecimalField(_('Cumulative Credit'), max_digits=18, decimal_places=3, default=0)
+
+    class Meta:
+        verbose_name = _('Account Balance Snapshot')
+        verbose_name_plural = _('Account Balance Snapshots')
+        unique_together = ['account', 'date']
+        ordering = ['account', 'date']
+        default_permissions = []  # No permissions needed
+
+    def __str__(self):
+        return f"{self.account_id} - {self.date}"
+
+
 class YearEndClosing(models.Model):
     """إقفال السنة المالية"""
     STATUS_CHOICES = [
@@ -563,100 +573,9 @@ class YearEndClosing(models.Model):
         return self.net_profit
 
     def perform_closing(self):
-        """إجراء الإقفال السنوي"""
-        if self.status == 'completed':
-            return False, _("Closing already completed")
-        
-        # حساب صافي الربح
-        self.calculate_net_profit()
-        
-        # إنشاء قيد الإقفال
-        closing_entry = JournalEntry.objects.create(
-            entry_date=self.closing_date,
-            description=f"إقفال السنة المالية {self.year}",
-            reference_type='year_end_closing',
-            total_amount=abs(self.net_profit),
-            created_by=self.created_by
-        )
-        
-        # الحصول على جميع حسابات الإيرادات والمصروفات النشطة
-        revenue_accounts = Account.objects.filter(
-            account_type__in=['revenue', 'sales'], 
-            is_active=True
-        )
-        expense_accounts = Account.objects.filter(
-            account_type__in=['expense', 'purchases'], 
-            is_active=True
-        )
-        
-        # إقفال حسابات الإيرادات (مدين)
-        # نقفل فقط الحسابات التي لها رصيد فعلي
-        for account in revenue_accounts:
-            balance = account.get_balance(as_of_date=self.closing_date)
-            # تجاهل الحسابات التي ليس لها رصيد أو التي هي حسابات رئيسية بدون حركات مباشرة
-            if balance > 0:
-                # التحقق من وجود حركات مباشرة على الحساب
-                has_direct_lines = JournalLine.objects.filter(
-                    account=account,
-                    journal_entry__entry_date__year=self.year
-                ).exists()
-                
-                if has_direct_lines:
-                    JournalLine.objects.create(
-                        journal_entry=closing_entry,
-                        account=account,
-                        debit=balance,
-                        credit=Decimal('0'),
-                        line_description=f"إقفال حساب {account.name}"
-                    )
-        
-        # إقفال حسابات المصروفات (دائن)
-        for account in expense_accounts:
-            balance = account.get_balance(as_of_date=self.closing_date)
-            if balance > 0:
-                # التحقق من وجود حركات مباشرة على الحساب
-                has_direct_lines = JournalLine.objects.filter(
-                    account=account,
-                    journal_entry__entry_date__year=self.year
-                ).exists()
-                
-                if has_direct_lines:
-                    JournalLine.objects.create(
-                        journal_entry=closing_entry,
-                        account=account,
-                        debit=Decimal('0'),
-                        credit=balance,
-                        line_description=f"إقفال حساب {account.name}"
-                    )
-        
-        # نقل صافي الربح أو الخسارة إلى رأس المال
-        retained_earnings = Account.objects.filter(account_type='equity', name__icontains='رأس المال').first()
-        if retained_earnings:
-            if self.net_profit > 0:
-                # ربح: دائن في رأس المال
-                JournalLine.objects.create(
-                    journal_entry=closing_entry,
-                    account=retained_earnings,
-                    debit=Decimal('0'),
-                    credit=self.net_profit,
-                    line_description="نقل صافي الربح إلى رأس المال"
-                )
-            elif self.net_profit < 0:
-                # خسارة: مدين في رأس المال
-                loss = abs(self.net_profit)
-                JournalLine.objects.create(
-                    journal_entry=closing_entry,
-                    account=retained_earnings,
-                    debit=loss,
-                    credit=Decimal('0'),
-                    line_description="نقل صافي الخسارة من رأس المال"
-                )
-        
-        self.closing_entry = closing_entry
-        self.status = 'completed'
-        self.save()
-        
-        return True, _("Year end closing performed successfully")
+        """إجراء الإقفال السنوي (انظر journal.closing.YearEndClosingEngine)"""
+        from .closing import YearEndClosingEngine
+        return YearEndClosingEngine().close(self)
 
 
 class FiscalYear(models.Model):
@@ -710,9 +629,8 @@ class FiscalYear(models.Model):
         """
         إنشاء الأرصدة الافتتاحية للسنة الجديدة
         ينقل أرصدة الأصول والخصوم وحقوق الملكية من السنة السابقة
+        (انظر journal.closing.YearEndClosingEngine)
         """
-        from datetime import datetime
-        
         # إذا لم يتم تحديد السنة السابقة، استخدم السنة التي قبلها
         if previous_year is None:
             try:
@@ -724,66 +642,5 @@ class FiscalYear(models.Model):
         if previous_year.status != 'closed':
             return False, _("Previous fiscal year must be closed first")
         
-        # إنشاء قيد الأرصدة الافتتاحية
-        opening_entry = JournalEntry.objects.create(
-            entry_date=self.start_date,
-            description=f"الأرصدة الافتتاحية للسنة المالية {self.year}",
-            reference_type='opening_balance',
-            total_amount=Decimal('0'),
-            created_by=self.created_by
-        )
-        
-        # الحسابات التي تنتقل أرصدتها (الميزانية العمومية فقط - لا تنتقل الإيرادات والمصروفات)
-        balance_sheet_types = ['asset', 'liability', 'equity']
-        accounts = Account.objects.filter(
-            account_type__in=balance_sheet_types,
-            is_active=True
-        )
-        
-        total_debits = Decimal('0')
-        total_credits = Decimal('0')
-        
-        for account in accounts:
-            # حساب الرصيد في نهاية السنة السابقة
-            balance = account.get_balance(as_of_date=previous_year.end_date)
-            
-            if balance != 0:
-                # التحقق من وجود حركات على الحساب في السنة السابقة
-                has_movements = JournalLine.objects.filter(
-                    account=account,
-                    journal_entry__entry_date__range=[previous_year.start_date, previous_year.end_date]
-                ).exists()
-                
-                if has_movements or balance != 0:
-                    # حسابات الأصول والمصروفات طبيعتها مدينة
-                    # حسابات الخصوم والإيرادات وحقوق الملكية طبيعتها دائنة
-                    if account.account_type in ['asset']:
-                        # رصيد موجب = مدين
-                        debit = abs(balance) if balance > 0 else Decimal('0')
-                        credit = abs(balance) if balance < 0 else Decimal('0')
-                    else:  # liability, equity
-                        # رصيد موجب = دائن
-                        credit = abs(balance) if balance > 0 else Decimal('0')
-                        debit = abs(balance) if balance < 0 else Decimal('0')
-                    
-                    if debit > 0 or credit > 0:
-                        JournalLine.objects.create(
-                            journal_entry=opening_entry,
-                            account=account,
-                            debit=debit,
-                            credit=credit,
-                            line_description=f"رصيد افتتاحي من سنة {previous_year.year}"
-                        )
-                        
-                        total_debits += debit
-                        total_credits += credit
-        
-        # تحديث إجمالي القيد
-        opening_entry.total_amount = max(total_debits, total_credits)
-        opening_entry.save()
-        
-        # ربط القيد بالسنة المالية
-        self.opening_entry = opening_entry
-        self.save()
-        
-        return True, _("Opening balances created successfully")
+        from .closing import YearEndClosingEngine
+        return YearEndClosingEngine().open_year(self, previous_year)
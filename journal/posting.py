@@ -0,0 +1,271 @@
+"""
+ترحيل القيود المجمّع (JournalPostingService)
+
+JournalService.create_journal_entry ينشئ القيد ثم يحفظه مرة ثانية لنوع المرجع
+ثم ينشئ البنود واحداً واحداً، وكل بند يمر بإشارات post_save (الرصيد، حركات
+الصندوق/البنك، المزامنة). هذا مناسب لمستند واحد، لكنه بطيء جداً عند ترحيل
+آلاف البنود (الأرصدة الافتتاحية، الرواتب، الاستيراد، إقفال السنة).
+
+post_entries يرحّل قائمة قيود دفعة واحدة:
+- التحقق من التوازن والمبالغ والحسابات في الذاكرة (استعلام واحد للحسابات)
+  قبل كتابة أي شيء؛ أي خطأ يرفع ValueError ولا يُكتب شيء.
+- حجز أرقام القيود بتحديث واحد لعداد التسلسل، ثم bulk_create للقيود والبنود.
+- تطبيق فروق الأرصدة واللقطات اليومية مرة واحدة لكل حساب متأثر
+  (AccountBalanceEngine) داخل نفس المعاملة.
+- حركات الصندوق/البنك للبنود على حساباتها تُنشأ بعد تثبيت المعاملة في
+  مرور واحد، وسجل مراجعة واحد للعملية، وتُفهرس القيود للبحث الشامل دفعة واحدة.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from .balance_engine import AccountBalanceEngine
+from .models import Account, JournalEntry, JournalLine
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+ROUNDING_TOLERANCE = Decimal('0.001')
+
+# حقول القيد التي يمكن تمريرها مع كل قيد
+ENTRY_FIELDS = ('entry_type', 'reference_type', 'reference_id', 'entry_number', 'sales_invoice', 'sales_return',
+                'purchase_invoice', 'purchase_return', 'cashbox_transfer', 'bank_transfer', 'created_by')
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def balance_lines(lines_data, reference=None):
+    """
+    التحقق من توازن بنود قيد وضبط فرق التقريب الصغير على آخر سطر مناسب.
+
+    Args:
+        lines_data: [{'account_id', 'debit', 'credit', 'description'}] - تُعدّل في مكانها
+        reference: وصف القيد في الرسائل
+
+    Returns:
+        tuple: (إجمالي المدين، إجمالي الدائن)
+
+    Raises:
+        ValueError: إذا تجاوز الفرق حد التقريب
+    """
+    total_debit = sum(_amount(line.get('debit')) for line in lines_data)
+    total_credit = sum(_amount(line.get('credit')) for line in lines_data)
+    diff = total_debit - total_credit
+    if abs(diff) > ROUNDING_TOLERANCE:
+        logger.warning(f"⚠️ عدم توازن قيد ({reference}) debit={total_debit} credit={total_credit} diff={diff}")
+        raise ValueError(_('The total amount owed must equal the total amount owed.'))
+    if diff == 0:
+        return total_debit, total_credit
+
+    side, amount = ('credit', diff) if diff > 0 else ('debit', -diff)
+    target = next((line for line in reversed(lines_data) if _amount(line.get(side)) > 0), None)
+    if target is None and lines_data:
+        target = lines_data[-1]
+    if target is not None:
+        target[side] = _amount(target.get(side)) + amount
+    total_debit = sum(_amount(line.get('debit')) for line in lines_data)
+    total_credit = sum(_amount(line.get('credit')) for line in lines_data)
+    logger.debug(f"تم تعديل القيد ({reference}) لتوازن فرق التقريب: debit={total_debit} credit={total_credit}")
+    return total_debit, total_credit
+
+
+def default_created_by():
+    """منشئ القيود عند عدم تحديد مستخدم: مدير نشط ثم أول مستخدم نشط"""
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    return User.objects.filter(is_active=True, is_superuser=True).first() or User.objects.filter(is_active=True).first()
+
+
+class JournalPostingService:
+    """ترحيل مجموعة قيود دفعة واحدة"""
+
+    @staticmethod
+    def post_entries(entries, user=None):
+        """
+        ترحيل قيود متعددة.
+
+        Args:
+            entries: [{'entry_date', 'description', 'lines': [{'account_id', 'debit', 'credit', 'description'}],
+                       + أي من ENTRY_FIELDS}]
+            user: منشئ القيود (الافتراضي: مدير نشط)
+
+        Returns:
+            list: القيود بنفس ترتيب المدخلات؛ None للقيد الصفري، والقيد الموجود
+            مسبقاً لنفس reference_type/reference_id (نفس سلوك create_journal_entry)
+
+        Raises:
+            ValueError: قيد غير متوازن، مبلغ سالب، بند مدين ودائن معاً، أو حساب غير موجود
+        """
+        prepared = [JournalPostingService._prepare(index, entry) for index, entry in enumerate(entries)]
+        JournalPostingService._validate_accounts(prepared)
+
+        results = [None] * len(prepared)
+        existing = JournalPostingService._existing_entries(prepared)
+        to_create = []
+        # مرجعان متطابقان في نفس الدفعة: قيد واحد فقط يُعاد للاثنين
+        first_index = {}
+        duplicates = []
+        for index, item in enumerate(prepared):
+            if item is None:
+                continue
+            reference = (item['fields'].get('reference_type'), item['fields'].get('reference_id'))
+            if reference in existing:
+                results[index] = existing[reference]
+                continue
+            if all(reference):
+                if reference in first_index:
+                    duplicates.append((index, first_index[reference]))
+                    continue
+                first_index[reference] = index
+            to_create.append((index, item))
+        if not to_create:
+            return results
+
+        created_by = user or default_created_by()
+        with transaction.atomic():
+            entries_to_insert = [
+                JournalEntry(
+                    entry_date=item['entry_date'],
+                    description=item['description'],
+                    total_amount=item['total'],
+                    **{'created_by': created_by, 'entry_type': 'daily', **item['fields']},
+                )
+                for index, item in to_create
+            ]
+            JournalPostingService._assign_numbers(entries_to_insert)
+            JournalEntry.objects.bulk_create(entries_to_insert, batch_size=BATCH_SIZE)
+
+            lines = []
+            changes = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+            for entry, (index, item) in zip(entries_to_insert, to_create):
+                results[index] = entry
+                AccountBalanceEngine.remember_entry_date(entry)
+                for line in item['lines']:
+                    lines.append(JournalLine(
+                        journal_entry=entry,
+                        account_id=line['account_id'],
+                        debit=line['debit'],
+                        credit=line['credit'],
+                        line_description=line['description'],
+                    ))
+                    key = (line['account_id'], entry.pk)
+                    changes[key][0] += line['debit']
+                    changes[key][1] += line['credit']
+            JournalLine.objects.bulk_create(lines, batch_size=BATCH_SIZE)
+
+            # الأرصدة واللقطات ومزامنة البنوك: مرة واحدة لكل حساب متأثر
+            AccountBalanceEngine.record(changes)
+
+            transaction.on_commit(lambda: JournalPostingService._after_commit(lines, created_by))
+
+        for index, original in duplicates:
+            results[index] = results[original]
+        logger.info(f"تم ترحيل {len(entries_to_insert)} قيد و {len(lines)} بند دفعة واحدة")
+        return results
+
+    @staticmethod
+    def _prepare(index, entry):
+        """تحويل القيد إلى مبالغ Decimal والتحقق منه في الذاكرة؛ None للقيد الصفري"""
+        lines = []
+        for line in entry.get('lines', ()):
+            debit, credit = _amount(line.get('debit')), _amount(line.get('credit'))
+            if debit < 0 or credit < 0:
+                raise ValueError(f"{_('Amounts must be positive')} (#{index + 1})")
+            if debit > 0 and credit > 0:
+                raise ValueError(f"{_('Line cannot be both debit and credit')} (#{index + 1})")
+            if debit == 0 and credit == 0:
+                continue
+            lines.append({'account_id': line['account_id'], 'debit': debit, 'credit': credit,
+                          'description': line.get('description', '')})
+        if not lines:
+            return None
+
+        total_debit, total_credit = balance_lines(lines, reference=f"#{index + 1} {entry.get('description', '')}")
+        return {
+            'entry_date': entry['entry_date'],
+            'description': entry.get('description', ''),
+            'total': total_debit,
+            'lines': lines,
+            'fields': {name: entry[name] for name in ENTRY_FIELDS if entry.get(name) is not None},
+        }
+
+    @staticmethod
+    def _validate_accounts(prepared):
+        account_ids = {line['account_id'] for item in prepared if item for line in item['lines']}
+        found = set(Account.objects.filter(pk__in=account_ids).values_list('pk', flat=True))
+        missing = account_ids - found
+        if missing:
+            raise ValueError(f"{_('Account')}: {sorted(missing)}")
+
+    @staticmethod
+    def _existing_entries(prepared):
+        """القيود الموجودة لنفس المراجع باستعلام واحد"""
+        references = {
+            (item['fields']['reference_type'], item['fields']['reference_id'])
+            for item in prepared
+            if item and item['fields'].get('reference_type') and item['fields'].get('reference_id')
+        }
+        if not references:
+            return {}
+        existing = {}
+        queryset = JournalEntry.objects.filter(
+            reference_type__in={reference[0] for reference in references},
+            reference_id__in={reference[1] for reference in references},
+        )
+        for entry in queryset:
+            reference = (entry.reference_type, entry.reference_id)
+            if reference in references:
+                existing.setdefault(reference, entry)
+        return existing
+
+    @staticmethod
+    def _assign_numbers(entries):
+        """حجز أرقام القيود بتحديث واحد لعداد التسلسل"""
+        from core.numbering import DocumentNumberService, format_document_number
+
+        unnumbered = [entry for entry in entries if not entry.entry_number]
+        if not unnumbered:
+            return
+        DocumentNumberService.ensure_sequence('journal_entry', prefix='JE-')
+        prefix, digits, first = DocumentNumberService.allocate('journal_entry', len(unnumbered))
+        for offset, entry in enumerate(unnumbered):
+            entry.entry_number = format_document_number(prefix, digits, first + offset)
+
+    @staticmethod
+    def _index_entries(entry_ids):
+        """bulk_create لا يطلق post_save: فهرسة القيود في البحث الشامل دفعة واحدة"""
+        try:
+            from search.documents import DOCUMENT_TYPES_BY_NAME
+            from search.services import SearchIndexService
+
+            doc_type = DOCUMENT_TYPES_BY_NAME['journal_entry']
+            SearchIndexService.reindex(doc_type, doc_type.queryset().filter(pk__in=entry_ids))
+        except Exception as e:
+            logger.error(f"خطأ في فهرسة القيود المرحّلة دفعة واحدة للبحث: {e}")
+
+    @staticmethod
+    def _after_commit(lines, user):
+        """حركات الصندوق/البنك للبنود على حساباتها دفعة واحدة وسجل مراجعة واحد"""
+        from .signals import create_cashbox_bank_transactions
+
+        create_cashbox_bank_transactions(lines)
+        JournalPostingService._index_entries({line.journal_entry_id for line in lines})
+
+        if user is not None:
+            try:
+                from core.models import AuditLog
+                entry_count = len({line.journal_entry_id for line in lines})
+                AuditLog.objects.create(
+                    user=user,
+                    action_type='create',
+                    content_type='JournalEntry',
+                    description=f'ترحيل مجمّع: {entry_count} قيد و {len(lines)} بند',
+                )
+            except Exception as audit_error:
+                logger.error(f"خطأ في تسجيل الترحيل المجمّع في سجل المراجعة: {audit_error}")
@@ -1,8 +1,12 @@
 from django.db import transaction
+from django.db.models import Sum
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 from datetime import date
 from .models import Account, JournalEntry, JournalLine
+from .balance_engine import AccountBalanceEngine
+from .posting import JournalPostingService, balance_lines
+from .account_resolver import AccountResolver, BANK, CASHBOX, CUSTOMER, SUPPLIER, WAREHOUSE
 
 
 class JournalService:
@@ -49,35 +53,8 @@ class JournalService:
                 print(f"تجاهل إنشاء قيد صفري - {reference_id}")
                 return None
             
-            # التحقق من توازن القيد
-            diff = total_debit - total_credit
-            if abs(diff) > Decimal('0.001'):
-                print(f"⚠️ عدم توازن قيد journal (ref={reference_type}:{reference_id}) debit={total_debit} credit={total_credit} diff={diff}")
-                raise ValueError(_('The total amount owed must equal the total amount owed.'))
-            if diff != 0:
-                # ضبط فرق التقريب الصغير على آخر سطر مناسب
-                adjusted = False
-                if diff > 0:
-                    for line_data in reversed(lines_data):
-                        if Decimal(str(line_data.get('credit', 0))) > 0:
-                            line_data['credit'] = Decimal(str(line_data.get('credit', 0))) + diff
-                            adjusted = True
-                            break
-                else:
-                    for line_data in reversed(lines_data):
-                        if Decimal(str(line_data.get('debit', 0))) > 0:
-                            line_data['debit'] = Decimal(str(line_data.get('debit', 0))) - diff
-                            adjusted = True
-                            break
-                if not adjusted and lines_data:
-                    last_line = lines_data[-1]
-                    if diff > 0:
-                        last_line['credit'] = Decimal(str(last_line.get('credit', 0))) + diff
-                    else:
-                        last_line['debit'] = Decimal(str(last_line.get('debit', 0))) - diff
-                total_debit = sum(Decimal(str(line.get('debit', 0))) for line in lines_data)
-                total_credit = sum(Decimal(str(line.get('credit', 0))) for line in lines_data)
-                print(f"✅ تم تعديل قيد journal لتوازن الفرق: debit={total_debit} credit={total_credit}")
+            # التحقق من توازن القيد وضبط فرق التقريب الصغير على آخر سطر مناسب
+            total_debit, total_credit = balance_lines(lines_data, reference=f'{reference_type}:{reference_id}')
             
             # إنشاء القيد
             # ملاحظة: entry_type موجود في قاعدة البيانات كـ NOT NULL
@@ -123,61 +100,39 @@ class JournalService:
                 journal_entry.reference_type = reference_type
                 journal_entry.save(update_fields=['reference_type'])
             
-            # إنشاء بنود القيد
-            for line_data in lines_data:
-                JournalLine.objects.create(
-                    journal_entry=journal_entry,
-                    account_id=line_data['account_id'],
-                    debit=Decimal(str(line_data.get('debit', 0))),
-                    credit=Decimal(str(line_data.get('credit', 0))),
-                    line_description=line_data.get('description', '')
-                )
+            # إنشاء بنود القيد - تُرحّل فروق الأرصدة مرة واحدة للقيد كاملاً
+            with AccountBalanceEngine.deferred():
+                for line_data in lines_data:
+                    JournalLine.objects.create(
+                        journal_entry=journal_entry,
+                        account_id=line_data['account_id'],
+                        debit=Decimal(str(line_data.get('debit', 0))),
+                        credit=Decimal(str(line_data.get('credit', 0))),
+                        line_description=line_data.get('description', '')
+                    )
             
             return journal_entry
 
     @staticmethod
-    def get_cash_account():
-        """الحصول على حساب النقد/الصندوق الافتراضي"""
-        try:
-            # البحث عن حساب النقد الافتراضي
-            account = Account.objects.filter(code='101').first()
-            if account:
-                return account
-            
-            # التأكد من وجود الحساب الأب (النقد وما في حكمه)
-            parent_account, _ = Account.objects.get_or_create(
-                code='10',
-                defaults={
-                    'name': 'النقد وما في حكمه',
-                    'account_type': 'asset',
-                    'description': 'حساب رئيسي للنقد والأرصدة النقدية - حسب IFRS'
-                }
-            )
-            
-            # إنشاء حساب النقد إذا لم يكن موجوداً
-            account = Account.objects.create(
-                code='101',
-                name='النقد في الصندوق',
-                account_type='asset',
-                parent=parent_account,  # ✅ إضافة الحساب الأب - متوافق مع IFRS
-                description='حساب النقد في الصندوق الرئيسي'
-            )
-            return account
-        except Exception as e:
-            print(f"خطأ في الحصول على حساب النقد: {e}")
-            raise
+    def create_journal_entries(entries, user=None):
+        """
+        إنشاء قيود متعددة دفعة واحدة (الأرصدة الافتتاحية، الرواتب، الاستيراد، الإقفال)
+
+        انظر JournalPostingService.post_entries
+        """
+        return JournalPostingService.post_entries(entries, user=user)
 
     @staticmethod
     def get_purchases_account():
         """الحصول على حساب المشتريات"""
         try:
             # البحث عن حساب المشتريات
-            account = Account.objects.filter(code='501').first()
+            account = AccountResolver.get('501')
             if account:
                 return account
             
             # التأكد من وجود الحساب الأب (المصاريف التشغيلية)
-            parent_account, _ = Account.objects.get_or_create(
+            parent_account, _ = AccountResolver.get_or_create(
                 code='50',
                 defaults={
                     'name': 'تكلفة المبيعات والمشتريات',
@@ -199,51 +154,6 @@ class JournalService:
             print(f"خطأ في الحصول على حساب المشتريات: {e}")
             raise
 
-    @staticmethod
-    def get_tax_receivable_account():
-        """الحصول على حساب ضريبة القيمة المضافة المدخلة"""
-        try:
-            # البحث عن حساب الضريبة المدخلة
-            account = Account.objects.filter(code='141').first()
-            if account:
-                return account
-            
-            # إنشاء حساب الضريبة المدخلة إذا لم يكن موجوداً
-            account = Account.objects.create(
-                code='141',
-                name='ضريبة القيمة المضافة مدخلة',
-                account_type='asset',
-                description='حساب ضريبة القيمة المضافة المدخلة من الموردين'
-            )
-            return account
-        except Exception as e:
-            print(f"خطأ في الحصول على حساب الضريبة المدخلة: {e}")
-            raise
-
-    @staticmethod
-    def get_or_create_supplier_account(supplier):
-        """الحصول على حساب المورد أو إنشاؤه إذا لم يكن موجوداً"""
-        try:
-            if not supplier:
-                raise ValueError("المورد مطلوب")
-            
-            # البحث عن حساب المورد
-            account = Account.objects.filter(code=f'201-{supplier.id}').first()
-            if account:
-                return account
-            
-            # إنشاء حساب المورد إذا لم يكن موجوداً
-            account = Account.objects.create(
-                code=f'201-{supplier.id}',
-                name=f'المورد: {supplier.name}',
-                account_type='liability',
-                description=f'حساب المورد {supplier.name}'
-            )
-            return account
-        except Exception as e:
-            print(f"خطأ في الحصول على حساب المورد: {e}")
-            raise
-
     @staticmethod
     def create_warehouse_transfer_entry(transfer, user=None):
         """إنشاء قيد محاسبي لتحويل المستودعات"""
@@ -599,9 +509,7 @@ class JournalService:
             movement_type='out'
         )
         
-        total_cogs = Decimal('0')
-        for movement in movements:
-            total_cogs += movement.total_cost
+        total_cogs = movements.aggregate(total=Sum('total_cost'))['total'] or Decimal('0')
         
         if total_cogs <= 0:
             return None  # لا يوجد تكلفة للتسجيل
@@ -1035,7 +943,7 @@ class JournalService:
     @staticmethod
     def get_cash_account():
         """الحصول على حساب الصندوق"""
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='1010',
             defaults={
                 'name': 'الصندوق',
@@ -1049,7 +957,7 @@ class JournalService:
     def get_sales_account():
         """الحصول على حساب المبيعات"""
         # التأكد من وجود الحساب الأب (الإيرادات)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='40',
             defaults={
                 'name': 'الإيرادات',
@@ -1058,7 +966,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='4010',
             defaults={
                 'name': 'المبيعات',
@@ -1073,7 +981,7 @@ class JournalService:
     def get_sales_discount_account():
         """الحصول على حساب خصم المبيعات"""
         # التأكد من وجود الحساب الأب (الخصومات والمسموحات)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='42',
             defaults={
                 'name': 'خصومات ومسموحات المبيعات',
@@ -1082,7 +990,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='4020',
             defaults={
                 'name': 'خصم المبيعات',
@@ -1100,7 +1008,7 @@ class JournalService:
             return JournalService.get_cash_account()
         
         # التأكد من وجود الحساب الأب (النقد في الصناديق) - رمز 1010
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='1010',
             defaults={
                 'name': 'الصندوق',
@@ -1111,108 +1019,31 @@ class JournalService:
         
         # استخدام نفس نمط الرمز الأصلي: 101{id:03d}
         code = f'101{cashbox.id:03d}'
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.for_entity(
+            CASHBOX, cashbox.id,
             code=code,
             defaults={
                 'name': f'صندوق - {cashbox.name}',
                 'account_type': 'asset',
                 'parent': parent_account,  # ✅ إضافة الحساب الأب - متوافق مع IFRS
+                'cashbox': cashbox,
                 'description': f'حساب الصندوق {cashbox.name}'
             }
         )
         
-        # تحديث parent إذا لم يكن موجوداً (للحسابات القديمة)
-        if not account.parent and not created:
+        # تحديث parent والربط بالصندوق إذا لم يكونا موجودين (للحسابات القديمة)
+        update_fields = []
+        if account.parent_id is None and not created:
             account.parent = parent_account
-            account.save(update_fields=['parent'])
+            update_fields.append('parent')
+        if account.cashbox_id is None:
+            account.cashbox = cashbox
+            update_fields.append('cashbox')
+        if update_fields:
+            account.save(update_fields=update_fields)
         
         return account
     
-    @staticmethod
-    def get_warehouse_account(warehouse):
-        """الحصول على حساب المستودع"""
-        account, created = Account.objects.get_or_create(
-            code=f'120{warehouse.id:03d}',
-            defaults={
-                'name': f'مستودع - {warehouse.name}',
-                'account_type': 'asset',
-                'description': f'حساب المخزون للمستودع {warehouse.name}'
-            }
-        )
-        return account
-    
-    @staticmethod
-    def get_or_create_supplier_account(supplier):
-        """الحصول على حساب المورد أو إنشاؤه إذا لم يكن موجوداً"""
-        try:
-            if not supplier:
-                raise ValueError("المورد مطلوب")
-            
-            # البحث عن حساب المورد
-            account = Account.objects.filter(code=f'201-{supplier.id}').first()
-            if account:
-                return account
-            
-            # إنشاء حساب المورد إذا لم يكن موجوداً
-            account = Account.objects.create(
-                code=f'201-{supplier.id}',
-                name=f'المورد: {supplier.name}',
-                account_type='liability',
-                description=f'حساب المورد {supplier.name}'
-            )
-            return account
-        except Exception as e:
-            print(f"خطأ في الحصول على حساب المورد: {e}")
-            raise
-
-    @staticmethod
-    def get_or_create_supplier_account(supplier):
-        """الحصول على حساب المورد أو إنشاؤه"""
-        # التأكد من وجود الحساب الأب (حسابات الموردين)
-        parent_account, _ = Account.objects.get_or_create(
-            code='210',
-            defaults={
-                'name': 'حسابات الموردين',
-                'account_type': 'liability',
-                'description': 'حساب رئيسي لحسابات الموردين - حسب IFRS'
-            }
-        )
-        
-        account, created = Account.objects.get_or_create(
-            code=f'210{supplier.sequence_number:04d}',
-            defaults={
-                'name': supplier.name,
-                'account_type': 'liability',
-                'parent': parent_account,  # ✅ إضافة الحساب الأب - متوافق مع IFRS
-                'description': f'حساب المورد {supplier.name}'
-            }
-        )
-        return account
-    
-    @staticmethod
-    def get_or_create_bank_account(bank_account):
-        """الحصول على حساب بنك أو إنشاؤه"""
-        # التأكد من وجود الحساب الأب (الحسابات البنكية)
-        parent_account, _ = Account.objects.get_or_create(
-            code='102',
-            defaults={
-                'name': 'الحسابات البنكية',
-                'account_type': 'asset',
-                'description': 'حساب رئيسي للحسابات البنكية - حسب IFRS'
-            }
-        )
-        
-        account, created = Account.objects.get_or_create(
-            code=f'102{str(bank_account.id).zfill(6)}',
-            defaults={
-                'name': f'البنك - {bank_account.name}',
-                'account_type': 'asset',
-                'parent': parent_account,  # ✅ إضافة الحساب الأب - متوافق مع IFRS
-                'description': f'حساب بنك {bank_account.name}'
-            }
-        )
-        return account
-    
     @staticmethod
     def create_cashbox_transfer_entry(transfer, user=None):
         """إنشاء قيد تحويل الصناديق"""
@@ -1305,7 +1136,7 @@ class JournalService:
     def get_tax_payable_account():
         """الحصول على حساب ضريبة مستحقة الدفع"""
         # أولاً، التأكد من وجود الحساب الرئيسي
-        parent_account, created = Account.objects.get_or_create(
+        parent_account, created = AccountResolver.get_or_create(
             code='2030',
             defaults={
                 'name': 'الضرائب المستحقة الدفع',
@@ -1316,7 +1147,7 @@ class JournalService:
         
         # إنشاء حساب فرعي لضريبة القيمة المضافة
         vat_code = '203001'
-        vat_account, created = Account.objects.get_or_create(
+        vat_account, created = AccountResolver.get_or_create(
             code=vat_code,
             defaults={
                 'name': 'ضريبة القيمة المضافة مستحقة الدفع',
@@ -1332,12 +1163,12 @@ class JournalService:
         """الحصول على حساب ضريبة القيمة المضافة المدخلة"""
         try:
             # البحث عن حساب الضريبة المدخلة
-            account = Account.objects.filter(code='141').first()
+            account = AccountResolver.get('141')
             if account:
                 return account
             
             # التأكد من وجود الحساب الأب (الذمم المدينة الأخرى)
-            parent_account, _ = Account.objects.get_or_create(
+            parent_account, _ = AccountResolver.get_or_create(
                 code='14',
                 defaults={
                     'name': 'ذمم مدينة أخرى',
@@ -1363,7 +1194,7 @@ class JournalService:
     def get_inventory_account():
         """الحصول على حساب المخزون العام"""
         # التأكد من وجود الحساب الأب (الأصول المتداولة - المخزون)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='12',
             defaults={
                 'name': 'المخزون',
@@ -1372,7 +1203,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='1020',
             defaults={
                 'name': 'المخزون العام',
@@ -1390,12 +1221,13 @@ class JournalService:
             return JournalService.get_inventory_account()
         
         code = f"1201{warehouse.id:04d}"
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.for_entity(
+            WAREHOUSE, warehouse.id,
             code=code,
             defaults={
                 'name': f'مستودع - {warehouse.name}',
                 'account_type': 'asset',
-                'parent': Account.objects.filter(code='1201').first(),
+                'parent': AccountResolver.get('1201'),
                 'description': f'حساب المستودع {warehouse.name}'
             }
         )
@@ -1405,7 +1237,7 @@ class JournalService:
     def get_cogs_account():
         """الحصول على حساب تكلفة البضاعة المباعة"""
         # التأكد من وجود الحساب الأب (تكلفة المبيعات)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='50',
             defaults={
                 'name': 'تكلفة المبيعات والمشتريات',
@@ -1414,7 +1246,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='5001',
             defaults={
                 'name': 'تكلفة البضاعة المباعة',
@@ -1429,7 +1261,7 @@ class JournalService:
     def get_or_create_customer_account(customer):
         """الحصول على حساب العميل أو إنشاؤه"""
         # التأكد من وجود الحساب الأب (حسابات العملاء)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='1301',
             defaults={
                 'name': 'حسابات العملاء',
@@ -1439,7 +1271,8 @@ class JournalService:
         )
         
         code = f"1301{customer.id:04d}"
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.for_entity(
+            CUSTOMER, customer.id,
             code=code,
             defaults={
                 'name': f'العميل - {customer.name}',
@@ -1454,7 +1287,7 @@ class JournalService:
     def get_or_create_supplier_account(supplier):
         """الحصول على حساب المورد أو إنشاؤه"""
         # التأكد من وجود الحساب الأب (حسابات الموردين)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='2101',
             defaults={
                 'name': 'حسابات الموردين',
@@ -1464,7 +1297,8 @@ class JournalService:
         )
         
         code = f"2101{supplier.id:04d}"
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.for_entity(
+            SUPPLIER, supplier.id,
             code=code,
             defaults={
                 'name': f'المورد - {supplier.name}',
@@ -1486,7 +1320,7 @@ class JournalService:
                 import hashlib
                 name_hash = hashlib.md5(bank_name.encode()).hexdigest()[:4]
                 code = f"1020{name_hash}"
-                account, created = Account.objects.get_or_create(
+                account, created = AccountResolver.get_or_create(
                     code=code,
                     defaults={
                         'name': f'البنك - {bank_name}',
@@ -1498,7 +1332,8 @@ class JournalService:
                 # إذا كان كائن بنك
                 bank = bank_name_or_obj
                 code = f"1020{bank.id:04d}"
-                account, created = Account.objects.get_or_create(
+                account, created = AccountResolver.for_entity(
+                    BANK, bank.id,
                     code=code,
                     defaults={
                         'name': f'البنك - {bank.name}',
@@ -1507,6 +1342,10 @@ class JournalService:
                         'bank_account': bank
                     }
                 )
+                # ربط الحسابات القديمة بالبنك
+                if account.bank_account_id is None:
+                    account.bank_account = bank
+                    account.save(update_fields=['bank_account'])
                 return account
         return JournalService.get_cash_account()
     
@@ -1514,7 +1353,7 @@ class JournalService:
     def get_or_create_expense_account(expense_type):
         """الحصول على حساب المصروف أو إنشاؤه"""
         # التأكد من وجود الحساب الأب (المصاريف العمومية والإدارية)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='60',
             defaults={
                 'name': 'المصاريف العمومية والإدارية',
@@ -1524,7 +1363,7 @@ class JournalService:
         )
         
         code = "6010"  # رمز افتراضي للمصاريف
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code=code,
             defaults={
                 'name': 'المصاريف العامة',
@@ -1539,7 +1378,7 @@ class JournalService:
     def get_or_create_checks_receivable_account():
         """الحصول على حساب الشيكات تحت التحصيل - متوافق مع IFRS"""
         # التأكد من وجود الحساب الأب (الأصول المتداولة الأخرى)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='15',
             defaults={
                 'name': 'أصول متداولة أخرى',
@@ -1548,7 +1387,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='1501',
             defaults={
                 'name': 'شيكات تحت التحصيل',
@@ -1570,7 +1409,7 @@ class JournalService:
         - الشيكات المصدرة تُعامل كالتزامات متداولة حتى يتم صرفها
         """
         # التأكد من وجود الحساب الأب (الالتزامات المتداولة الأخرى)
-        parent_account, _ = Account.objects.get_or_create(
+        parent_account, _ = AccountResolver.get_or_create(
             code='22',
             defaults={
                 'name': 'التزامات متداولة أخرى',
@@ -1579,7 +1418,7 @@ class JournalService:
             }
         )
         
-        account, created = Account.objects.get_or_create(
+        account, created = AccountResolver.get_or_create(
             code='2201',
             defaults={
                 'name': 'شيكات تحت الصرف',
@@ -1857,8 +1696,9 @@ class JournalService:
                 except Exception as log_error:
                     print(f"خطأ في تسجيل النشاط: {log_error}")
                 
-                # حذف القيد
-                entry.delete()
+                # حذف القيد - عكس أثر جميع البنود على الأرصدة دفعة واحدة
+                with transaction.atomic(), AccountBalanceEngine.deferred():
+                    entry.delete()
                 print(f"تم حذف القيد المحاسبي: {entry.entry_number}")
                 return True
             else:
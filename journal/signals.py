@@ -1,9 +1,13 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .services import JournalService
 from .models import Account
+from .balance_engine import AccountBalanceEngine
+from .account_resolver import AccountResolver, BANK, CASHBOX, get_chart
+from .snapshots import AccountSnapshotService
 import logging
+import weakref
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -21,8 +25,9 @@ except ImportError:
 def create_sales_invoice_journal_entry(sender, instance, created, **kwargs):
     """إنشاء أو تحديث القيد المحاسبي لفاتورة المبيعات عند الإنشاء أو التعديل.
 
-    - عند الإنشاء: نُنشئ قيد المبيعات وCOGS.
+    - عند الإنشاء: نُنشئ قيد المبيعات.
     - عند التعديل: نُحدّث القيد الموجود إذا وُجد، أو نُنشئه إذا كان مفقوداً.
+    - قيد COGS يُرحّل مرة واحدة لكل فاتورة بعد التثبيت (sales/costing.py).
     """
     # تجاهل أثناء استعادة النسخة الاحتياطية
     if is_restoring():
@@ -35,13 +40,10 @@ def create_sales_invoice_journal_entry(sender, instance, created, **kwargs):
             # إنشاء القيد عند الإنشاء
             if user:
                 JournalService.create_sales_invoice_entry(instance, user)
-                JournalService.create_cogs_entry(instance, user)
                 logger.info(f"تم إنشاء القيود المحاسبية تلقائياً لفاتورة المبيعات {instance.invoice_number}")
         else:
             # عند التعديل: حدّث القيد الموجود أو أنشئ واحداً إذا كان مفقوداً
             JournalService.update_sales_invoice_entry(instance, user)
-            # تحديث/إنشاء قيد COGS إن لزم
-            JournalService.create_cogs_entry(instance, user)
             logger.info(f"تم تحديث/التحقق من القيود المحاسبية لفاتورة المبيعات {instance.invoice_number}")
     except Exception as e:
         logger.error(f"خطأ في معالجة القيود المحاسبية لفاتورة المبيعات {instance.invoice_number}: {e}")
@@ -558,33 +560,35 @@ def delete_cashbox_transfer_journal_entry(sender, instance, **kwargs):
         logger.error(f"خطأ في حذف القيد المحاسبي للتحويل {instance.transfer_number}: {e}")
 
 
+@receiver(pre_save, sender='journal.JournalLine')
+def remember_journal_line_state(sender, instance, **kwargs):
+    """حفظ القيم السابقة للبند عند تعديل بند لم يُحمّل من قاعدة البيانات"""
+    if is_restoring():
+        return
+
+    if instance.pk and getattr(instance, '_balance_state', None) is None:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'account_id', 'journal_entry_id', 'debit', 'credit'
+        ).first()
+        if previous:
+            instance._balance_state = previous
+
+
 @receiver(post_save, sender='journal.JournalLine')
-@receiver(post_save, sender='journal.JournalLine')
-def update_account_balance_on_save(sender, instance, **kwargs):
-    """تحديث رصيد الحساب عند حفظ بند قيد محاسبي"""
+def update_account_balance_on_save(sender, instance, created, **kwargs):
+    """تحديث رصيد الحساب وسلسلة آبائه بفرق البند فقط عند حفظ بند قيد محاسبي"""
     if is_restoring():
         return
     
     try:
-        # 1. تحديث الحساب المباشر فقط (استدعاء الدالة الآمنة في models.py)
-        instance.account.update_account_balance()
-        
-        # 2. تحديث رصيد الأب (تحديث آمن يمنع استهلاك الذاكرة)
-        if instance.account.parent:
-            # تحديث الحقل مباشرة في قاعدة البيانات بدون إعادة استدعاء get_balance()
-            # سنقوم فقط بتصفير الرصيد أو تحديثه عبر منطق خارجي إن لزم الأمر لاحقاً
-            # لتجنب الـ Recursion والـ SIGKILL تماماً:
-            parent = instance.account.parent
-            Account.objects.filter(pk=parent.pk).update(balance=parent.get_balance(as_of_date=None))
-            
-            logger.info(f"تم تحديث رصيد الحساب الرئيسي {parent.code} بنجاح.")
-
-        # 3. العمليات الأخرى
-        create_cashbox_bank_transaction(instance)
-        sync_cashbox_or_bank_balance(instance.account)
+        # تطبيق الفرق (أو تأجيله حتى نهاية القيد) بدلاً من إعادة تجميع كل بنود الحساب
+        AccountBalanceEngine.line_saved(instance, created)
+
+        # حركات الصندوق/البنك لكل بنود المعاملة دفعة واحدة بعد التثبيت
+        queue_cashbox_bank_transaction(instance)
         
     except Exception as e:
-        logger.error(f"خطأ في تحديث رصيد الحساب {instance.account.code}: {e}")
+        logger.error(f"خطأ في تحديث رصيد الحساب {instance.account_id}: {e}")
 
 
 @receiver(post_delete, sender='journal.JournalLine')
@@ -595,241 +599,276 @@ def update_account_balance_on_delete(sender, instance, **kwargs):
         return
     
     try:
-        old_balance = instance.account.balance
-        instance.account.update_account_balance()
-        new_balance = instance.account.balance
-        
-        logger.info(f"تم تحديث رصيد الحساب {instance.account.code} - {instance.account.name} بعد الحذف: من {old_balance} إلى {new_balance}")
-        
+        AccountBalanceEngine.line_deleted(instance)
+        logger.info(f"تم عكس أثر البند المحذوف على رصيد الحساب {instance.account_id}")
+
         # تسجيل في audit log
         try:
+            from core import settings_cache
             from core.models import AuditLog
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            
-            # محاولة الحصول على مستخدم النظام
-            system_user = User.objects.filter(is_superuser=True).first()
-            if system_user:
+
+            # مستخدم النظام المخزن
+            system_user_id = settings_cache.system_user_id()
+            if system_user_id:
+                # رمز الحساب واسمه من الدليل المخزن بدلاً من استعلام لكل بند محذوف
+                chart = get_chart()
+                row = chart.by_id.get(instance.account_id) if chart is not None else None
+                account_label = f'{row[1]} - {row[2]}' if row else f'#{instance.account_id}'
                 AuditLog.objects.create(
-                    user=system_user,
+                    user_id=system_user_id,
                     action_type='update',
                     content_type='Account',
-                    object_id=instance.account.pk,
-                    description=f'تحديث رصيد الحساب بعد حذف بند قيد: {instance.account.code} - {instance.account.name}: من {old_balance} إلى {new_balance}'
+                    object_id=instance.account_id,
+                    description=f'تحديث رصيد الحساب بعد حذف بند قيد: {account_label}: مدين {instance.debit} / دائن {instance.credit}'
                 )
         except Exception as audit_error:
             logger.error(f"خطأ في تسجيل تحديث الرصيد في audit log: {audit_error}")
-        
-        # مزامنة رصيد الصندوق أو البنك إذا كان الحساب مرتبطاً بهم
-        logger.debug(f"استدعاء مزامنة رصيد الصندوق/البنك لحساب {instance.account.code} بعد حذف البند")
-        sync_cashbox_or_bank_balance(instance.account)
-        
+
     except Exception as e:
-        logger.error(f"خطأ في تحديث رصيد الحساب {instance.account.code}: {e}")
+        logger.error(f"خطأ في تحديث رصيد الحساب {instance.account_id}: {e}")
 
 
-def create_cashbox_bank_transaction(journal_line):
-    """
-    إنشاء حركة صندوق أو بنك عند إنشاء بند قيد محاسبي يؤثر عليها
-    """
+@receiver(pre_delete, sender='journal.JournalEntry')
+def remember_journal_entry_date(sender, instance, **kwargs):
+    """حفظ تاريخ القيد قبل حذفه لعكس أثر بنوده على اللقطات اليومية"""
+    if is_restoring():
+        return
+
+    AccountBalanceEngine.remember_entry_date(instance)
+
+
+@receiver(post_save, sender='journal.JournalEntry')
+def move_balance_snapshots_on_date_change(sender, instance, created, **kwargs):
+    """نقل أثر بنود القيد في اللقطات اليومية عند تعديل تاريخ القيد"""
+    if is_restoring():
+        return
+
+    old_date = getattr(instance, '_loaded_entry_date', None)
+    instance._loaded_entry_date = instance.entry_date
+    if created or old_date is None or old_date == instance.entry_date:
+        return
+
     try:
-        logger.debug(f"فحص إنشاء حركة للحساب {journal_line.account.code} - {journal_line.account.name}")
-        
-        # التحقق إذا كان حساب صندوق (يبدأ بـ 101)
-        if journal_line.account.code.startswith('101'):
-            create_cashbox_transaction_from_journal_line(journal_line)
-        
-        # التحقق إذا كان حساب بنك (يبدأ بـ 102)
-        elif journal_line.account.code.startswith('102'):
-            create_bank_transaction_from_journal_line(journal_line)
-        else:
-            logger.debug(f"الحساب {journal_line.account.code} ليس حساب صندوق أو بنك")
-            
+        AccountSnapshotService.move_entry(instance.pk, old_date, instance.entry_date)
     except Exception as e:
-        logger.error(f"خطأ في إنشاء حركة الصندوق/البنك للحساب {journal_line.account.code}: {e}")
+        logger.error(f"خطأ في نقل لقطات الأرصدة للقيد {instance.entry_number}: {e}")
+
+
+# أنواع المراجع التي تُنشأ حركاتها يدوياً أو قيود افتتاحية (IFRS - الرصيد الافتتاحي لا يعتبر معاملة)
+CASHBOX_IGNORED_REFERENCES = ('cashbox_transfer', 'bank_transfer', 'bank_initial', 'cashbox_initial',
+                              'bank_adjustment', 'cashbox_adjustment')
+BANK_IGNORED_REFERENCES = ('cashbox_transfer', 'bank_transfer', 'bank_initial', 'bank_adjustment',
+                           'bank_transaction')
+OPENING_DESCRIPTIONS = ('رصيد افتتاحي', 'Opening Balance')
+# قيود التحويل والقيود المنشأة من معاملات بنكية لا تُنشئ حركات بنك
+BANK_IGNORED_DESCRIPTIONS = ('تحويل', 'معاملة بنكية') + OPENING_DESCRIPTIONS
 
 
-def create_cashbox_transaction_from_journal_line(journal_line):
+def _skips_entry(entry, kind):
+    """True إذا كان القيد لا يُنشئ حركات صندوق (kind=CASHBOX) أو بنك (kind=BANK)"""
+    description = entry.description or ''
+    if kind == CASHBOX:
+        return (entry.reference_type in CASHBOX_IGNORED_REFERENCES
+                or any(text in description for text in OPENING_DESCRIPTIONS))
+    return (entry.reference_type in BANK_IGNORED_REFERENCES
+            or any(text in description for text in BANK_IGNORED_DESCRIPTIONS))
+
+
+def _transaction_description(entry, journal_line):
+    return f"قيد رقم {entry.entry_number}: {journal_line.line_description or entry.description}"
+
+
+def _entries_for(journal_lines):
+    """قيود البنود (المحملة مع البنود أو باستعلام واحد للباقي)"""
+    from .models import JournalEntry, JournalLine
+
+    field = JournalLine._meta.get_field('journal_entry')
+    entries = {line.journal_entry_id: line.journal_entry for line in journal_lines if field.is_cached(line)}
+    missing = {line.journal_entry_id for line in journal_lines} - set(entries)
+    if missing:
+        entries.update(JournalEntry.objects.in_bulk(missing))
+    return entries
+
+
+def create_cashbox_bank_transactions(journal_lines):
     """
-    إنشاء حركة صندوق من بند القيد المحاسبي
+    إنشاء حركات الصناديق والبنوك لبنود القيود على حساباتها دفعة واحدة.
+
+    - الصندوق أو البنك من ربط الحساب (Account.cashbox / Account.bank_account) عبر
+      AccountResolver، بدون تحليل رمز الحساب أو البحث بالاسم.
+    - استعلام واحد لكل نوع للحركات الموجودة (نفس قواعد منع التكرار) ثم bulk_create.
+    - رصيد الصندوق يُحدّث بتحديث F() واحد لكل صندوق بدلاً من إشارة لكل حركة.
+      رصيد البنك يُزامن من رصيد حسابه (sync_bank_balance_from_account) فلا يُضاف
+      المبلغ مرة أخرى، ولا يُنشأ قيد مقابل لحركة البنك (كان يكرر الترحيل على حساب البنك).
+    - سجلات المراجعة دفعة واحدة باسم مستخدم النظام المخزن.
+
+    Returns:
+        tuple: (عدد حركات الصناديق، عدد حركات البنوك)
     """
+    from django.db import transaction
+    from django.db.models import F
+    from banks.models import BankAccount, BankTransaction
+    from cashboxes.models import Cashbox, CashboxTransaction
+    from core import dashboard, settings_cache
+    from core.models import AuditLog
+
+    links = AccountResolver.links({line.account_id for line in journal_lines})
+    lines = [line for line in journal_lines if line.account_id in links and (line.debit > 0 or line.credit > 0)]
+    if not lines:
+        return 0, 0
+
     try:
-        from cashboxes.models import Cashbox, CashboxTransaction
-        
-        # تجاهل القيود التي تم إنشاء معاملاتها يدوياً أو الافتتاحية
-        # متوافق مع IFRS - الرصيد الافتتاحي لا يعتبر معاملة
-        ignored_reference_types = ['cashbox_transfer', 'bank_transfer', 'bank_initial', 'cashbox_initial', 'bank_adjustment', 'cashbox_adjustment']
-        if hasattr(journal_line.journal_entry, 'reference_type') and journal_line.journal_entry.reference_type in ignored_reference_types:
-            logger.debug(f"تجاهل إنشاء معاملة صندوق من القيد {journal_line.journal_entry.entry_number} - النوع: {journal_line.journal_entry.reference_type} (تم إنشاء المعاملة يدوياً أو قيد افتتاحي)")
-            return
-        
-        # تجاهل القيود الافتتاحية (IFRS - Opening Balance is equity, not a transaction)
-        if 'رصيد افتتاحي' in journal_line.journal_entry.description or 'Opening Balance' in journal_line.journal_entry.description:
-            logger.debug(f"تجاهل إنشاء معاملة صندوق من القيد {journal_line.journal_entry.entry_number} - الوصف: {journal_line.journal_entry.description} (قيد رصيد افتتاحي)")
-            return
-        
-        # استخراج رقم الصندوق من كود الحساب
-        if journal_line.account.code.startswith('101'):
-            try:
-                cashbox_id = int(journal_line.account.code[3:])
-                cashbox = Cashbox.objects.get(id=cashbox_id)
-                
-                # تحديد نوع الحركة بناءً على المدين/الدائن
-                if journal_line.debit > 0:
-                    # مدين - إيداع أو تحويل وارد
-                    transaction_type = 'deposit'
-                    amount = journal_line.debit
-                elif journal_line.credit > 0:
-                    # دائن - سحب أو تحويل صادر
-                    transaction_type = 'withdrawal'
-                    amount = -journal_line.credit
-                else:
-                    logger.debug(f"بند القيد بدون مبلغ للحساب {journal_line.account.code}")
-                    return
-                
-                # التحقق من عدم وجود حركة مكررة
-                existing_transaction = CashboxTransaction.objects.filter(
-                    cashbox=cashbox,
-                    reference_type='journal_entry',
-                    reference_id=journal_line.journal_entry.id,
-                    date=journal_line.journal_entry.entry_date
-                ).first()
-                
-                if existing_transaction:
-                    logger.debug(f"حركة الصندوق موجودة بالفعل للقيد {journal_line.journal_entry.entry_number}")
-                    return
-                
-                # إنشاء الحركة
-                CashboxTransaction.objects.create(
-                    cashbox=cashbox,
-                    transaction_type=transaction_type,
-                    date=journal_line.journal_entry.entry_date,
-                    amount=amount,
-                    description=f"قيد رقم {journal_line.journal_entry.entry_number}: {journal_line.line_description or journal_line.journal_entry.description}",
+        entries = _entries_for(lines)
+        candidates = {CASHBOX: [], BANK: []}
+        for line in lines:
+            kind, target_id = links[line.account_id]
+            entry = entries.get(line.journal_entry_id)
+            if entry is None or _skips_entry(entry, kind):
+                continue
+            candidates[kind].append((target_id, entry, line))
+
+        with transaction.atomic():
+            # (النوع، رقم الصندوق/البنك، رقم القيد) لسجلات المراجعة
+            created = []
+            cashbox_transactions = []
+            if candidates[CASHBOX]:
+                existing = set(CashboxTransaction.objects.filter(
+                    cashbox_id__in={target_id for target_id, entry, line in candidates[CASHBOX]},
                     reference_type='journal_entry',
-                    reference_id=journal_line.journal_entry.id,
-                    created_by=journal_line.journal_entry.created_by
+                    reference_id__in={entry.id for target_id, entry, line in candidates[CASHBOX]},
+                ).values_list('cashbox_id', 'reference_id', 'date'))
+                for cashbox_id, entry, line in candidates[CASHBOX]:
+                    key = (cashbox_id, entry.id, entry.entry_date)
+                    if key in existing:
+                        continue
+                    existing.add(key)
+                    created.append((CASHBOX, cashbox_id, entry.entry_number))
+                    cashbox_transactions.append(CashboxTransaction(
+                        cashbox_id=cashbox_id,
+                        transaction_type='deposit' if line.debit > 0 else 'withdrawal',
+                        date=entry.entry_date,
+                        amount=line.debit if line.debit > 0 else -line.credit,
+                        description=_transaction_description(entry, line),
+                        reference_type='journal_entry',
+                        reference_id=entry.id,
+                        created_by_id=entry.created_by_id,
+                    ))
+
+            bank_transactions = []
+            if candidates[BANK]:
+                existing = set()
+                for bank_id, day, description in BankTransaction.objects.filter(
+                    bank_id__in={target_id for target_id, entry, line in candidates[BANK]},
+                    date__in={entry.entry_date for target_id, entry, line in candidates[BANK]},
+                    description__contains='قيد رقم ',
+                ).values_list('bank_id', 'date', 'description'):
+                    number = description.split('قيد رقم ', 1)[1].split(':', 1)[0]
+                    existing.add((bank_id, day, number))
+                for bank_id, entry, line in candidates[BANK]:
+                    key = (bank_id, entry.entry_date, entry.entry_number)
+                    if key in existing:
+                        continue
+                    existing.add(key)
+                    created.append((BANK, bank_id, entry.entry_number))
+                    bank_transactions.append(BankTransaction(
+                        bank_id=bank_id,
+                        transaction_type='deposit' if line.debit > 0 else 'withdrawal',
+                        date=entry.entry_date,
+                        amount=line.debit if line.debit > 0 else line.credit,
+                        description=_transaction_description(entry, line),
+                        created_by_id=entry.created_by_id,
+                    ))
+
+            CashboxTransaction.objects.bulk_create(cashbox_transactions)
+            BankTransaction.objects.bulk_create(bank_transactions)
+
+            totals = {}
+            for cashbox_transaction in cashbox_transactions:
+                totals[cashbox_transaction.cashbox_id] = (
+                    totals.get(cashbox_transaction.cashbox_id, 0) + cashbox_transaction.amount
                 )
-                
-                logger.info(f"تم إنشاء حركة صندوق للقيد {journal_line.journal_entry.entry_number}: {cashbox.name} - {amount}")
-                
-                # تسجيل في audit log
-                try:
-                    from core.models import AuditLog
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    
-                    system_user = User.objects.filter(is_superuser=True).first()
-                    if system_user:
-                        AuditLog.objects.create(
-                            user=system_user,
-                            action_type='create',
-                            content_type='CashboxTransaction',
-                            object_id=cashbox.id,
-                            description=f'إنشاء حركة صندوق تلقائياً من قيد {journal_line.journal_entry.entry_number}: {cashbox.name}'
-                        )
-                except Exception as audit_error:
-                    logger.error(f"خطأ في تسجيل إنشاء حركة الصندوق في audit log: {audit_error}")
-                    
-            except (ValueError, Cashbox.DoesNotExist) as e:
-                logger.warning(f"لم يتم العثور على الصندوق المرتبط بحساب {journal_line.account.code}: {e}")
-                
+            for cashbox_id, amount in totals.items():
+                Cashbox.objects.filter(pk=cashbox_id).update(balance=F('balance') + amount)
+
+            system_user_id = settings_cache.system_user_id()
+            if system_user_id and created:
+                names = {
+                    CASHBOX: dict(Cashbox.objects.filter(pk__in=totals).values_list('id', 'name')),
+                    BANK: dict(BankAccount.objects.filter(
+                        pk__in={item.bank_id for item in bank_transactions}).values_list('id', 'name')),
+                }
+                AuditLog.objects.bulk_create([
+                    AuditLog(
+                        user_id=system_user_id,
+                        action_type='create',
+                        content_type='CashboxTransaction' if kind == CASHBOX else 'BankTransaction',
+                        object_id=target_id,
+                        description=f"إنشاء حركة {'صندوق' if kind == CASHBOX else 'بنك'} تلقائياً من قيد "
+                                    f"{entry_number}: {names[kind].get(target_id, '')}",
+                    )
+                    for kind, target_id, entry_number in created
+                ])
+
+        # bulk_create و update لا يطلقان إشارات إبطال لوحة التحكم
+        if cashbox_transactions:
+            dashboard.invalidate_for_model(CashboxTransaction)
+            dashboard.invalidate_for_model(Cashbox)
+        if bank_transactions:
+            dashboard.invalidate_for_model(BankTransaction)
+
+        logger.info(f"تم إنشاء {len(cashbox_transactions)} حركة صندوق و {len(bank_transactions)} حركة بنك من بنود القيود")
+        return len(cashbox_transactions), len(bank_transactions)
+
     except Exception as e:
-        logger.error(f"خطأ في إنشاء حركة الصندوق: {e}")
+        logger.error(f"خطأ في إنشاء حركات الصناديق/البنوك من بنود القيود: {e}")
+        return 0, 0
+
+
+class _PendingLines:
+    """بنود معاملة واحدة تنتظر التثبيت لإنشاء حركاتها معاً"""
+
+    def __init__(self):
+        self.lines = []
+        self.done = False
+
+    def __call__(self):
+        from .models import JournalLine
+
+        self.done = True
+        # البنود المحذوفة أو المتراجع عنها (نقطة حفظ) داخل المعاملة لا تُنشئ حركات
+        saved = set(JournalLine.objects.filter(pk__in=[line.pk for line in self.lines]).values_list('pk', flat=True))
+        create_cashbox_bank_transactions([line for line in self.lines if line.pk in saved])
 
 
-def create_bank_transaction_from_journal_line(journal_line):
+def queue_cashbox_bank_transaction(journal_line):
     """
-    إنشاء حركة بنك من بند القيد المحاسبي
+    تأجيل حركة الصندوق/البنك لبند قيد حتى تثبيت المعاملة؛ كل بنود المعاملة
+    الواحدة تُنشأ حركاتها دفعة واحدة (create_cashbox_bank_transactions).
     """
-    try:
-        from banks.models import BankAccount, BankTransaction
-        
-        # تجاهل القيود التي تم إنشاء معاملاتها يدوياً أو الافتتاحية
-        # متوافق مع IFRS - الرصيد الافتتاحي لا يعتبر معاملة بنكية
-        ignored_reference_types = ['cashbox_transfer', 'bank_transfer', 'bank_initial', 'bank_adjustment', 'bank_transaction']
-        if hasattr(journal_line.journal_entry, 'reference_type') and journal_line.journal_entry.reference_type in ignored_reference_types:
-            logger.debug(f"تجاهل إنشاء معاملة بنك من القيد {journal_line.journal_entry.entry_number} - النوع: {journal_line.journal_entry.reference_type} (تم إنشاء المعاملة يدوياً أو قيد افتتاحي)")
-            return
-        
-        # تجاهل القيود التي تحتوي على كلمة "تحويل" في الوصف
-        if 'تحويل' in journal_line.journal_entry.description:
-            logger.debug(f"تجاهل إنشاء معاملة بنك من القيد {journal_line.journal_entry.entry_number} - الوصف: {journal_line.journal_entry.description} (قيد تحويل)")
-            return
-        
-        # تجاهل القيود التي تم إنشاؤها تلقائياً من معاملات بنكية
-        if 'معاملة بنكية' in journal_line.journal_entry.description:
-            logger.debug(f"تجاهل إنشاء معاملة بنك من القيد {journal_line.journal_entry.entry_number} - الوصف: {journal_line.journal_entry.description} (تم إنشاء القيد من معاملة بنكية)")
-            return
-        
-        # تجاهل القيود الافتتاحية (IFRS - Opening Balance is equity, not a transaction)
-        if 'رصيد افتتاحي' in journal_line.journal_entry.description or 'Opening Balance' in journal_line.journal_entry.description:
-            logger.debug(f"تجاهل إنشاء معاملة بنك من القيد {journal_line.journal_entry.entry_number} - الوصف: {journal_line.journal_entry.description} (قيد رصيد افتتاحي)")
-            return
-        
-        # التحقق من أن الحساب مرتبط بحساب بنكي
-        if journal_line.account.code.startswith('102') and journal_line.account.bank_account:
-            bank = journal_line.account.bank_account
-            
-            # تحديد نوع الحركة بناءً على المدين/الدائن
-            if journal_line.debit > 0:
-                # مدين - إيداع أو تحويل وارد
-                transaction_type = 'deposit'
-                amount = journal_line.debit
-            elif journal_line.credit > 0:
-                # دائن - سحب أو تحويل صادر
-                transaction_type = 'withdrawal'
-                amount = journal_line.credit
-            else:
-                logger.debug(f"بند القيد بدون مبلغ للحساب {journal_line.account.code}")
-                return
-            
-            # التحقق من عدم وجود حركة مكررة
-            existing_transaction = BankTransaction.objects.filter(
-                bank=bank,
-                description__icontains=f"قيد رقم {journal_line.journal_entry.entry_number}",
-                date=journal_line.journal_entry.entry_date
-            ).first()
-            
-            if existing_transaction:
-                logger.debug(f"حركة البنك موجودة بالفعل للقيد {journal_line.journal_entry.entry_number}")
-                return
-            
-            # إنشاء الحركة
-            BankTransaction.objects.create(
-                bank=bank,
-                transaction_type=transaction_type,
-                date=journal_line.journal_entry.entry_date,
-                amount=amount,
-                description=f"قيد رقم {journal_line.journal_entry.entry_number}: {journal_line.line_description or journal_line.journal_entry.description}",
-                created_by=journal_line.journal_entry.created_by
-            )
-            
-            logger.info(f"تم إنشاء حركة بنك للقيد {journal_line.journal_entry.entry_number}: {bank.name} - {amount}")
-            
-            # تسجيل في audit log
-            try:
-                from core.models import AuditLog
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                
-                system_user = User.objects.filter(is_superuser=True).first()
-                if system_user:
-                    AuditLog.objects.create(
-                        user=system_user,
-                        action_type='create',
-                        content_type='BankTransaction',
-                        object_id=bank.id,
-                        description=f'إنشاء حركة بنك تلقائياً من قيد {journal_line.journal_entry.entry_number}: {bank.name}'
-                    )
-            except Exception as audit_error:
-                logger.error(f"خطأ في تسجيل إنشاء حركة البنك في audit log: {audit_error}")
-                
-        else:
-            logger.debug(f"الحساب {journal_line.account.code} ليس حساب بنك أو غير مرتبط بحساب بنكي")
-                
-    except Exception as e:
-        logger.error(f"خطأ في إنشاء حركة البنك: {e}")
+    from django.db import connection, transaction
+
+    if not AccountResolver.links((journal_line.account_id,)):
+        return
+    if not connection.in_atomic_block:
+        create_cashbox_bank_transactions([journal_line])
+        return
+
+    # الاتصال يحتفظ بمرجع ضعيف فقط: عند التراجع عن المعاملة أو نقطة الحفظ التي
+    # سُجلت فيها يتخلص Django من دالة on_commit فتبدأ دفعة جديدة
+    pending_ref = getattr(connection, '_cashbox_bank_pending', None)
+    pending = pending_ref() if pending_ref is not None else None
+    if pending is None or pending.done:
+        pending = _PendingLines()
+        connection._cashbox_bank_pending = weakref.ref(pending)
+        transaction.on_commit(pending)
+    pending.lines.append(journal_line)
+
+
+def create_cashbox_bank_transaction(journal_line):
+    """
+    إنشاء حركة صندوق أو بنك لبند قيد محاسبي يؤثر عليها (فوراً)
+    """
+    return create_cashbox_bank_transactions([journal_line])
 
 
 def sync_cashbox_balance_from_account(account):
@@ -839,47 +878,23 @@ def sync_cashbox_balance_from_account(account):
     هذه الدالة الآن تُستخدم فقط للمراقبة والتنبيه
     """
     try:
-        from cashboxes.models import Cashbox
-        
-        logger.debug(f"بدء مزامنة رصيد الصندوق لحساب {account.code} - {account.name}")
-        
-        # البحث عن الصندوق المرتبط بهذا الحساب
-        # استخدام كود الحساب لاستخراج رقم الصندوق
-        cashbox = None
-        
-        if account.code.startswith('101'):
-            try:
-                # استخراج رقم الصندوق من الكود (101001 -> 1)
-                cashbox_id = int(account.code[3:])  # إزالة '101' والحصول على الرقم
-                cashbox = Cashbox.objects.get(id=cashbox_id)
-                logger.debug(f"تم العثور على الصندوق {cashbox.name} من كود الحساب {account.code}")
-            except (ValueError, Cashbox.DoesNotExist) as e:
-                logger.warning(f"فشل استخراج رقم الصندوق من كود {account.code}: {e}")
-                # إذا فشل، جرب البحث بالاسم كطريقة احتياطية
-                if '1001' in account.name:
-                    cashbox = Cashbox.objects.filter(name__icontains='1001').first()
-                elif '1002' in account.name:
-                    cashbox = Cashbox.objects.filter(name__icontains='1002').first()
-                else:
-                    # محاولة بحث عام
-                    account_name_part = account.name.split('-')[-1].strip() if '-' in account.name else account.name
-                    cashbox = Cashbox.objects.filter(name__icontains=account_name_part).first()
-        
-        if cashbox:
-            # مراقبة التطابق فقط - لا تحديث تلقائي
-            # CashboxTransaction هو مصدر الحقيقة للأرصدة
-            old_balance = cashbox.balance
-            new_balance = account.balance
-            
-            if old_balance != new_balance:
-                # ⚠️ تحذير فقط - لا تحديث تلقائي
-                logger.warning(f"⚠️ عدم تطابق: رصيد الصندوق '{cashbox.name}' ({old_balance}) != رصيد الحساب ({new_balance})")
-                # ⚠️ لا نقوم بالتحديث - المعاملات هي مصدر الحقيقة
-            else:
-                logger.debug(f"رصيد الصندوق '{cashbox.name}' متطابق مع حسابه ({new_balance})")
-        else:
+        # الصندوق المرتبط بالحساب مباشرة (Account.cashbox)
+        cashbox = account.cashbox
+        if cashbox is None:
             logger.warning(f"لم يتم العثور على صندوق مرتبط بحساب {account.code} - {account.name}")
-    
+            return
+
+        # مراقبة التطابق فقط - لا تحديث تلقائي
+        # CashboxTransaction هو مصدر الحقيقة للأرصدة
+        old_balance = cashbox.balance
+        new_balance = account.balance
+
+        if old_balance != new_balance:
+            # ⚠️ تحذير فقط - لا تحديث تلقائي
+            logger.warning(f"⚠️ عدم تطابق: رصيد الصندوق '{cashbox.name}' ({old_balance}) != رصيد الحساب ({new_balance})")
+        else:
+            logger.debug(f"رصيد الصندوق '{cashbox.name}' متطابق مع حسابه ({new_balance})")
+
     except Exception as e:
         logger.error(f"خطأ في مزامنة رصيد الصندوق: {e}")
 
@@ -889,90 +904,59 @@ def sync_bank_balance_from_account(account):
     مزامنة رصيد البنك مع رصيد حسابه المحاسبي
     """
     try:
-        from banks.models import BankAccount
-        
-        logger.debug(f"بدء مزامنة رصيد البنك لحساب {account.code} - {account.name}")
-        
-        # البحث عن الحساب البنكي المرتبط بهذا الحساب
-        bank_account = None
-        
-        if account.code.startswith('102'):
-            # البحث عن الحساب البنكي المرتبط مباشرة من الحقل
-            bank_account = account.bank_account
-            
-            if not bank_account:
-                # إذا لم يكن مرتبط، حاول البحث بالاسم كطريقة احتياطية
-                logger.debug(f'الحساب {account.code} غير مرتبط بحساب بنكي، محاولة البحث بالاسم')
-                account_name_parts = account.name.split('-')
-                bank_name = account_name_parts[0].strip()
-                
-                if bank_name.startswith('البنك'):
-                    bank_name = bank_name[5:].strip()
-                
-                bank_account = BankAccount.objects.filter(
-                    name__icontains=bank_name
-                ).first()
-                
-                if not bank_account and len(account_name_parts) > 1:
-                    bank_account = BankAccount.objects.filter(
-                        name__icontains=account_name_parts[-1].strip()
-                    ).first()
-        
-        if bank_account:
-            # تحديث رصيد البنك ليطابق رصيد الحساب المحاسبي
-            old_balance = bank_account.balance
-            new_balance = account.balance
-            
-            if old_balance != new_balance:
-                bank_account.balance = new_balance
-                bank_account.save(update_fields=['balance'])
-                logger.info(f"✅ تم مزامنة رصيد البنك '{bank_account.name}' من {old_balance} إلى {new_balance}")
-                
-                # تسجيل في audit log
-                try:
-                    from core.models import AuditLog
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    
-                    system_user = User.objects.filter(is_superuser=True).first()
-                    if system_user:
-                        AuditLog.objects.create(
-                            user=system_user,
-                            action_type='update',
-                            content_type='BankAccount',
-                            object_id=bank_account.pk,
-                            description=f'مزامنة رصيد البنك {bank_account.name}: من {old_balance} إلى {new_balance} (من حساب {account.code})'
-                        )
-                except Exception as audit_error:
-                    logger.error(f"خطأ في تسجيل مزامنة رصيد البنك في audit log: {audit_error}")
-            else:
-                logger.debug(f"رصيد البنك '{bank_account.name}' متطابق مع حسابه ({new_balance})")
-        else:
+        from core import settings_cache
+
+        # الحساب البنكي المرتبط بالحساب مباشرة (Account.bank_account)
+        bank_account = account.bank_account
+        if bank_account is None:
             logger.warning(f"لم يتم العثور على بنك مرتبط بحساب {account.code} - {account.name}")
-                
+            return
+
+        # تحديث رصيد البنك ليطابق رصيد الحساب المحاسبي
+        old_balance = bank_account.balance
+        new_balance = account.balance
+
+        if old_balance != new_balance:
+            bank_account.balance = new_balance
+            bank_account.save(update_fields=['balance'])
+            logger.info(f"✅ تم مزامنة رصيد البنك '{bank_account.name}' من {old_balance} إلى {new_balance}")
+
+            # تسجيل في audit log
+            try:
+                from core.models import AuditLog
+
+                system_user_id = settings_cache.system_user_id()
+                if system_user_id:
+                    AuditLog.objects.create(
+                        user_id=system_user_id,
+                        action_type='update',
+                        content_type='BankAccount',
+                        object_id=bank_account.pk,
+                        description=f'مزامنة رصيد البنك {bank_account.name}: من {old_balance} إلى {new_balance} (من حساب {account.code})'
+                    )
+            except Exception as audit_error:
+                logger.error(f"خطأ في تسجيل مزامنة رصيد البنك في audit log: {audit_error}")
+        else:
+            logger.debug(f"رصيد البنك '{bank_account.name}' متطابق مع حسابه ({new_balance})")
+
     except Exception as e:
         logger.error(f"خطأ في مزامنة رصيد البنك: {e}")
 
 
 def sync_cashbox_or_bank_balance(account):
     """
-    مزامنة رصيد الصندوق أو البنك بناءً على نوع الحساب
+    مزامنة رصيد الصندوق أو البنك المرتبط بالحساب
     """
     try:
-        logger.debug(f"فحص نوع الحساب {account.code} - {account.name}")
-        
-        # التحقق إذا كان حساب صندوق (يبدأ بـ 101)
-        if account.code.startswith('101'):
-            logger.debug(f"الحساب {account.code} هو حساب صندوق - بدء المزامنة")
+        if account.cashbox_id:
+            logger.debug(f"الحساب {account.code} مرتبط بصندوق - بدء المزامنة")
             sync_cashbox_balance_from_account(account)
-        
-        # التحقق إذا كان حساب بنك (يبدأ بـ 102)
-        elif account.code.startswith('102'):
-            logger.debug(f"الحساب {account.code} هو حساب بنك - بدء المزامنة")
+        elif account.bank_account_id:
+            logger.debug(f"الحساب {account.code} مرتبط بحساب بنكي - بدء المزامنة")
             sync_bank_balance_from_account(account)
         else:
-            logger.debug(f"الحساب {account.code} ليس حساب صندوق أو بنك - لا حاجة للمزامنة")
-            
+            logger.debug(f"الحساب {account.code} غير مرتبط بصندوق أو بنك - لا حاجة للمزامنة")
+
     except Exception as e:
         logger.error(f"خطأ في مزامنة رصيد الصندوق/البنك للحساب {account.code}: {e}")
 
@@ -0,0 +1,183 @@
+"""
+لقطات الأرصدة اليومية للحسابات المحاسبية
+
+يحتفظ جدول AccountBalanceSnapshot لكل حساب ولكل يوم فيه حركة بمجموع المدين
+والدائن التراكمي حتى نهاية ذلك اليوم. رصيد أي حساب في تاريخ معين هو:
+أقرب لقطة قبل التاريخ + بنود الذيل بين تاريخ اللقطة والتاريخ المطلوب.
+
+- تُحدّث اللقطات بالفروق عند الترحيل (من محرك الأرصدة).
+- تُعاد بناؤها بالكامل بأمر rebuild_balance_snapshots.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q, Sum, OuterRef, Subquery
+
+
+class AccountSnapshotService:
+    """خدمة لقطات الأرصدة اليومية"""
+
+    @staticmethod
+    def get_totals(account_id, as_of_date):
+        """
+        مجموع المدين والدائن للحساب حتى تاريخ معين (شاملاً).
+
+        Returns:
+            tuple: (debit_total, credit_total)
+        """
+        from .models import AccountBalanceSnapshot, JournalLine
+
+        snapshot = AccountBalanceSnapshot.objects.filter(
+            account_id=account_id, date__lte=as_of_date
+        ).order_by('-date').values_list('date', 'debit_total', 'credit_total').first()
+
+        debit_total = credit_total = Decimal('0')
+        if snapshot:
+            snapshot_date, debit_total, credit_total = snapshot
+            if snapshot_date == as_of_date:
+                return debit_total, credit_total
+
+        # بنود الذيل بعد آخر لقطة
+        tail = JournalLine.objects.filter(account_id=account_id, journal_entry__entry_date__lte=as_of_date)
+        if snapshot:
+            tail = tail.filter(journal_entry__entry_date__gt=snapshot_date)
+        totals = tail.aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        return (debit_total + (totals['debit'] or Decimal('0')),
+                credit_total + (totals['credit'] or Decimal('0')))
+
+    @staticmethod
+    def get_totals_for_accounts(account_ids, as_of_date):
+        """
+        مجموع المدين والدائن لمجموعة حسابات حتى تاريخ معين باستعلامين فقط.
+
+        Returns:
+            dict: {account_id: (debit_total, credit_total)}
+        """
+        from .models import AccountBalanceSnapshot, JournalLine
+
+        account_ids = list(account_ids)
+        result = defaultdict(lambda: (Decimal('0'), Decimal('0')))
+        if not account_ids:
+            return result
+
+        latest_date = AccountBalanceSnapshot.objects.filter(
+            account_id=OuterRef('account_id'), date__lte=as_of_date
+        ).order_by('-date').values('date')[:1]
+
+        snapshots = AccountBalanceSnapshot.objects.filter(
+            account_id__in=account_ids, date=Subquery(latest_date)
+        ).values_list('account_id', 'debit_total', 'credit_total')
+        for account_id, debit_total, credit_total in snapshots:
+            result[account_id] = (debit_total, credit_total)
+
+        tail = JournalLine.objects.filter(
+            account_id__in=account_ids, journal_entry__entry_date__lte=as_of_date
+        ).annotate(snapshot_date=Subquery(latest_date)).filter(
+            Q(snapshot_date__isnull=True) | Q(journal_entry__entry_date__gt=F('snapshot_date'))
+        ).values('account_id').annotate(debit=Sum('debit'), credit=Sum('credit')).order_by()
+        for row in tail:
+            debit_total, credit_total = result[row['account_id']]
+            result[row['account_id']] = (debit_total + (row['debit'] or Decimal('0')),
+                                         credit_total + (row['credit'] or Decimal('0')))
+        return result
+
+    @staticmethod
+    def apply(changes):
+        """
+        تطبيق فروق مدين/دائن على اللقطات.
+
+        Args:
+            changes: {(account_id, date): (debit, credit)}
+
+        يجب استدعاؤها بعد كتابة البنود في قاعدة البيانات: اللقطة الناقصة
+        لليوم تُنشأ من حالة قاعدة البيانات الحالية (التي تتضمن التغيير أصلاً)
+        ولذلك لا يُضاف إليها الفرق. المعالجة بترتيب التاريخ تصاعدياً ضرورية
+        حتى لا تُعدّل لقطة أُنشئت للتو بفرق يوم سابق.
+        """
+        from .models import AccountBalanceSnapshot
+
+        for (account_id, day), (debit, credit) in sorted(changes.items(), key=lambda item: (item[0][0], item[0][1])):
+            if not debit and not credit:
+                continue
+            AccountBalanceSnapshot.objects.filter(account_id=account_id, date__gte=day).update(
+                debit_total=F('debit_total') + debit,
+                credit_total=F('credit_total') + credit,
+            )
+            if AccountBalanceSnapshot.objects.filter(account_id=account_id, date=day).exists():
+                continue
+            debit_total, credit_total = AccountSnapshotService.get_totals(account_id, day)
+            try:
+                with transaction.atomic():
+                    AccountBalanceSnapshot.objects.create(
+                        account_id=account_id, date=day,
+                        debit_total=debit_total, credit_total=credit_total,
+                    )
+            except IntegrityError:
+                # أنشأتها معاملة متزامنة من حالة لا ترى بنود هذه المعاملة غير المثبتة،
+                # فيُضاف الفرق إليها (اللقطات الأحدث أخذته في التحديث الأول)
+                AccountBalanceSnapshot.objects.filter(account_id=account_id, date=day).update(
+                    debit_total=F('debit_total') + debit,
+                    credit_total=F('credit_total') + credit,
+                )
+
+    @staticmethod
+    def move_entry(entry_id, old_date, new_date):
+        """نقل أثر بنود قيد من تاريخ إلى آخر عند تعديل تاريخ القيد"""
+        from .models import JournalLine
+
+        if old_date == new_date:
+            return
+        changes = {}
+        totals = JournalLine.objects.filter(journal_entry_id=entry_id).values('account_id').annotate(
+            debit=Sum('debit'), credit=Sum('credit')
+        ).order_by()
+        for row in totals:
+            debit = row['debit'] or Decimal('0')
+            credit = row['credit'] or Decimal('0')
+            changes[(row['account_id'], old_date)] = (-debit, -credit)
+            changes[(row['account_id'], new_date)] = (debit, credit)
+        AccountSnapshotService.apply(changes)
+
+    @staticmethod
+    def rebuild(account_ids=None, batch_size=1000):
+        """
+        إعادة بناء اللقطات بالكامل من بنود القيود.
+
+        Returns:
+            int: عدد اللقطات المنشأة
+        """
+        from .models import AccountBalanceSnapshot, JournalLine
+
+        daily = JournalLine.objects.values('account_id', 'journal_entry__entry_date').annotate(
+            debit=Sum('debit'), credit=Sum('credit')
+        ).order_by('account_id', 'journal_entry__entry_date')
+        existing = AccountBalanceSnapshot.objects.all()
+        if account_ids is not None:
+            daily = daily.filter(account_id__in=account_ids)
+            existing = existing.filter(account_id__in=account_ids)
+
+        created = 0
+        with transaction.atomic():
+            existing.delete()
+            batch = []
+            current_account = None
+            debit_total = credit_total = Decimal('0')
+            for row in daily.iterator(chunk_size=batch_size):
+                if row['account_id'] != current_account:
+                    current_account = row['account_id']
+                    debit_total = credit_total = Decimal('0')
+                debit_total += row['debit'] or Decimal('0')
+                credit_total += row['credit'] or Decimal('0')
+                batch.append(AccountBalanceSnapshot(
+                    account_id=current_account, date=row['journal_entry__entry_date'],
+                    debit_total=debit_total, credit_total=credit_total,
+                ))
+                if len(batch) >= batch_size:
+                    AccountBalanceSnapshot.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                AccountBalanceSnapshot.objects.bulk_create(batch)
+                created += len(batch)
+        return created
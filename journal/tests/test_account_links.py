@@ -0,0 +1,82 @@
+"""
+اختبارات ربط حسابات الصناديق بكياناتها وإنشاء حركاتها دفعة واحدة بعد التثبيت
+"""
+from datetime import date
+from unittest import mock
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+
+from cashboxes.models import Cashbox, CashboxTransaction
+from core import settings_cache
+from core.models import AuditLog
+from journal.account_resolver import AccountResolver, CASHBOX, ChartOfAccounts
+from journal.models import Account
+from journal.posting import JournalPostingService
+from journal.services import JournalService
+from journal.signals import _PendingLines
+
+User = get_user_model()
+
+
+class CashboxAccountLinkTests(TestCase):
+    """الصندوق من ربط الحساب لا من رمزه، وحركات المعاملة تُنشأ معاً"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='links_user', password='test_password',
+                                                  email='links@example.com')
+        self.cashbox = Cashbox.objects.create(name='صندوق الربط')
+        self.cash = JournalService.get_cashbox_account(self.cashbox)
+        self.revenue = Account.objects.create(code='84', name='إيراد الربط', account_type='revenue')
+
+    def _entry(self, amount, debit=True):
+        cash_line = {'account_id': self.cash.pk, 'debit' if debit else 'credit': amount}
+        revenue_line = {'account_id': self.revenue.pk, 'credit' if debit else 'debit': amount}
+        return {'entry_date': date(2024, 3, 1), 'description': 'حركة صندوق', 'lines': [cash_line, revenue_line]}
+
+    def test_account_is_linked_to_cashbox(self):
+        self.assertEqual(self.cash.cashbox_id, self.cashbox.pk)
+        self.assertEqual(AccountResolver.links([self.cash.pk, self.revenue.pk]),
+                         {self.cash.pk: (CASHBOX, self.cashbox.pk)})
+
+    def test_account_unknown_to_cached_chart_is_read_from_database(self):
+        AccountResolver.links([self.revenue.pk])
+        # حساب مرتبط أُنشئ في عملية أخرى: الدليل المخزن لا يعرفه
+        other = Cashbox.objects.create(name='صندوق عامل آخر')
+        account = Account.objects.filter(cashbox=other).first()
+        with mock.patch.object(settings_cache, 'bypassed', return_value=False), \
+                mock.patch.object(settings_cache, 'get', return_value=ChartOfAccounts([])):
+            self.assertEqual(AccountResolver.links([account.pk]), {account.pk: (CASHBOX, other.pk)})
+
+    def test_posted_entries_create_transactions_in_bulk(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            JournalPostingService.post_entries([self._entry('100'), self._entry('30', debit=False)], user=self.user)
+
+        transactions = CashboxTransaction.objects.filter(cashbox=self.cashbox, reference_type='journal_entry')
+        self.assertEqual(sorted(transactions.values_list('amount', flat=True)), [Decimal('-30'), Decimal('100')])
+        self.cashbox.refresh_from_db()
+        self.assertEqual(self.cashbox.balance, Decimal('70'))
+        self.assertEqual(AuditLog.objects.filter(content_type='CashboxTransaction', user=self.user).count(), 2)
+
+        # إعادة الإنشاء لا تكرر الحركات
+        lines = list(self.cash.journal_lines.all())
+        JournalPostingService._after_commit(lines, None)
+        self.assertEqual(transactions.count(), 2)
+
+    def test_saved_lines_are_batched_until_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                for amount in ('10', '20'):
+                    entry = self._entry(amount)
+                    JournalService.create_journal_entry(entry['entry_date'], entry['description'], entry['lines'],
+                                                        user=self.user)
+            self.assertFalse(CashboxTransaction.objects.filter(cashbox=self.cashbox).exists())
+
+        pending = [callback for callback in callbacks if isinstance(callback, _PendingLines)]
+        self.assertEqual(len(pending), 1)
+        pending[0]()
+        self.assertEqual(CashboxTransaction.objects.filter(cashbox=self.cashbox).count(), 2)
+        self.cashbox.refresh_from_db()
+        self.assertEqual(self.cashbox.balance, Decimal('30'))
@@ -0,0 +1,59 @@
+"""
+اختبارات محلل دليل الحسابات
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+
+from cashboxes.models import Cashbox
+from core import settings_cache
+from customers.models import CustomerSupplier
+from journal import account_resolver
+from journal.account_resolver import CUSTOMER, AccountResolver
+from journal.models import Account
+from journal.services import JournalService
+
+
+class AccountResolverTests(TestCase):
+    """حسابات الترحيل من الذاكرة بعد التحميل، والإبطال عند تعديل الحسابات"""
+
+    def setUp(self):
+        settings_cache.clear()
+        self.cashbox = Cashbox.objects.create(name='صندوق المحلل')
+        self.customer = CustomerSupplier.objects.create(name='عميل المحلل', type='customer', city='عمان')
+
+    def _sales_invoice_accounts(self):
+        return [
+            JournalService.get_cashbox_account(self.cashbox),
+            JournalService.get_or_create_customer_account(self.customer),
+            JournalService.get_sales_account(),
+            JournalService.get_tax_payable_account(),
+        ]
+
+    def test_warm_path_has_no_chart_queries(self):
+        created = self._sales_invoice_accounts()
+        account_resolver.warm()
+
+        with self.assertNumQueries(0):
+            accounts = self._sales_invoice_accounts()
+        self.assertEqual([account.pk for account in accounts], [account.pk for account in created])
+        self.assertEqual(accounts[2].code, '4010')
+        self.assertEqual(AccountResolver.entity_account_id(CUSTOMER, self.customer.id), accounts[1].pk)
+
+        # الرصيد غير مخزن: يُقرأ من قاعدة البيانات عند الوصول إليه
+        Account.objects.filter(pk=accounts[2].pk).update(balance=Decimal('12.500'))
+        self.assertEqual(accounts[2].balance, Decimal('12.500'))
+
+    def test_account_changes_invalidate_chart(self):
+        sales = JournalService.get_sales_account()
+        account_resolver.warm()
+
+        account = Account.objects.get(pk=sales.pk)
+        account.name = 'المبيعات المحلية'
+        account.save()
+        self.assertEqual(JournalService.get_sales_account().name, 'المبيعات المحلية')
+
+        account.delete()
+        recreated = JournalService.get_sales_account()
+        self.assertNotEqual(recreated.pk, sales.pk)
+        self.assertEqual(Account.objects.filter(code='4010').count(), 1)
@@ -0,0 +1,169 @@
+"""
+اختبارات محرك الأرصدة التراكمي
+التحقق من تطبيق الفروق وترحيلها للحسابات الأب ومطابقتها مع إعادة الحساب الكاملة
+"""
+from unittest import mock
+
+from django.test import TestCase
+from django.db import transaction
+from decimal import Decimal
+from datetime import date
+from django.contrib.auth import get_user_model
+from journal.models import Account, AccountBalanceSnapshot, JournalEntry, JournalLine
+from journal.balance_engine import AccountBalanceEngine
+from journal.snapshots import AccountSnapshotService
+
+User = get_user_model()
+
+
+class AccountBalanceEngineTests(TestCase):
+    """اختبارات تحديث الأرصدة بالفروق"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='engine_user',
+            password='test_password',
+            user_type='admin'
+        )
+        self.root = Account.objects.create(code='9', name='أصول اختبار', account_type='asset')
+        self.group = Account.objects.create(code='91', name='مجموعة اختبار', account_type='asset',
+                                            parent=self.root)
+        self.cash = Account.objects.create(code='911', name='نقد اختبار', account_type='asset',
+                                           parent=self.group)
+        self.revenue = Account.objects.create(code='941', name='إيراد اختبار', account_type='revenue')
+        self.entry = JournalEntry.objects.create(
+            entry_number='JE-ENGINE-1',
+            entry_date=date.today(),
+            description='قيد اختبار',
+            total_amount=Decimal('500.000'),
+            created_by=self.user
+        )
+
+    def _post(self, amount):
+        debit_line = JournalLine.objects.create(journal_entry=self.entry, account=self.cash,
+                                                debit=amount, credit=Decimal('0'))
+        JournalLine.objects.create(journal_entry=self.entry, account=self.revenue,
+                                   debit=Decimal('0'), credit=amount)
+        return debit_line
+
+    def _balances(self):
+        return {
+            account.code: account.balance
+            for account in Account.objects.filter(pk__in=[self.root.pk, self.group.pk, self.cash.pk, self.revenue.pk])
+        }
+
+    def test_insert_rolls_up_parent_chain(self):
+        """إنشاء البنود يحدث رصيد الحساب وجميع آبائه"""
+        self._post(Decimal('500.000'))
+
+        balances = self._balances()
+        self.assertEqual(balances['911'], Decimal('500.000'))
+        self.assertEqual(balances['91'], Decimal('500.000'))
+        self.assertEqual(balances['9'], Decimal('500.000'))
+        self.assertEqual(balances['941'], Decimal('500.000'))
+
+    def test_update_and_delete_apply_only_difference(self):
+        """تعديل البند يطبق الفرق فقط وحذفه يعكس أثره"""
+        self._post(Decimal('500.000'))
+        line = JournalLine.objects.get(account=self.cash)
+        line.debit = Decimal('200.000')
+        line.save()
+        self.assertEqual(self._balances()['9'], Decimal('200.000'))
+
+        JournalLine.objects.get(pk=line.pk).delete()
+        balances = self._balances()
+        self.assertEqual(balances['911'], Decimal('0.000'))
+        self.assertEqual(balances['9'], Decimal('0.000'))
+
+    def test_deferred_posting_matches_full_recompute(self):
+        """الترحيل المؤجل للقيد ينتج نفس نتيجة إعادة الحساب الكاملة"""
+        with transaction.atomic(), AccountBalanceEngine.deferred():
+            self._post(Decimal('300.000'))
+            self._post(Decimal('200.000'))
+            # لا تتغير الأرصدة قبل نهاية الكتلة
+            self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('0'))
+
+        self.assertEqual(self._balances()['9'], Decimal('500.000'))
+        self.assertEqual(AccountBalanceEngine.verify(), [])
+
+    def test_verify_detects_and_fixes_drift(self):
+        """وضع المطابقة يكشف الانحراف ويصححه"""
+        self._post(Decimal('500.000'))
+        Account.objects.filter(pk=self.group.pk).update(balance=Decimal('1.000'))
+
+        mismatches = AccountBalanceEngine.verify(fix=True)
+        self.assertEqual([item['account'].code for item in mismatches], ['91'])
+        self.assertEqual(Account.objects.get(pk=self.group.pk).balance, Decimal('500.000'))
+        self.assertEqual(AccountBalanceEngine.verify(), [])
+
+
+class AccountBalanceSnapshotTests(TestCase):
+    """اختبارات لقطات الأرصدة اليومية"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='snapshot_user',
+            password='test_password',
+            user_type='admin'
+        )
+        self.cash = Account.objects.create(code='921', name='نقد لقطات', account_type='asset')
+        self.revenue = Account.objects.create(code='951', name='إيراد لقطات', account_type='revenue')
+
+    def _post(self, entry_date, amount):
+        entry = JournalEntry.objects.create(
+            entry_date=entry_date,
+            description='قيد لقطات',
+            total_amount=amount,
+            created_by=self.user
+        )
+        JournalLine.objects.create(journal_entry=entry, account=self.cash, debit=amount, credit=Decimal('0'))
+        JournalLine.objects.create(journal_entry=entry, account=self.revenue, debit=Decimal('0'), credit=amount)
+        return entry
+
+    def _snapshot_rows(self):
+        return list(AccountBalanceSnapshot.objects.filter(account=self.cash)
+                    .values_list('date', 'debit_total', 'credit_total'))
+
+    def test_as_of_balances_with_back_dated_posting(self):
+        """الترحيل بتاريخ سابق يحدث اللقطات اللاحقة"""
+        self._post(date(2024, 1, 10), Decimal('100.000'))
+        self._post(date(2024, 3, 10), Decimal('50.000'))
+        self._post(date(2024, 2, 10), Decimal('25.000'))
+
+        self.assertEqual(self.cash.get_balance(as_of_date=date(2024, 1, 31)), Decimal('100.000'))
+        self.assertEqual(self.cash.get_balance(as_of_date=date(2024, 2, 10)), Decimal('125.000'))
+        self.assertEqual(self.cash.get_balance(as_of_date=date(2024, 12, 31)), Decimal('175.000'))
+        self.assertEqual(self.revenue.get_balance(as_of_date=date(2024, 2, 28)), Decimal('125.000'))
+
+    def test_incremental_snapshots_match_rebuild(self):
+        """اللقطات المحدثة بالفروق تطابق إعادة البناء الكاملة"""
+        first = self._post(date(2024, 1, 10), Decimal('100.000'))
+        second = self._post(date(2024, 3, 10), Decimal('50.000'))
+        second.entry_date = date(2024, 1, 5)
+        second.save()
+        JournalEntry.objects.get(pk=first.pk).delete()
+
+        incremental = self._snapshot_rows()
+        AccountSnapshotService.rebuild()
+        rebuilt = self._snapshot_rows()
+
+        as_of = {row[0]: row[1] - row[2] for row in incremental}
+        for day, debit_total, credit_total in rebuilt:
+            self.assertEqual(as_of[day], debit_total - credit_total)
+        self.assertEqual(self.cash.get_balance(as_of_date=date(2024, 2, 1)), Decimal('50.000'))
+
+    def test_concurrently_created_snapshot_receives_the_delta(self):
+        """لقطة أنشأتها معاملة متزامنة لا ترى البنود غير المثبتة يُضاف إليها الفرق"""
+        self._post(date(2024, 1, 10), Decimal('100.000'))
+        day = date(2024, 1, 20)
+
+        def concurrent_create(account_id, as_of_date):
+            AccountBalanceSnapshot.objects.create(account_id=account_id, date=as_of_date,
+                                                  debit_total=Decimal('100.000'), credit_total=Decimal('0'))
+            return Decimal('140.000'), Decimal('0')
+
+        with mock.patch.object(AccountSnapshotService, 'get_totals', side_effect=concurrent_create):
+            AccountSnapshotService.apply({(self.cash.pk, day): (Decimal('40.000'), Decimal('0'))})
+
+        snapshot = AccountBalanceSnapshot.objects.get(account=self.cash, date=day)
+        self.assertEqual(snapshot.debit_total, Decimal('140.000'))
@@ -0,0 +1,72 @@
+"""
+اختبارات إقفال السنة المالية وفتح السنة التالية
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from journal.models import Account, FiscalYear, JournalEntry, JournalLine, YearEndClosing
+from journal.posting import JournalPostingService
+
+User = get_user_model()
+
+
+class YearEndClosingEngineTests(TestCase):
+    """أرصدة السنة بتجميع واحد، قيد إقفال متوازن، وأمر قابل للاستئناف"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='closing_user', password='test_password', is_superuser=True)
+        self.cash = Account.objects.create(code='91', name='نقد الإقفال', account_type='asset')
+        self.capital = Account.objects.create(code='93', name='رأس المال', account_type='equity')
+        self.sales = Account.objects.create(code='94', name='مبيعات الإقفال', account_type='revenue')
+        self.rent = Account.objects.create(code='95', name='إيجار الإقفال', account_type='expense')
+        FiscalYear.objects.create(year=2024, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                                  is_current=True, created_by=self.user)
+        JournalPostingService.post_entries([
+            {'entry_date': date(2024, 3, 1), 'description': 'مبيعات', 'lines': [
+                {'account_id': self.cash.pk, 'debit': '500'}, {'account_id': self.sales.pk, 'credit': '500'}]},
+            {'entry_date': date(2024, 6, 1), 'description': 'إيجار', 'lines': [
+                {'account_id': self.rent.pk, 'debit': '120'}, {'account_id': self.cash.pk, 'credit': '120'}]},
+            {'entry_date': date(2024, 7, 1), 'description': 'مردود', 'lines': [
+                {'account_id': self.sales.pk, 'debit': '30'}, {'account_id': self.cash.pk, 'credit': '30'}]},
+        ], user=self.user)
+
+    def _year_total(self, account, year):
+        totals = JournalLine.objects.filter(account=account, journal_entry__entry_date__year=year).aggregate(
+            debit=Sum('debit'), credit=Sum('credit'))
+        return (totals['debit'] or Decimal('0')) - (totals['credit'] or Decimal('0'))
+
+    def test_command_closes_year_and_opens_next_once(self):
+        call_command('close_fiscal_year', 2024, '--open-next', stdout=StringIO())
+
+        closing = YearEndClosing.objects.get(year=2024)
+        self.assertEqual(closing.status, 'completed')
+        self.assertEqual(closing.net_profit, Decimal('350'))
+        lines = closing.closing_entry.lines.all()
+        self.assertEqual(sum(line.debit for line in lines), sum(line.credit for line in lines))
+        self.assertEqual(self._year_total(self.sales, 2024), 0)
+        self.assertEqual(self._year_total(self.rent, 2024), 0)
+        self.assertEqual(lines.get(account=self.capital).credit, Decimal('350'))
+
+        next_year = FiscalYear.objects.get(year=2025)
+        self.assertEqual(FiscalYear.objects.get(year=2024).status, 'closed')
+        opening = {line.account_id: line.debit - line.credit for line in next_year.opening_entry.lines.all()}
+        self.assertEqual(opening, {self.cash.pk: Decimal('350'), self.capital.pk: Decimal('-350')})
+
+        # إعادة التشغيل لا تكرر القيود
+        entries = JournalEntry.objects.count()
+        call_command('close_fiscal_year', 2024, '--open-next', stdout=StringIO())
+        self.assertEqual(JournalEntry.objects.count(), entries)
+
+    def test_perform_closing_is_not_repeated(self):
+        closing = YearEndClosing.objects.create(year=2024, closing_date=date(2024, 12, 31), created_by=self.user)
+        success, message = closing.perform_closing()
+        self.assertTrue(success)
+        # بند لكل حساب أرباح وخسائر + رأس المال
+        self.assertEqual(closing.closing_entry.lines.count(), 3)
+        self.assertEqual(closing.perform_closing()[0], False)
@@ -65,7 +65,7 @@ class GetBalancePerformanceTests(TestCase):
                 account=account,
                 debit=Decimal('1000.000'),
                 credit=Decimal('0.000'),
-                description=f'دين للحساب {account.code}'
+                line_description=f'دين للحساب {account.code}'
             )
     
     def test_get_balance_leaf_account(self):
@@ -219,7 +219,7 @@ class GetBalanceAccuracyTests(TestCase):
             account=self.asset_account,
             debit=Decimal('1000.000'),
             credit=Decimal('300.000'),
-            description='الرصيد'
+            line_description='الرصيد'
         )
         
         balance = self.asset_account.get_balance()
@@ -246,7 +246,7 @@ class GetBalanceAccuracyTests(TestCase):
             account=self.liability_account,
             debit=Decimal('300.000'),
             credit=Decimal('1000.000'),
-            description='الرصيد'
+            line_description='الرصيد'
         )
         
         balance = self.liability_account.get_balance()
@@ -0,0 +1,83 @@
+"""
+اختبارات دفتر الحساب بالترقيم بالمفتاح
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from journal.ledger import AccountLedger
+from journal.models import Account, JournalLine
+from journal.posting import JournalPostingService
+
+User = get_user_model()
+
+
+class AccountLedgerTests(TestCase):
+    """الرصيد التراكمي صحيح عبر الصفحات والتصدير، وعدد الاستعلامات ثابت"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='ledger_user', password='test_password',
+                                                  email='ledger@example.com')
+        self.cash = Account.objects.create(code='71', name='نقد الدفتر', account_type='asset')
+        self.revenue = Account.objects.create(code='74', name='إيراد الدفتر', account_type='revenue')
+        start = date(2024, 1, 1)
+        JournalPostingService.post_entries([
+            {
+                'entry_date': start + timedelta(days=index // 3),
+                'description': f'حركة {index}',
+                'lines': [
+                    {'account_id': self.cash.pk, 'debit': index + 1} if index % 4 else
+                    {'account_id': self.cash.pk, 'credit': index + 1},
+                    {'account_id': self.revenue.pk, 'credit': index + 1} if index % 4 else
+                    {'account_id': self.revenue.pk, 'debit': index + 1},
+                ],
+            }
+            for index in range(30)
+        ], user=self.user)
+
+    def _expected(self, date_from=None):
+        lines = JournalLine.objects.filter(account=self.cash).order_by(
+            'journal_entry__entry_date', 'journal_entry__created_at', 'id')
+        balance, expected = Decimal('0'), []
+        for line in lines:
+            balance += line.debit - line.credit
+            if date_from is None or line.journal_entry.entry_date >= date_from:
+                expected.append((line.pk, balance))
+        return expected
+
+    def test_pages_follow_cursor_with_running_balance(self):
+        ledger = AccountLedger(self.cash)
+        seen, page = [], ledger.page(size=7)
+        while True:
+            seen.extend((row['line'].pk, row['balance']) for row in page)
+            if not page.has_next:
+                break
+            page = ledger.page(after=page.next_cursor, size=7)
+        self.assertEqual(seen, self._expected())
+
+        previous = ledger.page(before=page.previous_cursor, size=7)
+        self.assertEqual([(row['line'].pk, row['balance']) for row in previous], self._expected()[21:28])
+
+    def test_page_queries_do_not_depend_on_history(self):
+        date_from = date(2024, 1, 5)
+        ledger = AccountLedger(self.cash, date_from=date_from)
+        first = ledger.page(size=5)
+        # الصفحة + لقطة اليوم السابق + بنود نفس اليوم قبل أول صف
+        with self.assertNumQueries(3):
+            page = ledger.page(after=first.next_cursor, size=5)
+        self.assertEqual([(row['line'].pk, row['balance']) for row in page], self._expected(date_from)[5:10])
+
+    def test_export_rows_use_window_balance(self):
+        date_from = date(2024, 1, 3)
+        rows = list(AccountLedger(self.cash, date_from=date_from).iter_rows())
+        self.assertEqual([row[5] for row in rows], [balance for pk, balance in self._expected(date_from)])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('journal:account_ledger_export', args=[self.cash.pk]),
+                                   {'format': 'csv', 'date_from': '2024-01-03'})
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.strip().splitlines()[-1].split(',')[-1], str(self._expected()[-1][1]))
+        self.assertEqual(self.client.get(reverse('journal:account_ledger', args=[self.cash.pk])).status_code, 200)
@@ -0,0 +1,85 @@
+"""
+اختبارات ترحيل القيود المجمّع
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from banks.models import BankAccount, BankTransaction
+from journal.models import Account, JournalEntry, JournalLine
+from journal.posting import JournalPostingService
+from search.models import SearchDocument
+
+User = get_user_model()
+
+
+class JournalPostingServiceTests(TestCase):
+    """التحقق في الذاكرة، الإدراج المجمّع، وتحديث الأرصدة مرة واحدة لكل حساب"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='posting_user', password='test_password')
+        self.root = Account.objects.create(code='8', name='أصول الترحيل', account_type='asset')
+        self.cash = Account.objects.create(code='81', name='نقد الترحيل', account_type='asset', parent=self.root)
+        self.revenue = Account.objects.create(code='84', name='إيراد الترحيل', account_type='revenue')
+
+    def _entries(self, count, lines_per_side):
+        return [
+            {
+                'entry_date': date(2024, 1, 1),
+                'description': f'قيد مجمّع {index}',
+                'reference_type': 'import',
+                'reference_id': index + 1,
+                'lines': [{'account_id': self.cash.pk, 'debit': '1.250'}] * lines_per_side
+                + [{'account_id': self.revenue.pk, 'credit': '1.250'}] * lines_per_side,
+            }
+            for index in range(count)
+        ]
+
+    def test_queries_do_not_grow_with_lines(self):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            entries = JournalPostingService.post_entries(self._entries(40, 25), user=self.user)
+        # دفعات الإدراج + الأرصدة واللقطات مرة واحدة لكل حساب، وليس استعلامات لكل بند
+        self.assertLess(len(queries), 60)
+
+        self.assertEqual(len(entries), 40)
+        self.assertEqual(len({entry.entry_number for entry in entries}), 40)
+        self.assertEqual(JournalLine.objects.filter(journal_entry__in=entries).count(), 2000)
+        balances = dict(Account.objects.values_list('code', 'balance'))
+        self.assertEqual(balances['81'], Decimal('1250.000'))
+        self.assertEqual(balances['8'], Decimal('1250.000'))
+        self.assertEqual(balances['84'], Decimal('1250.000'))
+        self.assertEqual(self.cash.get_balance(), Decimal('1250.000'))
+        # bulk_create بدون post_save: القيود تُفهرس للبحث بعد التثبيت
+        self.assertEqual(SearchDocument.objects.filter(doc_type='journal_entry',
+                                                       object_id__in=[entry.pk for entry in entries]).count(), 40)
+
+        # إعادة الترحيل لنفس المراجع تعيد القيود الموجودة
+        again = JournalPostingService.post_entries(self._entries(2, 1), user=self.user)
+        self.assertEqual([entry.pk for entry in again], [entry.pk for entry in entries[:2]])
+
+    def test_unbalanced_entry_writes_nothing(self):
+        entries = self._entries(3, 1)
+        entries[2]['lines'][0]['debit'] = '5'
+        with self.assertRaises(ValueError):
+            JournalPostingService.post_entries(entries, user=self.user)
+        self.assertFalse(JournalEntry.objects.filter(reference_type='import').exists())
+
+    def test_bank_transactions_created_after_commit(self):
+        bank = BankAccount.objects.create(name='بنك الترحيل', bank_name='بنك', account_number='55', created_by=self.user)
+        bank_account = Account.objects.filter(bank_account=bank).first() or Account.objects.create(
+            code='102955', name='بنك الترحيل', account_type='asset', bank_account=bank)
+        entry = {'entry_date': date(2024, 2, 1), 'description': 'إيداع مجمّع',
+                 'lines': [{'account_id': bank_account.pk, 'debit': '40'},
+                           {'account_id': self.revenue.pk, 'credit': '40'}]}
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            posted, = JournalPostingService.post_entries([entry], user=self.user)
+        self.assertFalse(BankTransaction.objects.filter(bank=bank, amount=Decimal('40')).exists())
+        for callback in callbacks:
+            callback()
+        self.assertTrue(BankTransaction.objects.filter(
+            bank=bank, amount=Decimal('40'), description__contains=posted.entry_number).exists())
@@ -15,6 +15,7 @@ urlpatterns = [
     path('accounts/<int:pk>/edit/', views.account_edit, name='account_edit'),
     path('accounts/<int:pk>/delete/', views.account_delete, name='account_delete'),
     path('accounts/<int:pk>/ledger/', views.account_ledger, name='account_ledger'),
+    path('accounts/<int:pk>/ledger/export/', views.account_ledger_export, name='account_ledger_export'),
     path('accounts/fix-hierarchy/', views.fix_account_hierarchy, name='fix_hierarchy'),
     
     # إدارة القيود المحاسبية
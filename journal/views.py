@@ -13,6 +13,7 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 from .models import Account, JournalEntry, JournalLine
+from .balance_engine import AccountBalanceEngine
 from .forms import (AccountForm, JournalEntryForm, JournalLineFormSet, 
                    JournalSearchForm, TrialBalanceForm)
 from .services import JournalService
@@ -631,9 +632,10 @@ def journal_entry_create(request):
                                 line.journal_entry = entry
                                 lines_to_save.append(line)
                     
-                    # حفظ جميع البنود الصالحة
-                    for line in lines_to_save:
-                        line.save()
+                    # حفظ جميع البنود الصالحة - تُرحّل الأرصدة مرة واحدة للقيد
+                    with AccountBalanceEngine.deferred():
+                        for line in lines_to_save:
+                            line.save()
 
                     # التحقق من وجود بنود صالحة
                     if not lines_to_save:
@@ -754,7 +756,8 @@ def journal_entry_edit(request, pk):
                 with transaction.atomic():
                     entry = form.save()
                     formset.instance = entry
-                    formset.save()
+                    with AccountBalanceEngine.deferred():
+                        formset.save()
                     entry.clean()
                     total_debit = entry.lines.aggregate(total=Sum('debit'))['total'] or Decimal('0')
                     entry.total_amount = total_debit
@@ -1059,7 +1062,8 @@ def delete_journal_entry(request, pk):
                 except Exception:
                     pass
                 # حذف القيد
-                entry.delete()
+                with AccountBalanceEngine.deferred():
+                    entry.delete()
                 messages.success(request, _('The Accounting Entry was Deleted Successfully'))
         except Exception as e:
             messages.error(request, _('Error deleting journal entry: ') + str(e))
@@ -1084,61 +1088,76 @@ def delete_journal_entry(request, pk):
 
 @login_required
 def account_ledger(request, pk):
-    """دفتر الحساب (حركات مفصلة)"""
+    """دفتر الحساب (حركات مفصلة) - ترقيم بالمفتاح، انظر journal.ledger"""
+    from django.utils.dateparse import parse_date
+    from .ledger import AccountLedger
+
     account = get_object_or_404(Account, pk=pk)
     
     # التصفية بالتاريخ
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     
-    lines = JournalLine.objects.filter(account=account).select_related('journal_entry')
-    
-    if date_from:
-        lines = lines.filter(journal_entry__entry_date__gte=date_from)
-    if date_to:
-        lines = lines.filter(journal_entry__entry_date__lte=date_to)
-    
-    lines = lines.order_by('journal_entry__entry_date', 'journal_entry__created_at')
-    
-    # حساب الرصيد التراكمي
-    running_balance = Decimal('0')
-    lines_with_balance = []
-    
-    for line in lines:
-        if account.account_type in ['asset', 'expense', 'purchases']:
-            # الأصول والمصاريف ترتفع بالمدين
-            running_balance += line.debit - line.credit
-        else:
-            # المطلوبات والإيرادات وحقوق الملكية ترتفع بالدائن
-            running_balance += line.credit - line.debit
-        
-        lines_with_balance.append({
-            'line': line,
-            'balance': running_balance
-        })
-    
-    # الترقيم
-    paginator = Paginator(lines_with_balance, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # إجماليات
-    totals = lines.aggregate(
-        total_debit=Sum('debit'),
-        total_credit=Sum('credit')
-    )
+    ledger = AccountLedger(account, date_from=parse_date(date_from) if date_from else None,
+                           date_to=parse_date(date_to) if date_to else None)
+    page_obj = ledger.page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
         'account': account,
         'page_obj': page_obj,
-        'totals': totals,
+        'opening_balance': ledger.opening_balance(),
+        'totals': ledger.totals(),
         'date_from': date_from,
         'date_to': date_to,
-        'final_balance': running_balance,
+        'final_balance': ledger.closing_balance(),
     }
     return render(request, 'journal/account_ledger.html', context)
 
 
+@login_required
+def account_ledger_export(request, pk):
+    """تصدير دفتر الحساب كاملاً (Excel أو CSV) بشكل متدفق"""
+    from django.utils.dateparse import parse_date
+    from django.utils.translation import gettext
+    from core.exports import csv_response, xlsx_response
+    from .ledger import AccountLedger
+
+    account = get_object_or_404(Account, pk=pk)
+    date_from = request.GET.get('date_from')
+    date_to = request.GET.get('date_to')
+    ledger = AccountLedger(account, date_from=parse_date(date_from) if date_from else None,
+                           date_to=parse_date(date_to) if date_to else None)
+
+    try:
+        log_view_activity(request, 'export', account, f"تصدير دفتر الحساب {account.code} - {account.name}")
+    except Exception:
+        pass
+
+    headers = [gettext('Date'), gettext('Entry Number'), gettext('Description'), gettext('Debit'),
+               gettext('Credit'), gettext('Balance')]
+    preamble = [
+        [gettext('Account Ledger'), f'{account.code} - {account.name}'],
+        [gettext('From Date'), date_from or '-', gettext('To Date'), date_to or '-'],
+        [gettext('Opening Balance'), float(ledger.opening_balance())],
+        [],
+    ]
+
+    if request.GET.get('format') == 'csv':
+        rows = ([day.isoformat(), number, description, debit, credit, balance]
+                for day, number, description, debit, credit, balance in ledger.iter_rows())
+        return csv_response(f'ledger_{account.code}.csv', rows, headers=headers, preamble=preamble)
+
+    rows = ([day.strftime('%Y-%m-%d'), number, description, float(debit), float(credit), float(balance)]
+            for day, number, description, debit, credit, balance in ledger.iter_rows())
+    return xlsx_response(
+        f'ledger_{account.code}.xlsx', rows, headers=headers, title=gettext('Account Ledger'), preamble=preamble,
+        widths=[14, 18, 50, 15, 15, 18],
+        header_font=Font(bold=True, color="FFFFFF"),
+        header_fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+        header_alignment=Alignment(horizontal="center"),
+    )
+
+
 @login_required
 def year_end_closing(request):
     """إقفال السنة المالية"""
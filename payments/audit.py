@@ -0,0 +1,8 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق payments (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('payments.PaymentVoucher', fields=['voucher_number', 'date', 'payment_type', 'amount', 'supplier', 'check_status', 'description', 'is_active', 'is_reversed']),
+)
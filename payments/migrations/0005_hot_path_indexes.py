@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_alter_paymentvoucher_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentvoucher',
+            index=models.Index(condition=models.Q(('check_status', 'pending'), ('payment_type', 'check')), fields=['check_due_date'], name='payment_open_check_idx'),
+        ),
+    ]
@@ -83,6 +83,11 @@ class PaymentVoucher(models.Model):
         verbose_name = _('Payment Voucher')
         verbose_name_plural = _('Payment Vouchers')
         ordering = ['-date', '-voucher_number']
+        indexes = [
+            # الشيكات الصادرة غير المصروفة فقط
+            models.Index(fields=['check_due_date'], name='payment_open_check_idx',
+                         condition=models.Q(payment_type='check', check_status='pending')),
+        ]
         default_permissions = []  # No default permissions
         permissions = [
             ("can_view_payments", _("Can View Payment Vouchers")),
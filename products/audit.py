@@ -0,0 +1,9 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق products (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('products.Product', fields=['code', 'name', 'category', 'description', 'cost_price', 'sale_price', 'tax_rate', 'is_active']),
+    AuditConfig('products.Category', fields=['name', 'code', 'parent', 'description', 'is_active']),
+)
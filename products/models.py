@@ -68,53 +68,29 @@ class Category(models.Model):
     @property
     def total_available_quantity(self):
         """Total available quantity for all products in the category"""
-        from django.db.models import Sum
-        from inventory.models import InventoryMovement
+        from inventory.stock_levels import StockLevelService
         
-        # Calculate incoming quantity minus outgoing quantity for products in this category
-        products = self.product_set.filter(is_active=True)
+        # Same logic as current_stock, read from the stock levels table in one query
+        products = list(self.product_set.filter(is_active=True))
+        levels = StockLevelService.levels([product.id for product in products])
         
         total_quantity = 0
         for product in products:
-            # Use the same logic as current_stock
-            incoming = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='in'
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            outgoing = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='out'
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            # Add opening balance
-            product_stock = (incoming - outgoing) + product.opening_balance_quantity
-            total_quantity += product_stock
+            total_quantity += StockLevelService.on_hand(product, levels)
         
         return total_quantity
 
     @property
     def total_available_cost(self):
         """Total cost of available quantity for all products in the category"""
-        from django.db.models import Sum
-        from inventory.models import InventoryMovement
+        from inventory.stock_levels import StockLevelService
         
-        products = self.product_set.filter(is_active=True)
+        products = list(self.product_set.filter(is_active=True))
+        levels = StockLevelService.levels([product.id for product in products])
         
         total_cost = 0
         for product in products:
-            # Calculate available quantity
-            incoming = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='in'
-            ).exclude(reference_type='opening_balance').aggregate(total=Sum('quantity'))['total'] or 0
-            
-            outgoing = InventoryMovement.objects.filter(
-                product=product,
-                movement_type='out'
-            ).aggregate(total=Sum('quantity'))['total'] or 0
-            
-            available_quantity = (incoming - outgoing) + product.opening_balance_quantity
+            available_quantity = StockLevelService.on_hand(product, levels)
             
             # Calculate cost using weighted average cost
             if available_quantity > 0:
@@ -254,43 +230,17 @@ class Product(models.Model):
     @property
     def current_stock(self):
         """Current quantity in stock (sum of all warehouses)"""
-        from inventory.models import InventoryMovement
-        
-        # Calculate incoming quantity (in) minus outgoing quantity (out), excluding opening balance movements to avoid duplication
-        incoming = InventoryMovement.objects.filter(
-            product=self,
-            movement_type='in'
-        ).exclude(reference_type='opening_balance').aggregate(total=models.Sum('quantity'))['total'] or 0
+        from inventory.stock_levels import StockLevelService
         
-        outgoing = InventoryMovement.objects.filter(
-            product=self,
-            movement_type='out'
-        ).aggregate(total=models.Sum('quantity'))['total'] or 0
-        
-        # Add opening balance
-        return (incoming - outgoing) + self.opening_balance_quantity
+        # Movements excluding opening balance movements (to avoid duplication) plus the opening balance
+        return StockLevelService.on_hand(self)
 
     def get_stock_in_warehouse(self, warehouse):
         """Get current quantity in a specific warehouse"""
-        from inventory.models import InventoryMovement
-        
-        # Calculate incoming quantity (in) minus outgoing quantity (out) in the specified warehouse
-        incoming = InventoryMovement.objects.filter(
-            product=self,
-            warehouse=warehouse,
-            movement_type='in'
-        ).exclude(reference_type='opening_balance').aggregate(total=models.Sum('quantity'))['total'] or 0
-        
-        outgoing = InventoryMovement.objects.filter(
-            product=self,
-            warehouse=warehouse,
-            movement_type='out'
-        ).aggregate(total=models.Sum('quantity'))['total'] or 0
-        
-        # Add opening balance if the warehouse is the opening balance warehouse
-        opening_balance = self.opening_balance_quantity if self.opening_balance_warehouse == warehouse else 0
+        from inventory.stock_levels import StockLevelService
         
-        return (incoming - outgoing) + opening_balance
+        # Opening balance is added only if the warehouse is the opening balance warehouse
+        return StockLevelService.on_hand(self, warehouse=warehouse)
 
     @property
     def is_low_stock(self):
@@ -0,0 +1,10 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق provisions (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('provisions.ProvisionType', fields=['name', 'description', 'is_active']),
+    AuditConfig('provisions.Provision', fields=['name', 'provision_type', 'amount', 'accumulated_amount', 'start_date', 'end_date', 'is_active', 'is_approved']),
+    AuditConfig('provisions.ProvisionEntry', fields=['provision', 'date', 'amount', 'journal_entry']),
+)
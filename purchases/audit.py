@@ -0,0 +1,12 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق purchases (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('purchases.PurchaseInvoice', fields=['invoice_number', 'date', 'supplier', 'warehouse', 'payment_type', 'total_amount']),
+    AuditConfig('purchases.PurchaseReturn', fields=['return_number', 'date', 'total_amount']),
+    AuditConfig('purchases.PurchaseInvoiceItem', fields=['invoice', 'product', 'quantity', 'unit_price', 'tax_rate', 'total_amount']),
+    AuditConfig('purchases.PurchaseReturnItem', fields=['return_invoice', 'product', 'returned_quantity', 'unit_price', 'total_amount']),
+    AuditConfig('purchases.PurchaseDebitNote', fields=['note_number', 'date', 'supplier', 'supplier_debit_note_number', 'subtotal', 'total_amount', 'notes']),
+)
@@ -0,0 +1,10 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق receipts (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('receipts.PaymentReceipt', fields=['receipt_number', 'date', 'customer', 'payment_type', 'amount', 'check_status', 'description', 'is_active', 'is_reversed']),
+    AuditConfig('receipts.ReceiptReversal', fields=['original_receipt', 'reversal_date', 'reason']),
+    AuditConfig('receipts.CheckCollection', fields=['receipt', 'collection_date', 'status', 'cashbox']),
+)
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0013_alter_paymentreceipt_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentreceipt',
+            index=models.Index(fields=['customer', 'date'], name='receipt_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentreceipt',
+            index=models.Index(condition=models.Q(('check_status', 'pending'), ('payment_type', 'check')), fields=['check_due_date'], name='receipt_open_check_idx'),
+        ),
+    ]
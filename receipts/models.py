@@ -84,6 +84,12 @@ class PaymentReceipt(models.Model):
         verbose_name = _('Receipt Voucher')
         verbose_name_plural = _('Receipt Vouchers')
         ordering = ['-date', '-receipt_number']
+        indexes = [
+            models.Index(fields=['customer', 'date'], name='receipt_customer_date_idx'),
+            # الشيكات المفتوحة فقط (تحت التحصيل)
+            models.Index(fields=['check_due_date'], name='receipt_open_check_idx',
+                         condition=models.Q(payment_type='check', check_status='pending')),
+        ]
         default_permissions = []  # No default permissions
         permissions = [
             ("can_view_receipts", _("Can View Receipt Vouchers")),
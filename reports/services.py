@@ -0,0 +1,151 @@
+"""
+محرك التقارير المالية المجمّعة
+
+يحمّل جميع الحسابات النشطة باستعلام واحد ومجاميع المدين والدائن لجميع
+الحسابات حتى تاريخ (أو خلال فترة) باستعلام مجمّع واحد، ثم يحسب أرصدة
+الحسابات الأب في الذاكرة من شجرة parent. عدد الاستعلامات ثابت مهما بلغ
+عدد الحسابات، ويغذي ميزان المراجعة والميزانية وقائمة الدخل والنسب المالية
+والتدفقات النقدية وتصديراتها.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from journal.balance_engine import DEBIT_NATURE_TYPES, signed_balance
+from journal.models import Account, JournalLine
+
+
+class FinancialReportEngine:
+    """أرصدة جميع الحسابات النشطة لتاريخ أو فترة محددة"""
+
+    def __init__(self, as_of_date=None, start_date=None):
+        """
+        Args:
+            as_of_date: احتساب الحركات حتى هذا التاريخ شاملاً (اختياري)
+            start_date: احتساب الحركات من هذا التاريخ شاملاً - لتقارير الفترات (اختياري)
+        """
+        self.as_of_date = as_of_date
+        self.start_date = start_date
+
+        self.accounts = list(
+            Account.objects.filter(is_active=True)
+            .only('id', 'code', 'name', 'account_type', 'parent_id', 'is_active')
+            .order_by('code')
+        )
+        self._by_id = {account.id: account for account in self.accounts}
+        self._children = defaultdict(list)
+        for account in self.accounts:
+            if account.parent_id in self._by_id:
+                self._children[account.parent_id].append(account.id)
+
+        lines = JournalLine.objects.filter(account__is_active=True)
+        if as_of_date:
+            lines = lines.filter(journal_entry__entry_date__lte=as_of_date)
+        if start_date:
+            lines = lines.filter(journal_entry__entry_date__gte=start_date)
+        self._totals = {
+            row['account_id']: (row['debit'] or Decimal('0'), row['credit'] or Decimal('0'))
+            for row in lines.values('account_id').annotate(
+                debit=Sum('debit'), credit=Sum('credit')
+            ).order_by()
+        }
+        self._rolled = {}
+
+    def has_entries(self, account):
+        """هل للحساب بنود مباشرة ضمن نطاق التقرير"""
+        return account.id in self._totals
+
+    def has_active_children(self, account):
+        return bool(self._children.get(account.id))
+
+    def direct_balance(self, account):
+        """رصيد الحساب من بنوده المباشرة فقط (بدون الحسابات الفرعية)"""
+        debit_total, credit_total = self._totals.get(account.id, (None, None))
+        return signed_balance(account.account_type, debit_total, credit_total)
+
+    def balance(self, account):
+        """
+        رصيد الحساب بنفس قاعدة Account.get_balance: الحساب الأب = مجموع
+        أرصدة أبنائه النشطين، والحساب الفرعي = رصيد بنوده المباشرة.
+        """
+        return self._resolve(account.id, set())
+
+    def _resolve(self, account_id, visiting):
+        if account_id in self._rolled:
+            return self._rolled[account_id]
+        # حماية من الحلقات المفرغة
+        if account_id in visiting:
+            return Decimal('0')
+        visiting.add(account_id)
+        children = self._children.get(account_id)
+        if children:
+            value = sum((self._resolve(child_id, visiting) for child_id in children), Decimal('0'))
+        else:
+            value = self.direct_balance(self._by_id[account_id])
+        visiting.discard(account_id)
+        self._rolled[account_id] = value
+        return value
+
+    def accounts_of_type(self, account_types):
+        """الحسابات النشطة من الأنواع المحددة مرتبة حسب الكود"""
+        if isinstance(account_types, str):
+            account_types = [account_types]
+        return [account for account in self.accounts if account.account_type in account_types]
+
+    def balances_by_type(self, account_types):
+        """
+        الحسابات ذات الرصيد غير الصفري مع مجموعها.
+
+        Returns:
+            tuple: ([{'account', 'balance'}], الإجمالي)
+        """
+        rows = []
+        total = Decimal('0')
+        for account in self.accounts_of_type(account_types):
+            balance = self.balance(account)
+            if balance != 0:
+                rows.append({'account': account, 'balance': balance})
+                total += balance
+        return rows, total
+
+    def total_for_type(self, account_types):
+        """مجموع أرصدة الحسابات النشطة من الأنواع المحددة"""
+        return sum((self.balance(account) for account in self.accounts_of_type(account_types)), Decimal('0'))
+
+    def trial_balance(self, account_type=None):
+        """
+        بيانات ميزان المراجعة: كل حساب له بنود مباشرة ورصيد غير صفري،
+        موزعاً على عمود المدين أو الدائن حسب طبيعة الحساب وإشارة الرصيد.
+
+        Returns:
+            tuple: (الصفوف، إجمالي المدين، إجمالي الدائن)
+        """
+        rows = []
+        total_debit = Decimal('0')
+        total_credit = Decimal('0')
+        for account in self.accounts:
+            if account_type and account.account_type != account_type:
+                continue
+            if not self.has_entries(account):
+                continue
+            # الحساب الأب الذي له بنود مباشرة يظهر برصيد بنوده المباشرة فقط
+            balance = self.direct_balance(account)
+            if balance == 0:
+                continue
+
+            if account.account_type in DEBIT_NATURE_TYPES:
+                debit_balance = balance if balance >= 0 else Decimal('0')
+                credit_balance = Decimal('0') if balance >= 0 else -balance
+            else:
+                debit_balance = Decimal('0') if balance >= 0 else -balance
+                credit_balance = balance if balance >= 0 else Decimal('0')
+
+            rows.append({
+                'account': account,
+                'debit_balance': debit_balance,
+                'credit_balance': credit_balance,
+            })
+            total_debit += debit_balance
+            total_credit += credit_balance
+        return rows, total_debit, total_credit
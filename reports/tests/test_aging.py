@@ -0,0 +1,115 @@
+"""
+اختبارات محرك أعمار الذمم
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from customers.models import CustomerSupplier
+from inventory.models import Warehouse
+from payments.models import PaymentVoucher
+from purchases.models import PurchaseInvoice
+from receipts.models import PaymentReceipt
+from reports.aging import AgingEngine
+from sales.models import SalesInvoice
+
+User = get_user_model()
+
+AS_OF = date(2024, 6, 30)
+
+
+class AgingEngineTests(TestCase):
+    """توزيع FIFO للدفعات على الفواتير وتصنيف المتبقي حسب العمر"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='aging_user', password='test_password', user_type='admin')
+        self.customer = CustomerSupplier.objects.create(name='عميل الأعمار', type='customer', city='عمان')
+        self.paid_up = CustomerSupplier.objects.create(name='عميل مسدد', type='customer', city='عمان')
+        self.supplier = CustomerSupplier.objects.create(name='مورد الأعمار', type='supplier', city='عمان')
+        warehouse = Warehouse.objects.create(name='مستودع الأعمار', code='AG-WH')
+
+        # bulk_create لتجنب القيود والحركات التلقائية - المحرك يقرأ الفواتير والدفعات فقط
+        SalesInvoice.objects.bulk_create([
+            self._sale('AG-1', self.customer, 100, '100'),
+            self._sale('AG-2', self.customer, 45, '50'),
+            self._sale('AG-3', self.customer, 10, '30'),
+            self._sale('AG-4', self.customer, -5, '999'),  # بعد تاريخ التقرير
+            self._sale('AG-5', self.paid_up, 20, '40'),
+        ])
+        PaymentReceipt.objects.bulk_create([
+            self._receipt('AG-R1', self.customer, 5, '120'),
+            self._receipt('AG-R2', self.customer, 3, '500', is_reversed=True),
+            self._receipt('AG-R3', self.paid_up, 1, '40'),
+        ])
+        PurchaseInvoice.objects.bulk_create([
+            PurchaseInvoice(invoice_number='AG-P1', supplier_invoice_number='S-1', date=AS_OF - timedelta(days=70),
+                            supplier=self.supplier, payment_type='credit', total_amount=Decimal('80'),
+                            warehouse=warehouse, created_by=self.user),
+        ])
+        PaymentVoucher.objects.bulk_create([
+            PaymentVoucher(voucher_number='AG-V1', date=AS_OF, voucher_type='supplier', payment_type='cash',
+                           amount=Decimal('20'), supplier=self.supplier, created_by=self.user),
+        ])
+
+    def _sale(self, number, customer, days_ago, amount):
+        return SalesInvoice(invoice_number=number, date=AS_OF - timedelta(days=days_ago), customer=customer,
+                            payment_type='credit', total_amount=Decimal(amount), created_by=self.user)
+
+    def _receipt(self, number, customer, days_ago, amount, is_reversed=False):
+        return PaymentReceipt(receipt_number=number, date=AS_OF - timedelta(days=days_ago), customer=customer,
+                              payment_type='cash', amount=Decimal(amount), is_reversed=is_reversed,
+                              created_by=self.user)
+
+    def test_payments_settle_oldest_invoices_first(self):
+        rows = list(AgingEngine('receivable', AS_OF).invoice_rows())
+        self.assertEqual(
+            [(row['invoice_number'], row['outstanding'], row['bucket']) for row in rows],
+            [('AG-2', Decimal('30'), 'aging_31_60'), ('AG-3', Decimal('30'), 'aging_0_30')],
+        )
+
+        summary = AgingEngine('receivable', AS_OF).summary()
+        self.assertEqual([row['party'] for row in summary], [self.customer])
+        self.assertEqual(summary[0]['outstanding'], Decimal('60'))
+        self.assertEqual(summary[0]['aging_over_90'], Decimal('0'))
+
+        payables = AgingEngine('payable', AS_OF).summary()
+        self.assertEqual(payables[0]['aging_61_90'], Decimal('60'))
+
+        # كما في تاريخ سابق: الإيصال لم يُستلم بعد
+        earlier = AgingEngine('receivable', AS_OF - timedelta(days=30)).summary()
+        self.assertEqual(earlier[0]['outstanding'], Decimal('150'))
+        self.assertEqual(earlier[0]['aging_0_30'], Decimal('50'))
+        self.assertEqual(earlier[0]['aging_61_90'], Decimal('100'))
+
+    def test_report_query_count_is_constant(self):
+        for index in range(20):
+            party = CustomerSupplier.objects.create(name=f'عميل {index}', type='customer', city='عمان')
+            SalesInvoice.objects.bulk_create([self._sale(f'AG-X{index}', party, index, '10')])
+
+        with self.assertNumQueries(2):
+            # الفواتير المفتوحة ثم الأطراف ذات الرصيد
+            summary = AgingEngine('receivable', AS_OF).summary()
+        self.assertEqual(len(summary), 21)
+
+        self.client.force_login(self.user)
+        url = reverse('reports:aging_report') + f'?end_date={AS_OF}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_customers_outstanding'], Decimal('260'))
+
+        response = self.client.get(url + '&export=csv')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('AG-2', content)
+        self.assertNotIn('AG-1,', content)
+
+        response = self.client.get(url + '&export=excel')
+        self.assertEqual(response['Content-Type'],
+                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        invoice_numbers = [row[2] for row in workbook.active.iter_rows(min_row=3, values_only=True)]
+        self.assertIn('AG-2', invoice_numbers)
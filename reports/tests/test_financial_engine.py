@@ -0,0 +1,70 @@
+"""
+اختبارات محرك التقارير المالية المجمّعة
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from journal.models import Account, JournalEntry, JournalLine
+from reports.services import FinancialReportEngine
+
+User = get_user_model()
+
+
+class FinancialReportEngineTests(TestCase):
+    """مطابقة أرصدة المحرك مع get_balance وثبات عدد الاستعلامات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='report_engine_user',
+            password='test_password',
+            user_type='admin'
+        )
+        self.assets = Account.objects.create(code='8', name='أصول تقرير', account_type='asset')
+        self.cash = Account.objects.create(code='81', name='نقد تقرير', account_type='asset', parent=self.assets)
+        self.bank = Account.objects.create(code='82', name='بنك تقرير', account_type='asset', parent=self.assets)
+        self.revenue = Account.objects.create(code='85', name='إيراد تقرير', account_type='revenue')
+
+    def _post(self, entry_date, account, amount):
+        entry = JournalEntry.objects.create(
+            entry_date=entry_date,
+            description='قيد تقرير',
+            total_amount=amount,
+            created_by=self.user
+        )
+        JournalLine.objects.create(journal_entry=entry, account=account, debit=amount, credit=Decimal('0'))
+        JournalLine.objects.create(journal_entry=entry, account=self.revenue, debit=Decimal('0'), credit=amount)
+
+    def test_balances_roll_up_and_respect_dates(self):
+        """الحساب الأب يجمع أبناءه والأرصدة تحترم التاريخ والفترة"""
+        self._post(date(2024, 1, 10), self.cash, Decimal('100.000'))
+        self._post(date(2024, 2, 10), self.bank, Decimal('40.000'))
+
+        engine = FinancialReportEngine(as_of_date=date(2024, 1, 31))
+        self.assertEqual(engine.balance(self.assets), Decimal('100.000'))
+        self.assertEqual(engine.balance(self.cash), self.cash.get_balance(as_of_date=date(2024, 1, 31)))
+
+        engine = FinancialReportEngine(as_of_date=date(2024, 12, 31))
+        self.assertEqual(engine.balance(self.assets), Decimal('140.000'))
+        rows, total_debit, total_credit = engine.trial_balance()
+        self.assertEqual([row['account'].code for row in rows], ['81', '82', '85'])
+        self.assertEqual(total_debit, total_credit)
+
+        period = FinancialReportEngine(as_of_date=date(2024, 2, 29), start_date=date(2024, 2, 1))
+        self.assertEqual(period.balance(self.revenue), Decimal('40.000'))
+
+    def test_query_count_is_constant(self):
+        """عدد الاستعلامات لا يتغير بزيادة عدد الحسابات"""
+        self._post(date(2024, 1, 10), self.cash, Decimal('100.000'))
+        for index in range(20):
+            account = Account.objects.create(code=f'83{index:02d}', name=f'فرعي {index}',
+                                             account_type='asset', parent=self.assets)
+            self._post(date(2024, 1, 11), account, Decimal('1.000'))
+
+        with self.assertNumQueries(2):
+            engine = FinancialReportEngine(as_of_date=date(2024, 12, 31))
+            engine.trial_balance()
+            engine.balances_by_type(['asset', 'revenue'])
+        self.assertEqual(engine.balance(self.assets), Decimal('120.000'))
@@ -12,6 +12,7 @@ from accounts.models import AccountTransaction
 from customers.models import CustomerSupplier
 from core.signals import log_view_activity, log_export_activity
 from journal.models import Account, JournalEntry
+from .services import FinancialReportEngine
 
 
 @login_required
@@ -175,32 +176,31 @@ def customer_statement(request):
         # Handle export
         if export and export.lower() in ('csv', 'xlsx'):
             filename_base = f"customer_statement_{selected_customer.sequence_number or selected_customer.pk}_{start_date}_{end_date}"
+            from itertools import chain
+            from core.exports import xlsx_response, csv_response
+            headers = [
+                _('Date'), _('Number'), _('Type'), _('Description'), _('Debit'), _('Credit'), _('Running Balance')
+            ]
             if export.lower() == 'xlsx':
-                # Best-effort XLSX using openpyxl; fallback to CSV
+                # Best-effort XLSX using openpyxl (write-only); fallback to CSV
                 try:
-                    import io
-                    from openpyxl import Workbook
-                    wb = Workbook()
-                    ws = wb.active
-                    ws.title = str(_('Statement'))
-                    headers = [
-                        _('Date'), _('Number'), _('Type'), _('Description'), _('Debit'), _('Credit'), _('Running Balance')
-                    ]
-                    ws.append(headers)
-                    # Opening row
-                    ws.append([str(start_date), '-', _('Opening Balance'), '', '', '', clean_numeric_value(opening_balance)])
-                    for r in statement_rows:
-                        ws.append([
-                            str(r['date']), r['number'], r['type'], r['description'], clean_numeric_value(r['debit']), clean_numeric_value(r['credit']), clean_numeric_value(r['running_balance'])
-                        ])
-                    # Totals and closing
-                    ws.append(['', '', _('Totals'), '', clean_numeric_value(totals_debit), clean_numeric_value(totals_credit), ''])
-                    ws.append(['', '', _('Closing Balance'), '', '', '', clean_numeric_value(closing_balance)])
-                    bio = io.BytesIO()
-                    wb.save(bio)
-                    bio.seek(0)
-                    response = HttpResponse(bio.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                    response['Content-Disposition'] = f'attachment; filename={filename_base}.xlsx'
+                    rows = chain(
+                        # Opening row
+                        [[str(start_date), '-', str(_('Opening Balance')), '', '', '', clean_numeric_value(opening_balance)]],
+                        (
+                            [str(r['date']), r['number'], r['type'], r['description'], clean_numeric_value(r['debit']),
+                             clean_numeric_value(r['credit']), clean_numeric_value(r['running_balance'])]
+                            for r in statement_rows
+                        ),
+                    )
+                    response = xlsx_response(
+                        f'{filename_base}.xlsx', rows, headers=headers, title=_('Statement'),
+                        footer=[
+                            # Totals and closing
+                            ['', '', _('Totals'), '', clean_numeric_value(totals_debit), clean_numeric_value(totals_credit), ''],
+                            ['', '', _('Closing Balance'), '', '', '', clean_numeric_value(closing_balance)],
+                        ],
+                    )
                     try:
                         log_export_activity(request, str(_('Customer Statement')), f'{filename_base}.xlsx', 'XLSX')
                     except Exception:
@@ -211,21 +211,26 @@ def customer_statement(request):
                     export = 'csv'
 
             if export.lower() == 'csv':
-                import csv
-                response = HttpResponse(content_type='text/csv; charset=utf-8')
-                response.write('\ufeff')  # BOM for Excel + Arabic
-                response['Content-Disposition'] = f'attachment; filename={filename_base}.csv'
-                writer = csv.writer(response)
-                writer.writerow([_('Customer Statement')])
-                writer.writerow([_('Customer'), selected_customer.name])
-                writer.writerow([_('From'), start_date, _('To'), end_date])
-                writer.writerow([])
-                writer.writerow([_('Date'), _('Number'), _('Type'), _('Description'), _('Debit'), _('Credit'), _('Running Balance')])
-                writer.writerow([start_date, '-', _('Opening Balance'), '', '', '', opening_balance])
-                for r in statement_rows:
-                    writer.writerow([r['date'], r['number'], r['type'], r['description'], r['debit'], r['credit'], r['running_balance']])
-                writer.writerow(['', '', _('Totals'), '', totals_debit, totals_credit, ''])
-                writer.writerow(['', '', _('Closing Balance'), '', '', '', closing_balance])
+                rows = chain(
+                    [[start_date, '-', _('Opening Balance'), '', '', '', opening_balance]],
+                    (
+                        [r['date'], r['number'], r['type'], r['description'], r['debit'], r['credit'], r['running_balance']]
+                        for r in statement_rows
+                    ),
+                )
+                response = csv_response(
+                    f'{filename_base}.csv', rows, headers=headers,
+                    preamble=[
+                        [_('Customer Statement')],
+                        [_('Customer'), selected_customer.name],
+                        [_('From'), start_date, _('To'), end_date],
+                        [],
+                    ],
+                    footer=[
+                        ['', '', _('Totals'), '', totals_debit, totals_credit, ''],
+                        ['', '', _('Closing Balance'), '', '', '', closing_balance],
+                    ],
+                )
                 try:
                     log_export_activity(request, str(_('Customer Statement')), f'{filename_base}.csv', 'CSV')
                 except Exception:
@@ -517,109 +522,9 @@ def trial_balance(request):
     account_type_filter = request.GET.get('account_type', '')
     export = request.GET.get('export', '')  # pdf or excel
 
-    # Get all active accounts for trial balance
-    # IFRS compliant: Include ALL accounts that have journal entries
-    # This includes both leaf accounts and parent accounts with direct entries
-    from django.db.models import Exists, OuterRef, Q
-
-    all_accounts = Account.objects.filter(is_active=True).order_by('code')
-    
-    # Get accounts that have journal entries (either direct or through children)
-    accounts = []
-    for account in all_accounts:
-        # Check if this account has direct journal entries
-        from journal.models import JournalLine
-        has_entries = JournalLine.objects.filter(account=account).exists()
-        
-        # Include account if it has entries AND doesn't have active children
-        # OR if it has entries AND has children (parent with direct entries - shouldn't happen but handle it)
-        has_active_children = account.children.filter(is_active=True).exists()
-        
-        if has_entries and not has_active_children:
-            # Leaf account with entries - include it
-            balance = account.get_balance(as_of_date=as_of_date)
-            if balance != 0:
-                accounts.append(account)
-        elif has_entries and has_active_children:
-            # Parent account with direct entries - SHOULD NOT HAPPEN but include anyway
-            # Calculate balance from direct entries only (not including children)
-            lines = JournalLine.objects.filter(account=account)
-            if as_of_date:
-                lines = lines.filter(journal_entry__entry_date__lte=as_of_date)
-            
-            from django.db.models import Sum
-            debit_total = lines.aggregate(total=Sum('debit'))['total'] or Decimal('0')
-            credit_total = lines.aggregate(total=Sum('credit'))['total'] or Decimal('0')
-            
-            if account.account_type in ['asset', 'expense', 'purchases']:
-                balance = debit_total - credit_total
-            else:
-                balance = credit_total - debit_total
-            
-            if balance != 0:
-                accounts.append(account)
-
-    if account_type_filter:
-        accounts = [acc for acc in accounts if acc.account_type == account_type_filter]
-
-    # Calculate balances
-    trial_balance_data = []
-    total_debit = Decimal('0')
-    total_credit = Decimal('0')
-
-    for account in accounts:
-        # For parent accounts with direct entries, calculate from direct entries only
-        from journal.models import JournalLine
-        has_active_children = account.children.filter(is_active=True).exists()
-        
-        if has_active_children:
-            # Parent account - get balance from direct entries only (not children)
-            lines = JournalLine.objects.filter(account=account)
-            if as_of_date:
-                lines = lines.filter(journal_entry__entry_date__lte=as_of_date)
-            
-            from django.db.models import Sum
-            debit_total = lines.aggregate(total=Sum('debit'))['total'] or Decimal('0')
-            credit_total = lines.aggregate(total=Sum('credit'))['total'] or Decimal('0')
-            
-            if account.account_type in ['asset', 'expense', 'purchases']:
-                balance = debit_total - credit_total
-            else:
-                balance = credit_total - debit_total
-        else:
-            # Leaf account - use get_balance method
-            balance = account.get_balance(as_of_date=as_of_date)
-
-        # IFRS-compliant trial balance logic:
-        # Accounts with normal debit balances: Assets, Expenses, Purchases
-        # Accounts with normal credit balances: Liabilities, Equity, Revenue
-        
-        if account.account_type in ['asset', 'expense', 'purchases']:
-            # Normal debit balance accounts
-            if balance >= 0:
-                debit_balance = balance
-                credit_balance = Decimal('0')
-            else:
-                # Negative balance = credit side
-                debit_balance = Decimal('0')
-                credit_balance = -balance
-        else:  # liability, equity, revenue
-            # Normal credit balance accounts
-            if balance >= 0:
-                debit_balance = Decimal('0')
-                credit_balance = balance
-            else:
-                # Negative balance = debit side
-                debit_balance = -balance
-                credit_balance = Decimal('0')
-
-        trial_balance_data.append({
-            'account': account,
-            'debit_balance': debit_balance,
-            'credit_balance': credit_balance,
-        })
-        total_debit += debit_balance
-        total_credit += credit_balance
+    # استعلامان فقط مهما بلغ عدد الحسابات: الحسابات النشطة ومجاميع بنودها المجمعة
+    engine = FinancialReportEngine(as_of_date=as_of_date)
+    trial_balance_data, total_debit, total_credit = engine.trial_balance(account_type_filter or None)
 
     # Handle export
     if export == 'pdf':
@@ -671,44 +576,24 @@ def trial_balance(request):
         return response
 
     elif export == 'excel':
-        from openpyxl import Workbook
         from openpyxl.styles import Font, Alignment
-        from io import BytesIO
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = _('Trial Balance')
-
-        # Headers
-        ws['A1'] = _('Trial Balance Report')
-        ws['A2'] = f"{_('As of Date')}: {as_of_date}"
-        ws['A4'] = _('Account Code')
-        ws['B4'] = _('Account Name')
-        ws['C4'] = _('Debit Balance')
-        ws['D4'] = _('Credit Balance')
+        from core.exports import xlsx_response
 
-        # Data
-        row = 5
-        for item in trial_balance_data:
-            ws[f'A{row}'] = item['account'].code
-            ws[f'B{row}'] = item['account'].name
-            ws[f'C{row}'] = clean_numeric_value(item['debit_balance'])
-            ws[f'D{row}'] = clean_numeric_value(item['credit_balance'])
-            row += 1
-
-        # Totals
-        ws[f'A{row}'] = _('Total')
-        ws[f'C{row}'] = clean_numeric_value(total_debit)
-        ws[f'D{row}'] = clean_numeric_value(total_credit)
-
-        # Styling
-        for col in ['A', 'B', 'C', 'D']:
-            ws[f'{col}4'].font = Font(bold=True)
-            ws[f'{col}4'].alignment = Alignment(horizontal='center')
-
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="trial_balance_{as_of_date}.xlsx"'
-        wb.save(response)
+        rows = (
+            [item['account'].code, item['account'].name, clean_numeric_value(item['debit_balance']),
+             clean_numeric_value(item['credit_balance'])]
+            for item in trial_balance_data
+        )
+        response = xlsx_response(
+            f'trial_balance_{as_of_date}.xlsx', rows,
+            headers=[_('Account Code'), _('Account Name'), _('Debit Balance'), _('Credit Balance')],
+            title=_('Trial Balance'),
+            preamble=[[_('Trial Balance Report')], [f"{_('As of Date')}: {as_of_date}"], []],
+            # Totals
+            footer=[[_('Total'), '', clean_numeric_value(total_debit), clean_numeric_value(total_credit)]],
+            header_font=Font(bold=True),
+            header_alignment=Alignment(horizontal='center'),
+        )
         try:
             log_export_activity(request, str(_('Trial Balance Report')), f'trial_balance_{as_of_date}.xlsx', 'Excel')
         except Exception:
@@ -755,44 +640,10 @@ def balance_sheet(request):
     today = date.today()
     as_of_date = _parse_date(request.GET.get('as_of_date'), today)
 
-    # Calculate assets
-    assets = Account.objects.filter(account_type='asset', is_active=True)
-    total_assets = Decimal('0')
-    asset_accounts = []
-    for account in assets:
-        balance = account.get_balance(as_of_date)
-        if balance != 0:
-            asset_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_assets += balance
-
-    # Calculate liabilities
-    liabilities = Account.objects.filter(account_type='liability', is_active=True)
-    total_liabilities = Decimal('0')
-    liability_accounts = []
-    for account in liabilities:
-        balance = account.get_balance(as_of_date)
-        if balance != 0:
-            liability_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_liabilities += balance
-
-    # Calculate equity
-    equities = Account.objects.filter(account_type='equity', is_active=True)
-    total_equity = Decimal('0')
-    equity_accounts = []
-    for account in equities:
-        balance = account.get_balance(as_of_date)
-        if balance != 0:
-            equity_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_equity += balance
+    engine = FinancialReportEngine(as_of_date=as_of_date)
+    asset_accounts, total_assets = engine.balances_by_type('asset')
+    liability_accounts, total_liabilities = engine.balances_by_type('liability')
+    equity_accounts, total_equity = engine.balances_by_type('equity')
 
     # Log activity
     try:
@@ -838,57 +689,12 @@ def income_statement(request):
     start_date = _parse_date(request.GET.get('start_date'), today.replace(day=1))
     end_date = _parse_date(request.GET.get('end_date'), today)
 
-    # Calculate revenues
-    revenues = Account.objects.filter(account_type='revenue', is_active=True)
-    total_revenues = Decimal('0')
-    revenue_accounts = []
-    for account in revenues:
-        balance = account.get_balance(end_date) - account.get_balance(start_date - timedelta(days=1))
-        if balance != 0:
-            revenue_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_revenues += balance
-
-    # Calculate expenses
-    expenses = Account.objects.filter(account_type='expense', is_active=True)
-    total_expenses = Decimal('0')
-    expense_accounts = []
-    for account in expenses:
-        balance = account.get_balance(end_date) - account.get_balance(start_date - timedelta(days=1))
-        if balance != 0:
-            expense_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_expenses += balance
-
-    # Calculate sales
-    sales = Account.objects.filter(account_type='sales', is_active=True)
-    total_sales = Decimal('0')
-    sales_accounts = []
-    for account in sales:
-        balance = account.get_balance(end_date) - account.get_balance(start_date - timedelta(days=1))
-        if balance != 0:
-            sales_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_sales += balance
-
-    # Calculate purchases
-    purchases = Account.objects.filter(account_type='purchases', is_active=True)
-    total_purchases = Decimal('0')
-    purchase_accounts = []
-    for account in purchases:
-        balance = account.get_balance(end_date) - account.get_balance(start_date - timedelta(days=1))
-        if balance != 0:
-            purchase_accounts.append({
-                'account': account,
-                'balance': balance
-            })
-            total_purchases += balance
+    # حركة الفترة مباشرة باستعلام مجمع واحد بدلاً من فرق رصيدين لكل حساب
+    engine = FinancialReportEngine(as_of_date=end_date, start_date=start_date)
+    revenue_accounts, total_revenues = engine.balances_by_type('revenue')
+    expense_accounts, total_expenses = engine.balances_by_type('expense')
+    sales_accounts, total_sales = engine.balances_by_type('sales')
+    purchase_accounts, total_purchases = engine.balances_by_type('purchases')
 
     # Calculate net profit
     gross_profit = total_sales - total_purchases
@@ -958,17 +764,17 @@ def cash_flow(request):
         Q(code__startswith='102')    # banks
     )
     
+    cash_accounts = list(cash_accounts.distinct())
+
     # Calculate end of period balances
-    cash_end_balance = Decimal('0')
-    for account in cash_accounts.distinct():
-        cash_end_balance += account.get_balance(end_date)
-    
+    end_engine = FinancialReportEngine(as_of_date=end_date)
+    cash_end_balance = sum((end_engine.balance(account) for account in cash_accounts), Decimal('0'))
+
     # Calculate beginning of period balances (day before start_date)
     start_minus_one = start_date - timedelta(days=1)
-    cash_start_balance = Decimal('0')
-    for account in cash_accounts.distinct():
-        cash_start_balance += account.get_balance(start_minus_one)
-    
+    start_engine = FinancialReportEngine(as_of_date=start_minus_one)
+    cash_start_balance = sum((start_engine.balance(account) for account in cash_accounts), Decimal('0'))
+
     # Cash flow from operating activities = change in cash
     operating_cash_flow = cash_end_balance - cash_start_balance
 
@@ -1024,20 +830,10 @@ def financial_ratios(request):
 
     # Profit Margin
     # We need to calculate net profit and revenues
-    revenues = Account.objects.filter(account_type__in=['revenue', 'sales'], is_active=True)
-    total_revenues = Decimal('0')
-    for account in revenues:
-        total_revenues += account.get_balance(as_of_date)
-
-    expenses = Account.objects.filter(account_type='expense', is_active=True)
-    total_expenses = Decimal('0')
-    for account in expenses:
-        total_expenses += account.get_balance(as_of_date)
-
-    purchases = Account.objects.filter(account_type='purchases', is_active=True)
-    total_purchases = Decimal('0')
-    for account in purchases:
-        total_purchases += account.get_balance(as_of_date)
+    engine = FinancialReportEngine(as_of_date=as_of_date)
+    total_revenues = engine.total_for_type(['revenue', 'sales'])
+    total_expenses = engine.total_for_type('expense')
+    total_purchases = engine.total_for_type('purchases')
 
     net_profit = total_revenues - total_expenses - total_purchases
 
@@ -1048,15 +844,8 @@ def financial_ratios(request):
 
     # Liquidity (Liquidity Ratio) - Current Assets / Current Liabilities
     # By default, all assets and liabilities
-    assets = Account.objects.filter(account_type='asset', is_active=True)
-    total_assets = Decimal('0')
-    for account in assets:
-        total_assets += account.get_balance(as_of_date)
-
-    liabilities = Account.objects.filter(account_type='liability', is_active=True)
-    total_liabilities = Decimal('0')
-    for account in liabilities:
-        total_liabilities += account.get_balance(as_of_date)
+    total_assets = engine.total_for_type('asset')
+    total_liabilities = engine.total_for_type('liability')
 
     if total_liabilities > 0:
         ratios['liquidity_ratio'] = total_assets / total_liabilities
@@ -1064,10 +853,7 @@ def financial_ratios(request):
         ratios['liquidity_ratio'] = Decimal('0')
 
     # Debt to Equity Ratio
-    equities = Account.objects.filter(account_type='equity', is_active=True)
-    total_equity = Decimal('0')
-    for account in equities:
-        total_equity += account.get_balance(as_of_date)
+    total_equity = engine.total_for_type('equity')
 
     if total_equity > 0:
         ratios['debt_to_equity'] = total_liabilities / total_equity
@@ -1099,6 +885,45 @@ def financial_ratios(request):
     return render(request, 'reports/financial_ratios.html', context)
 
 
+def _aging_rows(receivables, payables):
+    """صفوف أعمار الذمم فاتورةً فاتورة (مولّد مشترك لتصدير CSV و Excel)"""
+    for label, engine in ((_('Customer'), receivables), (_('Supplier'), payables)):
+        for row in engine.invoice_rows():
+            yield [
+                str(label), row['party_name'], row['invoice_number'], row['date'], row['total_amount'],
+                row['outstanding'], row['days'], row['bucket'].replace('aging_', ''),
+            ]
+
+
+def _aging_export(request, receivables, payables, as_of_date, export_format='csv'):
+    """
+    تصدير أعمار الذمم فاتورةً فاتورة دون تحميل التقرير كاملاً في الذاكرة:
+    CSV متدفق (StreamingHttpResponse) أو Excel بوضع الكتابة فقط.
+    """
+    from core.exports import csv_response, xlsx_response
+
+    title = _('Accounts Receivable Aging Report')
+    headers = [
+        _('Type'), _('Name'), _('Invoice Number'), _('Date'), _('Total Amount'),
+        _('Outstanding'), _('Days'), _('Period'),
+    ]
+    rows = _aging_rows(receivables, payables)
+    preamble = [[title, _('As of Date'), as_of_date]]
+    if export_format == 'excel':
+        filename = f'aging_report_{as_of_date}.xlsx'
+        response = xlsx_response(filename, rows, headers=headers, title=title, preamble=preamble)
+        export_type = 'XLSX'
+    else:
+        filename = f'aging_report_{as_of_date}.csv'
+        response = csv_response(filename, rows, headers=headers, preamble=preamble)
+        export_type = 'CSV'
+    try:
+        log_export_activity(request, str(title), filename, export_type)
+    except Exception:
+        pass
+    return response
+
+
 @login_required
 def aging_report(request):
     """
@@ -1114,11 +939,7 @@ def aging_report(request):
     if not has_perm:
         raise PermissionDenied
 
-    from sales.models import SalesInvoice
-    from purchases.models import PurchaseInvoice
-    from receipts.models import PaymentReceipt
-    from payments.models import PaymentVoucher
-    from datetime import date, timedelta
+    from .aging import AgingEngine
 
     # Filters
     customer_filter = request.GET.get('customer', '')
@@ -1127,148 +948,41 @@ def aging_report(request):
     start_date = _parse_date(request.GET.get('start_date'), date.today() - timedelta(days=365))
     end_date = _parse_date(request.GET.get('end_date'), date.today())
 
-    # Calculate customer receivables
+    # المتبقي لكل فاتورة بتوزيع FIFO للدفعات، والأعمار محسوبة حتى end_date
+    receivables = AgingEngine('receivable', end_date, party_id=customer_filter or None)
+    payables = AgingEngine('payable', end_date, party_id=supplier_filter or None)
+
+    export = request.GET.get('export', '')
+    if export in ('csv', 'excel'):
+        return _aging_export(request, receivables, payables, end_date, export)
+
     customers_data = []
-    customers = CustomerSupplier.objects.filter(type__in=['customer', 'both'], is_active=True)
-    if customer_filter:
-        customers = customers.filter(id=customer_filter)
-
-    for customer in customers:
-        # Total overdue invoices
-        sales_invoices = SalesInvoice.objects.filter(
-            customer=customer,
-            payment_type='credit',
-            date__lte=end_date
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-
-        # Total payments
-        payments = PaymentReceipt.objects.filter(
-            customer=customer,
-            date__lte=end_date,
-            is_active=True,
-            is_reversed=False
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        outstanding = sales_invoices - payments
-        if outstanding <= 0:
-            continue
-
-        # Classify by days
-        aging_0_30 = Decimal('0')
-        aging_31_60 = Decimal('0')
-        aging_61_90 = Decimal('0')
-        aging_over_90 = Decimal('0')
-
-        # By default, oldest invoices first
-        invoices = SalesInvoice.objects.filter(
-            customer=customer,
-            payment_type='credit',
-            date__lte=end_date
-        ).order_by('date')
-
-        remaining_outstanding = outstanding
-        for invoice in invoices:
-            if remaining_outstanding <= 0:
-                break
-            days = (date.today() - invoice.date).days
-            invoice_outstanding = min(remaining_outstanding, invoice.total_amount)
-            if days <= 30:
-                aging_0_30 += invoice_outstanding
-            elif days <= 60:
-                aging_31_60 += invoice_outstanding
-            elif days <= 90:
-                aging_61_90 += invoice_outstanding
-            else:
-                aging_over_90 += invoice_outstanding
-            remaining_outstanding -= invoice_outstanding
-
-        customers_data.append({
-            'customer': customer,
-            'outstanding': outstanding,
-            'aging_0_30': aging_0_30,
-            'aging_31_60': aging_31_60,
-            'aging_61_90': aging_61_90,
-            'aging_over_90': aging_over_90,
-        })
-
-    # Calculate supplier payables
+    for row in receivables.summary():
+        row['customer'] = row.pop('party')
+        customers_data.append(row)
+
     suppliers_data = []
-    suppliers = CustomerSupplier.objects.filter(type__in=['supplier', 'both'], is_active=True)
-    if supplier_filter:
-        suppliers = suppliers.filter(id=supplier_filter)
-
-    for supplier in suppliers:
-        # Total overdue invoices
-        purchase_invoices = PurchaseInvoice.objects.filter(
-            supplier=supplier,
-            payment_type='credit',
-            date__lte=end_date
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-
-        # Total payments
-        payments = PaymentVoucher.objects.filter(
-            supplier=supplier,
-            date__lte=end_date,
-            is_active=True,
-            is_reversed=False
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        outstanding = purchase_invoices - payments
-        if outstanding <= 0:
-            continue
-
-        # Classify by days
-        aging_0_30 = Decimal('0')
-        aging_31_60 = Decimal('0')
-        aging_61_90 = Decimal('0')
-        aging_over_90 = Decimal('0')
-
-        invoices = PurchaseInvoice.objects.filter(
-            supplier=supplier,
-            payment_type='credit',
-            date__lte=end_date
-        ).order_by('date')
-
-        remaining_outstanding = outstanding
-        for invoice in invoices:
-            if remaining_outstanding <= 0:
-                break
-            days = (date.today() - invoice.date).days
-            invoice_outstanding = min(remaining_outstanding, invoice.total_amount)
-            if days <= 30:
-                aging_0_30 += invoice_outstanding
-            elif days <= 60:
-                aging_31_60 += invoice_outstanding
-            elif days <= 90:
-                aging_61_90 += invoice_outstanding
-            else:
-                aging_over_90 += invoice_outstanding
-            remaining_outstanding -= invoice_outstanding
-
-        suppliers_data.append({
-            'supplier': supplier,
-            'outstanding': outstanding,
-            'aging_0_30': aging_0_30,
-            'aging_31_60': aging_31_60,
-            'aging_61_90': aging_61_90,
-            'aging_over_90': aging_over_90,
-        })
+    for row in payables.summary():
+        row['supplier'] = row.pop('party')
+        suppliers_data.append(row)
 
-    # Totals
-    total_customers_outstanding = sum(c['outstanding'] for c in customers_data)
-    total_suppliers_outstanding = sum(s['outstanding'] for s in suppliers_data)
+    customer_totals = AgingEngine.totals(customers_data)
+    supplier_totals = AgingEngine.totals(suppliers_data)
+
+    total_customers_outstanding = customer_totals['outstanding']
+    total_suppliers_outstanding = supplier_totals['outstanding']
 
     # Period totals for customers
-    total_customers_aging_0_30 = sum(c['aging_0_30'] for c in customers_data)
-    total_customers_aging_31_60 = sum(c['aging_31_60'] for c in customers_data)
-    total_customers_aging_61_90 = sum(c['aging_61_90'] for c in customers_data)
-    total_customers_aging_over_90 = sum(c['aging_over_90'] for c in customers_data)
+    total_customers_aging_0_30 = customer_totals['aging_0_30']
+    total_customers_aging_31_60 = customer_totals['aging_31_60']
+    total_customers_aging_61_90 = customer_totals['aging_61_90']
+    total_customers_aging_over_90 = customer_totals['aging_over_90']
 
     # Period totals for suppliers
-    total_suppliers_aging_0_30 = sum(s['aging_0_30'] for s in suppliers_data)
-    total_suppliers_aging_31_60 = sum(s['aging_31_60'] for s in suppliers_data)
-    total_suppliers_aging_61_90 = sum(s['aging_61_90'] for s in suppliers_data)
-    total_suppliers_aging_over_90 = sum(s['aging_over_90'] for s in suppliers_data)
+    total_suppliers_aging_0_30 = supplier_totals['aging_0_30']
+    total_suppliers_aging_31_60 = supplier_totals['aging_31_60']
+    total_suppliers_aging_61_90 = supplier_totals['aging_61_90']
+    total_suppliers_aging_over_90 = supplier_totals['aging_over_90']
 
     # Log activity
     try:
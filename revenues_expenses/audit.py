@@ -0,0 +1,11 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق revenues_expenses (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('revenues_expenses.RevenueExpenseEntry', fields=['entry_number', 'type', 'category', 'amount', 'description', 'date']),
+    AuditConfig('revenues_expenses.Sector', fields=['name', 'description', 'is_active']),
+    AuditConfig('revenues_expenses.RevenueExpenseCategory', fields=['name', 'type', 'account', 'is_active']),
+    AuditConfig('revenues_expenses.RecurringRevenueExpense', fields=['name', 'category', 'amount', 'frequency', 'next_due_date', 'is_active']),
+)
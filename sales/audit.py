@@ -0,0 +1,13 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق sales (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('sales.SalesInvoice', fields=['invoice_number', 'date', 'customer', 'warehouse', 'payment_type', 'total_amount']),
+    AuditConfig('sales.SalesReturn', fields=['return_number', 'date', 'customer', 'total_amount']),
+    AuditConfig('sales.SalesInvoiceItem', fields=['invoice', 'product', 'quantity', 'unit_price', 'tax_rate', 'total_amount']),
+    AuditConfig('sales.SalesReturnItem', fields=['return_invoice', 'product', 'quantity', 'unit_price', 'total_amount']),
+    AuditConfig('sales.SalesCreditNote', fields=['note_number', 'date', 'customer', 'subtotal', 'total_amount', 'notes']),
+    AuditConfig('sales.POSShift', fields=['user', 'opened_by', 'closed_by', 'closed_at', 'status']),
+)
@@ -0,0 +1,187 @@
+"""
+تكلفة البضاعة المباعة على مستوى الفاتورة
+
+بدلاً من إعادة إنشاء حركة المخزون وحساب متوسط التكلفة عند حفظ كل بند، تُجدول
+الفاتورة مرة واحدة لكل معاملة وتُكلّف بعد التثبيت (transaction.on_commit):
+- تكلفة FIFO لجميع البنود من طبقات التكلفة باستعلامين مجمّعين
+- إنشاء حركات الصرف بـ bulk_create مع تحديث الأرصدة والطبقات دفعة واحدة
+- قيد COGS واحد للفاتورة من مجموع تكلفة الحركات
+
+إذا فشل التكليف بعد التثبيت يُسجل الخطأ وتُعلّم الفاتورة needs_costing، ويعيد
+أمر rebuild_cost_layers تكليف الفواتير المعلّمة.
+"""
+import logging
+import weakref
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+logger = logging.getLogger(__name__)
+
+
+class _CostInvoice:
+    """
+    دالة on_commit لتكليف فاتورة. الاتصال يحتفظ بمرجع ضعيف لها فقط: عند التراجع
+    عن المعاملة (أو نقطة الحفظ) يتخلص Django منها فيمكن جدولة الفاتورة من جديد.
+    """
+
+    def __init__(self, invoice_id, using):
+        # علامة تميز دوال تكليف الفواتير بين دوال on_commit
+        self.sales_invoice_costing_id = invoice_id
+        self.using = using
+
+    def __call__(self):
+        invoice_id = self.sales_invoice_costing_id
+        _scheduled(self.using).pop(invoice_id, None)
+        try:
+            InvoiceCostingService.cost_invoice(invoice_id)
+        except Exception:
+            logger.exception('خطأ في تكليف فاتورة المبيعات %s', invoice_id)
+            InvoiceCostingService.mark_needs_costing(invoice_id)
+
+
+def _scheduled(using):
+    """{رقم الفاتورة: مرجع ضعيف لدالة التكليف} للمعاملة الجارية على الاتصال"""
+    connection = transaction.get_connection(using)
+    scheduled = getattr(connection, '_sales_costing_scheduled', None)
+    if scheduled is None:
+        scheduled = connection._sales_costing_scheduled = {}
+    return scheduled
+
+
+class InvoiceCostingService:
+    """تكليف فواتير المبيعات وترحيل قيد COGS"""
+
+    @staticmethod
+    def schedule(invoice_id, using=None):
+        """جدولة تكليف الفاتورة بعد تثبيت المعاملة الحالية (مرة واحدة لكل فاتورة)"""
+        scheduled = _scheduled(using)
+        pending = scheduled.get(invoice_id)
+        if pending is not None and pending() is not None:
+            return
+
+        callback = _CostInvoice(invoice_id, using)
+        scheduled[invoice_id] = weakref.ref(callback)
+        transaction.on_commit(callback, using=using)
+
+    @staticmethod
+    def mark_needs_costing(invoice_id):
+        """تعليم فاتورة فشل تكليفها ليعيد rebuild_cost_layers تكليفها"""
+        from .models import SalesInvoice
+
+        try:
+            SalesInvoice.objects.filter(pk=invoice_id).update(needs_costing=True)
+        except Exception:
+            logger.exception('تعذر تعليم فاتورة المبيعات %s للتكليف', invoice_id)
+
+    @staticmethod
+    def cost_pending():
+        """
+        إعادة تكليف الفواتير المعلّمة needs_costing.
+
+        Returns:
+            tuple: (عدد الفواتير التي كُلّفت، عدد التي فشلت)
+        """
+        from .models import SalesInvoice
+
+        costed = failed = 0
+        for invoice_id in SalesInvoice.objects.filter(needs_costing=True).values_list('pk', flat=True).iterator():
+            try:
+                InvoiceCostingService.cost_invoice(invoice_id)
+                costed += 1
+            except Exception:
+                logger.exception('خطأ في تكليف فاتورة المبيعات %s', invoice_id)
+                failed += 1
+        return costed, failed
+
+    @staticmethod
+    def cost_invoice(invoice_id):
+        """
+        مزامنة حركات صرف الفاتورة مع بنودها وترحيل قيد COGS.
+
+        Returns:
+            list: حركات المخزون الصادرة للفاتورة (فارغة إذا لم تعد الفاتورة موجودة)
+        """
+        from inventory.models import InventoryMovement, Warehouse
+        from .models import SalesInvoice
+
+        invoice = SalesInvoice.objects.select_related('warehouse', 'created_by').filter(pk=invoice_id).first()
+        if invoice is None:
+            return []
+        warehouse = invoice.warehouse or Warehouse.get_default_warehouse()
+        if warehouse is None:
+            print(f"لا يوجد مستودع افتراضي لفاتورة المبيعات {invoice.invoice_number}")
+            return []
+
+        items = list(
+            invoice.items.filter(product__product_type='physical')
+            .order_by('id').values_list('product_id', 'quantity')
+        )
+
+        with transaction.atomic():
+            existing = InventoryMovement.objects.filter(
+                reference_type='sales_invoice', reference_id=invoice.id, movement_type='out'
+            )
+            current = list(existing.order_by('id'))
+            wanted = Counter((product_id, warehouse.id, invoice.date, quantity) for product_id, quantity in items)
+            have = Counter((m.product_id, m.warehouse_id, m.date, m.quantity) for m in current)
+            if wanted != have:
+                # حذف الحركات القديمة أولاً لإعادة الكميات إلى الطبقات قبل التكليف
+                existing.delete()
+                current = InvoiceCostingService._create_movements(invoice, warehouse, items)
+
+            InvoiceCostingService._post_cogs_entry(invoice, current)
+            if invoice.needs_costing:
+                SalesInvoice.objects.filter(pk=invoice.pk).update(needs_costing=False)
+        return current
+
+    @staticmethod
+    def _create_movements(invoice, warehouse, items):
+        from inventory.cost_layers import CostLayerService
+        from inventory.models import InventoryMovement
+        from inventory.stock_levels import StockLevelService
+        from products.models import Product
+
+        if not items:
+            return []
+
+        costs = CostLayerService.fifo_costs(warehouse, items, invoice.date)
+        cost_prices = dict(
+            Product.objects.filter(id__in={product_id for product_id, _quantity in items})
+            .values_list('id', 'cost_price')
+        )
+        numbers = InventoryMovement.next_movement_numbers(len(items))
+
+        movements = []
+        for number, (product_id, quantity), unit_cost in zip(numbers, items, costs):
+            if unit_cost is None:
+                unit_cost = cost_prices.get(product_id) or Decimal('0')
+            movements.append(InventoryMovement(
+                movement_number=number, date=invoice.date, product_id=product_id, warehouse=warehouse,
+                movement_type='out', reference_type='sales_invoice', reference_id=invoice.id,
+                quantity=quantity, unit_cost=unit_cost,
+                total_cost=(quantity * unit_cost).quantize(Decimal('0.001')),
+                notes=f'مبيعات - فاتورة رقم {invoice.invoice_number}', created_by=invoice.created_by,
+            ))
+
+        InventoryMovement.objects.bulk_create(movements)
+        # bulk_create لا يطلق سيجنالات الحركة
+        StockLevelService.movements_created(movements)
+        CostLayerService.movements_created(movements)
+        return movements
+
+    @staticmethod
+    def _post_cogs_entry(invoice, movements):
+        """قيد COGS واحد بمجموع تكلفة الحركات؛ يعاد إنشاؤه إذا تغيرت التكلفة"""
+        from journal.models import JournalEntry
+        from journal.services import JournalService
+
+        total_cogs = sum((movement.total_cost for movement in movements), Decimal('0'))
+        entries = JournalEntry.objects.filter(reference_type='sales_invoice_cogs', reference_id=invoice.id)
+        posted = entries.aggregate(total=Sum('total_amount'))['total']
+        if posted == total_cogs or (posted is None and total_cogs <= 0):
+            return
+        entries.delete()
+        JournalService.create_cogs_entry(invoice, invoice.created_by)
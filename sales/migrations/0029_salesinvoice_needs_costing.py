@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0028_salesinvoice_pos_payment_method_posshift'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesinvoice',
+            name='needs_costing',
+            field=models.BooleanField(db_index=True, default=False, help_text='Costing after commit failed; picked up by rebuild_cost_layers', verbose_name='Needs Costing'),
+        ),
+    ]
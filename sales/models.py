@@ -60,6 +60,8 @@ class SalesInvoice(models.Model):
                                        help_text=_('QR Code image data from JoFotara (base64 or URL)'))
     is_posted_to_tax = models.BooleanField(_('Posted to Tax Authority'), default=False,
                                           help_text=_('Whether this invoice has been posted to Income and Sales Tax Department'))
+    needs_costing = models.BooleanField(_('Needs Costing'), default=False, db_index=True,
+                                        help_text=_('Costing after commit failed; picked up by rebuild_cost_layers'))
 
     class Meta:
         verbose_name = _('Sales Invoice')
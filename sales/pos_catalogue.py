@@ -0,0 +1,170 @@
+"""
+كتالوج منتجات نقطة البيع (PosCatalogue)
+
+كل مسح باركود أو حرف في بحث نقطة البيع كان يرسل استعلام icontains على ثلاثة
+حقول ثم استعلاماً لمخزون كل نتيجة. الكتالوج يُحمّل المنتجات النشطة مرة واحدة
+(استعلام values واحد) في ذاكرة العملية عبر core.settings_cache:
+
+- فهرس مباشر (dict) للباركود والكود بعد التوحيد: المسح يطابق منتجاً بدون استعلام.
+- فهرس بادئات مرتب [(كلمة، ترتيب المنتج)] لكلمات الاسم والكود والباركود
+  يُبحث فيه بـ bisect، ثم مطابقة جزئية في الذاكرة لبقية الحالات (نفس نتائج icontains).
+- يُبطل عند حفظ/حذف أي منتج (core.signals). بدون ذاكرة مشتركة يُتحقق منه في
+  العمليات الأخرى كل SETTINGS_CACHE_LOCAL_TIMEOUT ثوانٍ (مفتاح strict) حتى لا
+  تُباع المنتجات بأسعار قديمة، باستعلام تجميعي واحد (أعلى updated_at وعدد
+  المنتجات)، ولا يُعاد بناؤه إلا إذا تغيرت النتيجة.
+
+المخزون لا يُخزن في الكتالوج: يُقرأ لنتائج كل طلب من جدول StockLevel باستعلام واحد.
+"""
+from bisect import bisect_left
+from decimal import Decimal
+
+from core import settings_cache
+from search.normalize import normalize, tokenize
+
+CATALOGUE_KEY = 'pos_catalogue'
+SEARCH_LIMIT = 20
+
+CATALOGUE_FIELDS = (
+    'id', 'code', 'name', 'name_en', 'barcode', 'sale_price', 'tax_rate', 'product_type',
+    'opening_balance_quantity', 'opening_balance_warehouse_id',
+)
+
+
+class CatalogueProduct:
+    """بيانات منتج في الكتالوج (تكفي لـ StockLevelService.on_hand)"""
+
+    __slots__ = ('id', 'code', 'name', 'name_en', 'barcode', 'sale_price', 'tax_rate', 'is_service',
+                 'opening_balance_quantity', 'opening_balance_warehouse_id', 'position', 'text')
+
+    def __init__(self, row, position):
+        self.id = row['id']
+        self.code = row['code'] or ''
+        self.name = row['name']
+        self.name_en = row['name_en'] or ''
+        self.barcode = row['barcode'] or ''
+        self.sale_price = row['sale_price'] or Decimal('0')
+        self.tax_rate = row['tax_rate'] or Decimal('0')
+        self.is_service = row['product_type'] == 'service'
+        self.opening_balance_quantity = row['opening_balance_quantity']
+        self.opening_balance_warehouse_id = row['opening_balance_warehouse_id']
+        self.position = position
+        self.text = normalize(f'{self.name} {self.barcode} {self.code}')
+
+
+class PosCatalogue:
+    def __init__(self, rows):
+        self.products = [CatalogueProduct(row, position) for position, row in enumerate(rows)]
+        self.by_id = {product.id: product for product in self.products}
+        self.by_key = {}
+        words = set()
+        for product in self.products:
+            for key in (product.barcode, product.code):
+                key = normalize(key)
+                if key:
+                    self.by_key.setdefault(key, []).append(product)
+            for word in tokenize(f'{product.name} {product.barcode} {product.code}'):
+                words.add((word, product.position))
+        self.words = sorted(words)
+
+    def get(self, product_id):
+        return self.by_id.get(product_id)
+
+    def lookup(self, code):
+        """المنتجات التي يطابق باركودها أو كودها القيمة تماماً (مسح الباركود)"""
+        return list(self.by_key.get(normalize(code), ()))
+
+    def _prefix_positions(self, token):
+        positions = set()
+        index = bisect_left(self.words, (token, -1))
+        while index < len(self.words) and self.words[index][0].startswith(token):
+            positions.add(self.words[index][1])
+            index += 1
+        return positions
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        البحث بالاسم أو الباركود أو الكود بترتيب: مطابقة تامة للباركود/الكود، ثم
+        كلمات تبدأ بكل كلمات البحث، ثم احتواء العبارة في أي من الحقول الثلاثة.
+        """
+        text = normalize(query)
+        if not text:
+            return []
+        result = self.lookup(text)
+        seen = {product.id for product in result}
+
+        tokens = tokenize(text)
+        positions = self._prefix_positions(tokens[0]) if tokens else set()
+        for token in tokens[1:]:
+            if not positions:
+                break
+            positions &= self._prefix_positions(token)
+        for position in sorted(positions):
+            if len(result) >= limit:
+                return result
+            product = self.products[position]
+            if product.id not in seen:
+                seen.add(product.id)
+                result.append(product)
+
+        for product in self.products:
+            if len(result) >= limit:
+                break
+            if product.id not in seen and text in product.text:
+                seen.add(product.id)
+                result.append(product)
+        return result
+
+
+def _load():
+    from products.models import Product
+    return PosCatalogue(Product.objects.filter(is_active=True).values(*CATALOGUE_FIELDS))
+
+
+def _probe():
+    from django.db.models import Count, Max
+    from products.models import Product
+    return tuple(Product.objects.aggregate(Max('updated_at'), Count('id')).values())
+
+
+def get_catalogue():
+    return settings_cache.get(CATALOGUE_KEY, _load, strict=True, probe=_probe)
+
+
+def invalidate():
+    settings_cache.invalidate(CATALOGUE_KEY)
+
+
+def stock_levels(products, whole_catalogue=False):
+    """
+    {product_id: المخزون الحالي} لمجموعة منتجات باستعلام واحد.
+    whole_catalogue: المنتجات هي الكتالوج كاملاً فتُقرأ كل الأرصدة بدون قائمة
+    product_id__in (قد تتجاوز حد معاملات SQLite)
+    """
+    from inventory.stock_levels import StockLevelService
+
+    products = list(products)
+    if whole_catalogue:
+        levels = StockLevelService.levels()
+    else:
+        levels = StockLevelService.levels([product.id for product in products]) if products else {}
+    return {product.id: StockLevelService.on_hand(product, levels) for product in products}
+
+
+def as_json(product, stock, displayed_price=False):
+    """صيغة المنتج في استجابات نقطة البيع (السعر بدون الضريبة عند displayed_price)"""
+    tax_rate = float(product.tax_rate)
+    price = float(product.sale_price)
+    if displayed_price and tax_rate > 0:
+        price = price / (1 + tax_rate / 100)
+    return {
+        'id': product.id,
+        'name': product.name,
+        'name_en': product.name_en,
+        'price': price,
+        'stock': float(stock or 0),
+        'tax_rate': tax_rate,
+        'barcode': product.barcode,
+        'code': product.code,
+        'track_inventory': True,  # افتراض أن جميع المنتجات تتبع المخزون
+        'is_service': product.is_service,
+    }
@@ -310,7 +310,7 @@ def update_inventory_on_sales_invoice(sender, instance, created, **kwargs):
         pass
     
     try:
-        from inventory.models import InventoryMovement, Warehouse
+        from inventory.models import Warehouse
         
         # تحديد المستودع الافتراضي إذا لم يوجد
         if not instance.warehouse:
@@ -322,38 +322,12 @@ def update_inventory_on_sales_invoice(sender, instance, created, **kwargs):
                 instance.save(update_fields=['warehouse'])
                 instance._bypass_signals = False
         
-        warehouse = instance.warehouse
-        if not warehouse:
+        if not instance.warehouse:
             return
         
-        # تنفيذ حركات المخزون (كودك الأصلي تماماً بدون أي تعديل)
-        if created:
-            for item in instance.items.all():
-                if item.product.product_type == 'physical':
-                    from inventory.models import get_product_fifo_cost
-                    fifo_cost = get_product_fifo_cost(item.product, warehouse, item.quantity, instance.date)
-                    
-                    InventoryMovement.objects.create(
-                        date=instance.date, product=item.product, warehouse=warehouse,
-                        movement_type='out', reference_type='sales_invoice', reference_id=instance.id,
-                        quantity=item.quantity, unit_cost=fifo_cost, notes=f'مبيعات - فاتورة رقم {instance.invoice_number}',
-                        created_by=instance.created_by
-                    )
-        else:
-            InventoryMovement.objects.filter(reference_type='sales_invoice', reference_id=instance.id).delete()
-            for item in instance.items.all():
-                if item.product.product_type == 'physical':
-                    from inventory.models import get_product_fifo_cost
-                    fifo_cost = get_product_fifo_cost(item.product, warehouse, item.quantity, instance.date)
-                    
-                    InventoryMovement.objects.create(
-                        date=instance.date, product=item.product, warehouse=warehouse,
-                        movement_type='out', reference_type='sales_invoice', reference_id=instance.id,
-                        quantity=item.quantity, unit_cost=fifo_cost, notes=f'مبيعات - فاتورة رقم {instance.invoice_number}',
-                        created_by=instance.created_by
-                    )
-        
-        print(f"تم تحديث المخزون لفاتورة المبيعات {instance.invoice_number}")
+        # تكليف الفاتورة كاملة مرة واحدة بعد تثبيت المعاملة (حركات الصرف + قيد COGS)
+        from .costing import InvoiceCostingService
+        InvoiceCostingService.schedule(instance.id)
         
     except Exception as e:
         print(f"خطأ في تحديث المخزون لفاتورة المبيعات {instance.invoice_number}: {e}")
@@ -502,55 +476,30 @@ def update_inventory_on_sales_invoice_item(sender, instance, created, **kwargs):
     except ImportError:
         pass
     
-    try:
-        from inventory.models import InventoryMovement, Warehouse
+    # البنود لا تنشئ حركات بنفسها: تُجدول الفاتورة وتُكلّف بنودها معاً بعد التثبيت
+    from .costing import InvoiceCostingService
+    InvoiceCostingService.schedule(instance.invoice_id)
 
-        invoice = instance.invoice
-        warehouse = invoice.warehouse
-        if not warehouse:
-            warehouse = Warehouse.get_default_warehouse()
-            if warehouse:
-                invoice.warehouse = warehouse
-                invoice.save(update_fields=['warehouse'])
 
-        if not warehouse:
-            print(f"لا يوجد مستودع افتراضي لفاتورة المبيعات {invoice.invoice_number}")
+@receiver(post_delete, sender=SalesInvoiceItem)
+def update_inventory_on_sales_invoice_item_delete(sender, instance, **kwargs):
+    """إعادة تكليف الفاتورة عند حذف أحد بنودها"""
+    try:
+        from backup.restore_context import is_restoring
+        if is_restoring():
             return
-
-        # حذف الحركات القديمة لهذا العنصر
-        InventoryMovement.objects.filter(
-            reference_type='sales_invoice',
-            reference_id=invoice.id,
-            product=instance.product
-        ).delete()
-
-        # إنشاء حركة مخزون صادرة
-        if instance.product.product_type == 'physical':
-            InventoryMovement.objects.create(
-                date=invoice.date,
-                product=instance.product,
-                warehouse=warehouse,
-                movement_type='out',
-                reference_type='sales_invoice',
-                reference_id=invoice.id,
-                quantity=instance.quantity,
-                unit_cost=instance.product.calculate_weighted_average_cost(),
-                notes=f'مبيعات - فاتورة رقم {invoice.invoice_number}',
-                created_by=invoice.created_by
-            )
-
-        print(f"تم تحديث المخزون لفاتورة المبيعات {invoice.invoice_number}")
-
-    except Exception as e:
-        print(f"خطأ في تحديث المخزون لفاتورة المبيعات {invoice.invoice_number}: {e}")
+    except ImportError:
         pass
 
+    from .costing import InvoiceCostingService
+    InvoiceCostingService.schedule(instance.invoice_id)
+
 
 @receiver(post_save, sender=SalesInvoiceItem)
 def create_cogs_entry_for_sales_invoice_item(sender, instance, created, **kwargs):
     """
     ملاحظة: تم تعطيل إنشاء قيد COGS من هنا لتجنب التكرار.
-    قيد COGS يتم إنشاؤه الآن من views.py بعد حفظ الفاتورة وجميع عناصرها.
+    قيد COGS يرحّله تكليف الفاتورة (sales/costing.py) بعد تثبيت الفاتورة وجميع عناصرها.
     هذا يضمن:
     1. إنشاء قيد COGS واحد فقط لكل فاتورة (متوافق مع IFRS)
     2. حساب التكلفة بشكل صحيح بعد حفظ جميع العناصر
@@ -826,10 +775,7 @@ def create_journal_entry_for_sales_invoice(sender, instance, created, **kwargs):
                 if sales_entry:
                     print(f"✅ تم إنشاء قيد المبيعات {sales_entry.entry_number}")
                 
-                # قيد تكلفة البضاعة المباعة (COGS)
-                cogs_entry = JournalService.create_cogs_entry(invoice, invoice.created_by)
-                if cogs_entry:
-                    print(f"✅ تم إنشاء قيد COGS {cogs_entry.entry_number}")
+                # قيد تكلفة البضاعة المباعة (COGS) يرحّله تكليف الفاتورة (sales/costing.py)
             
             db_transaction.on_commit(_create_entries)
             
@@ -0,0 +1,123 @@
+"""
+اختبارات تكليف فواتير المبيعات على مستوى الفاتورة
+"""
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+
+from customers.models import CustomerSupplier
+from inventory.cost_layers import CostLayerService
+from inventory.models import InventoryCostLayer, InventoryMovement, Warehouse
+from inventory.stock_levels import StockLevelService
+from journal.models import JournalEntry
+from products.models import Category, Product
+from sales.costing import InvoiceCostingService
+from sales.models import SalesInvoice, SalesInvoiceItem
+
+User = get_user_model()
+
+
+class InvoiceCostingTests(TestCase):
+    """حركات الصرف وقيد COGS مرة واحدة لكل فاتورة بعد التثبيت"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='costing_user', password='test_password')
+        self.warehouse = Warehouse.objects.create(name='مستودع التكليف', code='COST-WH', is_default=True)
+        self.customer = CustomerSupplier.objects.create(name='عميل التكليف', type='customer', city='عمان')
+        category = Category.objects.create(name='تصنيف التكليف')
+        self.first = Product.objects.create(code='COST-1', name='منتج 1', category=category,
+                                            sale_price=Decimal('20.000'), cost_price=Decimal('1.000'))
+        self.second = Product.objects.create(code='COST-2', name='منتج 2', category=category,
+                                             sale_price=Decimal('20.000'), cost_price=Decimal('7.000'))
+        self._receive(self.first, '4', '5', 1)
+        self._receive(self.first, '10', '8', 2)
+
+    def _receive(self, product, quantity, unit_cost, reference_id):
+        InventoryMovement.objects.create(
+            date=date(2024, 1, 1), product=product, warehouse=self.warehouse, movement_type='in',
+            reference_type='purchase_invoice', reference_id=reference_id,
+            quantity=Decimal(quantity), unit_cost=Decimal(unit_cost), created_by=self.user
+        )
+
+    def _invoice(self, lines):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                invoice = SalesInvoice.objects.create(
+                    invoice_number='COST-INV-1', date=date(2024, 2, 1), customer=self.customer,
+                    warehouse=self.warehouse, payment_type='credit', created_by=self.user
+                )
+                for product, quantity in lines:
+                    SalesInvoiceItem.objects.create(invoice=invoice, product=product, quantity=Decimal(quantity),
+                                                    unit_price=Decimal('20.000'))
+        return invoice, callbacks
+
+    def test_invoice_is_costed_once_after_commit(self):
+        invoice, callbacks = self._invoice([(self.first, '3'), (self.first, '3'), (self.second, '2')])
+
+        costing = [callback for callback in callbacks if hasattr(callback, 'sales_invoice_costing_id')]
+        self.assertEqual(len(costing), 1)
+
+        movements = InventoryMovement.objects.filter(reference_type='sales_invoice', reference_id=invoice.id)
+        # البند الثاني لنفس المنتج يكمل من الطبقة التالية: (1×5 + 2×8) / 3 = 7
+        self.assertEqual(
+            sorted((m.product_id, m.unit_cost) for m in movements),
+            sorted([(self.first.id, Decimal('5.000')), (self.first.id, Decimal('7.000')),
+                    (self.second.id, Decimal('7.000'))]),
+        )
+
+        cogs = JournalEntry.objects.get(reference_type='sales_invoice_cogs', reference_id=invoice.id)
+        self.assertEqual(cogs.total_amount, Decimal('50.000'))
+
+        self.assertEqual(StockLevelService.verify(), [])
+        remaining = list(InventoryCostLayer.objects.order_by('date', 'movement_id').values_list('remaining_qty', flat=True))
+        CostLayerService.rebuild()
+        self.assertEqual(
+            remaining,
+            list(InventoryCostLayer.objects.order_by('date', 'movement_id').values_list('remaining_qty', flat=True)),
+        )
+
+    def test_recosting_after_item_change_replaces_movements_and_cogs(self):
+        invoice, _callbacks = self._invoice([(self.first, '2')])
+        item = invoice.items.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = Decimal('6')
+            item.save()
+
+        movement = InventoryMovement.objects.get(reference_type='sales_invoice', reference_id=invoice.id)
+        self.assertEqual(movement.quantity, Decimal('6'))
+        # 4×5 + 2×8
+        self.assertEqual(movement.total_cost, Decimal('36.000'))
+        cogs = JournalEntry.objects.filter(reference_type='sales_invoice_cogs', reference_id=invoice.id)
+        self.assertEqual([entry.total_amount for entry in cogs], [Decimal('36.000')])
+        self.assertEqual(StockLevelService.verify(), [])
+
+    def test_failed_costing_is_marked_and_recosted(self):
+        with mock.patch.object(InvoiceCostingService, '_create_movements', side_effect=RuntimeError('boom')), \
+                self.assertLogs('sales.costing', level='ERROR'):
+            invoice, _callbacks = self._invoice([(self.first, '2')])
+        invoice.refresh_from_db()
+        self.assertTrue(invoice.needs_costing)
+        self.assertFalse(InventoryMovement.objects.filter(reference_type='sales_invoice', reference_id=invoice.id).exists())
+
+        self.assertEqual(InvoiceCostingService.cost_pending(), (1, 0))
+        invoice.refresh_from_db()
+        self.assertFalse(invoice.needs_costing)
+        self.assertEqual(InventoryMovement.objects.get(reference_type='sales_invoice', reference_id=invoice.id).quantity,
+                         Decimal('2'))
+
+    def test_invoice_is_scheduled_again_after_rollback(self):
+        invoice, _callbacks = self._invoice([(self.first, '2')])
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    InvoiceCostingService.schedule(invoice.id)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            InvoiceCostingService.schedule(invoice.id)
+        self.assertEqual([callback.sales_invoice_costing_id for callback in callbacks], [invoice.id])
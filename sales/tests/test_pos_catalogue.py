@@ -0,0 +1,79 @@
+"""
+اختبارات كتالوج منتجات نقطة البيع
+"""
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import settings_cache
+from inventory.models import InventoryMovement, Warehouse
+from products.models import Category, Product
+from sales import pos_catalogue
+
+User = get_user_model()
+
+
+class PosCatalogueTests(TestCase):
+    """مطابقة الباركود والبادئات بدون استعلامات، ومخزون النتائج باستعلام واحد"""
+
+    def setUp(self):
+        settings_cache.clear()
+        user = User.objects.create_user(username='pos_catalogue_user', password='test_password')
+        self.warehouse = Warehouse.objects.create(name='مستودع نقطة البيع', code='POS-WH', is_default=True)
+        category = Category.objects.create(name='تصنيف نقطة البيع')
+        self.juice = Product.objects.create(code='POS-1', name='عصير برتقال', barcode='6251234567890', category=category,
+                                            sale_price=Decimal('1.160'), tax_rate=Decimal('16'))
+        self.water = Product.objects.create(code='POS-2', name='مياه معدنية', barcode='6259999999999', category=category,
+                                            sale_price=Decimal('0.350'), opening_balance_quantity=Decimal('4'),
+                                            opening_balance_warehouse=self.warehouse)
+        Product.objects.create(code='POS-3', name='عصير متوقف', category=category, sale_price=Decimal('1'),
+                               is_active=False)
+        InventoryMovement.objects.create(
+            date=date(2024, 1, 1), product=self.juice, warehouse=self.warehouse, movement_type='in',
+            reference_type='purchase_invoice', reference_id=1, quantity=Decimal('7'), unit_cost=Decimal('0.5'),
+            created_by=user,
+        )
+
+    def test_lookup_and_search_from_memory(self):
+        catalogue = pos_catalogue.get_catalogue()
+        with self.assertNumQueries(0):
+            self.assertEqual([p.id for p in catalogue.lookup('6251234567890')], [self.juice.id])
+            self.assertEqual([p.id for p in catalogue.search('pos-2')], [self.water.id])
+            self.assertEqual([p.id for p in catalogue.search('عصير')], [self.juice.id])
+            self.assertEqual([p.id for p in catalogue.search('برتق')], [self.juice.id])
+            self.assertEqual([p.id for p in catalogue.search('رتقال')], [self.juice.id])
+            self.assertIs(pos_catalogue.get_catalogue(), catalogue)
+
+        with self.assertNumQueries(1):
+            stocks = pos_catalogue.stock_levels(catalogue.products)
+        self.assertEqual(stocks[self.juice.id], self.juice.current_stock)
+        self.assertEqual(stocks[self.water.id], self.water.current_stock)
+        with self.assertNumQueries(1):
+            self.assertEqual(pos_catalogue.stock_levels(catalogue.products, whole_catalogue=True), stocks)
+
+    def test_product_save_refreshes_catalogue(self):
+        pos_catalogue.get_catalogue()
+        self.water.name = 'مياه غازية'
+        self.water.save()
+        self.assertEqual([p.id for p in pos_catalogue.get_catalogue().search('غازي')], [self.water.id])
+
+    @override_settings(SETTINGS_CACHE_ALIAS=None)
+    def test_expired_catalogue_is_rebuilt_only_when_products_changed(self):
+        catalogue = pos_catalogue.get_catalogue()
+        later = time.monotonic() + 3600
+        with mock.patch('core.settings_cache.time.monotonic', return_value=later):
+            # انتهت الصلاحية المحلية: استعلام البصمة فقط
+            with self.assertNumQueries(1):
+                self.assertIs(pos_catalogue.get_catalogue(), catalogue)
+
+        # تعديل من عملية أخرى لا يصل إبطاله إلى هذه العملية
+        Product.objects.filter(pk=self.water.pk).update(name='مياه غازية', updated_at=timezone.now())
+        with mock.patch('core.settings_cache.time.monotonic', return_value=later + 3600):
+            refreshed = pos_catalogue.get_catalogue()
+        self.assertIsNot(refreshed, catalogue)
+        self.assertEqual([p.id for p in refreshed.search('غازي')], [self.water.id])
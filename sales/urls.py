@@ -43,6 +43,7 @@ urlpatterns = [
     path('pos/shifts/close/<int:pk>/', views.close_pos_shift, name='pos_close_shift'),
     path('pos/product/<int:product_id>/', views.pos_get_product, name='pos_get_product'),
     path('pos/search-products/', views.pos_search_products, name='pos_search_products'),
+    path('pos/catalogue/', views.pos_catalogue_snapshot, name='pos_catalogue'),
     
     # Reports
     path('reports/', views.SalesReportView.as_view(), name='sales_report'),
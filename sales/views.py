@@ -19,7 +19,7 @@ from products.models import Product
 from customers.models import CustomerSupplier
 from settings.models import CompanySettings, Currency
 from core.models import DocumentSequence
-import openpyxl
+from core.numbering import DocumentNumberService
 from core.models import AuditLog
 from django.views.generic import TemplateView
 import time
@@ -30,20 +30,10 @@ def get_product_stock_in_warehouse(product, warehouse):
     حساب المخزون المتوفر للمنتج في مستودع معين
     """
     try:
-        from inventory.models import InventoryMovement
-        incoming = InventoryMovement.objects.filter(
-            product=product,
-            warehouse=warehouse,
-            movement_type='in'
-        ).aggregate(total=Sum('quantity'))['total'] or Decimal('0')
-        
-        outgoing = InventoryMovement.objects.filter(
-            product=product,
-            warehouse=warehouse,
-            movement_type='out'
-        ).aggregate(total=Sum('quantity'))['total'] or Decimal('0')
-        
-        return incoming - outgoing
+        from inventory.stock_levels import StockLevelService
+        # رصيد الحركات (دخول - خروج) من جدول أرصدة المخزون باستعلام واحد
+        row = StockLevelService.levels([product.id], warehouse).get(product.id)
+        return row['quantity'] if row else Decimal('0')
     except ImportError:
         # في حالة عدم وجود نموذج المخزون
         return product.current_stock if hasattr(product, 'current_stock') else Decimal('0')
@@ -113,13 +103,9 @@ def create_sales_invoice_journal_entry(invoice, user):
         else:
             print(f"⚠️ لم يتم إنشاء قيد المبيعات للفاتورة {invoice.invoice_number}")
         
-        # إنشاء قيد تكلفة البضاعة المباعة (COGS)
-        # يتم إنشاؤه هنا مرة واحدة فقط بعد حفظ الفاتورة وعناصرها
-        cogs_entry = JournalService.create_cogs_entry(invoice, user)
-        if cogs_entry:
-            print(f"✅ تم إنشاء قيد COGS {cogs_entry.entry_number} للفاتورة {invoice.invoice_number}")
-        else:
-            print(f"⚠️ لم يتم إنشاء قيد COGS للفاتورة {invoice.invoice_number}")
+        # قيد تكلفة البضاعة المباعة (COGS) يُرحّل مع حركات الصرف عند تكليف الفاتورة بعد التثبيت
+        from .costing import InvoiceCostingService
+        InvoiceCostingService.schedule(invoice.id)
             
     except Exception as e:
         print(f"❌ خطأ في إنشاء القيد المحاسبي لفاتورة المبيعات {invoice.invoice_number}: {e}")
@@ -415,15 +401,10 @@ def export_invoices_to_xlsx(request):
     else:
         queryset = queryset.order_by(order_by, 'id')
     
-    # تحميل البيانات المرتبطة
-    invoices = queryset.select_related('customer', 'created_by', 'cashbox')
-    
-    # إنشاء ملف Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "فواتير المبيعات"
-    
-    # إضافة العناوين
+    # إنشاء ملف Excel بالكتابة المتدفقة (حقول محددة على دفعات بدلاً من كائنات الفواتير)
+    from core.exports import iter_rows, xlsx_response
+
+    invoices = queryset
     headers = [
         'رقم الفاتورة',
         'التاريخ',
@@ -435,38 +416,35 @@ def export_invoices_to_xlsx(request):
         'أنشأ بواسطة',
         'تاريخ الإنشاء'
     ]
-    for col_num, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col_num, value=header)
-    
-    # إضافة البيانات
-    for row_num, invoice in enumerate(invoices, 2):
-        ws.cell(row=row_num, column=1, value=invoice.invoice_number)
-        ws.cell(row=row_num, column=2, value=invoice.date.strftime('%Y-%m-%d') if invoice.date else '')
-        ws.cell(row=row_num, column=3, value=invoice.customer.name if invoice.customer else '')
-        ws.cell(row=row_num, column=4, value=invoice.get_payment_type_display())
-        ws.cell(row=row_num, column=5, value=float(invoice.total_amount))
-        ws.cell(row=row_num, column=6, value=invoice.get_status_display())
-        ws.cell(row=row_num, column=7, value=invoice.cashbox.name if invoice.cashbox else '')
-        ws.cell(row=row_num, column=8, value=invoice.created_by.get_full_name() if invoice.created_by else '')
-        ws.cell(row=row_num, column=9, value=invoice.created_at.strftime('%Y-%m-%d %H:%M') if invoice.created_at else '')
-    
-    # إنشاء الاستجابة
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="فواتير_المبيعات.xlsx"'
-    
-    # حفظ الملف
-    wb.save(response)
+    payment_types = dict(SalesInvoice._meta.get_field('payment_type').flatchoices)
+    # لا يوجد حقل status في SalesInvoice؛ الحالة هي الترحيل لدائرة الضريبة
+    fields = ('invoice_number', 'date', 'customer__name', 'payment_type', 'total_amount', 'is_posted_to_tax',
+              'cashbox__name', 'created_by__first_name', 'created_by__last_name', 'created_at')
+    rows = (
+        [
+            number,
+            invoice_date.strftime('%Y-%m-%d') if invoice_date else '',
+            customer or '',
+            str(payment_types.get(payment_type, payment_type)),
+            float(total_amount),
+            'مرحلة للضريبة' if posted else 'غير مرحلة',
+            cashbox or '',
+            f'{first_name or ""} {last_name or ""}'.strip(),
+            created_at.strftime('%Y-%m-%d %H:%M') if created_at else '',
+        ]
+        for (number, invoice_date, customer, payment_type, total_amount, posted,
+             cashbox, first_name, last_name, created_at) in iter_rows(invoices, fields)
+    )
+    response = xlsx_response('فواتير_المبيعات.xlsx', rows, headers=headers, title='فواتير المبيعات')
     
     # تسجيل في سجل الأنشطة
     AuditLog.objects.create(
         user=request.user,
         action_type='export',
-        model_name='SalesInvoice',
+        content_type='SalesInvoice',
         object_id=None,  # تصدير قائمة
         description=f'تصدير قائمة الفواتير إلى Excel ({invoices.count()} فاتورة)',
         ip_address=get_client_ip(request),
-        user_agent=request.META.get('HTTP_USER_AGENT', ''),
-        changes={}
     )
     
     return response
@@ -2664,9 +2642,22 @@ def pos_view(request):
         # المستخدم Admin/SuperAdmin: لا يتم إنشاء صندوق تلقائي
         selected_cashbox = None
     
+    # المنتجات من كتالوج نقطة البيع ومخزونها باستعلام واحد بدلاً من current_stock لكل منتج
+    from .pos_catalogue import get_catalogue, stock_levels
+    catalogue_products = get_catalogue().products
+    stocks = stock_levels(catalogue_products, whole_catalogue=True)
+    pos_products = [
+        {
+            'id': product.id, 'name': product.name, 'name_en': product.name_en, 'code': product.code,
+            'barcode': product.barcode, 'sale_price': product.sale_price, 'tax_rate': product.tax_rate,
+            'is_service': product.is_service, 'current_stock': stocks[product.id],
+        }
+        for product in catalogue_products
+    ]
+    
     context = {
         'user_name': request.user.get_full_name() or request.user.username,
-        'products': Product.objects.filter(is_active=True),
+        'products': pos_products,
         'customers': CustomerSupplier.objects.filter(
             type__in=['customer', 'both'], 
             is_active=True
@@ -2848,36 +2839,6 @@ def pos_create_invoice(request):
             return JsonResponse({'success': False, 'message': 'يجب اختيار طريقة الدفع نقداً أو بطاقة'})
 
         with transaction.atomic():
-            # توليد رقم الفاتورة باستخدام معاينة أولاً
-            try:
-                sequence = DocumentSequence.objects.get(document_type='pos_invoice')
-                invoice_number = sequence.peek_next_number()
-            except DocumentSequence.DoesNotExist:
-                # في حالة عدم وجود تسلسل نقطة البيع، إنشاء واحد جديد
-                try:
-                    sequence = DocumentSequence.objects.create(
-                        document_type='pos_invoice',
-                        prefix='POS-',
-                        digits=6,
-                        current_number=1
-                    )
-                    invoice_number = sequence.peek_next_number()
-                except Exception as seq_error:
-                    # في حالة فشل إنشاء التسلسل، استخدام رقم بسيط
-                    print(f"فشل في إنشاء تسلسل pos_invoice: {seq_error}")
-                    last_invoice = SalesInvoice.objects.filter(
-                        invoice_number__startswith='POS-'
-                    ).order_by('-id').first()
-                    if last_invoice:
-                        try:
-                            last_number = int(last_invoice.invoice_number.split('-')[-1])
-                            number = last_number + 1
-                        except:
-                            number = 1
-                    else:
-                        number = 1
-                    invoice_number = f"POS-{number:06d}"
-            
             # إنشاء الفاتورة - استخدام Cash Customer دائماً
             try:
                 cash_customer = CustomerSupplier.objects.get(name='Cash Customer', type='customer')
@@ -2927,43 +2888,24 @@ def pos_create_invoice(request):
                 except Exception as e:
                     return JsonResponse({'success': False, 'message': f'خطأ في تحديد الصندوق: {str(e)}'})
             
-            # التحقق من عدم تكرار رقم الفاتورة
-            max_attempts = 10
-            attempt = 0
-            while attempt < max_attempts:
-                try:
-                    invoice = SalesInvoice.objects.create(
-                        invoice_number=invoice_number,
-                        customer=cash_customer,  # استخدام Cash Customer دائماً
-                        date=date.today(),
-                        payment_type='cash',  # دفع نقدي دائماً
-                        pos_payment_method=payment_method,
-                        cashbox=selected_cashbox,  # ربط الفاتورة بالصندوق المحدد
-                        notes=data.get('notes', ''),
-                        created_by=request.user,
-                        subtotal=Decimal(str(data.get('subtotal', 0))),
-                        tax_amount=Decimal(str(data.get('tax_amount', 0))),
-                        discount_amount=Decimal(str(data.get('discount_amount', 0))),
-                        total_amount=Decimal(str(data.get('total', 0))),
-                    )
-                    break
-                except Exception as e:
-                    if 'UNIQUE constraint failed' in str(e):
-                        # في حالة تكرار رقم الفاتورة، توليد رقم جديد
-                        attempt += 1
-                        try:
-                            sequence = DocumentSequence.objects.get(document_type='pos_invoice')
-                            invoice_number = sequence.get_next_number()
-                        except:
-                            # رقم بديل
-                            import time
-                            timestamp = int(time.time())
-                            invoice_number = f"POS-{timestamp}"
-                        
-                        if attempt >= max_attempts:
-                            raise Exception('فشل في إنشاء رقم فاتورة فريد')
-                    else:
-                        raise e
+            # تخصيص رقم الفاتورة من عداد التسلسل مباشرة (تحديث ذرّي واحد دون إعادة محاولة)
+            DocumentNumberService.ensure_sequence('pos_invoice', prefix='POS-')
+            invoice_number = DocumentNumberService.next_number('pos_invoice')
+
+            invoice = SalesInvoice.objects.create(
+                invoice_number=invoice_number,
+                customer=cash_customer,  # استخدام Cash Customer دائماً
+                date=date.today(),
+                payment_type='cash',  # دفع نقدي دائماً
+                pos_payment_method=payment_method,
+                cashbox=selected_cashbox,  # ربط الفاتورة بالصندوق المحدد
+                notes=data.get('notes', ''),
+                created_by=request.user,
+                subtotal=Decimal(str(data.get('subtotal', 0))),
+                tax_amount=Decimal(str(data.get('tax_amount', 0))),
+                discount_amount=Decimal(str(data.get('discount_amount', 0))),
+                total_amount=Decimal(str(data.get('total', 0))),
+            )
             
             # إضافة عناصر الفاتورة
             for item_data in data.get('items', []):
@@ -3098,42 +3040,17 @@ def pos_get_product(request, product_id):
         return JsonResponse({'success': False, 'message': _('You do not have access to the point of sale.')})
     
     try:
-        product = Product.objects.get(id=product_id, is_active=True)
+        from .pos_catalogue import get_catalogue, stock_levels, as_json
+
+        product = get_catalogue().get(product_id)
+        if product is None:
+            return JsonResponse({'success': False, 'message': _('Product not found.')})
         
-        # حساب المخزون الحالي باستخدام property مع معالجة الأخطاء
-        try:
-            current_stock = product.current_stock
-            if current_stock is None:
-                current_stock = 0
-        except Exception as stock_error:
-            # في حالة خطأ في حساب المخزون، استخدم 0
-            import sys
-            print(f"خطأ في حساب المخزون للمنتج {product_id}: {stock_error}", file=sys.stderr)
-            current_stock = 0
-        
-        # الحصول على نسبة الضريبة (استخدام القيمة المحددة للمنتج فقط)
-        tax_rate = float(product.tax_rate or 0)
-        
-        # Calculate displayed price as sale_price / (1 + tax_rate/100)
-        displayed_price = float(product.sale_price)
-        if tax_rate > 0:
-            displayed_price = displayed_price / (1 + tax_rate / 100)
+        # المخزون من جدول أرصدة المخزون (استعلام واحد)
+        stock = stock_levels([product])[product.id]
         
-        return JsonResponse({
-            'success': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'price': displayed_price,
-                'stock': float(current_stock),
-                'tax_rate': tax_rate,
-                'barcode': product.barcode or '',
-                'track_inventory': True,  # افتراض أن جميع المنتجات تتبع المخزون
-                'is_service': getattr(product, 'is_service', False), # إضافة هذه السطر لإرسال حالة الخدمة
-            }
-        })
-    except Product.DoesNotExist:
-        return JsonResponse({'success': False, 'message': _('Product not found.')})
+        # السعر المعروض = سعر البيع / (1 + نسبة الضريبة / 100)
+        return JsonResponse({'success': True, 'product': as_json(product, stock, displayed_price=True)})
     except Exception as e:
         # تسجيل الخطأ بشكل مفصل
         import sys
@@ -3154,33 +3071,36 @@ def pos_search_products(request):
         return JsonResponse({'products': []})
     
     try:
-        products = Product.objects.filter(
-            Q(name__icontains=query) | Q(barcode__icontains=query) | Q(code__icontains=query),
-            is_active=True
-        )[:20]
-        
-        products_data = []
-        for product in products:
-            # حساب المخزون الحالي
-            current_stock = product.current_stock
-            
-            products_data.append({
-                'id': product.id,
-                'name': product.name,
-                'price': float(product.sale_price),
-                'stock': float(current_stock) if current_stock is not None else 0,
-                'tax_rate': float(product.tax_rate or 0),
-                'barcode': product.barcode or '',
-                'code': product.code or '',
-                'track_inventory': True,  # افتراض أن جميع المنتجات تتبع المخزون
-            })
-        
-        return JsonResponse({'products': products_data})
+        from .pos_catalogue import get_catalogue, stock_levels, as_json
+
+        # البحث في كتالوج الذاكرة ثم مخزون النتائج باستعلام واحد
+        products = get_catalogue().search(query)
+        stocks = stock_levels(products)
+        return JsonResponse({'products': [as_json(product, stocks[product.id]) for product in products]})
         
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'حدث خطأ في البحث: {str(e)}'})
 
 
+@login_required
+def pos_catalogue_snapshot(request):
+    """
+    كتالوج منتجات نقطة البيع كاملاً مع المخزون (للبحث ومسح الباركود في المتصفح)
+    بدون طلب للخادم لكل حرف
+    """
+    if not request.user.has_pos_permission():
+        return JsonResponse({'success': False, 'message': _('You do not have access to the point of sale.')})
+    
+    from .pos_catalogue import get_catalogue, stock_levels, as_json
+
+    products = get_catalogue().products
+    stocks = stock_levels(products, whole_catalogue=True)
+    return JsonResponse({
+        'success': True,
+        'products': [as_json(product, stocks[product.id]) for product in products],
+    })
+
+
 class SalesReportView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     template_name = 'sales/sales_report.html'
     
@@ -1,7 +1,31 @@
 from django.apps import AppConfig
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_migrate
+
+
+def _build_empty_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """بناء فهرس البحث بعد الترحيل إذا كان فارغاً (أول ترقية إلى الفهرس)"""
+    from .models import SearchDocument
+    from .services import SearchIndexService
+
+    if using != DEFAULT_DB_ALIAS or SearchDocument.objects.exists():
+        return
+    try:
+        result = SearchIndexService.rebuild()
+    except Exception as e:
+        print(f"⚠️ تعذر بناء فهرس البحث بعد الترحيل، نفّذ rebuild_search_index: {e}")
+        return
+    if any(result.values()):
+        print(f"✓ تم بناء فهرس البحث: {sum(result.values())} مستند")
 
 
 class SearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'search'
     verbose_name = 'البحث الشامل'
+
+    def ready(self):
+        """ربط مستقبلات تحديث فهرس البحث وبناء الفهرس الفارغ بعد الترحيل"""
+        from . import signals
+        signals.connect()
+        post_migrate.connect(_build_empty_index, sender=self, dispatch_uid='search_build_empty_index')
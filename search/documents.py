@@ -0,0 +1,182 @@
+"""
+أنواع المستندات في فهرس البحث الشامل
+
+كل نوع يحدد النموذج، والاستعلام المستخدم لإعادة البناء (مع select_related)،
+ودالة build التي تعيد بيانات العرض والحقول التي يُبحث فيها - نفس الحقول التي
+كانت تُفحص بـ icontains في search_api سابقاً.
+
+depends_on: {النموذج المرتبط: مسار الحقل} لإعادة فهرسة المستندات عند تغيير
+اسم العميل/المورد أو الفئة المعروضة فيها.
+"""
+from django.apps import apps
+
+
+class SearchDocumentType:
+    def __init__(self, name, model, type_display, icon, url, build, select_related=(), depends_on=None):
+        self.name = name
+        self.model_label = model
+        self.type_display = type_display
+        self.icon = icon
+        self.url = url
+        self.build = build
+        self.select_related = tuple(select_related)
+        self.depends_on = depends_on or {}
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def queryset(self):
+        return self.model.objects.select_related(*self.select_related).order_by('pk')
+
+
+def _party_name(party):
+    return party.name if party else ''
+
+
+def _sales_invoice(invoice):
+    customer = _party_name(invoice.customer)
+    return {
+        'title': f'فاتورة مبيعات #{invoice.invoice_number}',
+        'description': f'العميل: {customer} - التاريخ: {invoice.date} - المبلغ: {invoice.total_amount}',
+        'date': invoice.date,
+        'terms': [invoice.invoice_number, customer, invoice.notes],
+    }
+
+
+def _sales_return(return_doc):
+    customer = _party_name(return_doc.customer)
+    return {
+        'title': f'مردود مبيعات #{return_doc.return_number}',
+        'description': f'العميل: {customer} - التاريخ: {return_doc.date} - المبلغ: {return_doc.total_amount}',
+        'date': return_doc.date,
+        'terms': [return_doc.return_number, customer, return_doc.notes],
+    }
+
+
+def _purchase_invoice(invoice):
+    supplier = _party_name(invoice.supplier)
+    return {
+        'title': f'فاتورة مشتريات #{invoice.invoice_number}',
+        'description': f'المورد: {supplier} - التاريخ: {invoice.date} - المبلغ: {invoice.total_amount}',
+        'date': invoice.date,
+        'terms': [invoice.invoice_number, supplier, invoice.notes],
+    }
+
+
+def _purchase_return(return_doc):
+    supplier = _party_name(return_doc.original_invoice.supplier) if return_doc.original_invoice else ''
+    return {
+        'title': f'مردود مشتريات #{return_doc.return_number}',
+        'description': f'المورد: {supplier} - التاريخ: {return_doc.date} - المبلغ: {return_doc.total_amount}',
+        'date': return_doc.date,
+        'terms': [return_doc.return_number, supplier, return_doc.notes],
+    }
+
+
+def _receipt(receipt):
+    customer = _party_name(receipt.customer)
+    return {
+        'title': f'سند قبض #{receipt.receipt_number}',
+        'description': f'من: {customer} - التاريخ: {receipt.date} - المبلغ: {receipt.amount}',
+        'date': receipt.date,
+        'terms': [receipt.receipt_number, customer, receipt.description],
+    }
+
+
+def _payment_voucher(voucher):
+    supplier = _party_name(voucher.supplier)
+    recipient_name = supplier or voucher.beneficiary_name
+    return {
+        'title': f'سند صرف #{voucher.voucher_number}',
+        'description': f'إلى: {recipient_name} - التاريخ: {voucher.date} - المبلغ: {voucher.amount}',
+        'date': voucher.date,
+        'terms': [voucher.voucher_number, supplier, voucher.beneficiary_name, voucher.description],
+    }
+
+
+def _customer(customer):
+    # الرصيد متغير باستمرار (تحديثات F() بدون إشارات) فلا يُخزن في الفهرس
+    return {
+        'title': customer.name,
+        'type_display': 'عميل' if customer.type == 'customer' else 'مورد' if customer.type == 'supplier' else 'عميل ومورد',
+        'description': f'الهاتف: {customer.phone or "غير محدد"} - المدينة: {customer.city or "غير محددة"}',
+        'date': customer.created_at.date() if getattr(customer, 'created_at', None) else None,
+        'terms': [customer.name, customer.phone, customer.email, customer.city],
+    }
+
+
+def _product(product):
+    # المخزون الحالي يُحسب من الحركات فلا يُخزن في الفهرس
+    return {
+        'title': f'{product.name} ({product.code})',
+        'description': f'الفئة: {product.category.name if product.category else "غير محددة"} - السعر: {product.sale_price}',
+        'date': None,
+        'terms': [product.name, product.code, product.description],
+    }
+
+
+def _journal_entry(entry):
+    return {
+        'title': f'قيد محاسبي #{entry.entry_number or entry.id}',
+        'description': f'الوصف: {entry.description} - التاريخ: {entry.entry_date} - المبلغ: {entry.total_amount}',
+        'date': entry.entry_date,
+        'terms': [entry.entry_number, entry.description],
+    }
+
+
+def _revenue_expense(entry):
+    entry_type = 'إيراد' if entry.type == 'revenue' else 'مصروف'
+    category = entry.category.name if entry.category else ''
+    return {
+        'title': f'{entry_type} - {category or "غير محدد"}',
+        'type_display': entry_type,
+        'description': f'الوصف: {entry.description} - التاريخ: {entry.date} - المبلغ: {entry.amount}',
+        'date': entry.date,
+        'terms': [entry.description, category],
+    }
+
+
+DOCUMENT_TYPES = [
+    SearchDocumentType('sales_invoice', 'sales.SalesInvoice', 'فاتورة مبيعات', 'fas fa-file-invoice',
+                       '/sales/invoices/{id}/', _sales_invoice, select_related=['customer'],
+                       depends_on={'customers.CustomerSupplier': 'customer'}),
+    SearchDocumentType('sales_return', 'sales.SalesReturn', 'مردود مبيعات', 'fas fa-undo-alt',
+                       '/sales/returns/{id}/', _sales_return, select_related=['customer'],
+                       depends_on={'customers.CustomerSupplier': 'customer'}),
+    SearchDocumentType('purchase_invoice', 'purchases.PurchaseInvoice', 'فاتورة مشتريات', 'fas fa-shopping-cart',
+                       '/purchases/invoices/{id}/', _purchase_invoice, select_related=['supplier'],
+                       depends_on={'customers.CustomerSupplier': 'supplier'}),
+    SearchDocumentType('purchase_return', 'purchases.PurchaseReturn', 'مردود مشتريات', 'fas fa-undo-alt',
+                       '/purchases/returns/{id}/', _purchase_return, select_related=['original_invoice__supplier'],
+                       depends_on={'customers.CustomerSupplier': 'original_invoice__supplier'}),
+    SearchDocumentType('receipt', 'receipts.PaymentReceipt', 'سند قبض', 'fas fa-receipt',
+                       '/receipts/{id}/', _receipt, select_related=['customer'],
+                       depends_on={'customers.CustomerSupplier': 'customer'}),
+    SearchDocumentType('payment_voucher', 'payments.PaymentVoucher', 'سند صرف', 'fas fa-money-bill-wave',
+                       '/payments/vouchers/{id}/', _payment_voucher, select_related=['supplier'],
+                       depends_on={'customers.CustomerSupplier': 'supplier'}),
+    SearchDocumentType('customer', 'customers.CustomerSupplier', 'عميل', 'fas fa-users',
+                       '/customers/{id}/', _customer),
+    SearchDocumentType('product', 'products.Product', 'منتج', 'fas fa-box',
+                       '/products/detail/{id}/', _product, select_related=['category'],
+                       depends_on={'products.Category': 'category'}),
+    SearchDocumentType('journal_entry', 'journal.JournalEntry', 'قيد محاسبي', 'fas fa-book',
+                       '/journal/entries/{id}/', _journal_entry),
+    SearchDocumentType('revenue_expense', 'revenues_expenses.RevenueExpenseEntry', 'إيراد/مصروف', 'fas fa-chart-line',
+                       '/revenues-expenses/entries/{id}/', _revenue_expense, select_related=['category'],
+                       depends_on={'revenues_expenses.RevenueExpenseCategory': 'category'}),
+]
+
+DOCUMENT_TYPES_BY_NAME = {doc_type.name: doc_type for doc_type in DOCUMENT_TYPES}
+
+
+def types_for_model(model):
+    label = model._meta.label
+    return [doc_type for doc_type in DOCUMENT_TYPES if doc_type.model_label == label]
+
+
+def dependents_of(model):
+    """[(نوع المستند، مسار الحقل)] للمستندات التي تعرض بيانات من هذا النموذج"""
+    label = model._meta.label
+    return [(doc_type, doc_type.depends_on[label]) for doc_type in DOCUMENT_TYPES if label in doc_type.depends_on]
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from search.documents import DOCUMENT_TYPES_BY_NAME
+from search.services import SearchIndexService
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس البحث الشامل من المستندات (بعد الترحيل أو الاستيراد)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='types',
+            choices=sorted(DOCUMENT_TYPES_BY_NAME),
+            help='إعادة بناء نوع مستند محدد فقط (يمكن تكراره)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='عدد المستندات في كل دفعة إدخال',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('بدء إعادة بناء فهرس البحث...')
+        result = SearchIndexService.rebuild(type_names=options.get('types'), batch_size=options['batch_size'])
+        for name, count in result.items():
+            self.stdout.write(f'  {DOCUMENT_TYPES_BY_NAME[name].type_display}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'تم فهرسة {sum(result.values())} مستند'))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=50, verbose_name='Document Type')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('type_display', models.CharField(max_length=50, verbose_name='Type Display')),
+                ('title', models.CharField(max_length=255, verbose_name='Title')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('url', models.CharField(max_length=255, verbose_name='URL')),
+                ('date', models.DateField(blank=True, null=True, verbose_name='Date')),
+                ('content', models.TextField(verbose_name='Search Content')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'indexes': [models.Index(fields=['-date'], name='search_doc_date_idx')],
+                'unique_together': {('doc_type', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+"""
+فهارس البحث النصي حسب قاعدة البيانات:
+- SQLite: جدول FTS5 خارجي المحتوى بمقسم trigram مع قوادح (triggers) تبقيه
+  متزامناً مع search_searchdocument. ملاحظة: ترحيلات SQLite التي تعيد إنشاء
+  جدول search_searchdocument تحذف القوادح، فيجب إعادة تنفيذ create_search_backends بعدها.
+- PostgreSQL: الامتداد pg_trgm وفهرس GIN (gin_trgm_ops) على content.
+إذا لم يتوفر FTS5 أو pg_trgm يُتخطى الفهرس ويعمل البحث بـ LIKE عادي.
+يُبنى الفهرس الفارغ تلقائياً بعد migrate (search.apps)؛ لإعادة البناء يدوياً:
+python manage.py rebuild_search_index
+"""
+from django.db import migrations, transaction
+
+FTS_TABLE = 'search_searchdocument_fts'
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"content, content='search_searchdocument', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS search_searchdocument_fts_ai AFTER INSERT ON search_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_searchdocument_fts_ad AFTER DELETE ON search_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_searchdocument_fts_au AFTER UPDATE ON search_searchdocument BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS search_searchdocument_fts_ai',
+    'DROP TRIGGER IF EXISTS search_searchdocument_fts_ad',
+    'DROP TRIGGER IF EXISTS search_searchdocument_fts_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_TRGM = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS search_doc_content_trgm ON search_searchdocument USING GIN (content gin_trgm_ops)',
+]
+
+
+def _execute(schema_editor, statements):
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            with schema_editor.connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+    except Exception as e:
+        print(f"⚠️ تعذر إنشاء فهرس البحث النصي ({schema_editor.connection.vendor}): {e}")
+
+
+def create_search_backends(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_FTS)
+    elif schema_editor.connection.vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_TRGM)
+
+
+def drop_search_backends(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_FTS_DROP)
+    elif schema_editor.connection.vendor == 'postgresql':
+        _execute(schema_editor, ['DROP INDEX IF EXISTS search_doc_content_trgm'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_backends, drop_search_backends),
+    ]
@@ -1,4 +1,32 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
-# لا نحتاج إلى نماذج للبحث الشامل
+
+class SearchDocument(models.Model):
+    """
+    مستند في فهرس البحث الشامل (نسخة مشتقة من المستندات الأصلية)
+
+    يُحدّث عبر الإشارات (search.signals) ويُعاد بناؤه بأمر rebuild_search_index.
+    content هو النص الموحد (search.normalize) الذي يُبحث فيه؛ فهرسه:
+    FTS5 بمقسم trigram في SQLite، و GIN (tsvector + pg_trgm) في PostgreSQL.
+    """
+    doc_type = models.CharField(_('Document Type'), max_length=50)
+    object_id = models.PositiveBigIntegerField(_('Object ID'))
+    type_display = models.CharField(_('Type Display'), max_length=50)
+    title = models.CharField(_('Title'), max_length=255)
+    description = models.TextField(_('Description'), blank=True)
+    url = models.CharField(_('URL'), max_length=255)
+    date = models.DateField(_('Date'), null=True, blank=True)
+    content = models.TextField(_('Search Content'))
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Search Document')
+        verbose_name_plural = _('Search Documents')
+        unique_together = ('doc_type', 'object_id')
+        indexes = [
+            models.Index(fields=['-date'], name='search_doc_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.doc_type}: {self.title}'
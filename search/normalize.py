@@ -0,0 +1,44 @@
+"""
+توحيد النص العربي للفهرسة والبحث
+
+يُطبّق نفس التوحيد على نص المستند عند فهرسته وعلى عبارة البحث، فتتطابق
+"فاتورة" و "فاتوره" و "أحمد" و "احمد" و "مصطفى" و "مصطفي":
+- الألف بأشكالها (أ إ آ ٱ) -> ا
+- الألف المقصورة ى -> ي
+- التاء المربوطة ة -> ه
+- حذف التشكيل والتطويل، وتحويل الأرقام العربية الهندية إلى لاتينية
+- أحرف صغيرة ومسافات موحدة
+"""
+import re
+
+_TRANSLATION = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+})
+
+# التشكيل (064B-065F)، الألف الخنجرية (0670) والتطويل (0640)
+_DIACRITICS = re.compile('[\u064B-\u065F\u0670\u0640]')
+_SPACES = re.compile(r'\s+')
+# ما يُسمح به داخل الكلمة: أحرف وأرقام و - / . (أرقام المستندات مثل INV-2024/001)
+_TOKEN = re.compile(r'[\w\-/.]+')
+
+
+def normalize(text):
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text)).translate(_TRANSLATION).lower()
+    return _SPACES.sub(' ', text).strip()
+
+
+def tokenize(text):
+    """كلمات عبارة البحث بعد التوحيد (بدون تكرار وبنفس الترتيب)"""
+    tokens = []
+    for token in _TOKEN.findall(normalize(text)):
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
@@ -0,0 +1,214 @@
+"""
+خدمة فهرس البحث الشامل (SearchIndexService)
+
+الفهرسة: كل حفظ/حذف لمستند مسجل في search.documents يحدّث صفاً واحداً في
+SearchDocument (search.signals)، وأمر rebuild_search_index يعيد بناء الفهرس
+على دفعات بـ bulk_create (update_conflicts).
+
+البحث: استعلام واحد على SearchDocument بدلاً من 10 استعلامات icontains:
+- SQLite: جدول FTS5 بمقسم trigram (search_searchdocument_fts) يطابق أي جزء
+  من النص بطول 3 أحرف فأكثر، مرتب بـ bm25.
+- PostgreSQL: فهرس GIN بـ gin_trgm_ops على content يخدم LIKE '%...%'،
+  مرتب بـ ts_rank.
+- غير ذلك (أو عند عدم توفر FTS5/pg_trgm): LIKE على content مرتب بالتاريخ.
+النص وعبارة البحث موحدان (search.normalize) فلا حاجة لـ icontains.
+"""
+import logging
+
+from django.db import connection
+from django.db.models import Subquery
+
+from .documents import DOCUMENT_TYPES, DOCUMENT_TYPES_BY_NAME, dependents_of, types_for_model
+from .models import SearchDocument
+from .normalize import normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'search_searchdocument_fts'
+# أقصر كلمة يخدمها فهرس trigram
+TRIGRAM_MIN_LENGTH = 3
+
+DOCUMENT_FIELDS = ('type_display', 'title', 'description', 'url', 'date', 'content')
+
+_fts_available = {}
+
+
+def _like_pattern(token):
+    escaped = token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _fts_phrase(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def fts_available():
+    """هل أُنشئ جدول FTS5 لقاعدة البيانات الحالية (انظر الترحيل 0002)"""
+    key = connection.settings_dict['NAME']
+    if key not in _fts_available:
+        _fts_available[key] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[key]
+
+
+class SearchIndexService:
+    """تحديث فهرس البحث والاستعلام منه"""
+
+    @staticmethod
+    def build_document(doc_type, instance):
+        data = doc_type.build(instance)
+        title = str(data['title'])[:255]
+        terms = [title] + [str(term) for term in data.get('terms', ()) if term]
+        return SearchDocument(
+            doc_type=doc_type.name,
+            object_id=instance.pk,
+            type_display=data.get('type_display') or doc_type.type_display,
+            title=title,
+            description=data.get('description', ''),
+            url=doc_type.url.format(id=instance.pk),
+            date=data.get('date'),
+            content=normalize(' '.join(terms)),
+        )
+
+    @staticmethod
+    def index_instance(instance):
+        """
+        تحديث مستندات الكائن في الفهرس.
+
+        Returns:
+            dict: {اسم النوع: (العنوان السابق أو None إن لم يكن مفهرساً، العنوان الجديد)}
+        """
+        titles = {}
+        for doc_type in types_for_model(type(instance)):
+            document = SearchIndexService.build_document(doc_type, instance)
+            existing = SearchDocument.objects.filter(doc_type=doc_type.name, object_id=instance.pk).first()
+            titles[doc_type.name] = (existing.title if existing else None, document.title)
+            if existing is None:
+                document.save()
+                continue
+            changed = [field for field in DOCUMENT_FIELDS if getattr(existing, field) != getattr(document, field)]
+            if changed:
+                for field in changed:
+                    setattr(existing, field, getattr(document, field))
+                existing.save(update_fields=changed + ['updated_at'])
+        return titles
+
+    @staticmethod
+    def remove_instance(instance):
+        names = [doc_type.name for doc_type in types_for_model(type(instance))]
+        if names:
+            SearchDocument.objects.filter(doc_type__in=names, object_id=instance.pk).delete()
+
+    @staticmethod
+    def reindex_dependents(instance):
+        """إعادة فهرسة المستندات التي تعرض بيانات هذا الكائن (اسم العميل، الفئة...)"""
+        count = 0
+        for doc_type, path in dependents_of(type(instance)):
+            count += SearchIndexService.reindex(doc_type, doc_type.queryset().filter(**{path: instance}))
+        return count
+
+    @staticmethod
+    def reindex(doc_type, queryset, batch_size=1000):
+        """فهرسة مجموعة كائنات من نوع واحد على دفعات (إدراج أو تحديث)"""
+        count = 0
+        batch = []
+        for instance in queryset.iterator(chunk_size=batch_size):
+            batch.append(SearchIndexService.build_document(doc_type, instance))
+            if len(batch) >= batch_size:
+                count += SearchIndexService._upsert(batch, batch_size)
+                batch = []
+        if batch:
+            count += SearchIndexService._upsert(batch, batch_size)
+        return count
+
+    @staticmethod
+    def _upsert(documents, batch_size):
+        SearchDocument.objects.bulk_create(
+            documents,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['doc_type', 'object_id'],
+            update_fields=list(DOCUMENT_FIELDS) + ['updated_at'],
+        )
+        return len(documents)
+
+    @staticmethod
+    def rebuild(type_names=None, batch_size=1000):
+        """
+        إعادة بناء الفهرس (كله أو أنواع محددة) وحذف مستندات الكائنات المحذوفة.
+
+        Returns:
+            dict: {اسم النوع: عدد المستندات المفهرسة}
+        """
+        doc_types = [DOCUMENT_TYPES_BY_NAME[name] for name in type_names] if type_names else DOCUMENT_TYPES
+        result = {}
+        for doc_type in doc_types:
+            try:
+                model = doc_type.model
+            except LookupError:
+                continue
+            SearchDocument.objects.filter(doc_type=doc_type.name).exclude(
+                object_id__in=Subquery(model.objects.values('pk'))
+            ).delete()
+            result[doc_type.name] = SearchIndexService.reindex(doc_type, doc_type.queryset(), batch_size)
+        return result
+
+    @staticmethod
+    def search(query, page=1, per_page=50):
+        """
+        البحث في الفهرس باستعلام واحد.
+
+        Returns:
+            tuple: (قائمة SearchDocument للصفحة، هل توجد صفحة تالية)
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return [], False
+        page = max(int(page or 1), 1)
+        offset = (page - 1) * per_page
+        limit = per_page + 1  # صف إضافي لمعرفة وجود صفحة تالية بدون COUNT
+
+        long_tokens = [token for token in tokens if len(token) >= TRIGRAM_MIN_LENGTH]
+        short_tokens = [token for token in tokens if len(token) < TRIGRAM_MIN_LENGTH]
+        columns = ', '.join(f'd.{field}' for field in ('id', 'doc_type', 'object_id') + DOCUMENT_FIELDS)
+
+        if connection.vendor == 'sqlite' and long_tokens and fts_available():
+            conditions = [f'{FTS_TABLE} MATCH %s'] + ["d.content LIKE %s ESCAPE '\\'"] * len(short_tokens)
+            sql = (
+                f'SELECT {columns} FROM search_searchdocument d '
+                f'JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = d.id '
+                f'WHERE {" AND ".join(conditions)} '
+                f'ORDER BY bm25({FTS_TABLE}), d.date DESC, d.id DESC LIMIT %s OFFSET %s'
+            )
+            params = [' AND '.join(_fts_phrase(token) for token in long_tokens)]
+            params += [_like_pattern(token) for token in short_tokens] + [limit, offset]
+            documents = list(SearchDocument.objects.raw(sql, params))
+        elif connection.vendor == 'postgresql':
+            conditions = ["d.content LIKE %s ESCAPE '\\'"] * len(tokens)
+            sql = (
+                f"SELECT {columns}, ts_rank(to_tsvector('simple', d.content), plainto_tsquery('simple', %s)) AS rank "
+                f'FROM search_searchdocument d WHERE {" AND ".join(conditions)} '
+                f'ORDER BY rank DESC, d.date DESC NULLS LAST, d.id DESC LIMIT %s OFFSET %s'
+            )
+            params = [' '.join(tokens)] + [_like_pattern(token) for token in tokens] + [limit, offset]
+            documents = list(SearchDocument.objects.raw(sql, params))
+        else:
+            documents = SearchDocument.objects.all()
+            for token in tokens:
+                documents = documents.filter(content__contains=token)
+            documents = list(documents.order_by('-date', '-id')[offset:offset + limit])
+
+        return documents[:per_page], len(documents) > per_page
+
+    @staticmethod
+    def as_result(document):
+        """صيغة النتيجة في search_api"""
+        doc_type = DOCUMENT_TYPES_BY_NAME.get(document.doc_type)
+        return {
+            'type': document.doc_type,
+            'type_display': document.type_display,
+            'title': document.title,
+            'description': document.description,
+            'url': document.url,
+            'date': document.date.strftime('%Y-%m-%d') if document.date else '',
+            'icon': doc_type.icon if doc_type else 'fas fa-file',
+        }
@@ -0,0 +1,78 @@
+"""
+تحديث فهرس البحث الشامل عند حفظ المستندات وحذفها
+
+تُربط المستقبلات بنماذج search.documents فقط (sender)، وتتجاهل الاستعادة من
+النسخ الاحتياطية (يُعاد بناء الفهرس بعدها). أي خطأ في الفهرسة يُسجل ولا يمنع
+حفظ المستند - أمر rebuild_search_index يصلح الفهرس. المستند نفسه يُحدّث داخل
+المعاملة، أما المستندات المرتبطة (عند تغيير اسم عميل أو فئة) فبعد تثبيتها.
+"""
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .documents import DOCUMENT_TYPES
+from .services import SearchIndexService
+
+logger = logging.getLogger(__name__)
+
+try:
+    from backup.restore_context import is_restoring
+except ImportError:
+    def is_restoring():
+        return False
+
+
+def index_document(sender, instance, created=False, raw=False, **kwargs):
+    if raw or is_restoring():
+        return
+    try:
+        titles = SearchIndexService.index_instance(instance)
+        # إعادة فهرسة المستندات المرتبطة فقط إذا تغير العنوان (اسم العميل/المورد)
+        if any(old is not None and old != new for old, new in titles.values()):
+            _reindex_dependents_on_commit(instance)
+    except Exception as e:
+        logger.error(f"خطأ في فهرسة {sender._meta.label} #{instance.pk} للبحث: {e}")
+
+
+def _reindex_dependents_on_commit(instance):
+    """قد تكون المستندات المرتبطة كثيرة فتُفهرس بعد تثبيت المعاملة لا داخلها"""
+    def reindex():
+        try:
+            SearchIndexService.reindex_dependents(instance)
+        except Exception as e:
+            logger.error(f"خطأ في إعادة فهرسة المستندات المرتبطة بـ {instance._meta.label} #{instance.pk}: {e}")
+    transaction.on_commit(reindex)
+
+
+def reindex_dependents(sender, instance, created=False, raw=False, **kwargs):
+    """نماذج غير مفهرسة تظهر بياناتها في مستندات أخرى (الفئات)"""
+    if raw or created or is_restoring():
+        return
+    _reindex_dependents_on_commit(instance)
+
+
+def remove_document(sender, instance, **kwargs):
+    if is_restoring():
+        return
+    try:
+        SearchIndexService.remove_instance(instance)
+    except Exception as e:
+        logger.error(f"خطأ في حذف {sender._meta.label} #{instance.pk} من فهرس البحث: {e}")
+
+
+def connect():
+    indexed = set()
+    for doc_type in DOCUMENT_TYPES:
+        if not apps.is_installed(doc_type.model_label.split('.')[0]):
+            continue
+        label = doc_type.model_label
+        if label not in indexed:
+            indexed.add(label)
+            post_save.connect(index_document, sender=label, dispatch_uid=f'search_index_save_{label}')
+            post_delete.connect(remove_document, sender=label, dispatch_uid=f'search_index_delete_{label}')
+
+    dependency_labels = {label for doc_type in DOCUMENT_TYPES for label in doc_type.depends_on}
+    for label in dependency_labels - indexed:
+        post_save.connect(reindex_dependents, sender=label, dispatch_uid=f'search_dependents_save_{label}')
@@ -0,0 +1,12 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق settings (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('settings.CompanySettings', fields=['company_name', 'tax_number', 'phone', 'email', 'address', 'base_currency']),
+    AuditConfig('settings.Currency', fields=['code', 'name', 'symbol', 'exchange_rate', 'is_base_currency', 'is_active']),
+    AuditConfig('settings.SuperadminSettings', fields=['system_title', 'system_subtitle', 'primary_color', 'secondary_color', 'accent_color', 'show_company_info']),
+    AuditConfig('settings.JoFotaraSettings', fields=['api_url', 'client_id', 'is_active', 'use_mock_api', 'auto_transfer_enabled', 'immediate_transfer']),
+    AuditConfig('settings.DocumentPrintSettings', fields=['document_type', 'paper_size', 'orientation', 'is_default', 'is_active']),
+)
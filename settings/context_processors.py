@@ -1,10 +1,10 @@
-from settings.models import CompanySettings, Currency, SuperadminSettings
+from core import settings_cache
 
 def currency_context(request):
     """إضافة العملة الأساسية إلى جميع templates"""
     try:
-        company_settings = CompanySettings.objects.first()
-        base_currency = Currency.get_base_currency()
+        company_settings = settings_cache.settings_company()
+        base_currency = settings_cache.base_currency()
 
         return {
             'base_currency': base_currency,
@@ -20,7 +20,7 @@ def currency_context(request):
 def superadmin_context(request):
     """إتاحة SuperadminSettings لجميع القوالب بشكل آمن"""
     try:
-        settings = SuperadminSettings.get_settings()
+        settings = settings_cache.superadmin_settings()
         return {'superadmin_settings': settings}
     except Exception:
         return {'superadmin_settings': None}
@@ -1,5 +1,6 @@
 from django import template
-from settings.models import Currency, CompanySettings
+from settings.models import Currency
+from core import settings_cache
 from decimal import Decimal
 
 register = template.Library()
@@ -22,11 +23,11 @@ def currency_format(value, currency_code=None):
             currency = Currency.objects.filter(code=currency_code).first()
         else:
             # البحث عن العملة الأساسية من إعدادات الشركة أولاً
-            company_settings = CompanySettings.objects.first()
+            company_settings = settings_cache.settings_company()
             if company_settings and company_settings.base_currency:
                 currency = company_settings.base_currency
             else:
-                currency = Currency.get_base_currency()
+                currency = settings_cache.base_currency()
         
         if not currency:
             # تنسيق ثابت: فاصلة للآلاف، نقطة للعشرية
@@ -38,7 +39,7 @@ def currency_format(value, currency_code=None):
         formatted_value = f"{value:,.{decimal_places}f}"
         
         # إضافة رمز العملة
-        company_settings = CompanySettings.objects.first()
+        company_settings = settings_cache.settings_company()
         if company_settings and company_settings.show_currency_symbol and currency.symbol:
             return f"{formatted_value} {currency.symbol}"
         else:
@@ -54,14 +55,14 @@ def currency_symbol(currency_code=None):
         currency = Currency.objects.filter(code=currency_code).first()
     else:
         # البحث عن العملة الأساسية من إعدادات الشركة أولاً
-        company_settings = CompanySettings.objects.first()
+        company_settings = settings_cache.settings_company()
         if company_settings and company_settings.base_currency:
             currency = company_settings.base_currency
         else:
-            currency = Currency.get_base_currency()
+            currency = settings_cache.base_currency()
     
     if currency:
-        company_settings = CompanySettings.objects.first()
+        company_settings = settings_cache.settings_company()
         if company_settings and company_settings.show_currency_symbol and currency.symbol:
             return currency.symbol
         else:
@@ -71,10 +72,10 @@ def currency_symbol(currency_code=None):
 @register.simple_tag
 def get_base_currency():
     """الحصول على العملة الأساسية"""
-    company_settings = CompanySettings.objects.first()
+    company_settings = settings_cache.settings_company()
     if company_settings and company_settings.base_currency:
         return company_settings.base_currency
-    return Currency.get_base_currency()
+    return settings_cache.base_currency()
 
 @register.simple_tag
 def get_active_currencies():
@@ -84,12 +85,12 @@ def get_active_currencies():
 @register.simple_tag
 def get_currency_code():
     """الحصول على رمز العملة الأساسية"""
-    company_settings = CompanySettings.objects.first()
+    company_settings = settings_cache.settings_company()
     if company_settings and company_settings.base_currency:
         return company_settings.base_currency.code
     
     # البحث عن العملة الأساسية في النظام
-    currency = Currency.get_base_currency()
+    currency = settings_cache.base_currency()
     if currency:
         return currency.code
     
@@ -99,7 +100,7 @@ def get_currency_code():
 @register.simple_tag
 def get_currency_symbol():
     """الحصول على رمز العملة الأساسية"""
-    company_settings = CompanySettings.objects.first()
+    company_settings = settings_cache.settings_company()
     if company_settings and company_settings.base_currency:
         currency = company_settings.base_currency
         if company_settings.show_currency_symbol and currency.symbol:
@@ -107,7 +108,7 @@ def get_currency_symbol():
         return currency.code
     
     # البحث عن العملة الأساسية في النظام
-    currency = Currency.get_base_currency()
+    currency = settings_cache.base_currency()
     if currency:
         return currency.symbol if currency.symbol else currency.code
     
@@ -131,11 +132,11 @@ def format_currency(value):
             value = Decimal(str(value))
         
         # الحصول على العملة الأساسية
-        company_settings = CompanySettings.objects.first()
+        company_settings = settings_cache.settings_company()
         if company_settings and company_settings.base_currency:
             currency = company_settings.base_currency
         else:
-            currency = Currency.get_base_currency()
+            currency = settings_cache.base_currency()
         
         # إذا لم توجد عملة، استخدم خانتين عشريتين افتراضياً (فاصلة للآلاف، نقطة للعشرية)
         if not currency:
@@ -8,8 +8,8 @@ register = template.Library()
 def get_session_settings():
     """الحصول على إعدادات الجلسة من إعدادات الشركة"""
     try:
-        from settings.models import CompanySettings
-        company_settings = CompanySettings.objects.first()
+        from core import settings_cache
+        company_settings = settings_cache.settings_company()
         
         if company_settings:
             return {
@@ -37,8 +37,8 @@ def get_session_settings():
 def company_setting(key, default=None):
     """فلتر للحصول على إعدادات الشركة"""
     try:
-        from settings.models import CompanySettings
-        company_settings = CompanySettings.objects.first()
+        from core import settings_cache
+        company_settings = settings_cache.settings_company()
         
         if company_settings:
             return getattr(company_settings, key, default)
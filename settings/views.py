@@ -522,6 +522,10 @@ class DocumentSequenceEditView(LoginRequiredMixin, View):
             sequence.current_number = current_number
             sequence.digits = digits
             sequence.save()
+
+            # الكتل المحجوزة مسبقاً بالبادئة أو العداد القديم لم تعد صالحة
+            from core.numbering import DocumentNumberService
+            DocumentNumberService.release_blocks()
             
             # تسجيل النشاط في سجل الأنشطة
             from core.signals import log_activity
@@ -0,0 +1,10 @@
+"""
+النماذج الخاضعة لسجل المراجعة في تطبيق users (انظر core.audit_registry)
+"""
+from core.audit_registry import AuditConfig, audit_registry
+
+audit_registry.register(
+    AuditConfig('users.User', fields=['username', 'email', 'is_active', 'user_type', 'phone', 'department']),
+    AuditConfig('users.UserGroup', fields=['name', 'description']),
+    AuditConfig('users.UserGroupMembership', fields=['user', 'group']),
+)
@@ -5,105 +5,6 @@ from django.utils.translation import gettext_lazy as _
 
 
 class User(AbstractUser):
-    def has_revenueexpenseentry_view_permission(self):
-        """
-        تعيد True إذا كان لدى المستخدم صلاحية عرض قيد إيراد/مصروف
-        سواء من دجانغو أو من الclass UserGroup(models.Model):
-    
-    name = models.CharField(_('Group Name'), max_length=100, unique=True)
-    description = models.TextField(_('Description'), blank=True)
-    permissions = models.JSONField(_('Permissions'), default=dict)
-    dashboard_sections = models.JSONField(_('Dashboard Sections'), default=list, help_text=_('List of dashboard sections to display for this group'))
-    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
-    updated_at = models.DateTimeField(_('Updated At'), auto_now=True) المخصصة
-        """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحية دجانغو الافتراضية
-        if self.has_perm('revenues_expenses.view_revenueexpenseentry'):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'view_revenueexpenseentry' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
-    def has_revenueexpensecategory_view_permission(self):
-        """
-        تعيد True إذا كان لدى المستخدم صلاحية عرض فئة إيراد/مصروف
-        سواء من دجانغو أو من المجموعات المخصصة
-        """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحية دجانغو الافتراضية
-        if self.has_perm('revenues_expenses.view_revenueexpensecategory'):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'view_revenueexpensecategory' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
-    def has_revenueexpensecategory_add_permission(self):
-        """
-        تعيد True إذا كان لدى المستخدم صلاحية إضافة فئة إيراد/مصروف
-        سواء من دجانغو أو من المجموعات المخصصة
-        """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحية دجانغو الافتراضية
-        if self.has_perm('revenues_expenses.add_revenueexpensecategory'):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'add_revenueexpensecategory' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
-    def has_revenueexpenseentry_add_permission(self):
-        """
-        تعيد True إذا كان لدى المستخدم صلاحية إضافة قيد إيراد/مصروف
-        سواء من دجانغو أو من المجموعات المخصصة
-        """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحية دجانغو الافتراضية
-        if self.has_perm('revenues_expenses.add_revenueexpenseentry'):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'add_revenueexpenseentry' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
     """مستخدم مخصص"""
     USER_TYPES = [
         ('superadmin', _('Super Admin')),
@@ -184,213 +85,104 @@ class User(AbstractUser):
     def is_admin(self):
         return self.user_type in ['superadmin', 'admin', 'manager'] or self.is_superuser
 
+    @property
+    def permission_matrix(self):
+        """الصلاحيات الفعلية المجمعة مسبقاً (users.permission_matrix)"""
+        from users.permission_matrix import get_matrix
+        return get_matrix(self)
+
+    def _has_capability(self, capability):
+        return self.is_admin or self.permission_matrix.has(capability)
+
+    def has_revenueexpenseentry_view_permission(self):
+        """
+        تعيد True إذا كان لدى المستخدم صلاحية عرض قيد إيراد/مصروف
+        سواء من دجانغو أو من المجموعات المخصصة
+        """
+        return self._has_capability('view_revenueexpenseentry')
+
+    def has_revenueexpensecategory_view_permission(self):
+        """
+        تعيد True إذا كان لدى المستخدم صلاحية عرض فئة إيراد/مصروف
+        سواء من دجانغو أو من المجموعات المخصصة
+        """
+        return self._has_capability('view_revenueexpensecategory')
+
+    def has_revenueexpensecategory_add_permission(self):
+        """
+        تعيد True إذا كان لدى المستخدم صلاحية إضافة فئة إيراد/مصروف
+        سواء من دجانغو أو من المجموعات المخصصة
+        """
+        return self._has_capability('add_revenueexpensecategory')
+
+    def has_revenueexpenseentry_add_permission(self):
+        """
+        تعيد True إذا كان لدى المستخدم صلاحية إضافة قيد إيراد/مصروف
+        سواء من دجانغو أو من المجموعات المخصصة
+        """
+        return self._has_capability('add_revenueexpenseentry')
+
     def has_sales_permission(self):
         """
         تعيد True إذا كان لدى المستخدم صلاحية الوصول إلى المبيعات
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحيات sales المفصلة
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            cts = ContentType.objects.filter(app_label='sales')
-            sales_perms = set()
-            for ct in cts:
-                sales_perms.update(f'sales.{codename}' for codename in Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            sales_perms = set()
-        user_perms = set(self.get_all_permissions())
-        if user_perms.intersection(sales_perms):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'view_sales' in perms_list or 'add_salesinvoice' in perms_list or 'change_salesinvoice' in perms_list or 'delete_salesinvoice' in perms_list or 'view_salesreturn' in perms_list or 'add_salesreturn' in perms_list or 'change_salesreturn' in perms_list or 'delete_salesreturn' in perms_list or 'view_salescreditnote' in perms_list or 'add_salescreditnote' in perms_list or 'change_salescreditnote' in perms_list or 'delete_salescreditnote' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
+        return self._has_capability('sales')
 
     def can_change_invoice_creator(self):
         """
         تعيد True إذا كان لدى المستخدم صلاحية تغيير منشئ الفاتورة
         """
-        if self.is_admin:
-            return True
-        # تحقق من الصلاحية المخصصة
-        if self.has_perm('sales.can_change_invoice_creator'):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                sales_perms = group_perms.get('sales', [])
-                if 'can_change_invoice_creator' in sales_perms:
-                    return True
-        except Exception:
-            pass
-        return False
+        return self._has_capability('change_invoice_creator')
 
     def has_purchases_permission(self):
-        return (
-            self.is_admin
-            or self.has_perm('purchases.can_view_purchases')
-            or self.has_perm('purchases.can_view_debitnote')
-            or self.has_perm('purchases.can_view_purchasereturn')
-            or self.has_perm('purchases.add_purchaseinvoice')
-            or self.has_perm('purchases.add_purchasereturn')
-            or self.has_perm('purchases.view_purchaseinvoice')
-            or self.has_perm('purchases.can_view_purchase_statement')
-        )
+        return self._has_capability('purchases')
 
     def has_inventory_permission(self):
         """
         تعيد True إذا كان لدى المستخدم صلاحية الوصول إلى المخزون
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحيات inventory المفصلة
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            cts = ContentType.objects.filter(app_label='inventory')
-            inventory_perms = set()
-            for ct in cts:
-                inventory_perms.update(f'inventory.{codename}' for codename in Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            inventory_perms = set()
-        user_perms = set(self.get_all_permissions())
-        if user_perms.intersection(inventory_perms):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'view_inventory' in perms_list or 'add_warehouse' in perms_list or 'change_warehouse' in perms_list or 'delete_warehouse' in perms_list or 'view_inventorymovement' in perms_list or 'add_inventorymovement' in perms_list or 'change_inventorymovement' in perms_list or 'delete_inventorymovement' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
+        return self._has_capability('inventory')
 
     def has_products_permission(self):
-        return (
-            self.is_admin
-            or self.has_perm('products.can_view_products')
-            or self.has_perm('products.can_edit_products')
-        )
+        return self._has_capability('products')
 
     def has_banks_permission(self):
-        return (
-            self.is_admin
-            or self.has_perm('banks.can_view_banks_account')
-        )
+        return self._has_capability('banks')
 
     def has_cashboxes_permission(self):
         """التحقق من صلاحية عرض الصناديق النقدية"""
-        return (
-            self.is_admin 
-            or self.has_perm('cashboxes.can_view_cashboxes')
-        )
+        return self._has_capability('cashboxes')
 
     def has_receipts_permission(self):
-        return self.is_superadmin or self.user_type == 'admin' or self.has_perm('receipts.can_access_receipts')
+        return self.is_superadmin or self.user_type == 'admin' or self.permission_matrix.has('receipts')
 
     def has_reports_permission(self):
         """
         تعيد True إذا كان لدى المستخدم صلاحية الوصول إلى التقارير
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحيات reports المفصلة
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            cts = ContentType.objects.filter(app_label='reports')
-            reports_perms = set()
-            for ct in cts:
-                reports_perms.update(f'reports.{codename}' for codename in Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            reports_perms = set()
-        user_perms = set(self.get_all_permissions())
-        if user_perms.intersection(reports_perms):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    # Check for any reports-related custom permissions
-                    if 'view_reports' in perms_list or any(perm.startswith('can_view_') and 'report' in perm for perm in perms_list):
-                        return True
-        except Exception:
-            pass
-        return False
+        return self._has_capability('reports')
 
     def has_settings_permission(self):
         """
         تعيد True إذا كان لدى المستخدم صلاحية الوصول إلى الإعدادات
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         """
-        if self.is_admin:
-            return True
-        # تحقق من صلاحيات settings المفصلة
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            cts = ContentType.objects.filter(app_label='settings')
-            settings_perms = set()
-            for ct in cts:
-                settings_perms.update(f'settings.{codename}' for codename in Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            settings_perms = set()
-        user_perms = set(self.get_all_permissions())
-        if user_perms.intersection(settings_perms):
-            return True
-        # تحقق من صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    if 'view_settings' in perms_list or 'add_currency' in perms_list or 'change_currency' in perms_list or 'delete_currency' in perms_list or 'add_companysettings' in perms_list or 'change_companysettings' in perms_list or 'delete_companysettings' in perms_list:
-                        return True
-        except Exception:
-            pass
-        return False
+        return self._has_capability('settings')
 
     def can_delete_invoice(self):
-        return self.is_admin or self.has_perm('users.can_delete_invoices')
+        return self._has_capability('delete_invoices')
 
     def can_edit_invoice_date(self):
-        return self.is_admin or self.has_perm('users.can_edit_dates')
+        return self._has_capability('edit_dates')
 
     def can_edit_invoice_number(self):
-        return self.is_admin or self.has_perm('users.can_edit_invoice_numbers')
+        return self._has_capability('edit_invoice_numbers')
 
     def has_pos_permission(self):
-        return (self.is_admin or self.user_type == 'pos_user' or
-                self.has_perm('users.can_access_pos') or self.has_perm('sales.can_access_pos'))
+        return self.is_admin or self.user_type == 'pos_user' or self.permission_matrix.has('pos')
 
     def is_pos_only_user(self):
         return False  # تم إزالة الصلاحية غير المستخدمة
@@ -409,76 +201,15 @@ class User(AbstractUser):
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         تقرأ جميع الصلاحيات المخزنة في UserGroup لأي مفتاح.
         """
-        if self.is_admin:
-            return True
-        # صلاحيات دجانغو الافتراضية
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            ct = ContentType.objects.get(app_label='revenues_expenses')
-            perms_django = set(Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            perms_django = set()
-        user_perms = set(self.get_all_permissions())
-        # صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            custom_perms = set()
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                # اجمع جميع الصلاحيات لأي مفتاح
-                for perms_list in group_perms.values():
-                    for perm in perms_list:
-                        custom_perms.add(perm)
-        except Exception:
-            custom_perms = set()
-        # تحقق من أي صلاحية تخص الإيرادات والمصروفات
-        all_perms = user_perms.union(custom_perms)
-        for perm in all_perms:
-            if 'revenueexpense' in perm or 'revenues_expenses' in perm:
-                return True
-        return False
+        return self._has_capability('revenues_expenses')
+
     def has_journal_permission(self):
         """
         تعيد True إذا كان لدى المستخدم أي صلاحية من قسم القيود اليومية (journal)
         سواء كانت الصلاحية مباشرة أو من خلال المجموعات الافتراضية أو المجموعات المخصصة (UserGroup).
         """
-        if self.is_admin:
-            return True
-        # صلاحيات دجانغو الافتراضية
-        from django.contrib.auth.models import Permission
-        from django.contrib.contenttypes.models import ContentType
-        try:
-            ct = ContentType.objects.get(app_label='journal')
-            perms_django = set(Permission.objects.filter(content_type=ct).values_list('codename', flat=True))
-        except Exception:
-            perms_django = set()
-        user_perms = set(self.get_all_permissions())
-        # صلاحيات المجموعات المخصصة
-        try:
-            from users.models import UserGroupMembership
-            group_ids = UserGroupMembership.objects.filter(user=self).values_list('group_id', flat=True)
-            from users.models import UserGroup
-            custom_perms = set()
-            for group in UserGroup.objects.filter(id__in=group_ids):
-                group_perms = group.permissions or {}
-                for perms_list in group_perms.values():
-                    for perm in perms_list:
-                        custom_perms.add(perm)
-        except Exception:
-            custom_perms = set()
-        all_perms = user_perms.union(custom_perms)
-        for perm in all_perms:
-            if (
-                'journalentry' in perm or 'journal_entry' in perm or
-                'account' in perm or 'journalaccount' in perm or
-                'journalline' in perm or 'journal_line' in perm or
-                'journal' in perm
-            ):
-                return True
-        return False
+        return self._has_capability('journal')
+
     def save(self, *args, **kwargs):
         """حفظ المستخدم مع تعيين الصلاحيات حسب النوع"""
         is_new = self.pk is None
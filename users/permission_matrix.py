@@ -0,0 +1,178 @@
+"""
+مصفوفة صلاحيات المستخدم المُجمّعة مسبقاً
+
+كانت كل دالة has_*_permission في User تستعلم ContentType و Permission للتطبيق
+ثم get_all_permissions() ثم تمر على UserGroupMembership و UserGroup.permissions
+(JSON) - وتُستدعى عشرات المرات في القائمة الجانبية لكل صفحة.
+
+الآن تُجمع الصلاحيات الفعلية للمستخدم مرة واحدة (3 استعلامات):
+- صلاحيات دجانغو المباشرة ومن المجموعات ('app.codename')
+- صلاحيات المجموعات المخصصة UserGroup (الأسماء المختصرة لكل قسم)
+ثم تُحسب منها القدرات (sales، journal، ...) في frozenset ثابت، ويُحفظ الناتج
+على كائن المستخدم وفي core.settings_cache بمفتاح لكل مستخدم.
+
+الإبطال من core.signals: تعديل مجموعات المستخدم وصلاحيات المجموعات وصلاحياته
+المباشرة (m2m_changed) وحفظ/حذف UserGroup و UserGroupMembership وحفظ المستخدم.
+فحوص is_admin و user_type تبقى في النموذج لأنها من صف المستخدم نفسه.
+بدون ذاكرة مشتركة (SETTINGS_CACHE_ALIAS) لا يصل الإبطال إلى العمليات الأخرى، لذلك
+المفتاح strict: لا تبقى المصفوفة فيها أكثر من SETTINGS_CACHE_LOCAL_TIMEOUT ثوانٍ.
+"""
+from core import settings_cache
+
+CACHE_KEY = 'permission_matrix:{}'
+
+SALES_GROUP_PERMS = frozenset({
+    'view_sales', 'add_salesinvoice', 'change_salesinvoice', 'delete_salesinvoice',
+    'view_salesreturn', 'add_salesreturn', 'change_salesreturn', 'delete_salesreturn',
+    'view_salescreditnote', 'add_salescreditnote', 'change_salescreditnote', 'delete_salescreditnote',
+})
+INVENTORY_GROUP_PERMS = frozenset({
+    'view_inventory', 'add_warehouse', 'change_warehouse', 'delete_warehouse',
+    'view_inventorymovement', 'add_inventorymovement', 'change_inventorymovement', 'delete_inventorymovement',
+})
+SETTINGS_GROUP_PERMS = frozenset({
+    'view_settings', 'add_currency', 'change_currency', 'delete_currency',
+    'add_companysettings', 'change_companysettings', 'delete_companysettings',
+})
+PURCHASES_PERMS = frozenset({
+    'purchases.can_view_purchases', 'purchases.can_view_debitnote', 'purchases.can_view_purchasereturn',
+    'purchases.add_purchaseinvoice', 'purchases.add_purchasereturn', 'purchases.view_purchaseinvoice',
+    'purchases.can_view_purchase_statement',
+})
+JOURNAL_MARKERS = ('journalentry', 'journal_entry', 'account', 'journalaccount', 'journalline',
+                   'journal_line', 'journal')
+
+
+def _has_app_perm(matrix, app_label):
+    prefix = f'{app_label}.'
+    return any(perm.startswith(prefix) for perm in matrix.perms)
+
+
+def _has_model_perm(matrix, app_label, codename):
+    """صلاحية دجانغو أو نفس الاسم المختصر في أي قسم من المجموعات المخصصة"""
+    return f'{app_label}.{codename}' in matrix.perms or codename in matrix.group_perms
+
+
+# القدرة -> شرطها على المصفوفة (نفس منطق دوال User السابقة)
+CAPABILITY_RULES = {
+    'sales': lambda m: _has_app_perm(m, 'sales') or bool(m.group_perms & SALES_GROUP_PERMS),
+    'change_invoice_creator': lambda m: (
+        'sales.can_change_invoice_creator' in m.perms
+        or 'can_change_invoice_creator' in m.section_perms.get('sales', ())
+    ),
+    'purchases': lambda m: bool(m.perms & PURCHASES_PERMS),
+    'inventory': lambda m: _has_app_perm(m, 'inventory') or bool(m.group_perms & INVENTORY_GROUP_PERMS),
+    'products': lambda m: bool(m.perms & {'products.can_view_products', 'products.can_edit_products'}),
+    'banks': lambda m: 'banks.can_view_banks_account' in m.perms,
+    'cashboxes': lambda m: 'cashboxes.can_view_cashboxes' in m.perms,
+    'receipts': lambda m: 'receipts.can_access_receipts' in m.perms,
+    'reports': lambda m: _has_app_perm(m, 'reports') or 'view_reports' in m.group_perms or any(
+        perm.startswith('can_view_') and 'report' in perm for perm in m.group_perms
+    ),
+    'settings': lambda m: _has_app_perm(m, 'settings') or bool(m.group_perms & SETTINGS_GROUP_PERMS),
+    'delete_invoices': lambda m: 'users.can_delete_invoices' in m.perms,
+    'edit_dates': lambda m: 'users.can_edit_dates' in m.perms,
+    'edit_invoice_numbers': lambda m: 'users.can_edit_invoice_numbers' in m.perms,
+    'pos': lambda m: bool(m.perms & {'users.can_access_pos', 'sales.can_access_pos'}),
+    'revenues_expenses': lambda m: any(
+        'revenueexpense' in perm or 'revenues_expenses' in perm for perm in m.perms | m.group_perms
+    ),
+    'journal': lambda m: any(
+        marker in perm for perm in m.perms | m.group_perms for marker in JOURNAL_MARKERS
+    ),
+    'view_revenueexpenseentry': lambda m: _has_model_perm(m, 'revenues_expenses', 'view_revenueexpenseentry'),
+    'add_revenueexpenseentry': lambda m: _has_model_perm(m, 'revenues_expenses', 'add_revenueexpenseentry'),
+    'view_revenueexpensecategory': lambda m: _has_model_perm(m, 'revenues_expenses', 'view_revenueexpensecategory'),
+    'add_revenueexpensecategory': lambda m: _has_model_perm(m, 'revenues_expenses', 'add_revenueexpensecategory'),
+}
+
+
+class PermissionMatrix:
+    """صلاحيات مستخدم واحد بعد تجميعها (غير قابلة للتعديل)"""
+
+    __slots__ = ('perms', 'group_perms', 'section_perms', 'capabilities')
+
+    def __init__(self, perms=(), section_perms=None):
+        """
+        Args:
+            perms: صلاحيات دجانغو الفعلية بصيغة 'app_label.codename'
+            section_perms: {القسم: [الأسماء المختصرة]} مجمعة من UserGroup.permissions
+        """
+        self.perms = frozenset(perms)
+        self.section_perms = {
+            section: frozenset(codenames) for section, codenames in (section_perms or {}).items()
+        }
+        self.group_perms = frozenset().union(*self.section_perms.values())
+        self.capabilities = frozenset(name for name, rule in CAPABILITY_RULES.items() if rule(self))
+
+    def has(self, capability):
+        return capability in self.capabilities
+
+    def has_perm(self, perm):
+        return perm in self.perms
+
+
+def _section_perms(user):
+    """دمج UserGroup.permissions لجميع مجموعات المستخدم المخصصة باستعلام واحد"""
+    from .models import UserGroup
+
+    sections = {}
+    try:
+        for group_perms in UserGroup.objects.filter(usergroupmembership__user_id=user.pk).values_list(
+            'permissions', flat=True
+        ):
+            if not isinstance(group_perms, dict):
+                continue
+            for section, codenames in group_perms.items():
+                if isinstance(codenames, (list, tuple, set)):
+                    sections.setdefault(section, set()).update(codenames)
+    except Exception:
+        pass
+    return sections
+
+
+def compile_matrix(user):
+    """تجميع مصفوفة المستخدم من قاعدة البيانات (بدون ذاكرة مؤقتة)"""
+    return PermissionMatrix(user.get_all_permissions(), _section_perms(user))
+
+
+def get_matrix(user):
+    """مصفوفة المستخدم: من الكائن، ثم من الذاكرة المؤقتة، ثم التجميع"""
+    matrix = getattr(user, '_permission_matrix', None)
+    if matrix is None:
+        if user.pk is None:
+            matrix = compile_matrix(user)
+        else:
+            matrix = settings_cache.get(CACHE_KEY.format(user.pk), lambda: compile_matrix(user), strict=True)
+        user._permission_matrix = matrix
+    return matrix
+
+
+def invalidate_users(user_ids):
+    keys = [CACHE_KEY.format(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        settings_cache.invalidate(*keys)
+
+
+def invalidate_user(user):
+    """إبطال مصفوفة مستخدم (كائن أو معرّف)"""
+    if hasattr(user, 'pk'):
+        user.__dict__.pop('_permission_matrix', None)
+        # ذاكرة دجانغو لصلاحيات الكائن نفسه
+        user.__dict__.pop('_perm_cache', None)
+        user.__dict__.pop('_user_perm_cache', None)
+        user.__dict__.pop('_group_perm_cache', None)
+        user = user.pk
+    invalidate_users([user])
+
+
+def invalidate_group(group):
+    """إبطال مصفوفات أعضاء مجموعة دجانغو (auth.Group)"""
+    invalidate_users(group.user_set.values_list('id', flat=True))
+
+
+def invalidate_user_group(group):
+    """إبطال مصفوفات أعضاء مجموعة مخصصة (UserGroup)"""
+    from .models import UserGroupMembership
+
+    invalidate_users(UserGroupMembership.objects.filter(group_id=group.pk).values_list('user_id', flat=True))
@@ -0,0 +1,76 @@
+"""
+اختبارات مصفوفة الصلاحيات المجمعة مسبقاً
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.test import TestCase, override_settings
+
+from core import settings_cache
+from users.models import UserGroup, UserGroupMembership
+
+User = get_user_model()
+
+PERMISSION_METHODS = (
+    'has_sales_permission', 'can_change_invoice_creator', 'has_purchases_permission',
+    'has_inventory_permission', 'has_products_permission', 'has_banks_permission',
+    'has_cashboxes_permission', 'has_receipts_permission', 'has_reports_permission',
+    'has_settings_permission', 'can_delete_invoice', 'can_edit_invoice_date', 'can_edit_invoice_number',
+    'has_pos_permission', 'has_company_settings_permission', 'has_system_management_permission',
+    'has_revenues_expenses_permission', 'has_journal_permission',
+    'has_revenueexpenseentry_view_permission', 'has_revenueexpenseentry_add_permission',
+    'has_revenueexpensecategory_view_permission', 'has_revenueexpensecategory_add_permission',
+)
+
+
+class PermissionMatrixTests(TestCase):
+    """تجميع الصلاحيات مرة واحدة لكل مستخدم وإبطالها عند تعديلها"""
+
+    def setUp(self):
+        settings_cache.clear()
+        self.user = User.objects.create_user(username='matrix_user', password='test_password')
+        self.group = UserGroup.objects.create(name='مبيعات', permissions={'sales': ['view_sales']})
+        UserGroupMembership.objects.create(user=self.user, group=self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_checks_are_cached_per_user(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(3):
+            self.assertTrue(user.has_sales_permission())
+        with self.assertNumQueries(0):
+            for method in PERMISSION_METHODS:
+                getattr(user, method)()
+
+        # كائن جديد لنفس المستخدم (طلب جديد) يقرأ من الذاكرة المؤقتة
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_sales_permission())
+            self.assertFalse(user.has_journal_permission())
+
+    def test_user_group_changes_invalidate(self):
+        self.assertFalse(self.fresh_user().has_reports_permission())
+
+        self.group.permissions = {'sales': ['view_sales'], 'reports': ['view_reports']}
+        self.group.save()
+        self.assertTrue(self.fresh_user().has_reports_permission())
+
+        UserGroupMembership.objects.filter(user=self.user).delete()
+        self.assertFalse(self.fresh_user().has_sales_permission())
+
+    def test_direct_permissions_invalidate(self):
+        self.assertFalse(self.fresh_user().can_delete_invoice())
+
+        user = self.fresh_user()
+        self.assertFalse(user.can_edit_invoice_date())
+        user.user_permissions.add(Permission.objects.get(codename='can_edit_dates'))
+        self.assertTrue(user.can_edit_invoice_date())
+        self.assertTrue(self.fresh_user().can_edit_invoice_date())
+
+    @override_settings(SETTINGS_CACHE_ALIAS=None, SETTINGS_CACHE_LOCAL_TIMEOUT=0)
+    def test_not_shared_across_requests_without_shared_cache(self):
+        self.assertTrue(self.fresh_user().has_sales_permission())
+        # إبطال في عامل آخر لا يصل لهذه العملية: كل طلب يعيد التجميع
+        user = self.fresh_user()
+        with self.assertNumQueries(3):
+            self.assertTrue(user.has_sales_permission())